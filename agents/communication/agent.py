@@ -1,4 +1,4 @@
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 from datetime import datetime
 import re
 import os
@@ -6,6 +6,8 @@ from schemas import (
     VehicleDefect, VehicleStatus, ConversationContext, 
     UserResponse, AgentMessage, CommunicationOutput
 )
+import keyword_matcher
+from intent_model import INTENT_MODEL_CONFIDENCE, load_model
 
 # Load environment variables from .env file
 try:
@@ -17,7 +19,7 @@ except ImportError:
 # Twilio for voice calls
 try:
     from twilio.rest import Client
-    from twilio.twiml.voice_response import VoiceResponse, Gather
+    from twilio.twiml.voice_response import VoiceResponse, Gather, Connect
     TWILIO_AVAILABLE = True
 except ImportError:
     TWILIO_AVAILABLE = False
@@ -64,6 +66,9 @@ class VoiceCommunicationAgent:
         else:
             print("Using rule-based responses (LLM not configured)")
         
+        # Trained intent classifier (None until scripts/train_intent_model.py has written a model)
+        self.intent_model = load_model()
+        
         # Severity-based response templates (used as fallback)
         self.severity_intros = {
             "Critical": {
@@ -139,6 +144,21 @@ class VoiceCommunicationAgent:
     def analyze_user_tone(self, user_message: str) -> Dict[str, str]:
         """Analyze user's speaking style and preferences using LLM or rule-based logic"""
         
+        # A confident prediction from the trained intent classifier skips the LLM
+        if self.use_llm and self.intent_model:
+            intent, confidence = self.intent_model.predict(user_message)
+            if confidence >= INTENT_MODEL_CONFIDENCE:
+                analysis = keyword_matcher.analyze(user_message)
+                return {
+                    'tone': analysis['tone'],
+                    'language_preference': analysis['language_preference'],
+                    'sentiment': analysis['sentiment'],
+                    'intent': intent,
+                    'key_concerns': analysis['key_concerns'],
+                    'confidence': round(confidence, 3),
+                    'method': 'model'
+                }
+        
         # Use LLM for advanced analysis if available
         if self.use_llm:
             try:
@@ -171,59 +191,19 @@ class VoiceCommunicationAgent:
                     'intent': analysis.get('intent', 'ask_question'),
                     'key_concerns': analysis.get('key_concerns', []),
                     'confidence': analysis.get('confidence', 0.9),
-                    'method': 'llm'
+                    'method': analysis.get('method', 'llm')
                 }
             except Exception as e:
                 print(f"LLM analysis failed, falling back to rules: {e}")
         
-        # Fallback to rule-based analysis
-        message_lower = user_message.lower()
-        
-        # Detect formality
-        formal_indicators = ["sir", "madam", "please", "kindly", "thank you", "appreciate"]
-        casual_indicators = ["yeah", "yep", "ok", "sure", "cool", "got it", "alright"]
-        
-        is_formal = any(word in message_lower for word in formal_indicators)
-        is_casual = any(word in message_lower for word in casual_indicators)
-        
-        # Detect technical vs simple preference
-        technical_words = ["diagnostic", "sensor", "dtc", "fault code", "system", "mechanism"]
-        has_technical = any(word in message_lower for word in technical_words)
-        
-        # Detect urgency/concern
-        urgent_words = ["urgent", "emergency", "immediate", "asap", "quickly", "right now"]
-        concerned_words = ["worried", "concerned", "afraid", "serious", "dangerous", "safe"]
-        
-        is_urgent = any(word in message_lower for word in urgent_words)
-        is_concerned = any(word in message_lower for word in concerned_words)
-        
-        # Determine tone
-        if is_formal and not is_casual:
-            tone = "formal"
-        elif is_casual and not is_formal:
-            tone = "casual"
-        else:
-            tone = "neutral"
-        
-        # Determine language preference
-        language_pref = "technical" if has_technical else "simple"
-        
-        # Determine sentiment
-        if is_urgent or is_concerned:
-            sentiment = "concerned"
-        elif any(word in message_lower for word in ["great", "good", "thanks", "appreciate"]):
-            sentiment = "positive"
-        elif any(word in message_lower for word in ["no", "not interested", "busy", "later"]):
-            sentiment = "negative"
-        else:
-            sentiment = "neutral"
-        
+        # Fallback to rule-based analysis (one pass of the keyword matcher)
+        analysis = keyword_matcher.analyze(user_message)
         return {
-            "tone": tone,
-            "language_preference": language_pref,
-            "sentiment": sentiment,
-            "is_urgent": is_urgent,
-            "is_concerned": is_concerned
+            "tone": analysis["tone"],
+            "language_preference": analysis["language_preference"],
+            "sentiment": analysis["sentiment"],
+            "is_urgent": analysis["is_urgent"],
+            "is_concerned": analysis["is_concerned"]
         }
     
     def explain_defect(self, defect: VehicleDefect, user_preference: str = "simple", 
@@ -429,6 +409,68 @@ class VoiceCommunicationAgent:
             simplified_version=response
         )
     
+    def stream_defect_explanation(self, defect: VehicleDefect, user_preference: str = "simple",
+                                  tone: str = "empathetic") -> Iterator[str]:
+        """
+        Streaming variant of explain_defect for the media-stream voice mode:
+        yields LLM text deltas as they are generated, or the template
+        explanation in one piece when the LLM is not configured
+        """
+        if not self.use_llm:
+            yield self.explain_defect(defect, user_preference, tone).message
+            return
+        
+        vehicle_context, defect_info, history = self._llm_context(defect)
+        yield from self.llm_service.stream_response(
+            user_message=f"Explain the {defect.component} issue in {user_preference} terms with {tone} tone",
+            conversation_history=history,
+            vehicle_context=vehicle_context,
+            defect_info=defect_info,
+            response_type='urgent' if defect.severity == 'Critical' else 'informative'
+        )
+    
+    def stream_user_question(self, question: str, defect: VehicleDefect) -> Iterator[str]:
+        """Streaming variant of handle_user_question (see stream_defect_explanation)"""
+        if not self.use_llm:
+            yield self.handle_user_question(question, defect).message
+            return
+        
+        vehicle_context, defect_info, history = self._llm_context(defect)
+        yield from self.llm_service.stream_response(
+            user_message=question,
+            conversation_history=history,
+            vehicle_context=vehicle_context,
+            defect_info=defect_info,
+            response_type='conversational'
+        )
+    
+    def _llm_context(self, defect: VehicleDefect):
+        """Vehicle context, defect info and history in the shape LLMService expects"""
+        vehicle_context = {
+            'registration_number': self.context.vehicle_status.registration_number,
+            'health_score': self.context.vehicle_status.health_score,
+            'defect_count': len(self.context.vehicle_status.defects),
+            'owner_name': getattr(self.context.vehicle_status, 'owner_name', 'Customer'),
+            'odometer_km': getattr(self.context.vehicle_status, 'odometer_km', 0)
+        }
+        
+        defect_info = {
+            'component': defect.component,
+            'severity': defect.severity,
+            'description': defect.description,
+            'confidence': defect.confidence,
+            'estimated_time_to_failure': defect.estimated_time_to_failure,
+            'recommended_action': defect.recommended_action,
+            'fault_codes': defect.fault_codes
+        }
+        
+        history = [
+            {'role': msg.get('role', 'unknown'), 'message': msg.get('message', '')}
+            for msg in self.context.conversation_history
+        ]
+        
+        return vehicle_context, defect_info, history
+    
     def make_voice_call(self, to_phone_number: str, customer_name: str, 
                        callback_url: str) -> Dict[str, str]:
         """
@@ -641,3 +683,31 @@ class VoiceCommunicationAgent:
         response.hangup()
         
         return str(response)
+    
+    def generate_twiml_media_stream(self, stream_url: str,
+                                    parameters: Optional[Dict[str, str]] = None) -> str:
+        """
+        Generate TwiML that hands the call to the media-stream server
+        (media_stream_server.py) instead of <Say>/<Gather> turns
+        
+        Args:
+            stream_url: wss:// URL of the media-stream server
+            parameters: Call facts passed to the server as stream customParameters
+            
+        Returns:
+            TwiML XML string
+        """
+        response = VoiceResponse()
+        
+        connect = Connect()
+        stream = connect.stream(url=stream_url)
+        for name, value in (parameters or {}).items():
+            if value is not None:
+                stream.parameter(name=name, value=str(value))
+        
+        response.append(connect)
+        
+        # Reached when the server closes the stream
+        response.hangup()
+        
+        return str(response)
@@ -0,0 +1,100 @@
+"""
+Tail-latency benchmark for LLMRouter against local fake providers.
+
+Compares:
+- single: every request to one provider (what LLMService does with LLM_PROVIDER)
+- hedged: the same requests through LLMRouter over two providers
+- outage: the primary fails every call; the breaker opens and requests go
+  straight to the second provider instead of paying the failure each time
+
+Run with: python benchmark_llm_router.py [requests]
+"""
+
+import json
+import math
+import random
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from llm_router import LLMRouter, LLMUnavailable
+
+
+class FakeProvider:
+    """Blocking prompt -> text callable with a latency profile: base latency, plus a slow tail on tail_rate of calls."""
+
+    def __init__(self, name: str, latency_ms: float, tail_ms: float = 0.0, tail_rate: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.tail_ms = tail_ms
+        self.tail_rate = tail_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt: str) -> str:
+        with self.lock:
+            self.calls += 1
+            slow = self.random.random() < self.tail_rate
+            fail = self.random.random() < self.error_rate
+            jitter = self.random.uniform(0.8, 1.2)
+        if fail:
+            time.sleep(self.latency_ms * 0.1 / 1000)
+            raise RuntimeError(f"{self.name} unavailable")
+        time.sleep((self.tail_ms if slow else self.latency_ms) * jitter / 1000)
+        return f"{self.name}: {prompt[:20]}"
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+
+    def rank(q):
+        return round(ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)] * 1000, 1)
+
+    return {"p50_ms": rank(50), "p90_ms": rank(90), "p99_ms": rank(99)}
+
+
+def timed(call, requests: int) -> dict:
+    latencies = []
+    failures = 0
+    for i in range(requests):
+        started = time.perf_counter()
+        try:
+            call(f"Explain defect {i} to the customer")
+        except (LLMUnavailable, RuntimeError):
+            failures += 1
+        latencies.append(time.perf_counter() - started)
+    return {**percentiles(latencies), "failures": failures}
+
+
+def benchmark(requests: int = 200, latency_ms: float = 20.0, tail_ms: float = 400.0,
+              tail_rate: float = 0.05) -> dict:
+    """Single-provider vs hedged latency percentiles, and the outage scenario."""
+    single = timed(FakeProvider("groq", latency_ms, tail_ms, tail_rate, seed=1), requests)
+
+    router = LLMRouter({
+        "groq": FakeProvider("groq", latency_ms, tail_ms, tail_rate, seed=1),
+        "gemini": FakeProvider("gemini", latency_ms * 1.5, tail_ms, tail_rate, seed=2),
+    }, hedge_delay_seconds=latency_ms * 3 / 1000)
+    hedged = timed(router.complete_sync, requests)
+    hedged["hedge_rate"] = round(router.hedges / router.requests, 3)
+    hedged["hedge_wins"] = router.hedge_wins
+
+    down = FakeProvider("groq", latency_ms, error_rate=1.0)
+    outage_router = LLMRouter({
+        "groq": down,
+        "gemini": FakeProvider("gemini", latency_ms * 1.5, seed=2),
+    }, failure_threshold=3, reset_seconds=60)
+    outage = timed(outage_router.complete_sync, requests)
+    outage["primary_calls"] = down.calls
+    outage["primary_state"] = outage_router.report()["providers"]["groq"]["state"]
+
+    return {"requests": requests, "single": single, "hedged": hedged, "outage": outage}
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(json.dumps(benchmark(count), indent=2))
@@ -0,0 +1,327 @@
+"""
+Local fake of Twilio's side of a media stream, for tests and local runs of
+media_stream_server.py without a phone call.
+
+FakeTwilioCall connects to the server the way Twilio does after
+<Connect><Stream>: it sends connected/start (with customParameters), plays the
+caller's turns as media or dtmf events, echoes marks back as the agent's audio
+"finishes playing", and sends stop on hang-up.
+
+TextRecognizer / TextSpeech stand in for speech recognition and synthesis:
+caller speech and agent audio are UTF-8 text in the media payloads, so a test
+can read exactly what the agent said, sentence by sentence.
+
+Playback takes playback_seconds per sentence (0 = instant), so a test can
+speak over the agent while audio is still queued.
+
+FakeMessagingEndpoint is a local stand-in for the Messages API (SMS), for
+load tests of SMSAgent.send_bulk: point a Twilio Client at it with
+client.api.base_url = endpoint.url. It enforces a per-sender rate limit
+(429) and can fail a share of requests with 503.
+"""
+
+import asyncio
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+import aiohttp
+
+from media_stream_server import SpeechToText, TextToSpeech
+
+
+class TextRecognizer(SpeechToText):
+    """Each inbound media payload is one final utterance (UTF-8 text)."""
+
+    def feed(self, audio: bytes) -> Optional[str]:
+        return audio.decode("utf-8", errors="ignore") or None
+
+
+class TextSpeech(TextToSpeech):
+    """"Audio" is the sentence itself as UTF-8, optionally after a synthesis delay."""
+
+    def __init__(self, delay_seconds: float = 0.0):
+        self.delay_seconds = delay_seconds
+
+    def synthesize(self, text: str) -> bytes:
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+        return text.encode("utf-8")
+
+
+class FakeTwilioCall:
+    """
+    One fake call against a media-stream server.
+
+        async with FakeTwilioCall(url, {"customer_name": "Rajesh"}) as call:
+            greeting = await call.listen()
+            await call.say("yes")
+            explanation = await call.listen()
+
+    Timeline entries are (ms since the caller's last turn, sentence) when the
+    sentence arrived; cleared counts the server's clear (barge-in) events.
+    """
+
+    def __init__(self, url: str, parameters: Optional[Dict[str, str]] = None, call_sid: Optional[str] = None,
+                 playback_seconds: float = 0.0):
+        self.url = url
+        self.parameters = parameters or {}
+        self.playback_seconds = playback_seconds
+        self.call_sid = call_sid or f"CA{uuid.uuid4().hex}"
+        self.stream_sid = f"MZ{uuid.uuid4().hex}"
+        self.session = None
+        self.ws = None
+        self.reader = None
+        self.turns = asyncio.Queue()
+        self.timeline = []
+        self.cleared = 0
+        self.closed = asyncio.Event()
+        self._sequence = 0
+        self._audio = b""
+        self._sentences = []
+        self._turn_started = time.perf_counter()
+        self._playback = asyncio.Queue()
+        self._playing = None
+        self._player = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.hangup()
+
+    async def connect(self):
+        self.session = aiohttp.ClientSession()
+        self.ws = await self.session.ws_connect(self.url)
+        await self._send({"event": "connected", "protocol": "Call", "version": "1.0.0"})
+        await self._send({
+            "event": "start",
+            "streamSid": self.stream_sid,
+            "start": {
+                "streamSid": self.stream_sid,
+                "accountSid": "ACfake",
+                "callSid": self.call_sid,
+                "tracks": ["inbound"],
+                "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": 8000, "channels": 1},
+                "customParameters": self.parameters,
+            },
+        })
+        self._turn_started = time.perf_counter()
+        self._player = asyncio.ensure_future(self._play())
+        self.reader = asyncio.ensure_future(self._read())
+
+    async def say(self, text: str):
+        """Caller speech (one final utterance)."""
+        self._turn_started = time.perf_counter()
+        await self._send({
+            "event": "media",
+            "streamSid": self.stream_sid,
+            "media": {"track": "inbound", "chunk": str(self._sequence), "timestamp": str(self._sequence * 20),
+                      "payload": base64.b64encode(text.encode("utf-8")).decode("ascii")},
+        })
+
+    async def press(self, digit: str):
+        """Caller keypress."""
+        self._turn_started = time.perf_counter()
+        await self._send({"event": "dtmf", "streamSid": self.stream_sid,
+                          "dtmf": {"track": "inbound_track", "digit": digit}})
+
+    async def listen(self, timeout: float = 5.0) -> List[str]:
+        """Sentences of the agent's next complete turn (up to its end mark)."""
+        return await asyncio.wait_for(self.turns.get(), timeout)
+
+    async def wait_closed(self, timeout: float = 5.0) -> bool:
+        """True once the server has ended the stream."""
+        await asyncio.wait_for(self.closed.wait(), timeout)
+        return True
+
+    async def hangup(self):
+        if self.ws is not None and not self.ws.closed:
+            await self._send({"event": "stop", "streamSid": self.stream_sid,
+                              "stop": {"accountSid": "ACfake", "callSid": self.call_sid}})
+            await self.ws.close()
+        if self.reader:
+            await asyncio.gather(self.reader, return_exceptions=True)
+        if self.session:
+            await self.session.close()
+
+    async def _send(self, event: dict):
+        self._sequence += 1
+        await self.ws.send_json({**event, "sequenceNumber": str(self._sequence)})
+
+    async def _read(self):
+        try:
+            async for msg in self.ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                event = msg.json()
+                kind = event.get("event")
+                if kind == "media":
+                    self._audio += base64.b64decode(event["media"]["payload"])
+                elif kind == "mark":
+                    name = event["mark"]["name"]
+                    played = bool(self._audio)
+                    if self._audio:
+                        sentence = self._audio.decode("utf-8")
+                        self._audio = b""
+                        self._sentences.append(sentence)
+                        self.timeline.append(((time.perf_counter() - self._turn_started) * 1000, sentence))
+                    if name.endswith(":end"):
+                        self.turns.put_nowait(self._sentences)
+                        self._sentences = []
+                    # Twilio echoes a mark once the audio sent before it has played
+                    self._playback.put_nowait((name, self.playback_seconds if played else 0.0))
+                elif kind == "clear":
+                    # Queued audio is dropped and its marks are echoed right away
+                    self.cleared += 1
+                    self._audio = b""
+                    self._sentences = []
+                    self._player.cancel()
+                    dropped = [self._playing] if self._playing else []
+                    while not self._playback.empty():
+                        dropped.append(self._playback.get_nowait()[0])
+                    for name in dropped:
+                        await self._ack(name)
+                    self._playing = None
+                    self._player = asyncio.ensure_future(self._play())
+        finally:
+            self._player.cancel()
+            self.closed.set()
+
+    async def _play(self):
+        """Plays queued sentences in order, echoing each mark when its audio is done."""
+        while True:
+            name, seconds = await self._playback.get()
+            self._playing = name
+            if seconds:
+                await asyncio.sleep(seconds)
+            self._playing = None
+            await self._ack(name)
+
+    async def _ack(self, name: str):
+        if not self.ws.closed:
+            await self._send({"event": "mark", "streamSid": self.stream_sid, "mark": {"name": name}})
+
+
+class FakeMessagingEndpoint:
+    """
+    Local fake of POST /2010-04-01/Accounts/{sid}/Messages.json.
+
+        with FakeMessagingEndpoint(rate_per_second=10) as endpoint:
+            client = Client("AC123", "token")
+            client.api.base_url = endpoint.url
+            SMS sent with client.messages.create(...) land in endpoint.messages
+
+    Args:
+        rate_per_second: Messages per second each From number may send (None = unlimited);
+                         requests over the limit get 429 (Twilio error 20429)
+        failure_rate: Share of requests answered with 503
+        latency_seconds: Processing time per request
+        invalid_numbers: To numbers rejected with 400 (Twilio error 21211)
+    """
+
+    def __init__(self, rate_per_second: Optional[float] = None, failure_rate: float = 0.0,
+                 latency_seconds: float = 0.0, invalid_numbers: Optional[List[str]] = None, seed: int = 0):
+        self.rate_per_second = rate_per_second
+        self.failure_rate = failure_rate
+        self.latency_seconds = latency_seconds
+        self.invalid_numbers = set(invalid_numbers or [])
+        self.random = random.Random(seed)
+        self.messages = []  # (to, from, body, time.monotonic())
+        self.counts = {"requests": 0, "accepted": 0, "rate_limited": 0, "failed": 0, "invalid": 0}
+        self.lock = threading.Lock()
+        self._arrival: Dict[str, float] = {}  # sender -> theoretical arrival time
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeMessagingEndpoint":
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+                form = {key: values[0] for key, values in parse_qs(body).items()}
+                status, payload = endpoint.handle(self.path, form)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, path: str, form: Dict[str, str]):
+        """(HTTP status, JSON body) for one request"""
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        to, sender = form.get("To"), form.get("From")
+        with self.lock:
+            self.counts["requests"] += 1
+            if not path.endswith("/Messages.json"):
+                return 404, self._error(20404, "The requested resource was not found", 404)
+            if to in self.invalid_numbers:
+                self.counts["invalid"] += 1
+                return 400, self._error(21211, f"The 'To' number {to} is not a valid phone number.", 400)
+            if self.random.random() < self.failure_rate:
+                self.counts["failed"] += 1
+                return 503, self._error(20503, "Service unavailable", 503)
+            now = time.monotonic()
+            if self.rate_per_second:
+                # GCRA per sender: rate_per_second sustained, up to one second's worth at once
+                arrival = max(self._arrival.get(sender, now), now)
+                if arrival - now >= 1.0:
+                    self.counts["rate_limited"] += 1
+                    return 429, self._error(20429, "Too Many Requests", 429)
+                self._arrival[sender] = arrival + 1.0 / self.rate_per_second
+            self.counts["accepted"] += 1
+            self.messages.append((to, sender, form.get("Body"), now))
+        sid = f"SM{uuid.uuid4().hex}"
+        return 201, {
+            "sid": sid,
+            "account_sid": path.split("/Accounts/")[-1].split("/")[0],
+            "to": to,
+            "from": sender,
+            "body": form.get("Body"),
+            "status": "queued",
+            "num_segments": "1",
+            "direction": "outbound-api",
+            "uri": f"{path[:-len('.json')]}/{sid}.json",
+        }
+
+    @staticmethod
+    def _error(code: int, message: str, status: int) -> dict:
+        return {"code": code, "message": message, "more_info": f"https://www.twilio.com/docs/errors/{code}",
+                "status": status}
@@ -0,0 +1,151 @@
+"""
+Google Cloud speech adapters for the media-stream server.
+
+- GoogleSpeechToText: one streaming recognition per call, fed with the
+  caller's 8 kHz mu-law audio as it arrives (phone_call model); feed()
+  returns each final transcript
+- GoogleTextToSpeech: synthesizes each sentence directly as 8 kHz mu-law,
+  so the audio can be sent to Twilio without resampling
+
+Requires google-cloud-speech and google-cloud-texttospeech, and application
+default credentials (GOOGLE_APPLICATION_CREDENTIALS or the service account
+of the host).
+
+Configuration:
+    MEDIA_STREAM_LANGUAGE   Recognition and synthesis language (default en-IN)
+    MEDIA_STREAM_VOICE      Text-to-Speech voice (default en-IN-Wavenet-A)
+"""
+
+import os
+import queue
+import struct
+import threading
+from typing import Iterator, Optional
+
+try:
+    from google.cloud import speech
+    from google.cloud import texttospeech
+    GOOGLE_SPEECH_AVAILABLE = True
+except ImportError:
+    GOOGLE_SPEECH_AVAILABLE = False
+
+from media_stream_server import SpeechToText, TextToSpeech
+
+SAMPLE_RATE_HERTZ = 8000
+DEFAULT_LANGUAGE = "en-IN"
+DEFAULT_VOICE = "en-IN-Wavenet-A"
+
+
+def strip_wav_header(audio: bytes) -> bytes:
+    """
+    Raw samples of a WAV file (Text-to-Speech returns MULAW audio with a WAV
+    header, which Twilio would play as noise). Anything else is returned as is.
+    """
+    if len(audio) < 12 or audio[:4] != b"RIFF" or audio[8:12] != b"WAVE":
+        return audio
+    offset = 12
+    while offset + 8 <= len(audio):
+        chunk_id, size = audio[offset:offset + 4], struct.unpack("<I", audio[offset + 4:offset + 8])[0]
+        if chunk_id == b"data":
+            return audio[offset + 8:offset + 8 + size]
+        offset += 8 + size + (size & 1)  # chunks are word-aligned
+    return b""
+
+
+class GoogleSpeechToText(SpeechToText):
+    """
+    Streaming recognizer for one call.
+
+    Audio is queued by feed() and streamed to Cloud Speech-to-Text from a
+    background thread; final transcripts come back on the same thread and are
+    returned by the next feed(). A stream that ends (Cloud Speech limits one
+    stream to about five minutes) is reopened until close().
+    """
+
+    def __init__(self, language_code: Optional[str] = None, client=None):
+        if client is None:
+            if not GOOGLE_SPEECH_AVAILABLE:
+                raise ImportError("google-cloud-speech is not installed")
+            client = speech.SpeechClient()
+        self.client = client
+        self.streaming_config = speech.StreamingRecognitionConfig(
+            config=speech.RecognitionConfig(
+                encoding=speech.RecognitionConfig.AudioEncoding.MULAW,
+                sample_rate_hertz=SAMPLE_RATE_HERTZ,
+                language_code=language_code or os.getenv("MEDIA_STREAM_LANGUAGE", DEFAULT_LANGUAGE),
+                model="phone_call",
+                enable_automatic_punctuation=True,
+            ),
+            interim_results=False,
+        )
+        self.audio = queue.Queue()
+        self.finals = queue.Queue()
+        self.closed = threading.Event()
+        self.thread = None
+
+    def _requests(self) -> Iterator:
+        while True:
+            chunk = self.audio.get()
+            if chunk is None:
+                return
+            yield speech.StreamingRecognizeRequest(audio_content=chunk)
+
+    def _recognize(self):
+        while not self.closed.is_set():
+            try:
+                for response in self.client.streaming_recognize(self.streaming_config, self._requests()):
+                    for result in response.results:
+                        if result.is_final and result.alternatives:
+                            self.finals.put(result.alternatives[0].transcript)
+            except Exception as e:
+                print(f"Speech recognition stream ended: {e}")
+                if self.closed.is_set():
+                    return
+            if not self.closed.is_set():
+                print("Reopening speech recognition stream")
+
+    def feed(self, audio: bytes) -> Optional[str]:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._recognize, name="speech-to-text", daemon=True)
+            self.thread.start()
+        if audio:
+            self.audio.put(audio)
+        texts = []
+        while True:
+            try:
+                texts.append(self.finals.get_nowait())
+            except queue.Empty:
+                break
+        text = " ".join(t.strip() for t in texts if t.strip())
+        return text or None
+
+    def close(self):
+        self.closed.set()
+        self.audio.put(None)
+
+
+class GoogleTextToSpeech(TextToSpeech):
+    """Cloud Text-to-Speech synthesizer shared by all calls (the client is thread-safe)."""
+
+    def __init__(self, voice_name: Optional[str] = None, language_code: Optional[str] = None, client=None):
+        if client is None:
+            if not GOOGLE_SPEECH_AVAILABLE:
+                raise ImportError("google-cloud-texttospeech is not installed")
+            client = texttospeech.TextToSpeechClient()
+        self.client = client
+        self.voice = texttospeech.VoiceSelectionParams(
+            language_code=language_code or os.getenv("MEDIA_STREAM_LANGUAGE", DEFAULT_LANGUAGE),
+            name=voice_name or os.getenv("MEDIA_STREAM_VOICE", DEFAULT_VOICE),
+        )
+        self.audio_config = texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.MULAW,
+            sample_rate_hertz=SAMPLE_RATE_HERTZ,
+        )
+
+    def synthesize(self, text: str) -> bytes:
+        response = self.client.synthesize_speech(
+            input=texttospeech.SynthesisInput(text=text),
+            voice=self.voice,
+            audio_config=self.audio_config,
+        )
+        return strip_wav_header(response.audio_content)
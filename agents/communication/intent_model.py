@@ -0,0 +1,316 @@
+"""
+Local intent classifier trained from stored call transcripts.
+
+A TF-IDF weighted multinomial naive Bayes over word unigrams and bigrams,
+in plain Python so it deploys with the function (no numpy/scikit-learn).
+It predicts one of INTENTS with a calibrated confidence: the naive Bayes
+log-scores go through a softmax with a temperature fitted on a held-out
+split, so "0.9" means right about 90% of the time on past calls.
+
+Training is offline (scripts/train_intent_model.py): customer turns of
+communication_cases are labelled from the keyword intent recorded with each
+turn and, for turns the keywords missed, from the case outcome; turns that
+ask something are always "ask_question". The model is
+a JSON file loaded once per process (INTENT_MODEL_PATH, default
+intent_model.json next to this module); without one, load_model() returns
+None and callers keep their existing path.
+
+Each deployment keeps its own copy (twilio_webhook, agents/communication) -
+keep the copies identical.
+"""
+
+import json
+import math
+import os
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+INTENTS = ("schedule_service", "decline", "ask_question", "emergency")
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", os.path.join(os.path.dirname(__file__), "intent_model.json"))
+INTENT_MODEL_CONFIDENCE = float(os.getenv("INTENT_MODEL_CONFIDENCE", "0.85"))
+MODEL_VERSION = 1
+
+# Keyword intent recorded on transcript turns (voice_turns.detect_intent) -> classifier label
+TURN_INTENT_LABELS = {
+    "yes": "schedule_service",
+    "no": "decline",
+    "callback": "decline",
+    "cost": "ask_question",
+    "duration": "ask_question",
+    "location": "ask_question",
+    "repeat": "ask_question",
+}
+# Case outcome -> label for the last customer turn the keywords missed ("open")
+OUTCOME_LABELS = {"confirmed": "schedule_service", "declined": "decline"}
+
+# Turns that ask something are "ask_question" whatever keyword intent they were
+# recorded with ("what happens if I don't fix it?" is not a decline). Same rule
+# as voice_turns.is_question: a "?" or a clause starting with a question word.
+QUESTION_WORDS = {"how", "what", "why", "when", "where", "which", "who", "can", "could",
+                  "is", "are", "will", "would", "should", "does", "kya", "kab"}
+_CLAUSE_BREAK = re.compile(r"[,.;:!]+|\b(?:but|and|so|then)\b")
+
+# Always part of the training set, so every intent has examples
+# (emergencies are rare on recorded calls)
+SEED_EXAMPLES = [
+    ("yes please go ahead and book it", "schedule_service"),
+    ("that slot works for me", "schedule_service"),
+    ("okay confirm the appointment", "schedule_service"),
+    ("no I am not interested", "decline"),
+    ("not now I will do it myself later", "decline"),
+    ("please don't call me again", "decline"),
+    ("how much will this cost", "ask_question"),
+    ("what exactly is wrong with the brakes", "ask_question"),
+    ("how long will the service take", "ask_question"),
+    ("my car is smoking right now", "emergency"),
+    ("the brakes failed I need help immediately", "emergency"),
+    ("engine warning light and a burning smell while driving", "emergency"),
+]
+
+_WORD = re.compile(r"[a-z']+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Word unigrams and bigrams"""
+    words = _WORD.findall((text or "").lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _softmax(scores: Dict[str, float], temperature: float) -> Dict[str, float]:
+    top = max(scores.values())
+    exps = {label: math.exp((score - top) / temperature) for label, score in scores.items()}
+    total = sum(exps.values())
+    return {label: value / total for label, value in exps.items()}
+
+
+class IntentModel:
+    """TF-IDF naive Bayes with temperature-calibrated confidence (see module docstring)."""
+
+    def __init__(self, idf: Dict[str, float], log_priors: Dict[str, float],
+                 log_likelihoods: Dict[str, Dict[str, float]], temperature: float = 1.0,
+                 metadata: Optional[dict] = None):
+        self.idf = idf
+        self.log_priors = log_priors
+        self.log_likelihoods = log_likelihoods
+        self.temperature = temperature
+        self.metadata = metadata or {}
+
+    # Training
+
+    @classmethod
+    def fit(cls, examples: List[Tuple[str, str]], alpha: float = 0.1) -> "IntentModel":
+        """Fit on (text, label) pairs (temperature 1.0; see train() for calibration)"""
+        docs = [(Counter(tokenize(text)), label) for text, label in examples]
+        document_frequency = Counter(token for counts, _ in docs for token in counts)
+        n = len(docs)
+        idf = {token: math.log((1 + n) / (1 + df)) + 1 for token, df in document_frequency.items()}
+
+        model = cls(idf, {}, {})
+        weights = defaultdict(Counter)
+        label_counts = Counter(label for _, label in docs)
+        for counts, label in docs:
+            weights[label].update(model._vector(counts))
+
+        labels = sorted(label_counts)
+        for label in labels:
+            model.log_priors[label] = math.log(label_counts[label] / n)
+            total = sum(weights[label].values()) + alpha * len(idf)
+            model.log_likelihoods[label] = {
+                token: math.log((weights[label][token] + alpha) / total) for token in idf
+            }
+            model.log_likelihoods[label][""] = math.log(alpha / total)  # unseen in this class
+        return model
+
+    @classmethod
+    def train(cls, examples: List[Tuple[str, str]], calibration_share: float = 0.2,
+              seed: int = 7) -> "IntentModel":
+        """
+        Fit, calibrate the temperature on a held-out share of the examples,
+        then refit on all of them with that temperature.
+        """
+        shuffled = list(examples)
+        random.Random(seed).shuffle(shuffled)
+        held_out = max(1, int(len(shuffled) * calibration_share))
+        probe = cls.fit(shuffled[held_out:])
+        temperature = probe.calibrate(shuffled[:held_out])
+        model = cls.fit(shuffled)
+        model.temperature = temperature
+        model.metadata = {"examples": len(examples), "labels": dict(Counter(label for _, label in examples))}
+        return model
+
+    def calibrate(self, examples: List[Tuple[str, str]]) -> float:
+        """Temperature minimizing the negative log-likelihood of the examples"""
+        scored = [(self.scores(text), label) for text, label in examples]
+        candidates = [0.01 * 1.25 ** i for i in range(40)]  # 0.01 .. ~60
+
+        def nll(temperature):
+            return -sum(math.log(max(_softmax(scores, temperature).get(label, 0.0), 1e-12))
+                        for scores, label in scored)
+
+        self.temperature = min(candidates, key=nll)
+        return self.temperature
+
+    # Prediction
+
+    def _vector(self, counts: Counter) -> Dict[str, float]:
+        """Sublinear tf * idf, L2-normalized; tokens outside the vocabulary are dropped"""
+        vector = {token: (1 + math.log(count)) * self.idf[token] for token, count in counts.items() if token in self.idf}
+        norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+        return {token: value / norm for token, value in vector.items()}
+
+    def scores(self, text: str) -> Dict[str, float]:
+        vector = self._vector(Counter(tokenize(text)))
+        scores = {}
+        for label, prior in self.log_priors.items():
+            likelihoods = self.log_likelihoods[label]
+            unseen = likelihoods[""]
+            scores[label] = prior + sum(weight * likelihoods.get(token, unseen) for token, weight in vector.items())
+        return scores
+
+    def probabilities(self, text: str) -> Dict[str, float]:
+        return _softmax(self.scores(text), self.temperature)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """(intent, calibrated confidence)"""
+        probabilities = self.probabilities(text)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+    # Persistence
+
+    def to_dict(self) -> dict:
+        return {
+            "version": MODEL_VERSION,
+            "idf": self.idf,
+            "log_priors": self.log_priors,
+            "log_likelihoods": self.log_likelihoods,
+            "temperature": self.temperature,
+            "metadata": self.metadata,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IntentModel":
+        if data.get("version") != MODEL_VERSION:
+            raise ValueError(f"Unsupported intent model version: {data.get('version')}")
+        return cls(data["idf"], data["log_priors"], data["log_likelihoods"],
+                   data.get("temperature", 1.0), data.get("metadata"))
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+
+_model: Optional[IntentModel] = None
+_model_loaded = False
+
+
+def load_model(path: Optional[str] = None) -> Optional[IntentModel]:
+    """The process-wide model (loaded on first use), or None if there is no usable model file."""
+    global _model, _model_loaded
+    if path is None and _model_loaded:
+        return _model
+    model = None
+    model_path = path or INTENT_MODEL_PATH
+    if os.path.exists(model_path):
+        try:
+            with open(model_path) as f:
+                model = IntentModel.from_dict(json.load(f))
+        except Exception as e:
+            print(f"Intent model not loaded (non-blocking): {str(e)}")
+    if path is None:
+        _model, _model_loaded = model, True
+    return model
+
+
+def is_question(text: str) -> bool:
+    """Whether a customer turn asks something (see QUESTION_WORDS)"""
+    text = (text or "").lower()
+    if "?" in text:
+        return True
+    for clause in _CLAUSE_BREAK.split(text):
+        words = _WORD.findall(clause)
+        if words and words[0] in QUESTION_WORDS and words[:2] != ["why", "not"]:
+            return True
+    return False
+
+
+def examples_from_case(case_data: dict, transcript: List[dict]) -> List[Tuple[str, str]]:
+    """
+    Labelled customer turns of one communication case.
+
+    Questions are "ask_question"; other turns keep the keyword intent they
+    were handled with, and the last "open" one takes the case outcome. Other
+    open turns went to the LLM as questions. Silence, DTMF digits and "human"
+    requests are skipped.
+    """
+    turns = [entry for entry in transcript
+             if entry.get("speaker") == "customer" and (entry.get("message") or "").strip()
+             and not entry["message"].strip().isdigit()]
+    outcome_label = OUTCOME_LABELS.get(case_data.get("outcome"))
+    last_open = max((i for i, entry in enumerate(turns)
+                     if entry.get("intent") == "open" and not is_question(entry["message"])), default=None)
+
+    examples = []
+    for i, entry in enumerate(turns):
+        intent = entry.get("intent")
+        if intent not in TURN_INTENT_LABELS and intent != "open":
+            continue
+        if is_question(entry["message"]):
+            label = "ask_question"
+        elif intent in TURN_INTENT_LABELS:
+            label = TURN_INTENT_LABELS[intent]
+        else:
+            label = outcome_label if i == last_open and outcome_label else "ask_question"
+        examples.append((entry["message"].strip(), label))
+    return examples
+
+
+def evaluate(model: IntentModel, examples: List[Tuple[str, str]],
+             threshold: float = INTENT_MODEL_CONFIDENCE) -> dict:
+    """Accuracy, calibration error, coverage at the confidence threshold and prediction latency."""
+    latencies = []
+    correct = 0
+    per_label = defaultdict(lambda: [0, 0])
+    confident = confident_correct = 0
+    bins = defaultdict(lambda: [0, 0.0, 0])  # bin -> [count, confidence sum, correct]
+    for text, label in examples:
+        started = time.perf_counter()
+        predicted, confidence = model.predict(text)
+        latencies.append((time.perf_counter() - started) * 1e6)
+        hit = predicted == label
+        correct += hit
+        per_label[label][0] += 1
+        per_label[label][1] += hit
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += hit
+        bucket = bins[min(int(confidence * 10), 9)]
+        bucket[0] += 1
+        bucket[1] += confidence
+        bucket[2] += hit
+
+    n = len(examples) or 1
+    latencies.sort()
+    return {
+        "examples": len(examples),
+        "accuracy": round(correct / n, 3),
+        "per_intent_accuracy": {label: round(hits / total, 3) for label, (total, hits) in sorted(per_label.items())},
+        "expected_calibration_error": round(sum(abs(total_conf - hits) for _, total_conf, hits in bins.values()) / n, 3),
+        "threshold": threshold,
+        "coverage": round(confident / n, 3),
+        "accuracy_above_threshold": round(confident_correct / confident, 3) if confident else None,
+        "latency_us_p50": round(latencies[len(latencies) // 2], 1) if latencies else None,
+        "latency_us_p95": round(latencies[int(len(latencies) * 0.95)], 1) if latencies else None,
+    }
+
+
+def split(examples: Iterable[Tuple[str, str]], test_share: float = 0.2,
+          seed: int = 13) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Seeded (train, test) split"""
+    shuffled = list(examples)
+    random.Random(seed).shuffle(shuffled)
+    cut = int(len(shuffled) * test_share)
+    return shuffled[cut:], shuffled[:cut]
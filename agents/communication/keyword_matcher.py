@@ -0,0 +1,135 @@
+"""
+Single-pass keyword matcher for the rule-based message analysis.
+
+All keyword classes (intents, tone, language preference, sentiment and
+concerns) are compiled into one regex: a word-bounded alternation of every
+phrase, longest first, so "not now" is matched as a decline rather than as
+"no" + "now" (and "no problem" as an acceptance). One finditer pass over the message collects the classes of
+every phrase it contains, and analyze() derives intent, tone, sentiment and
+concerns from that set.
+
+Matching on word boundaries also stops the false hits of the old substring
+scans ("ok" in "book", "no" in "know"); a few suffixes are allowed so
+"costs" and "safety" still count.
+
+analyze() is cheap enough to run on every turn, so LLMService uses it as a
+pre-classifier: an unambiguous message (confidence >= LLM_PRECLASSIFY_CONFIDENCE)
+is answered without an LLM call.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Set
+
+KEYWORD_CLASSES = {
+    # Intents
+    "schedule": ["yes", "yeah", "yep", "schedule", "book", "okay", "ok", "sure", "go ahead", "confirm", "haan", "theek hai",
+                 "no problem", "not a problem", "no worries", "why not"],
+    "decline": ["no", "nope", "not now", "later", "maybe", "not interested", "don't", "cancel", "nahi", "busy"],
+    "emergency": ["emergency", "urgent", "immediate", "immediately", "asap", "right now", "breakdown", "smoke"],
+    "question": ["what", "why", "how", "which", "where", "when", "how much", "how long", "explain", "tell me"],
+    # Tone
+    "formal": ["sir", "madam", "please", "kindly", "thank you", "could you", "would you", "appreciate", "ji"],
+    "casual": ["yeah", "yep", "nope", "ok", "sure", "cool", "got it", "alright", "gonna", "wanna"],
+    # Language preference
+    "technical": ["diagnostic", "sensor", "dtc", "fault code", "system", "mechanism", "obd", "rpm"],
+    # Sentiment
+    "urgent": ["urgent", "emergency", "immediate", "immediately", "asap", "quickly", "right now"],
+    "concerned": ["worried", "concerned", "afraid", "scared", "serious", "dangerous", "safe", "anxious"],
+    "positive": ["great", "good", "thanks", "thank you", "appreciate", "perfect", "wonderful"],
+    "negative": ["no", "not interested", "busy", "later", "annoyed", "frustrated", "waste"],
+    # Concerns
+    "cost": ["cost", "price", "expensive", "money", "charge", "how much", "rupees"],
+    "safety": ["safe", "danger", "dangerous", "risk", "accident"],
+    "timeline": ["when", "how long", "time", "days", "wait"],
+}
+
+# Intents in precedence order when a message matches several
+INTENT_CLASSES = [
+    ("schedule", "schedule_service"),
+    ("decline", "decline"),
+    ("emergency", "emergency"),
+    ("question", "ask_question"),
+]
+CONCERN_CLASSES = ["cost", "safety", "timeline"]
+
+UNAMBIGUOUS_CONFIDENCE = 0.9  # exactly one intent class matched
+DEFAULT_CONFIDENCE = 0.6  # no intent keyword: defaults to ask_question
+AMBIGUOUS_CONFIDENCE = 0.5  # conflicting intents ("yes, but how much?")
+
+_SUFFIXES = r"(?:s|es|d|ed|ing|ty|ly)?"
+
+
+class KeywordMatcher:
+    """Compiled matcher over named keyword classes (class -> phrases)."""
+
+    def __init__(self, classes: Dict[str, Iterable[str]]):
+        self.labels: Dict[str, Set[str]] = {}
+        for label, phrases in classes.items():
+            for phrase in phrases:
+                self.labels.setdefault(phrase.lower(), set()).add(label)
+        alternation = "|".join(re.escape(p) for p in sorted(self.labels, key=len, reverse=True))
+        self.pattern = re.compile(rf"\b({alternation}){_SUFFIXES}\b")
+
+    def match(self, text: str) -> Set[str]:
+        """Classes of every phrase found in text (one pass)"""
+        found: Set[str] = set()
+        for match in self.pattern.finditer(text.lower()):
+            found |= self.labels[match.group(1)]
+        return found
+
+
+_matcher = KeywordMatcher(KEYWORD_CLASSES)
+
+
+def match_classes(text: str) -> Set[str]:
+    return _matcher.match(text or "")
+
+
+def analyze(text: str) -> Dict[str, Any]:
+    """
+    Rule-based analysis of a customer message.
+
+    Returns:
+        intent, tone, sentiment, language_preference, key_concerns,
+        is_urgent, is_concerned and confidence (see the *_CONFIDENCE constants)
+    """
+    found = match_classes(text)
+    if "?" in (text or ""):
+        found.add("question")
+
+    intents: List[str] = [intent for label, intent in INTENT_CLASSES if label in found]
+    if len(intents) == 1:
+        confidence = UNAMBIGUOUS_CONFIDENCE
+    elif intents:
+        confidence = AMBIGUOUS_CONFIDENCE
+    else:
+        confidence = DEFAULT_CONFIDENCE
+
+    is_formal, is_casual = "formal" in found, "casual" in found
+    if is_formal and not is_casual:
+        tone = "formal"
+    elif is_casual and not is_formal:
+        tone = "casual"
+    else:
+        tone = "neutral"
+
+    is_urgent, is_concerned = "urgent" in found, "concerned" in found
+    if is_urgent or is_concerned:
+        sentiment = "concerned"
+    elif "positive" in found:
+        sentiment = "positive"
+    elif "negative" in found:
+        sentiment = "negative"
+    else:
+        sentiment = "neutral"
+
+    return {
+        "intent": intents[0] if intents else "ask_question",
+        "tone": tone,
+        "sentiment": sentiment,
+        "language_preference": "technical" if "technical" in found else "simple",
+        "key_concerns": [concern for concern in CONCERN_CLASSES if concern in found],
+        "is_urgent": is_urgent,
+        "is_concerned": is_concerned,
+        "confidence": confidence,
+    }
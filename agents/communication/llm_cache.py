@@ -0,0 +1,185 @@
+"""
+Prompt/response cache for LLMService.
+
+Component names and defect descriptions recur across thousands of
+customers, so the same prompts reach the LLM over and over. LLMCache keeps
+successful replies:
+
+- keyed on a hash of (method, provider, model, temperature, normalized prompt),
+  so changing the model or temperature never serves stale replies
+- in a size-bounded in-memory LRU (LLM_CACHE_MAX_ENTRIES)
+- optionally in a SQLite file (LLM_CACHE_DB) shared across processes and
+  restarts; disk hits are promoted to memory
+- with a TTL per LLMService method (0 disables caching for that method)
+
+Hits and misses are counted per method; report() gives hit rates and
+log_report() prints them as a metric line.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTLS = {
+    "translate_technical_to_simple": 7 * 24 * 3600,  # depends on the defect text only
+    "analyze_user_input": 24 * 3600,
+    "generate_response": 3600,  # includes the conversation history, so repeats are mostly first turns
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share an entry"""
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+
+def cache_key(method: str, provider: str, model: str, temperature: float, prompt: str) -> str:
+    identity = json.dumps([method, provider, model, round(temperature, 3), normalize_prompt(prompt)])
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier (memory LRU + optional SQLite) cache of LLM replies. Thread-safe.
+
+    Args:
+        max_entries: Size of the in-memory LRU
+        ttls: {method: seconds}; methods not listed are not cached
+        db_path: SQLite file for the persistent tier (None = memory only)
+        clock: Wall-clock time source (entries on disk outlive the process)
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttls: Optional[Dict[str, float]] = None,
+                 db_path: Optional[str] = None, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.db = None
+        if db_path:
+            try:
+                self.db = sqlite3.connect(db_path, check_same_thread=False)
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, method TEXT, response TEXT, expires_at REAL)"
+                )
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"LLM cache database unavailable (non-blocking, memory only): {e}")
+                self.db = None
+
+    def enabled_for(self, method: str) -> bool:
+        return self.ttls.get(method, 0) > 0
+
+    def _count(self, method: str, outcome: str):
+        counts = self.stats.setdefault(method, {"hits": 0, "disk_hits": 0, "misses": 0})
+        counts[outcome] += 1
+
+    def get(self, method: str, key: str) -> Optional[str]:
+        """Cached reply, or None on a miss (or if the method is not cached)"""
+        if not self.enabled_for(method):
+            return None
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._count(method, "hits")
+                    return entry[1]
+                del self._entries[key]
+
+            if self.db is not None:
+                try:
+                    row = self.db.execute(
+                        "SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print(f"LLM cache read error (non-blocking): {e}")
+                    row = None
+                if row and row[1] > now:
+                    self._remember(key, row[1], row[0])
+                    self._count(method, "disk_hits")
+                    return row[0]
+
+            self._count(method, "misses")
+            return None
+
+    def set(self, method: str, key: str, response: str):
+        if not self.enabled_for(method):
+            return
+        expires_at = self.clock() + self.ttls[method]
+        with self._lock:
+            self._remember(key, expires_at, response)
+            if self.db is not None:
+                try:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, method, response, expires_at) VALUES (?, ?, ?, ?)",
+                        (key, method, response, expires_at)
+                    )
+                    self.db.commit()
+                except sqlite3.Error as e:
+                    print(f"LLM cache write error (non-blocking): {e}")
+
+    def _remember(self, key: str, expires_at: float, response: str):
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def prune(self) -> int:
+        """Delete expired entries from both tiers; returns how many disk rows were removed"""
+        now = self.clock()
+        with self._lock:
+            for key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                del self._entries[key]
+            if self.db is None:
+                return 0
+            try:
+                removed = self.db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,)).rowcount
+                self.db.commit()
+                return removed
+            except sqlite3.Error as e:
+                print(f"LLM cache prune error (non-blocking): {e}")
+                return 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM llm_cache")
+                self.db.commit()
+
+    def report(self) -> dict:
+        """Hits (memory and disk), misses and hit rate per method and overall"""
+        with self._lock:
+            methods = {method: dict(counts) for method, counts in self.stats.items()}
+            entries = len(self._entries)
+
+        def with_rate(counts):
+            hits = counts["hits"] + counts["disk_hits"]
+            lookups = hits + counts["misses"]
+            return {**counts, "hit_rate": round(hits / lookups, 3) if lookups else None}
+
+        total = {outcome: sum(counts[outcome] for counts in methods.values())
+                 for outcome in ("hits", "disk_hits", "misses")}
+        return {
+            "entries": entries,
+            "persistent": self.db is not None,
+            "methods": {method: with_rate(counts) for method, counts in methods.items()},
+            **with_rate(total),
+        }
+
+    def log_report(self) -> dict:
+        report = self.report()
+        print(json.dumps({"metric": "llm_cache_hit_rate", **report}))
+        return report
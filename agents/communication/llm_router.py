@@ -0,0 +1,349 @@
+"""
+Hedged multi-provider LLM calls for LLMService.
+
+With LLM_PROVIDERS set (e.g. "groq,gemini"), LLMService sends each prompt
+through an LLMRouter instead of a single provider:
+
+- Per-provider latency is tracked over a rolling window (LatencyStats)
+- The fastest healthy provider is asked first. If it has not answered by its
+  own p90 latency, the request is hedged: the next provider is asked as well,
+  and whichever answers first wins. Hedges are capped at max_hedge_ratio of
+  requests so a slow primary cannot double the load
+- A provider that fails fast is failed over immediately, without waiting
+  for the hedge delay
+- Each provider has a CircuitBreaker: after failure_threshold consecutive
+  failures (errors, or calls slower than slow_call_seconds) it is skipped for
+  reset_seconds, then gets a single probe call
+- Streamed replies (stream()) go to the best-ranked available provider and
+  fail over to the next one until a provider yields its first delta; after
+  that the stream is committed to it. Time to first delta is tracked per
+  provider separately from complete-call latency, and feeds the same breaker
+
+Provider clients are synchronous, so calls run on a thread pool; a hedged
+loser keeps running in its thread and still records its latency, so the
+percentiles are not biased towards the winners.
+
+benchmark_llm_router.py compares single-provider and hedged tail latency
+against local fake providers.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterator, List, Optional
+
+DEFAULT_HEDGE_DELAY_SECONDS = 0.8  # until a provider has MIN_SAMPLES latencies
+MIN_HEDGE_DELAY_SECONDS = 0.05
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+
+class LLMUnavailable(Exception):
+    """No provider answered (all failed, skipped by their breakers, or timed out)"""
+
+
+class LatencyStats:
+    """Rolling latencies (seconds) and outcome counts of one provider. Thread-safe."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool = True):
+        with self.lock:
+            self.calls += 1
+            if ok:
+                self.latencies.append(seconds)
+            else:
+                self.errors += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self.lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]  # nearest rank
+
+    @property
+    def samples(self) -> int:
+        return len(self.latencies)
+
+
+class CircuitBreaker:
+    """closed -> open after failure_threshold consecutive failures -> half_open probe after reset_seconds."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go to this provider now (claims the probe when half-open)."""
+        with self.lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def available(self) -> bool:
+        """Like allow() but without claiming anything (for ranking)."""
+        with self.lock:
+            if self.state == self.OPEN:
+                return self.clock() - self.opened_at >= self.reset_seconds
+            return self.state == self.CLOSED or not self.probe_in_flight
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class RoutedProvider:
+    """One provider behind the router: a blocking prompt -> text callable plus its stats and breaker."""
+
+    def __init__(self, name: str, call: Callable[[str], str], breaker: CircuitBreaker,
+                 slow_call_seconds: float):
+        self.name = name
+        self.fn = call
+        self.breaker = breaker
+        self.stats = LatencyStats()
+        self.first_delta_stats = LatencyStats()  # streamed replies: time to first delta
+        self.slow_call_seconds = slow_call_seconds
+        self.wins = 0
+
+    def call(self, prompt: str) -> str:
+        """Runs on a worker thread; records latency and feeds the breaker."""
+        started = time.perf_counter()
+        try:
+            result = self.fn(prompt)
+        except Exception:
+            self.stats.record(time.perf_counter() - started, ok=False)
+            self.breaker.record_failure()
+            raise
+        elapsed = time.perf_counter() - started
+        self.stats.record(elapsed)
+        if elapsed > self.slow_call_seconds:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return result
+
+    def hedge_delay(self, default: float) -> float:
+        p90 = self.stats.percentile(90) if self.stats.samples >= MIN_SAMPLES else None
+        return max(MIN_HEDGE_DELAY_SECONDS, p90 if p90 is not None else default)
+
+
+class LLMRouter:
+    """
+    Routes prompts over several providers with hedging and circuit breakers.
+
+    Args:
+        providers: {name: blocking prompt -> text callable}, in preference order
+        streams: {name: prompt -> iterator of text deltas} for stream() (optional)
+        timeout_seconds: Overall deadline of one request (for stream(): of the first delta)
+        hedge_delay_seconds: Hedge delay until a provider has enough samples for its p90
+        max_hedge_ratio: Upper bound on hedged requests / requests
+    """
+
+    def __init__(self, providers: Dict[str, Callable[[str], str]], timeout_seconds: float = 8.0,
+                 hedge_delay_seconds: float = DEFAULT_HEDGE_DELAY_SECONDS, max_hedge_ratio: float = 0.25,
+                 failure_threshold: int = 3, reset_seconds: float = 30.0, max_workers: int = 16,
+                 streams: Optional[Dict[str, Callable[[str], Iterator[str]]]] = None):
+        self.timeout_seconds = timeout_seconds
+        self.streams = dict(streams or {})
+        self.hedge_delay_seconds = hedge_delay_seconds
+        self.max_hedge_ratio = max_hedge_ratio
+        self.providers = [
+            RoutedProvider(name, call, CircuitBreaker(failure_threshold, reset_seconds), timeout_seconds)
+            for name, call in providers.items()
+        ]
+        # Not the loop's default executor: asyncio.run() would wait for hedged losers on exit
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.lock = threading.Lock()
+
+    def ranked(self) -> List[RoutedProvider]:
+        """Available providers, fastest median first; providers still warming up keep config order."""
+        order = {provider.name: i for i, provider in enumerate(self.providers)}
+
+        def key(provider):
+            p50 = provider.stats.percentile(50) if provider.stats.samples >= MIN_SAMPLES else 0.0
+            return (p50, order[provider.name])
+
+        return sorted((p for p in self.providers if p.breaker.available()), key=key)
+
+    def _may_hedge(self) -> bool:
+        with self.lock:
+            return self.hedges < self.max_hedge_ratio * self.requests
+
+    async def complete(self, prompt: str, timeout_seconds: Optional[float] = None) -> str:
+        """First successful answer, hedging and failing over as described above."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout_seconds or self.timeout_seconds)
+        candidates = self.ranked()
+        pending = {}
+        errors = []
+        with self.lock:
+            self.requests += 1
+
+        def launch() -> Optional[RoutedProvider]:
+            while candidates:
+                provider = candidates.pop(0)
+                if provider.breaker.allow():
+                    pending[loop.run_in_executor(self.executor, provider.call, prompt)] = provider
+                    return provider
+            return None
+
+        primary = launch()
+        if primary is None:
+            raise LLMUnavailable("All LLM providers are unavailable (circuit open)")
+        hedge_at = loop.time() + primary.hedge_delay(self.hedge_delay_seconds)
+        hedge_decided = False
+        hedged = None
+
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                can_hedge = not hedge_decided and candidates
+                wait_until = min(deadline, hedge_at) if can_hedge else deadline
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, wait_until - now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    provider = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors.append(f"{provider.name}: {e}")
+                        continue
+                    provider.wins += 1
+                    if provider is hedged:
+                        with self.lock:
+                            self.hedge_wins += 1
+                    return result
+
+                if not pending:
+                    # Everything in flight failed: fail over right away
+                    if launch() is None:
+                        break
+                elif can_hedge and loop.time() >= hedge_at:
+                    hedge_decided = True  # hedge at most once; without budget just wait for the primary
+                    if self._may_hedge():
+                        hedged = launch()
+                        if hedged:
+                            with self.lock:
+                                self.hedges += 1
+        finally:
+            for future in pending:
+                future.cancel()  # the thread finishes on its own and still records its latency
+
+        raise LLMUnavailable("; ".join(errors) or "LLM request timed out")
+
+    def stream(self, prompt: str, timeout_seconds: Optional[float] = None) -> Iterator[str]:
+        """
+        Text deltas of one reply from the best-ranked available provider.
+
+        A provider that fails or yields nothing within the timeout before its
+        first delta is failed over to the next one. Once a delta has been
+        yielded, a later failure is recorded and raised to the caller.
+        """
+        timeout = timeout_seconds or self.timeout_seconds
+        errors = []
+        with self.lock:
+            self.requests += 1
+
+        for provider in self.ranked():
+            open_stream = self.streams.get(provider.name)
+            if open_stream is None or not provider.breaker.allow():
+                continue
+            started = time.perf_counter()
+            deltas = None
+            try:
+                deltas = iter(open_stream(prompt))
+                first = self.executor.submit(next, deltas, None).result(timeout=timeout)
+                if first is None:
+                    raise ValueError("empty reply")
+            except Exception as e:
+                provider.first_delta_stats.record(time.perf_counter() - started, ok=False)
+                provider.breaker.record_failure()
+                error = "no first delta in time" if isinstance(e, FutureTimeoutError) else str(e)
+                errors.append(f"{provider.name}: {error}")
+                print(f"LLM stream from {provider.name} failed before the first delta, failing over: {error}")
+                continue
+            provider.first_delta_stats.record(time.perf_counter() - started)
+            provider.wins += 1
+
+            try:
+                yield first
+                yield from deltas
+            except GeneratorExit:
+                raise  # the caller stopped reading (e.g. barge-in), not a provider failure
+            except Exception:
+                provider.breaker.record_failure()
+                raise
+            provider.breaker.record_success()
+            return
+
+        raise LLMUnavailable("; ".join(errors) or "All LLM providers are unavailable for streaming")
+
+    def complete_sync(self, prompt: str, timeout_seconds: Optional[float] = None) -> str:
+        """complete() for synchronous callers (LLMService); must not be called from a running event loop."""
+        return asyncio.run(self.complete(prompt, timeout_seconds))
+
+    def report(self) -> dict:
+        """Per-provider latency percentiles, breaker state and wins, plus hedging counts."""
+        def ms(seconds):
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "providers": {
+                provider.name: {
+                    "state": provider.breaker.state,
+                    "calls": provider.stats.calls,
+                    "errors": provider.stats.errors,
+                    "wins": provider.wins,
+                    "p50_ms": ms(provider.stats.percentile(50)),
+                    "p90_ms": ms(provider.stats.percentile(90)),
+                    "p99_ms": ms(provider.stats.percentile(99)),
+                    "stream_first_delta_p50_ms": ms(provider.first_delta_stats.percentile(50)),
+                    "stream_first_delta_p90_ms": ms(provider.first_delta_stats.percentile(90)),
+                }
+                for provider in self.providers
+            },
+        }
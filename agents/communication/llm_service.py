@@ -5,7 +5,7 @@ Supports OpenAI, Anthropic Claude, Google Gemini, and Groq
 
 import os
 import json
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, Iterator, List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -34,6 +34,10 @@ try:
 except ImportError:
     GROQ_AVAILABLE = False
 
+import keyword_matcher
+from llm_cache import DEFAULT_TTLS, LLMCache, cache_key
+from llm_router import LLMRouter
+
 
 class LLMProvider(Enum):
     """Supported LLM providers"""
@@ -69,22 +73,61 @@ class LLMConfig:
         
         # Enable/disable LLM
         self.enabled = os.getenv('LLM_ENABLED', 'true').lower() == 'true'
+        
+        # Multi-provider mode: comma-separated providers in preference order
+        # (e.g. "groq,gemini"); requests are hedged across them (see llm_router.py)
+        self.providers = [p.strip().lower() for p in os.getenv('LLM_PROVIDERS', '').split(',') if p.strip()]
+        self.timeout_seconds = float(os.getenv('LLM_TIMEOUT_SECONDS', '8'))
+        self.hedge_delay_seconds = float(os.getenv('LLM_HEDGE_DELAY_SECONDS', '0.8'))
+        self.max_hedge_ratio = float(os.getenv('LLM_MAX_HEDGE_RATIO', '0.25'))
+        self.breaker_failures = int(os.getenv('LLM_BREAKER_FAILURES', '3'))
+        self.breaker_reset_seconds = float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+        
+        # Messages the keyword matcher classifies at least this confidently skip
+        # the LLM analysis (see keyword_matcher.py); above 1.0 disables it
+        self.preclassify_confidence = float(os.getenv('LLM_PRECLASSIFY_CONFIDENCE', '0.9'))
+        
+        # Reply cache (see llm_cache.py); LLM_CACHE_DB adds a persistent SQLite tier
+        self.cache_enabled = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+        self.cache_max_entries = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1024'))
+        self.cache_db = os.getenv('LLM_CACHE_DB') or None
+        self.cache_ttls = {
+            'translate_technical_to_simple': float(os.getenv('LLM_CACHE_TTL_TRANSLATE', DEFAULT_TTLS['translate_technical_to_simple'])),
+            'analyze_user_input': float(os.getenv('LLM_CACHE_TTL_ANALYZE', DEFAULT_TTLS['analyze_user_input'])),
+            'generate_response': float(os.getenv('LLM_CACHE_TTL_RESPONSE', DEFAULT_TTLS['generate_response'])),
+        }
+    
+    def model_for(self, provider: str) -> str:
+        """Model name used with a provider"""
+        return {
+            'openai': self.openai_model,
+            'anthropic': self.anthropic_model,
+            'gemini': self.gemini_model,
+            'groq': self.groq_model,
+        }.get(provider, '')
+    
+    def provider_configured(self, provider: str) -> bool:
+        """Check if one provider has its API key and SDK"""
+        if provider == 'openai':
+            return bool(self.openai_api_key and OPENAI_AVAILABLE)
+        elif provider == 'anthropic':
+            return bool(self.anthropic_api_key and ANTHROPIC_AVAILABLE)
+        elif provider == 'gemini':
+            return bool(self.gemini_api_key and GEMINI_AVAILABLE)
+        elif provider == 'groq':
+            return bool(self.groq_api_key and GROQ_AVAILABLE)
+        return False
+    
+    def configured_providers(self) -> List[str]:
+        """Providers requests can go to: LLM_PROVIDERS if set, else LLM_PROVIDER"""
+        return [p for p in (self.providers or [self.provider]) if self.provider_configured(p)]
     
     def is_configured(self) -> bool:
         """Check if LLM is properly configured"""
         if not self.enabled:
             return False
         
-        if self.provider == 'openai' and self.openai_api_key and OPENAI_AVAILABLE:
-            return True
-        elif self.provider == 'anthropic' and self.anthropic_api_key and ANTHROPIC_AVAILABLE:
-            return True
-        elif self.provider == 'gemini' and self.gemini_api_key and GEMINI_AVAILABLE:
-            return True
-        elif self.provider == 'groq' and self.groq_api_key and GROQ_AVAILABLE:
-            return True
-        
-        return False
+        return bool(self.configured_providers())
 
 
 class LLMService:
@@ -95,29 +138,62 @@ class LLMService:
     
     def __init__(self, config: Optional[LLMConfig] = None):
         self.config = config or LLMConfig()
+        self.router: Optional[LLMRouter] = None
+        self.cache: Optional[LLMCache] = None
+        if self.config.cache_enabled:
+            self.cache = LLMCache(self.config.cache_max_entries, self.config.cache_ttls, self.config.cache_db)
         self._initialize_client()
     
     def _initialize_client(self):
-        """Initialize the appropriate LLM client"""
+        """Initialize the appropriate LLM client (and the router in multi-provider mode)"""
+        self.client = None
         if not self.config.is_configured():
-            self.client = None
             return
         
-        try:
-            if self.config.provider == 'openai' and OPENAI_AVAILABLE:
-                self.client = openai.OpenAI(api_key=self.config.openai_api_key)
-            elif self.config.provider == 'anthropic' and ANTHROPIC_AVAILABLE:
-                self.client = anthropic.Anthropic(api_key=self.config.anthropic_api_key)
-            elif self.config.provider == 'gemini' and GEMINI_AVAILABLE:
-                genai.configure(api_key=self.config.gemini_api_key)
-                self.client = genai.GenerativeModel(self.config.gemini_model)
-            elif self.config.provider == 'groq' and GROQ_AVAILABLE:
-                self.client = Groq(api_key=self.config.groq_api_key)
-            else:
-                self.client = None
-        except Exception as e:
-            print(f"LLM initialization error: {e}")
-            self.client = None
+        if not self.config.providers:
+            try:
+                self.client = self._create_client(self.config.provider)
+            except Exception as e:
+                print(f"LLM initialization error: {e}")
+            return
+        
+        clients = {}
+        for provider in self.config.configured_providers():
+            try:
+                clients[provider] = self._create_client(provider)
+            except Exception as e:
+                print(f"LLM initialization error ({provider}): {e}")
+        if not clients:
+            return
+        
+        # The single-provider paths (no router) use the first provider
+        self.config.provider = next(iter(clients))
+        self.client = clients[self.config.provider]
+        if len(clients) > 1:
+            self.router = LLMRouter(
+                {name: (lambda prompt, name=name, client=client: self._call_provider(name, client, prompt))
+                 for name, client in clients.items()},
+                streams={name: (lambda prompt, name=name, client=client: self._stream_provider(name, client, prompt))
+                         for name, client in clients.items()},
+                timeout_seconds=self.config.timeout_seconds,
+                hedge_delay_seconds=self.config.hedge_delay_seconds,
+                max_hedge_ratio=self.config.max_hedge_ratio,
+                failure_threshold=self.config.breaker_failures,
+                reset_seconds=self.config.breaker_reset_seconds
+            )
+    
+    def _create_client(self, provider: str):
+        """Client for one provider"""
+        if provider == 'openai' and OPENAI_AVAILABLE:
+            return openai.OpenAI(api_key=self.config.openai_api_key)
+        elif provider == 'anthropic' and ANTHROPIC_AVAILABLE:
+            return anthropic.Anthropic(api_key=self.config.anthropic_api_key)
+        elif provider == 'gemini' and GEMINI_AVAILABLE:
+            genai.configure(api_key=self.config.gemini_api_key)
+            return genai.GenerativeModel(self.config.gemini_model)
+        elif provider == 'groq' and GROQ_AVAILABLE:
+            return Groq(api_key=self.config.groq_api_key)
+        return None
     
     def analyze_user_input(
         self,
@@ -127,8 +203,9 @@ class LLMService:
     ) -> Dict[str, Any]:
         """Analyze user input with deep understanding"""
         
-        if not self.client:
-            return self._fallback_analyze(user_message)
+        quick = self._fallback_analyze(user_message)
+        if not self.client or quick['confidence'] >= self.config.preclassify_confidence:
+            return quick
         
         try:
             system_prompt = f"""You are analyzing customer responses in a vehicle maintenance conversation.
@@ -156,13 +233,11 @@ User Message: "{user_message}"
 
 Return ONLY valid JSON, no markdown formatting."""
 
-            response = self._call_llm(system_prompt)
-            result = json.loads(response)
-            return result
+            return self._complete('analyze_user_input', system_prompt, parse=json.loads)
             
         except Exception as e:
             print(f"LLM analysis error: {e}")
-            return self._fallback_analyze(user_message)
+            return quick
     
     def generate_response(
         self,
@@ -178,7 +253,57 @@ Return ONLY valid JSON, no markdown formatting."""
             return self._fallback_response(user_message, defect_info)
         
         try:
-            system_prompt = f"""You are NaviGo, an AI assistant helping customers understand vehicle issues.
+            system_prompt = self._response_prompt(
+                user_message, conversation_history, vehicle_context, defect_info, response_type
+            )
+            return self._complete('generate_response', system_prompt)
+            
+        except Exception as e:
+            print(f"LLM generation error: {e}")
+            return self._fallback_response(user_message, defect_info)
+    
+    def stream_response(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        vehicle_context: Dict[str, Any],
+        defect_info: Optional[Dict[str, Any]] = None,
+        response_type: str = 'conversational'
+    ) -> Iterator[str]:
+        """
+        Same response as generate_response, yielded as text deltas while the
+        provider generates it (used by the media-stream voice mode)
+        """
+        
+        if not self.client:
+            yield self._fallback_response(user_message, defect_info)
+            return
+        
+        streamed = False
+        try:
+            system_prompt = self._response_prompt(
+                user_message, conversation_history, vehicle_context, defect_info, response_type
+            )
+            for delta in self._stream_llm(system_prompt):
+                if delta:
+                    streamed = True
+                    yield delta
+            
+        except Exception as e:
+            print(f"LLM streaming error: {e}")
+            if not streamed:
+                yield self._fallback_response(user_message, defect_info)
+    
+    def _response_prompt(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        vehicle_context: Dict[str, Any],
+        defect_info: Optional[Dict[str, Any]],
+        response_type: str
+    ) -> str:
+        """Prompt shared by generate_response and stream_response"""
+        return f"""You are NaviGo, an AI assistant helping customers understand vehicle issues.
 
 CRITICAL RULES:
 1. Be empathetic and helpful
@@ -204,13 +329,6 @@ Response Type: {response_type}
 User Message: "{user_message}"
 
 Generate a natural, helpful response. Be conversational but professional."""
-
-            response = self._call_llm(system_prompt)
-            return response.strip()
-            
-        except Exception as e:
-            print(f"LLM generation error: {e}")
-            return self._fallback_response(user_message, defect_info)
     
     def translate_technical_to_simple(
         self,
@@ -237,18 +355,53 @@ Rules:
 
 Simple Version:"""
 
-            response = self._call_llm(prompt)
-            return response.strip()
+            return self._complete('translate_technical_to_simple', prompt)
             
         except Exception as e:
             print(f"Translation error: {e}")
             return self._fallback_translate(technical_text)
     
+    def _complete(self, method: str, prompt: str, parse: Callable[[str], Any] = str.strip) -> Any:
+        """
+        Cached LLM call for one of the public methods. The raw reply is only
+        cached once parse() accepted it, so a malformed reply is retried next time.
+        """
+        
+        key = None
+        if self.cache and self.cache.enabled_for(method):
+            key = cache_key(method, *self._cache_identity(), prompt)
+            cached = self.cache.get(method, key)
+            if cached is not None:
+                return parse(cached)
+        
+        response = self._call_llm(prompt)
+        result = parse(response)
+        if key:
+            self.cache.set(method, key, response)
+        return result
+    
+    def _cache_identity(self):
+        """(provider, model, temperature) part of the cache key; all hedged providers when routing"""
+        providers = self.config.configured_providers() if self.router else [self.config.provider]
+        models = [self.config.model_for(provider) for provider in providers]
+        return ",".join(providers), ",".join(models), self.config.temperature
+    
+    def cache_report(self) -> Optional[Dict[str, Any]]:
+        """Cache hit rates (None with the cache disabled)"""
+        return self.cache.report() if self.cache else None
+    
     def _call_llm(self, prompt: str) -> str:
-        """Call the configured LLM provider"""
+        """Call the configured LLM provider (hedged across providers when a router is set up)"""
+        
+        if self.router:
+            return self.router.complete_sync(prompt)
+        return self._call_provider(self.config.provider, self.client, prompt)
+    
+    def _call_provider(self, provider: str, client, prompt: str) -> str:
+        """Call one LLM provider"""
         
-        if self.config.provider == 'openai':
-            response = self.client.chat.completions.create(
+        if provider == 'openai':
+            response = client.chat.completions.create(
                 model=self.config.openai_model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=self.config.temperature,
@@ -256,8 +409,8 @@ Simple Version:"""
             )
             return response.choices[0].message.content
         
-        elif self.config.provider == 'anthropic':
-            response = self.client.messages.create(
+        elif provider == 'anthropic':
+            response = client.messages.create(
                 model=self.config.anthropic_model,
                 max_tokens=self.config.max_tokens,
                 temperature=self.config.temperature,
@@ -265,8 +418,8 @@ Simple Version:"""
             )
             return response.content[0].text
         
-        elif self.config.provider == 'gemini':
-            response = self.client.generate_content(
+        elif provider == 'gemini':
+            response = client.generate_content(
                 prompt,
                 generation_config={
                     'temperature': self.config.temperature,
@@ -275,8 +428,8 @@ Simple Version:"""
             )
             return response.text
         
-        elif self.config.provider == 'groq':
-            response = self.client.chat.completions.create(
+        elif provider == 'groq':
+            response = client.chat.completions.create(
                 model=self.config.groq_model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=self.config.temperature,
@@ -285,7 +438,54 @@ Simple Version:"""
             return response.choices[0].message.content
         
         else:
-            raise ValueError(f"Unsupported provider: {self.config.provider}")
+            raise ValueError(f"Unsupported provider: {provider}")
+    
+    def _stream_llm(self, prompt: str) -> Iterator[str]:
+        """Stream text deltas from the configured LLM provider (through the router when set up)"""
+        if self.router:
+            return self.router.stream(prompt)
+        return self._stream_provider(self.config.provider, self.client, prompt)
+    
+    def _stream_provider(self, provider: str, client, prompt: str) -> Iterator[str]:
+        """Stream text deltas from one provider's client"""
+        
+        if provider in ('openai', 'groq'):
+            model = self.config.openai_model if provider == 'openai' else self.config.groq_model
+            stream = client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=self.config.temperature,
+                max_tokens=self.config.max_tokens,
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        
+        elif provider == 'anthropic':
+            with client.messages.stream(
+                model=self.config.anthropic_model,
+                max_tokens=self.config.max_tokens,
+                temperature=self.config.temperature,
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                for text in stream.text_stream:
+                    yield text
+        
+        elif provider == 'gemini':
+            response = client.generate_content(
+                prompt,
+                generation_config={
+                    'temperature': self.config.temperature,
+                    'max_output_tokens': self.config.max_tokens
+                },
+                stream=True
+            )
+            for chunk in response:
+                yield chunk.text
+        
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
     
     def _format_history(self, history: List[Dict[str, str]]) -> str:
         """Format conversation history for context"""
@@ -312,43 +512,8 @@ Simple Version:"""
     
     # Fallback methods for when LLM is not available
     def _fallback_analyze(self, user_message: str) -> Dict[str, Any]:
-        """Rule-based analysis when LLM unavailable"""
-        message_lower = user_message.lower()
-        
-        intent = 'ask_question'
-        if any(w in message_lower for w in ['yes', 'schedule', 'book', 'okay', 'sure']):
-            intent = 'schedule_service'
-        elif any(w in message_lower for w in ['no', 'not now', 'later', 'maybe']):
-            intent = 'decline'
-        elif any(w in message_lower for w in ['emergency', 'urgent', 'immediate', 'now']):
-            intent = 'emergency'
-        
-        tone = 'neutral'
-        if any(w in message_lower for w in ['please', 'could you', 'kindly']):
-            tone = 'formal'
-        elif any(w in message_lower for w in ['yeah', 'yep', 'nope', 'gonna']):
-            tone = 'casual'
-        
-        sentiment = 'neutral'
-        if any(w in message_lower for w in ['worried', 'concerned', 'scared', 'afraid']):
-            sentiment = 'concerned'
-        
-        concerns = []
-        if any(w in message_lower for w in ['cost', 'price', 'expensive', 'money']):
-            concerns.append('cost')
-        if any(w in message_lower for w in ['safe', 'danger', 'risk']):
-            concerns.append('safety')
-        if any(w in message_lower for w in ['when', 'how long', 'time']):
-            concerns.append('timeline')
-        
-        return {
-            'intent': intent,
-            'tone': tone,
-            'sentiment': sentiment,
-            'language_preference': 'simple',
-            'key_concerns': concerns,
-            'confidence': 0.6
-        }
+        """Rule-based analysis when LLM unavailable (one pass of the keyword matcher)"""
+        return {**keyword_matcher.analyze(user_message), 'method': 'rules'}
     
     def _fallback_response(self, user_message: str, defect: Optional[Dict] = None) -> str:
         """Template-based response when LLM unavailable"""
@@ -396,6 +561,9 @@ def test_llm_configuration() -> Dict[str, Any]:
         'enabled': config.enabled,
         'provider': config.provider,
         'configured': config.is_configured(),
+        'hedged_providers': config.providers,
+        'cache_enabled': config.cache_enabled,
+        'cache_db': config.cache_db,
         'available_providers': []
     }
     
@@ -429,3 +597,5 @@ if __name__ == "__main__":
         print("  export OPENAI_API_KEY=sk-...")
         print("  # or")
         print("  export ANTHROPIC_API_KEY=sk-ant-...")
+        print("\nTo hedge requests across several providers:")
+        print("  export LLM_PROVIDERS=groq,gemini  # preference order")
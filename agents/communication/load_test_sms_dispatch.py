@@ -0,0 +1,75 @@
+"""
+Load test for SMSAgent.send_bulk against a local fake Messages API.
+
+The real Twilio client is pointed at fake_twilio.FakeMessagingEndpoint, which
+adds per-request latency, rate-limits each sender and fails a share of
+requests with 503. Compares:
+- sequential: SMSAgent.send_sms in a loop (what fleet-wide alerts did before)
+- bulk: SMSAgent.send_bulk over several senders, within their rate limits
+
+Run with: python load_test_sms_dispatch.py [messages]
+"""
+
+import json
+import sys
+import time
+
+from twilio.rest import Client
+
+from fake_twilio import FakeMessagingEndpoint
+from sms_agent import SMSAgent
+
+SENDERS = ["+15550000001", "+15550000002", "+15550000003", "+15550000004"]
+
+
+def agent_for(endpoint: FakeMessagingEndpoint, senders, rate_per_second: float) -> SMSAgent:
+    agent = SMSAgent()
+    agent.twilio_client = Client("AC00000000000000000000000000000000", "token")
+    agent.twilio_client.api.base_url = endpoint.url
+    agent.twilio_phone_number = senders[0]
+    agent.sms_senders = list(senders)
+    agent.sms_rate_per_second = rate_per_second
+    return agent
+
+
+def recipients(count: int):
+    return [{"to": f"+9198{i:08d}", "vehicle_reg": f"MH-12-AB-{i:04d}"} for i in range(count)]
+
+
+def load_test(messages: int = 400, sequential_sample: int = 40, rate_per_second: float = 50.0,
+              latency_seconds: float = 0.02, failure_rate: float = 0.05, max_workers: int = 16) -> dict:
+    """Sequential throughput (on a sample) vs bulk dispatch of the full batch."""
+    with FakeMessagingEndpoint(latency_seconds=latency_seconds) as endpoint:
+        agent = agent_for(endpoint, SENDERS[:1], rate_per_second)
+        started = time.perf_counter()
+        for recipient in recipients(sequential_sample):
+            agent.send_sms(recipient["to"], agent.reminder_message(recipient["vehicle_reg"]))
+        sequential_rate = sequential_sample / (time.perf_counter() - started)
+
+    with FakeMessagingEndpoint(rate_per_second=rate_per_second, failure_rate=failure_rate,
+                               latency_seconds=latency_seconds, invalid_numbers=["+919800000007"]) as endpoint:
+        agent = agent_for(endpoint, SENDERS, rate_per_second)
+        report = agent.send_bulk_reminders(recipients(messages), max_workers=max_workers)
+        summary = report["summary"]
+        per_sender = {}
+        for _, sender, _, _ in endpoint.messages:
+            per_sender[sender] = per_sender.get(sender, 0) + 1
+        bulk = {
+            **summary,
+            "endpoint": dict(endpoint.counts),
+            "per_sender": per_sender,
+            "rate_limit_per_second": rate_per_second * len(SENDERS),
+        }
+
+    return {
+        "messages": messages,
+        "sequential_messages_per_second": round(sequential_rate, 1),
+        "sequential_estimate_seconds": round(messages / sequential_rate, 1),
+        "bulk": bulk,
+        "failed": [r for r in report["results"] if r["status"] == "failed"],
+    }
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    print(json.dumps(load_test(count), indent=2))
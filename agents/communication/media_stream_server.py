@@ -0,0 +1,452 @@
+"""
+Media-stream voice mode for VoiceCommunicationAgent.
+
+With TwiML <Say>, nothing is spoken until the whole reply has been generated.
+In this mode the call is connected (generate_twiml_media_stream) to a
+long-running websocket server that speaks the Twilio media-stream protocol:
+
+    Twilio -> server: connected, start, media (caller audio), dtmf, mark, stop
+    server -> Twilio: media (agent audio), mark, clear
+
+Replies are streamed from the LLM and cut into sentences (SentenceChunker).
+Each sentence is synthesized and sent as soon as it is complete, so the caller
+hears the first sentence while the rest is still being generated. Every
+sentence is followed by a mark; Twilio echoes it back once played, which is
+how the server knows when the last turn has finished playing before it hangs
+up. Caller speech during playback clears the queued audio (barge-in).
+
+The conversation itself (greeting, defect explanation, questions, scheduling)
+is VoiceCommunicationAgent's. Speech recognition and synthesis are pluggable
+(SpeechToText / TextToSpeech); Twilio audio is 8 kHz mu-law. google_speech.py
+has the Google Cloud Speech-to-Text / Text-to-Speech implementations used for
+real calls; fake_twilio.py has a local fake Twilio client and a text codec for
+tests and local runs.
+
+Run:
+    python media_stream_server.py   (MEDIA_STREAM_PORT, default 8765, path /stream)
+    MEDIA_STREAM_SPEECH=text python media_stream_server.py   (plain-text loopback, no Google credentials)
+"""
+
+import abc
+import asyncio
+import base64
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+from aiohttp import WSMsgType, web
+
+import keyword_matcher
+from agent import VoiceCommunicationAgent
+from schemas import VehicleDefect, VehicleStatus
+
+STREAM_PATH = "/stream"
+DEFAULT_PORT = 8765
+
+MAX_MEDIA_BYTES = 8000  # 1 s of 8 kHz mu-law per media message
+MIN_SENTENCE_CHARS = 20  # shorter sentences are merged with the next one
+MAX_SENTENCE_CHARS = 200  # longer runs are cut at a comma or space
+
+SCHEDULE_PROMPT = "Would you like to schedule a service appointment? Press 1 for yes, 2 for no, or just speak your response."
+FOLLOW_UP_PROMPT = "Do you have any other questions? Or would you like to schedule service?"
+CALL_LATER_MESSAGE = "No problem. I'll send you the details via SMS, and you can call us anytime. Have a great day!"
+DECLINED_MESSAGE = "I understand. I'll send you the full details via SMS. You can call us anytime to schedule service. Thank you!"
+
+# A turn opening with one of these is a question even when it contains a yes ("is it ok to drive")
+QUESTION_WORDS = {"how", "what", "why", "when", "where", "which", "can", "is", "will", "should", "does"}
+
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(\s+)")
+_WORD = re.compile(r"[a-z']+")
+_END = object()
+
+
+class SentenceChunker:
+    """
+    Cuts a stream of text deltas into sentence-sized chunks for TTS.
+
+    A sentence ends at ., ! or ? followed by whitespace, so "2.5 km" is not
+    cut and the last sentence waits for flush().
+    """
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS, max_chars: int = MAX_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        """Add a delta; returns the sentences it completed."""
+        self.buffer += delta
+        sentences = []
+        cut = self._cut()
+        while cut:
+            sentence, self.buffer = self.buffer[:cut].strip(), self.buffer[cut:]
+            if sentence:
+                sentences.append(sentence)
+            cut = self._cut()
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Whatever is left once the stream has ended."""
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
+    def _cut(self) -> Optional[int]:
+        for match in _SENTENCE_END.finditer(self.buffer):
+            if match.start(1) >= self.min_chars:
+                return match.end()
+        if len(self.buffer) > self.max_chars:
+            comma = self.buffer.rfind(", ", 0, self.max_chars)
+            space = self.buffer.rfind(" ", 0, self.max_chars)
+            return comma + 1 if comma > 0 else (space if space > 0 else self.max_chars)
+        return None
+
+
+class SpeechToText(abc.ABC):
+    """Speech recognizer for one call (one instance per stream)."""
+
+    @abc.abstractmethod
+    def feed(self, audio: bytes) -> Optional[str]:
+        """Add inbound mu-law audio; returns the caller's utterance once it is final."""
+
+    def close(self):
+        """The stream has ended."""
+
+
+class TextToSpeech(abc.ABC):
+    """Speech synthesizer shared by all calls."""
+
+    @abc.abstractmethod
+    def synthesize(self, text: str) -> bytes:
+        """8 kHz mono mu-law audio for a sentence."""
+
+
+def classify_reply(text: Optional[str], digit: Optional[str] = None) -> str:
+    """
+    "yes", "no" or "question" for a caller turn. Local and instant, so routing
+    a turn never waits for the LLM. Only an unambiguous schedule or decline
+    (keyword_matcher.analyze) is a yes or no; a question ("yes, but how much
+    will it cost?") or a turn matching both ("yes... actually no") is answered
+    as a question.
+    """
+    if digit:
+        return {"1": "yes", "2": "no"}.get(digit.strip()[:1], "question")
+    words = _WORD.findall((text or "").lower())
+    if words and words[0] in QUESTION_WORDS:
+        return "question"
+    analysis = keyword_matcher.analyze(text or "")
+    if analysis["confidence"] < keyword_matcher.UNAMBIGUOUS_CONFIDENCE:
+        return "question"
+    return {"schedule_service": "yes", "decline": "no"}.get(analysis["intent"], "question")
+
+
+def agent_from_parameters(parameters: Dict[str, str]) -> VoiceCommunicationAgent:
+    """
+    VoiceCommunicationAgent with a conversation initialized from the stream's
+    customParameters (see generate_twiml_media_stream).
+    """
+    customer_name = parameters.get("customer_name") or "Customer"
+    vehicle_id = parameters.get("vehicle_id") or "unknown"
+    defect = VehicleDefect(
+        defect_id=parameters.get("defect_id") or "DEF001",
+        component=parameters.get("component") or "vehicle",
+        description=parameters.get("description") or "An issue was detected during monitoring",
+        severity=parameters.get("severity") or "Medium",
+        confidence=float(parameters.get("confidence") or 0.8),
+        detected_at=datetime.now(),
+        estimated_time_to_failure=parameters.get("estimated_time_to_failure"),
+        recommended_action=parameters.get("recommended_action") or "Visit a service center for an inspection."
+    )
+    vehicle = VehicleStatus(
+        vehicle_id=vehicle_id,
+        registration_number=parameters.get("registration_number") or vehicle_id,
+        owner_name=customer_name,
+        health_score=int(parameters.get("health_score") or 70),
+        defects=[defect],
+        odometer_km=float(parameters.get("odometer_km") or 0)
+    )
+    agent = VoiceCommunicationAgent()
+    agent.initialize_conversation(vehicle, customer_name)
+    return agent
+
+
+class StreamCall:
+    """Conversation state of one media stream."""
+
+    def __init__(self, agent: VoiceCommunicationAgent, stt: SpeechToText, stream_sid: str,
+                 call_sid: Optional[str], parameters: Dict[str, str]):
+        self.agent = agent
+        self.stt = stt
+        self.stream_sid = stream_sid
+        self.call_sid = call_sid
+        self.parameters = parameters
+        self.turn = 0
+        self.pending_marks = set()
+        self.finished = False
+        self.closing = False
+        self.outcome = None
+
+    @property
+    def defect(self) -> Optional[VehicleDefect]:
+        defects = self.agent.context.vehicle_status.defects
+        return defects[0] if defects else None
+
+    def plan_turn(self, text: Optional[str] = None, digit: Optional[str] = None) -> List[Union[str, Iterator[str]]]:
+        """
+        What to say for the caller's turn, as a list of fixed texts and LLM
+        delta streams (generated lazily while earlier parts are playing).
+        text=None and digit=None is the greeting.
+        """
+        context = self.agent.context
+        self.turn += 1
+
+        if text is None and digit is None:
+            name = context.vehicle_status.owner_name
+            return [self.agent.generate_greeting(name, self.parameters.get("time_of_day", "day")).message]
+
+        context.conversation_history.append({"role": "user", "message": text or f"[pressed {digit}]"})
+        reply = classify_reply(text, digit)
+
+        if reply == "no":
+            self.finished = True
+            self.outcome = "needs_followup" if context.current_topic == "greeting" else "declined"
+            return [CALL_LATER_MESSAGE if context.current_topic == "greeting" else DECLINED_MESSAGE]
+
+        if context.current_topic == "greeting":
+            context.current_topic = "defect_explanation"
+            if reply == "yes" or not text:
+                return [self.agent.stream_defect_explanation(
+                    self.defect, context.user_language_preference, context.user_tone
+                ), SCHEDULE_PROMPT]
+
+        if reply == "yes":
+            self.finished = True
+            self.outcome = "scheduled"
+            center = self.parameters.get("service_center_name") or "our service center"
+            appointment = self.parameters.get("appointment_time") or "the next available slot"
+            return [f"Great! I've scheduled your service appointment at {center} for {appointment}. "
+                    "You'll receive a confirmation SMS with all the details shortly. "
+                    "Thank you for using NaviGo. Drive safe!"]
+
+        context.questions_asked.append(text or "")
+        return [self.agent.stream_user_question(text or "", self.defect), FOLLOW_UP_PROMPT]
+
+
+class MediaStreamServer:
+    """
+    Websocket server for Twilio media streams; one StreamCall per connection.
+
+    Args:
+        stt_factory: New SpeechToText for each call
+        tts: TextToSpeech shared by all calls
+        agent_factory: customParameters -> VoiceCommunicationAgent with an initialized conversation
+    """
+
+    def __init__(self, stt_factory: Callable[[], SpeechToText], tts: TextToSpeech,
+                 agent_factory: Callable[[Dict[str, str]], VoiceCommunicationAgent] = agent_from_parameters,
+                 host: str = "0.0.0.0", port: int = DEFAULT_PORT, max_workers: int = 32):
+        self.stt_factory = stt_factory
+        self.tts = tts
+        self.agent_factory = agent_factory
+        self.host = host
+        self.port = port
+        # LLM streams and synthesis are blocking calls; they run here so the event loop keeps serving calls
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="media-stream")
+        self.runner = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(STREAM_PATH, self.handle_stream)
+        return app
+
+    async def start(self) -> int:
+        """Start listening; returns the bound port (useful with port=0)."""
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        print(f"✓ Media stream server listening on ws://{self.host}:{self.port}{STREAM_PATH}")
+        return self.port
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+        self.executor.shutdown(wait=False)
+
+    async def handle_stream(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        call = None
+        turn_task = None
+
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            event = json.loads(msg.data)
+            kind = event.get("event")
+
+            if kind == "start":
+                start = event.get("start") or {}
+                parameters = start.get("customParameters") or {}
+                agent = await asyncio.get_running_loop().run_in_executor(self.executor, self.agent_factory, parameters)
+                call = StreamCall(agent, self.stt_factory(), event.get("streamSid") or start.get("streamSid"),
+                                  start.get("callSid"), parameters)
+                print(f"Media stream started: {call.call_sid} ({call.stream_sid})")
+                turn_task = asyncio.ensure_future(self._run_turn(ws, call))
+
+            elif call is None or (call.finished and kind in ("media", "dtmf")):
+                continue
+
+            elif kind == "media":
+                media = event.get("media") or {}
+                if media.get("track", "inbound") != "inbound":
+                    continue
+                text = call.stt.feed(base64.b64decode(media.get("payload") or ""))
+                if text and text.strip():
+                    turn_task = await self._barge_in(ws, call, turn_task)
+                    turn_task = asyncio.ensure_future(self._run_turn(ws, call, text=text.strip()))
+
+            elif kind == "dtmf":
+                digit = (event.get("dtmf") or {}).get("digit")
+                if digit:
+                    turn_task = await self._barge_in(ws, call, turn_task)
+                    turn_task = asyncio.ensure_future(self._run_turn(ws, call, digit=digit))
+
+            elif kind == "mark":
+                call.pending_marks.discard((event.get("mark") or {}).get("name"))
+                # The closing turn has played out: hang up (TwiML continues with <Hangup/>)
+                if call.closing and not call.pending_marks:
+                    await ws.close()
+
+            elif kind == "stop":
+                break
+
+        if turn_task and not turn_task.done():
+            turn_task.cancel()
+        if call:
+            call.stt.close()
+            print(f"Media stream closed: {call.call_sid} ({call.turn} turns, outcome: {call.outcome})")
+        return ws
+
+    async def _barge_in(self, ws, call: StreamCall, turn_task):
+        """Caller spoke: stop generating the current reply and drop its queued audio."""
+        if turn_task and not turn_task.done():
+            turn_task.cancel()
+        if call.pending_marks:
+            await ws.send_json({"event": "clear", "streamSid": call.stream_sid})
+            call.pending_marks.clear()
+        return None
+
+    async def _run_turn(self, ws, call: StreamCall, text: Optional[str] = None, digit: Optional[str] = None):
+        received = time.perf_counter()
+        parts = call.plan_turn(text, digit)
+        turn = call.turn
+        spoken = []
+        first_audio = None
+
+        try:
+            for part in parts:
+                chunker = SentenceChunker()
+                async for delta in self._deltas(part):
+                    for sentence in chunker.feed(delta):
+                        sent_at = await self._speak(ws, call, turn, len(spoken), sentence)
+                        first_audio = first_audio or sent_at
+                        spoken.append(sentence)
+                for sentence in chunker.flush():
+                    sent_at = await self._speak(ws, call, turn, len(spoken), sentence)
+                    first_audio = first_audio or sent_at
+                    spoken.append(sentence)
+        except asyncio.CancelledError:
+            print(f"Turn {turn} interrupted by the caller ({call.call_sid})")
+            raise
+        finally:
+            if spoken:
+                call.agent.context.conversation_history.append({"role": "assistant", "message": " ".join(spoken)})
+
+        call.closing = call.finished
+        await self._send_mark(ws, call, f"{turn}:end")
+        done = time.perf_counter()
+        print(json.dumps({
+            "metric": "voice_stream_first_audio_ms",
+            "latency_ms": round(((first_audio or done) - received) * 1000, 1),
+            "turn_ms": round((done - received) * 1000, 1),
+            "sentences": len(spoken),
+            "call_sid": call.call_sid,
+            "turn": turn,
+        }))
+
+    async def _speak(self, ws, call: StreamCall, turn: int, index: int, sentence: str) -> float:
+        """Synthesize one sentence and send it followed by its mark; returns when the audio was sent."""
+        audio = await asyncio.get_running_loop().run_in_executor(self.executor, self.tts.synthesize, sentence)
+        sent_at = time.perf_counter()
+        for offset in range(0, len(audio), MAX_MEDIA_BYTES):
+            await ws.send_json({
+                "event": "media",
+                "streamSid": call.stream_sid,
+                "media": {"payload": base64.b64encode(audio[offset:offset + MAX_MEDIA_BYTES]).decode("ascii")},
+            })
+        await self._send_mark(ws, call, f"{turn}:{index}")
+        return sent_at
+
+    async def _send_mark(self, ws, call: StreamCall, name: str):
+        call.pending_marks.add(name)
+        await ws.send_json({"event": "mark", "streamSid": call.stream_sid, "mark": {"name": name}})
+
+    async def _deltas(self, part: Union[str, Iterator[str]]):
+        """Text deltas of a reply part; LLM streams are pumped from a worker thread."""
+        if isinstance(part, str):
+            yield part
+            return
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                cancelled.set()  # event loop already closed
+
+        def pump():
+            try:
+                for delta in part:
+                    if cancelled.is_set():
+                        break
+                    put(delta)
+            except Exception as e:
+                print(f"Reply stream failed: {e}")
+            finally:
+                put(_END)
+
+        loop.run_in_executor(self.executor, pump)
+        try:
+            while True:
+                delta = await queue.get()
+                if delta is _END:
+                    break
+                yield delta
+        finally:
+            cancelled.set()
+
+
+if __name__ == "__main__":
+    if os.getenv("MEDIA_STREAM_SPEECH", "google") == "text":
+        # Local loopback run: caller speech and agent audio are plain text (see fake_twilio.py)
+        from fake_twilio import TextRecognizer as stt_factory, TextSpeech as tts_factory
+    else:
+        from google_speech import GoogleSpeechToText as stt_factory, GoogleTextToSpeech as tts_factory
+
+    async def serve():
+        server = MediaStreamServer(stt_factory, tts_factory(), port=int(os.getenv("MEDIA_STREAM_PORT", DEFAULT_PORT)))
+        await server.start()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
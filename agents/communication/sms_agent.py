@@ -1,6 +1,7 @@
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional
 import os
 from schemas import VehicleDefect, VehicleStatus, AgentMessage
+from sms_dispatch import BulkSMSDispatcher, TokenBucket
 
 # Load environment variables from .env file
 try:
@@ -50,6 +51,17 @@ class SMSAgent:
             else:
                 print("⚠ Twilio credentials not configured")
         
+        # Bulk dispatch: sending numbers (TWILIO_SMS_SENDERS, comma-separated) and
+        # each number's rate limit in messages per second
+        self.sms_senders = [n.strip() for n in os.getenv('TWILIO_SMS_SENDERS', '').split(',') if n.strip()]
+        if not self.sms_senders and self.twilio_phone_number:
+            self.sms_senders = [self.twilio_phone_number]
+        self.sms_rate_per_second = float(os.getenv('SMS_RATE_PER_SECOND', '1'))
+        self.sms_max_workers = int(os.getenv('SMS_MAX_WORKERS', '16'))
+        # One token bucket per sender for the agent's lifetime, shared by all bulk sends,
+        # so concurrent batches together stay within each sender's rate
+        self.sms_buckets: Dict[str, TokenBucket] = {}
+        
         # Initialize LLM service
         self.llm_service = LLMService() if LLM_AVAILABLE else None
         self.use_llm = self.llm_service and self.llm_service.config.is_configured()
@@ -130,22 +142,7 @@ class SMSAgent:
             }
         
         try:
-            # Truncate message if too long for single SMS
-            if len(message) > self.MAX_LONG_SMS_LENGTH:
-                message = message[:self.MAX_LONG_SMS_LENGTH - 3] + "..."
-            
-            # Send SMS
-            sms_params = {
-                'to': to_phone_number,
-                'from_': self.twilio_phone_number,
-                'body': message
-            }
-            
-            # Add media if provided (converts to MMS)
-            if media_urls:
-                sms_params['media_url'] = media_urls
-            
-            message_obj = self.twilio_client.messages.create(**sms_params)
+            message_obj = self._create_message(to_phone_number, self.twilio_phone_number, message, media_urls)
             
             return {
                 'status': 'success',
@@ -161,6 +158,101 @@ class SMSAgent:
                 'message_sid': None
             }
     
+    def _create_message(self, to_phone_number: str, from_number: str, message: str,
+                        media_urls: Optional[List[str]] = None):
+        """Create one message via Twilio (raises on failure)"""
+        # Truncate message if too long for single SMS
+        if len(message) > self.MAX_LONG_SMS_LENGTH:
+            message = message[:self.MAX_LONG_SMS_LENGTH - 3] + "..."
+        
+        sms_params = {
+            'to': to_phone_number,
+            'from_': from_number,
+            'body': message
+        }
+        
+        # Add media if provided (converts to MMS)
+        if media_urls:
+            sms_params['media_url'] = media_urls
+        
+        return self.twilio_client.messages.create(**sms_params)
+    
+    def send_bulk(self, messages: List[Dict[str, Any]], max_workers: Optional[int] = None,
+                  on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Send many SMS concurrently within each sender's rate limit (see sms_dispatch.py)
+        
+        Args:
+            messages: [{"to", "message", "media_urls" (optional), "reference" (optional, e.g. vehicle_id)}]
+            max_workers: Concurrent sends (defaults to SMS_MAX_WORKERS)
+            on_result: Called with each recipient's result as it completes
+            
+        Returns:
+            Dict with a batch summary and one result per message (sent / failed / duplicate)
+        """
+        if not self.twilio_client or not self.sms_senders:
+            return {
+                'status': 'error',
+                'message': 'Twilio not configured',
+                'summary': {'total': len(messages), 'sent': 0, 'failed': len(messages)},
+                'results': []
+            }
+        
+        dispatcher = BulkSMSDispatcher(
+            self._create_message,
+            self.sms_senders,
+            rate_per_second=self.sms_rate_per_second,
+            max_workers=max_workers or self.sms_max_workers,
+            buckets=self.sms_buckets
+        )
+        report = dispatcher.dispatch(messages, on_result)
+        summary = report['summary']
+        print(f"Bulk SMS: {summary['sent']}/{summary['total']} sent, {summary['failed']} failed "
+              f"in {summary['duration_seconds']}s")
+        return {'status': 'success' if not summary['failed'] else 'partial', **report}
+    
+    def send_bulk_defect_alerts(self, recipients: List[Dict[str, Any]],
+                                include_details: bool = False, **kwargs) -> Dict[str, Any]:
+        """
+        Send defect alerts to many vehicles
+        
+        Args:
+            recipients: [{"to": phone number, "vehicle_status": VehicleStatus}]
+            include_details: Whether to include detailed defect information
+            
+        Returns:
+            send_bulk result (results reference each vehicle_id)
+        """
+        return self.send_bulk([
+            {
+                'to': recipient['to'],
+                'message': self.defect_alert_message(recipient['vehicle_status'], include_details),
+                'reference': recipient['vehicle_status'].vehicle_id
+            }
+            for recipient in recipients
+        ], **kwargs)
+    
+    def send_bulk_reminders(self, recipients: List[Dict[str, str]],
+                            reminder_type: str = "maintenance", **kwargs) -> Dict[str, Any]:
+        """
+        Send reminders to many vehicles
+        
+        Args:
+            recipients: [{"to": phone number, "vehicle_reg": registration number}]
+            reminder_type: Type of reminder (maintenance, service, followup)
+            
+        Returns:
+            send_bulk result (results reference each registration number)
+        """
+        return self.send_bulk([
+            {
+                'to': recipient['to'],
+                'message': self.reminder_message(recipient['vehicle_reg'], reminder_type),
+                'reference': recipient['vehicle_reg']
+            }
+            for recipient in recipients
+        ], **kwargs)
+    
     def send_defect_alert(self, to_phone_number: str, vehicle_status: VehicleStatus,
                          include_details: bool = False) -> Dict[str, str]:
         """
@@ -174,6 +266,10 @@ class SMSAgent:
         Returns:
             Dict with send status
         """
+        return self.send_sms(to_phone_number, self.defect_alert_message(vehicle_status, include_details))
+    
+    def defect_alert_message(self, vehicle_status: VehicleStatus, include_details: bool = False) -> str:
+        """Defect alert text (summary, optionally with details of the top defects)"""
         # Generate summary message
         message = self.generate_summary_sms(vehicle_status, use_icons=True)
         
@@ -187,8 +283,7 @@ class SMSAgent:
                 if defect.estimated_time_to_failure:
                     message += f"   Timeline: {defect.estimated_time_to_failure}\n"
         
-        # Send the SMS
-        return self.send_sms(to_phone_number, message)
+        return message
     
     def send_appointment_confirmation(self, to_phone_number: str,
                                      appointment_details: Dict[str, str]) -> Dict[str, str]:
@@ -232,6 +327,10 @@ class SMSAgent:
         Returns:
             Dict with send status
         """
+        return self.send_sms(to_phone_number, self.reminder_message(vehicle_reg, reminder_type))
+    
+    def reminder_message(self, vehicle_reg: str, reminder_type: str = "maintenance") -> str:
+        """Reminder text for a reminder type"""
         if reminder_type == "maintenance":
             message = f"🔔 NaviGo Reminder\n\n"
             message += f"Your vehicle {vehicle_reg} is due for routine maintenance.\n\n"
@@ -248,4 +347,4 @@ class SMSAgent:
             message += f"We're following up on your recent service inquiry.\n"
             message += f"Need help? Call 1800-NAVIGO"
         
-        return self.send_sms(to_phone_number, message)
+        return message
@@ -0,0 +1,203 @@
+"""
+Bulk SMS dispatch for SMSAgent.
+
+Fleet-wide alerts go to thousands of recipients; sending them one by one
+with SMSAgent.send_sms takes hours. BulkSMSDispatcher sends a batch on a
+bounded worker pool:
+
+- Each sending number has its own TokenBucket (carriers and Twilio rate-limit
+  per sender), and messages are spread round-robin over the senders. The
+  buckets can be shared between dispatchers (SMSAgent keeps one set), so
+  concurrent batches together stay within each sender's rate
+- Twilio rate limits (429), server errors (5xx) and network errors (connection
+  failures, timeouts) are retried with exponential backoff and jitter; anything
+  else (e.g. an invalid number, or a bug raising TypeError) fails at once
+- Identical (recipient, message) pairs in a batch are sent once
+- Every recipient gets a result (sent / failed / duplicate) with the message
+  SID, attempts and last error, plus a batch summary with throughput
+
+load_test_sms_dispatch.py runs it against a local fake of the Messages API
+(fake_twilio.FakeMessagingEndpoint).
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+try:
+    from twilio.base.exceptions import TwilioRestException
+except ImportError:
+    TwilioRestException = None
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 8.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: rate_per_second sustained, up to burst at once."""
+
+    def __init__(self, rate_per_second: float, burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate_per_second
+        self.capacity = burst if burst is not None else max(1.0, rate_per_second)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available; returns 0, or the seconds until the next one"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            self.sleep(wait)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Twilio rate limits and server errors, and network errors (connection, timeout) are retried"""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if TwilioRestException is not None and isinstance(error, TwilioRestException):
+        return error.status in RETRYABLE_STATUS
+    return False
+
+
+class BulkSMSDispatcher:
+    """
+    Sends batches of SMS concurrently within per-sender rate limits.
+
+    Args:
+        send: Blocking (to, from_, body, media_urls) -> message object (.sid,
+              .status, .num_segments); raises on failure (e.g. TwilioRestException)
+        senders: Sending numbers (messages are spread round-robin over them)
+        rate_per_second: Sustained messages per second per sender
+        burst: Messages a sender may send at once (defaults to one second's worth)
+        max_workers: Concurrent sends
+        max_attempts: Attempts per message, including the first
+        backoff_seconds: First retry delay (doubles per attempt, capped at MAX_BACKOFF_SECONDS)
+        buckets: sender -> TokenBucket shared with other dispatchers (missing senders are
+                 added); by default the dispatcher has its own
+    """
+
+    def __init__(self, send: Callable[..., Any], senders: List[str], rate_per_second: float = 1.0,
+                 burst: Optional[float] = None, max_workers: int = DEFAULT_MAX_WORKERS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+                 sleep: Callable[[float], None] = time.sleep, buckets: Optional[Dict[str, TokenBucket]] = None):
+        if not senders:
+            raise ValueError("At least one sender number is required")
+        self.send = send
+        self.senders = list(senders)
+        self.buckets = buckets if buckets is not None else {}
+        for sender in self.senders:
+            if sender not in self.buckets:
+                self.buckets.setdefault(sender, TokenBucket(rate_per_second, burst, sleep=sleep))
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.sleep = sleep
+
+    def _backoff(self, attempt: int) -> float:
+        return min(MAX_BACKOFF_SECONDS, self.backoff_seconds * (2 ** (attempt - 1))) + random.uniform(0, self.backoff_seconds)
+
+    def _deliver(self, item: Dict[str, Any], sender: str) -> Dict[str, Any]:
+        result = {
+            "to": item["to"],
+            "reference": item.get("reference"),
+            "from": sender,
+            "status": "failed",
+            "message_sid": None,
+            "attempts": 0,
+            "error": None,
+        }
+        for attempt in range(1, self.max_attempts + 1):
+            self.buckets[sender].acquire()
+            result["attempts"] = attempt
+            try:
+                message = self.send(item["to"], sender, item["message"], item.get("media_urls"))
+            except Exception as e:
+                result["error"] = str(e)
+                result["error_status"] = getattr(e, "status", None)
+                if not is_retryable(e) or attempt == self.max_attempts:
+                    return result
+                self.sleep(self._backoff(attempt))
+                continue
+            result.update({
+                "status": "sent",
+                "message_sid": message.sid,
+                "message_status": message.status,
+                "segments": message.num_segments,
+                "error": None,
+            })
+            result.pop("error_status", None)
+            return result
+        return result
+
+    def dispatch(self, messages: List[Dict[str, Any]],
+                 on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Send a batch.
+
+        Args:
+            messages: [{"to", "message", "media_urls" (optional), "reference" (optional, e.g. vehicle_id)}]
+            on_result: Called with each recipient's result as it completes (from worker threads)
+
+        Returns:
+            {"summary": {...}, "results": [one result per input message, in input order]}
+        """
+        started = time.perf_counter()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+        first_index: Dict[tuple, int] = {}
+        jobs = []
+        for i, item in enumerate(messages):
+            key = (item["to"], item["message"])
+            if key in first_index:
+                results[i] = {"to": item["to"], "reference": item.get("reference"), "status": "duplicate",
+                              "message_sid": None, "attempts": 0, "error": None, "duplicate_of": first_index[key]}
+                continue
+            first_index[key] = i
+            jobs.append(i)
+
+        def run(position: int, index: int):
+            result = self._deliver(messages[index], self.senders[position % len(self.senders)])
+            results[index] = result
+            if on_result:
+                on_result(result)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sms-dispatch") as executor:
+            for future in [executor.submit(run, position, index) for position, index in enumerate(jobs)]:
+                future.result()
+
+        elapsed = time.perf_counter() - started
+        counts = {status: sum(1 for r in results if r["status"] == status) for status in ("sent", "failed", "duplicate")}
+        summary = {
+            "total": len(messages),
+            **counts,
+            "retries": sum(max(0, r["attempts"] - 1) for r in results),
+            "senders": len(self.senders),
+            "duration_seconds": round(elapsed, 3),
+            "messages_per_second": round(counts["sent"] / elapsed, 1) if elapsed > 0 else None,
+        }
+        return {"summary": summary, "results": results}
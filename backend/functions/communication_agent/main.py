@@ -11,6 +11,7 @@ import re
 from datetime import datetime, timezone
 from google.cloud import pubsub_v1, firestore
 import functions_framework
+from reference_cache import get_document
 
 # Twilio imports
 try:
@@ -223,14 +224,12 @@ def communication_agent(cloud_event):
                 return {"status": "skipped", "message": "Duplicate communication detected", "communication_id": existing_comm_id}
         
         # 3. Fetch vehicle data to get customer phone and name
-        vehicle_ref = db.collection("vehicles").document(vehicle_id)
-        vehicle_doc = vehicle_ref.get()
+        vehicle_data = get_document(db, "vehicles", vehicle_id)
         
-        if not vehicle_doc.exists:
+        if vehicle_data is None:
             print(f"Vehicle {vehicle_id} not found")
             return {"status": "error", "error": "Vehicle not found"}
         
-        vehicle_data = vehicle_doc.to_dict()
         # Use phone/name from message if available, otherwise from vehicle data
         customer_phone = customer_phone or vehicle_data.get("owner_phone") or vehicle_data.get("phone")
         customer_name = customer_name or vehicle_data.get("owner_name") or vehicle_data.get("name") or "Customer"
@@ -338,7 +337,7 @@ def communication_agent(cloud_event):
             "customer_name": customer_name,
             "call_status": "initiating",
             "conversation_stage": "pending",
-            "conversation_transcript": [],
+            "transcript_turns": 0,  # turns are appended to the transcript subcollection
             "outcome": None,
             "booking_id": None,
             "created_at": firestore.SERVER_TIMESTAMP,
@@ -0,0 +1,173 @@
+"""
+Local DTC (Diagnostic Trouble Code) knowledge base.
+
+Codes are resolved through a sorted range table: every range in DTC_RANGES is
+flattened once per process into non-overlapping intervals (the narrowest
+matching range wins), so a lookup is a single bisect over integers.
+
+This module is shared by data_analysis_agent, diagnosis_agent and rca_agent.
+Each Cloud Function deploys its own copy - keep the copies identical.
+"""
+
+from bisect import bisect_right
+from functools import lru_cache
+from typing import List, Optional
+
+# First character of a DTC -> system
+SYSTEM_PREFIXES = {"P": "powertrain", "C": "chassis", "B": "body", "U": "network"}
+
+# (first code, last code, component, severity hint 0-1, description, recommended action)
+# Narrower ranges override the broader ranges they sit inside.
+DTC_RANGES = [
+    # Powertrain - generic SAE ranges
+    ("P0000", "P0099", "fuel_system", 0.4, "Fuel and air metering / auxiliary emission control fault", "Inspect fuel and air metering components"),
+    ("P0100", "P0199", "fuel_system", 0.4, "Fuel and air metering fault", "Inspect fuel and air metering sensors and wiring"),
+    ("P0115", "P0119", "engine_coolant_system", 0.5, "Engine coolant temperature sensor circuit fault", "Test and replace engine coolant temperature sensor"),
+    ("P0125", "P0128", "engine_coolant_system", 0.5, "Coolant temperature below thermostat regulating temperature", "Replace thermostat and check coolant level"),
+    ("P0195", "P0199", "engine_oil_system", 0.5, "Engine oil temperature sensor fault", "Test and replace engine oil temperature sensor"),
+    ("P0200", "P0299", "fuel_system", 0.5, "Fuel injector circuit fault", "Inspect fuel injectors and injector wiring"),
+    ("P0217", "P0217", "engine_coolant_system", 0.9, "Engine coolant over-temperature condition", "Inspect coolant pump, radiator and thermostat; flush and refill cooling system"),
+    ("P0218", "P0218", "transmission", 0.8, "Transmission fluid over-temperature condition", "Check transmission fluid level and cooler; replace fluid"),
+    ("P0300", "P0399", "engine", 0.6, "Ignition system or misfire fault", "Inspect ignition system"),
+    ("P0300", "P0312", "engine", 0.7, "Cylinder misfire detected", "Inspect spark plugs, ignition coils and injectors on misfiring cylinders"),
+    ("P0335", "P0349", "engine", 0.7, "Crankshaft / camshaft position sensor fault", "Test and replace crankshaft or camshaft position sensor"),
+    ("P0400", "P0499", "emission_system", 0.3, "Auxiliary emission control fault", "Inspect EGR, EVAP and catalytic converter components"),
+    ("P0500", "P0599", "engine", 0.4, "Vehicle speed, idle control or auxiliary input fault", "Inspect idle control and auxiliary inputs"),
+    ("P0500", "P0503", "transmission", 0.5, "Vehicle speed sensor fault", "Test and replace vehicle speed sensor"),
+    ("P0520", "P0523", "engine_oil_system", 0.6, "Engine oil pressure sensor circuit fault", "Test oil pressure sensor and check oil level"),
+    ("P0524", "P0524", "engine_oil_system", 0.9, "Engine oil pressure too low", "Stop driving; check oil level and oil pump, change oil and filter"),
+    ("P0560", "P0563", "battery", 0.6, "System voltage fault", "Test battery and charging system"),
+    ("P0571", "P0573", "brake_system", 0.6, "Brake switch circuit fault", "Test and replace brake light switch"),
+    ("P0600", "P0699", "engine", 0.5, "Engine control module / output circuit fault", "Scan and reflash or replace engine control module"),
+    ("P0700", "P0999", "transmission", 0.6, "Transmission control fault", "Inspect transmission control system and fluid"),
+    ("P0730", "P0730", "transmission", 0.7, "Incorrect gear ratio", "Inspect transmission clutches and fluid condition"),
+    ("P0A00", "P0AFF", "battery", 0.6, "Hybrid / EV propulsion system fault", "Inspect hybrid battery and propulsion system"),
+    ("P0A7F", "P0A80", "battery", 0.8, "Hybrid battery pack deterioration", "Test battery cells and replace hybrid battery pack"),
+    # P1xxx is manufacturer-specific; the pipeline treats it as transmission
+    ("P1000", "P1FFF", "transmission", 0.5, "Manufacturer-specific powertrain fault", "Run manufacturer transmission diagnostics"),
+    ("P2000", "P2099", "emission_system", 0.3, "Emission control fault", "Inspect emission control components"),
+    ("P2100", "P2199", "engine", 0.6, "Throttle actuator control fault", "Inspect throttle body and actuator"),
+    ("P2500", "P2504", "battery", 0.6, "Charging system / generator circuit fault", "Test alternator and battery charging circuit"),
+    ("P2700", "P2799", "transmission", 0.6, "Transmission friction element fault", "Inspect transmission friction elements"),
+    # Chassis
+    ("C0000", "C0999", "brake_system", 0.6, "Chassis / ABS fault", "Inspect ABS and brake system"),
+    ("C0300", "C0999", "suspension", 0.5, "Steering or suspension fault", "Inspect steering and suspension components"),
+    ("C1000", "C1FFF", "brake_system", 0.6, "Manufacturer-specific brake / ABS fault", "Inspect brake pads, rotors and ABS sensors"),
+    # Body and network
+    ("B0000", "B3FFF", "body_electrical", 0.3, "Body electrical fault", "Inspect body control module and wiring"),
+    ("U0000", "U3FFF", "communication_network", 0.5, "Vehicle network communication fault", "Inspect CAN bus wiring and module connectors"),
+]
+
+
+def code_to_int(code: str) -> Optional[int]:
+    """Encode a DTC like 'P0A80' as an integer that preserves code ordering."""
+    code = (code or "").strip().upper()
+    if len(code) != 5 or code[0] not in SYSTEM_PREFIXES:
+        return None
+    try:
+        return list(SYSTEM_PREFIXES).index(code[0]) * 0x10000 + int(code[1:], 16)
+    except ValueError:
+        return None
+
+
+def _build_table(ranges: list) -> tuple:
+    """Flatten (possibly nested) ranges into sorted non-overlapping intervals."""
+    parsed = []
+    for start, end, component, severity, description, action in ranges:
+        entry = {
+            "component": component,
+            "severity": severity,
+            "description": description,
+            "recommended_action": action,
+        }
+        parsed.append((code_to_int(start), code_to_int(end), entry))
+
+    boundaries = sorted({r[0] for r in parsed} | {r[1] + 1 for r in parsed})
+    starts, entries = [], []
+    for boundary in boundaries:
+        covering = [r for r in parsed if r[0] <= boundary <= r[1]]
+        # Narrowest range wins; later definitions win ties
+        best = min(reversed(covering), key=lambda r: r[1] - r[0], default=None)
+        starts.append(boundary)
+        entries.append(best[2] if best else None)
+    return starts, entries
+
+
+# Loaded once per process (module import)
+_STARTS, _ENTRIES = _build_table(DTC_RANGES)
+
+
+@lru_cache(maxsize=4096)
+def decode_code(code: str) -> Optional[dict]:
+    """
+    Resolve a single DTC to component, severity hint and description.
+
+    Returns None for malformed or unknown codes.
+    """
+    value = code_to_int(code)
+    if value is None:
+        return None
+    index = bisect_right(_STARTS, value) - 1
+    if index < 0 or _ENTRIES[index] is None:
+        return None
+    normalized = code.strip().upper()
+    return {
+        "code": normalized,
+        "system": SYSTEM_PREFIXES[normalized[0]],
+        **_ENTRIES[index],
+    }
+
+
+def decode_codes(codes: List[str]) -> List[dict]:
+    """Decode a list of DTCs, skipping duplicates and unknown codes."""
+    findings = []
+    seen = set()
+    for code in codes or []:
+        finding = decode_code(code)
+        if finding and finding["code"] not in seen:
+            seen.add(finding["code"])
+            findings.append(dict(finding))  # copy - decode_code results are cached
+    return findings
+
+
+def summarize_codes(codes: List[str]) -> dict:
+    """
+    Summarize a list of DTCs for component attribution.
+
+    Returns:
+        Dict with primary_component (highest severity, then most codes),
+        components (component -> count), max_severity, findings and
+        unresolved codes
+    """
+    findings = decode_codes(codes)
+    resolved = {f["code"] for f in findings}
+    unresolved = sorted({(c or "").strip().upper() for c in codes or []} - resolved)
+
+    components = {}
+    component_severity = {}
+    for finding in findings:
+        component = finding["component"]
+        components[component] = components.get(component, 0) + 1
+        component_severity[component] = max(component_severity.get(component, 0.0), finding["severity"])
+
+    primary_component = None
+    if components:
+        primary_component = max(components, key=lambda c: (component_severity[c], components[c]))
+
+    return {
+        "primary_component": primary_component,
+        "components": components,
+        "max_severity": max(component_severity.values()) if component_severity else None,
+        "findings": findings,
+        "unresolved": unresolved,
+    }
+
+
+def collect_codes(telemetry_window: List[dict]) -> List[str]:
+    """All distinct DTCs reported across a telemetry window, in first-seen order."""
+    codes = []
+    for event in telemetry_window or []:
+        for code in event.get("dtc_codes") or []:
+            if code not in codes:
+                codes.append(code)
+    return codes
@@ -16,6 +16,8 @@ import functions_framework
 import vertexai
 from vertexai.preview.generative_models import GenerativeModel
 from google.api_core import exceptions
+from dtc_decoder import collect_codes, summarize_codes
+from case_dossier import append_stage
 
 # Vertex AI configuration
 # Read and validate environment variables
@@ -62,7 +64,7 @@ ANOMALY DETECTION RULES (apply these rules to the ACTUAL data values):
 - Engine RPM: Normal range 600-4000 RPM. Anomaly if >6500 RPM (rpm_spike) or <500 RPM when vehicle moving (speed_kmph > 5) (rpm_stall)
 - Battery SOC: Normal range 20-100%. Anomaly if <10% (low_charge)
 - Battery SOH: Normal range 80-100%. Anomaly if <70% (battery_degradation)
-- DTC Codes: ANY DTC code present (non-empty array) = anomaly (dtc_fault)
+- DTC Codes: ANY DTC code present (non-empty array) = anomaly (dtc_fault); use the severity hints in "dtc_findings" when present
 - Speed Patterns: Sudden drops to 0 while previous speed > 10 kmph = anomaly (speed_anomaly)
 - GPS: Invalid coordinates (lat outside -90 to 90, lon outside -180 to 180) or sudden jumps > 1km = anomaly (gps_anomaly)
 
@@ -300,6 +302,11 @@ def data_analysis_agent(cloud_event):
             "telemetry_window": telemetry_window
         }
         
+        # Decode DTCs locally so the case carries component attribution downstream
+        dtc_summary = summarize_codes(collect_codes(telemetry_window))
+        if dtc_summary["findings"] or dtc_summary["unresolved"]:
+            input_data["dtc_findings"] = dtc_summary
+        
         # 6. Initialize Vertex AI and call Gemini 2.5 Flash
         # Validate PROJECT_ID and LOCATION before initialization
         if not PROJECT_ID or " " in PROJECT_ID or "=" in PROJECT_ID:
@@ -402,6 +409,14 @@ def data_analysis_agent(cloud_event):
                 "created_at": firestore.SERVER_TIMESTAMP
             }
             
+            # Attach locally decoded DTCs (severity hint fills in a missing dtc_fault score)
+            if dtc_summary["findings"]:
+                case_data["dtc_codes"] = [f["code"] for f in dtc_summary["findings"]]
+                case_data["dtc_components"] = dtc_summary["components"]
+                case_data["dtc_severity_hint"] = dtc_summary["max_severity"]
+                if anomaly_type == "dtc_fault" and case_data["severity_score"] is None:
+                    case_data["severity_score"] = dtc_summary["max_severity"]
+            
             # Store telemetry_window as reference (store event IDs)
             telemetry_event_ids = [e.get("event_id", "") for e in telemetry_window]
             case_data["telemetry_event_ids"] = telemetry_event_ids
@@ -446,6 +461,10 @@ def data_analysis_agent(cloud_event):
             db.collection("anomaly_cases").document(case_id).set(case_data)
             print(f"Created anomaly case {case_id} for vehicle {vehicle_id}")
             
+            # Start the case dossier with the full telemetry window so later stages
+            # don't re-read telemetry_events one document at a time
+            append_stage(db, case_id, "anomaly", case_data, vehicle_id=vehicle_id, telemetry_window=telemetry_window)
+            
             # 11. Prepare BigQuery row
             bq_row = prepare_bigquery_row(case_data)
             
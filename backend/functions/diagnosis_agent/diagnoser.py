@@ -0,0 +1,166 @@
+"""
+Deterministic diagnoser for the diagnosis_agent Cloud Function.
+
+Implements the component mapping, failure probability bands and RUL bands
+from the diagnosis SYSTEM_PROMPT locally, so mapped anomaly types are
+diagnosed without a Gemini call. Only anomaly types that need contextual
+reasoning (see LLM_ANOMALY_TYPES) are left to the LLM.
+"""
+
+from typing import Optional
+from dtc_decoder import collect_codes, summarize_codes
+
+# anomaly_type -> component (same strings as the SYSTEM_PROMPT mapping)
+COMPONENT_MAP = {
+    "thermal_overheat": "engine_coolant_system",
+    "oil_overheat": "engine_oil_system",
+    "battery_degradation": "battery",
+    "low_charge": "battery",
+    "rpm_spike": "engine",
+    "rpm_stall": "engine",
+    "gps_anomaly": "gps_system",
+}
+
+# Anomaly types that still need the LLM (component depends on context).
+# dtc_fault is resolved locally when every code is in the DTC knowledge base.
+LLM_ANOMALY_TYPES = {"dtc_fault", "speed_anomaly"}
+
+# (band upper bound, nominal severity range, failure probability range)
+# Band bounds sit halfway between the nominal prompt ranges so every
+# severity_score falls into exactly one band.
+FAILURE_PROBABILITY_BANDS = [
+    (0.35, (0.1, 0.3), (0.2, 0.4)),    # low risk
+    (0.65, (0.4, 0.6), (0.5, 0.7)),    # moderate risk
+    (0.85, (0.7, 0.8), (0.75, 0.85)),  # high risk
+    (1.0, (0.9, 1.0), (0.9, 1.0)),     # critical risk
+]
+
+# (band upper bound, nominal severity range, RUL range in days)
+# RUL ranges are (rul at low end of severity, rul at high end of severity)
+RUL_BANDS = [
+    (0.35, (0.0, 0.4), (180, 90)),  # low issues
+    (0.65, (0.4, 0.6), (90, 30)),   # moderate issues
+    (0.8, (0.7, 0.8), (30, 7)),     # serious issues
+    (1.0, (0.8, 1.0), (7, 1)),      # critical issues
+]
+
+NO_ANOMALY_RUL_DAYS = 180
+
+
+def _interpolate(value: float, src: tuple, dst: tuple) -> float:
+    """Linearly map value from src range onto dst range (clamped to src)."""
+    lo, hi = src
+    value = min(max(value, lo), hi)
+    if hi == lo:
+        return dst[0]
+    ratio = (value - lo) / (hi - lo)
+    return dst[0] + ratio * (dst[1] - dst[0])
+
+
+def _lookup_band(severity_score: float, bands: list) -> tuple:
+    for upper, nominal, output in bands:
+        if severity_score <= upper:
+            return nominal, output
+    return bands[-1][1], bands[-1][2]
+
+
+def compute_failure_probability(severity_score: Optional[float]) -> float:
+    """Failure probability from severity_score using the prompt's bands."""
+    if not severity_score:
+        return 0.0
+    severity_score = min(max(float(severity_score), 0.0), 1.0)
+    nominal, probability_range = _lookup_band(severity_score, FAILURE_PROBABILITY_BANDS)
+    return round(_interpolate(severity_score, nominal, probability_range), 3)
+
+
+def compute_rul_days(severity_score: Optional[float]) -> int:
+    """Remaining useful life in days - higher severity means lower RUL (minimum 1)."""
+    if not severity_score:
+        return NO_ANOMALY_RUL_DAYS
+    severity_score = min(max(float(severity_score), 0.0), 1.0)
+    nominal, rul_range = _lookup_band(severity_score, RUL_BANDS)
+    return max(1, int(round(_interpolate(severity_score, nominal, rul_range))))
+
+
+def classify_severity(failure_probability: float) -> str:
+    """Severity label from failure_probability."""
+    if failure_probability >= 0.7:
+        return "High"
+    if failure_probability >= 0.3:
+        return "Medium"
+    return "Low"
+
+
+def needs_llm(anomaly_type: Optional[str]) -> bool:
+    """True if this anomaly type cannot be diagnosed deterministically."""
+    if anomaly_type in LLM_ANOMALY_TYPES:
+        return True
+    return anomaly_type is not None and anomaly_type not in COMPONENT_MAP
+
+
+def diagnose_dtc(input_data: dict) -> Optional[dict]:
+    """
+    Diagnose a dtc_fault from the DTC knowledge base.
+
+    Returns None if the window has no codes or any code is unknown.
+    """
+    summary = summarize_codes(collect_codes(input_data.get("telemetry_window", [])))
+    if not summary["primary_component"] or summary["unresolved"]:
+        return None
+
+    severity_score = input_data.get("severity_score")
+    if not severity_score:
+        severity_score = summary["max_severity"]
+    failure_probability = compute_failure_probability(severity_score)
+
+    return {
+        "vehicle_id": input_data.get("vehicle_id"),
+        "component": summary["primary_component"],
+        "failure_probability": failure_probability,
+        "estimated_rul_days": compute_rul_days(severity_score),
+        "severity": classify_severity(failure_probability),
+        "context_window": input_data.get("telemetry_window", [])
+    }
+
+
+def diagnose(input_data: dict) -> Optional[dict]:
+    """
+    Diagnose an anomaly without the LLM.
+
+    Args:
+        input_data: Same dict that is sent to Gemini (vehicle_id, anomaly_detected,
+            anomaly_type, severity_score, telemetry_window)
+
+    Returns:
+        Dict matching DiagnosisOutput, or None if the anomaly type needs the LLM
+    """
+    anomaly_type = input_data.get("anomaly_type")
+    telemetry_window = input_data.get("telemetry_window", [])
+
+    if not input_data.get("anomaly_detected", True):
+        return {
+            "vehicle_id": input_data.get("vehicle_id"),
+            "component": COMPONENT_MAP.get(anomaly_type, "none"),
+            "failure_probability": 0.0,
+            "estimated_rul_days": NO_ANOMALY_RUL_DAYS,
+            "severity": "Low",
+            "context_window": telemetry_window
+        }
+
+    if anomaly_type == "dtc_fault":
+        return diagnose_dtc(input_data)
+
+    if anomaly_type is None or needs_llm(anomaly_type):
+        return None
+
+    severity_score = input_data.get("severity_score")
+    failure_probability = compute_failure_probability(severity_score)
+
+    return {
+        "vehicle_id": input_data.get("vehicle_id"),
+        "component": COMPONENT_MAP[anomaly_type],
+        "failure_probability": failure_probability,
+        "estimated_rul_days": compute_rul_days(severity_score),
+        "severity": classify_severity(failure_probability),
+        "context_window": telemetry_window
+    }
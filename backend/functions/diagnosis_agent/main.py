@@ -1,7 +1,7 @@
 """
 Cloud Function: diagnosis_agent
 Pub/Sub Trigger: Subscribes to navigo-anomaly-detected topic
-Purpose: Diagnoses component failures using Gemini 2.5 Flash
+Purpose: Diagnoses component failures (deterministic mapping, Gemini 2.5 Flash for DTC/speed anomalies)
 """
 
 import json
@@ -13,11 +13,20 @@ from google.cloud import pubsub_v1, firestore, bigquery
 import functions_framework
 import vertexai
 from vertexai.preview.generative_models import GenerativeModel
+from diagnoser import diagnose
+from dtc_decoder import collect_codes, summarize_codes
+from rul_estimator import get_fits, update_fits, estimate_rul
+from case_dossier import append_stage, load_dossier
 
 # Vertex AI configuration
 PROJECT_ID = os.getenv("PROJECT_ID", "navigo-27206")
 LOCATION = os.getenv("LOCATION", "us-central1")
 
+# Telemetry events read per page when updating a vehicle's RUL fits, and pages
+# per invocation (a longer backlog is caught up, oldest first, on later invocations)
+RUL_HISTORY_LIMIT = 500
+RUL_MAX_PAGES = 10
+
 # Pub/Sub configuration
 DIAGNOSIS_TOPIC_NAME = "navigo-diagnosis-complete"
 
@@ -42,7 +51,7 @@ COMPONENT MAPPING (map anomaly_type to component - use EXACTLY these strings):
 - "low_charge" → "battery"
 - "rpm_spike" → "engine"
 - "rpm_stall" → "engine"
-- "dtc_fault" → Analyze DTC codes to determine component (P0xxx = engine, P1xxx = transmission, etc.)
+- "dtc_fault" → Analyze DTC codes to determine component (use "dtc_findings" from the input when present; P0xxx = engine, P1xxx = transmission, etc.)
 - "speed_anomaly" → "transmission" or "brake_system" (analyze context)
 - "gps_anomaly" → "gps_system"
 
@@ -141,13 +150,52 @@ def extract_json_from_response(text: str) -> dict:
         raise
 
 
+def estimate_trend_rul(db, vehicle_id: str, component: str):
+    """
+    Update the vehicle's degradation fits with telemetry since the last fit and
+    extrapolate the component's trend to its failure threshold.
+
+    Fits are cached in-process and persisted in rul_fits/{vehicle_id}, so each
+    invocation only reads telemetry newer than the previous fit. Events are read
+    oldest first, in pages, so last_timestamp never moves past an event that
+    was not folded in.
+    """
+    fits_ref = db.collection("rul_fits").document(vehicle_id)
+
+    def load_fits():
+        doc = fits_ref.get()
+        return doc.to_dict() if doc.exists else None
+
+    fits = get_fits(vehicle_id, load=load_fits)
+
+    query = db.collection("telemetry_events").where("vehicle_id", "==", vehicle_id)
+    if fits.get("last_timestamp"):
+        query = query.where("timestamp_utc", ">", fits["last_timestamp"])
+    query = query.order_by("timestamp_utc").limit(RUL_HISTORY_LIMIT)
+
+    new_events = 0
+    last_doc = None
+    for _ in range(RUL_MAX_PAGES):
+        docs = list((query.start_after(last_doc) if last_doc is not None else query).stream())
+        new_events += update_fits(fits, [doc.to_dict() for doc in docs])
+        if len(docs) < RUL_HISTORY_LIMIT:
+            break
+        last_doc = docs[-1]
+    if new_events:
+        fits_ref.set({**fits, "vehicle_id": vehicle_id, "updated_at": firestore.SERVER_TIMESTAMP})
+        print(f"Updated RUL fits for {vehicle_id} with {new_events} new events")
+
+    return estimate_rul(component, fits)
+
+
 @functions_framework.cloud_event
 def diagnosis_agent(cloud_event):
     """
     Pub/Sub triggered function that:
     1. Receives anomaly detection event
     2. Fetches anomaly case and telemetry window from Firestore
-    3. Uses Gemini 2.5 Flash to diagnose component failure
+    3. Diagnoses mapped anomaly types locally; uses Gemini 2.5 Flash only for
+       dtc_fault and speed_anomaly
     4. Stores diagnosis result and publishes to Pub/Sub
     """
     
@@ -173,22 +221,25 @@ def diagnosis_agent(cloud_event):
             print("Missing case_id or vehicle_id in message")
             return {"status": "error", "error": "Missing required fields"}
         
-        # 2. Fetch anomaly case from Firestore
+        # 2. Fetch anomaly case from the case dossier (one read), falling back to anomaly_cases
         db = firestore.Client()
         case_ref = db.collection("anomaly_cases").document(case_id)
-        case_doc = case_ref.get()
-        
-        if not case_doc.exists:
-            print(f"Anomaly case {case_id} not found")
-            return {"status": "error", "error": "Case not found"}
+        dossier = load_dossier(db, case_id)
+        case_data = dossier.get("anomaly")
         
-        case_data = case_doc.to_dict()
+        if case_data is None:
+            case_doc = case_ref.get()
+            if not case_doc.exists:
+                print(f"Anomaly case {case_id} not found")
+                return {"status": "error", "error": "Case not found"}
+            case_data = case_doc.to_dict()
         
-        # 3. Fetch telemetry window using event IDs stored in case
+        # 3. Telemetry window from the dossier, or fetch it using event IDs stored in case
         telemetry_event_ids = case_data.get("telemetry_event_ids", [])
-        telemetry_window = []
+        telemetry_window = dossier.get("telemetry_window")
         
-        if telemetry_event_ids:
+        if telemetry_window is None:
+            telemetry_window = []
             for event_id in telemetry_event_ids:
                 event_doc = db.collection("telemetry_events").document(event_id).get()
                 if event_doc.exists:
@@ -207,27 +258,52 @@ def diagnosis_agent(cloud_event):
             "telemetry_window": telemetry_window
         }
         
-        # 5. Initialize Vertex AI and call Gemini 2.5 Flash
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-        model = GenerativeModel("gemini-2.5-flash")
-        
-        prompt = f"{SYSTEM_PROMPT}\n\nAnalyze this anomaly data:\n{json.dumps(input_data, default=str, indent=2)}\n\nReturn ONLY the JSON response matching the output format specified above."
+        # 5. Deterministic fast path for mapped anomaly types (no LLM call)
+        result = diagnose(input_data)
+        diagnosis_method = "deterministic"
         
-        response = model.generate_content(prompt)
-        response_text = response.text
-        
-        # 6. Parse Gemini response
-        try:
-            result = extract_json_from_response(response_text)
-        except Exception as e:
-            print(f"Error parsing Gemini response: {e}")
-            print(f"Response text: {response_text}")
-            raise ValueError(f"Invalid JSON response from Gemini: {e}")
+        if result is None:
+            # dtc_fault / speed_anomaly need contextual reasoning - call Gemini 2.5 Flash
+            diagnosis_method = "llm"
+            dtc_codes = collect_codes(telemetry_window)
+            if dtc_codes:
+                # Give Gemini the locally decoded codes; only unresolved ones need reasoning
+                input_data["dtc_findings"] = summarize_codes(dtc_codes)
+            vertexai.init(project=PROJECT_ID, location=LOCATION)
+            model = GenerativeModel("gemini-2.5-flash")
+            
+            prompt = f"{SYSTEM_PROMPT}\n\nAnalyze this anomaly data:\n{json.dumps(input_data, default=str, indent=2)}\n\nReturn ONLY the JSON response matching the output format specified above."
+            
+            response = model.generate_content(prompt)
+            response_text = response.text
+            
+            # 6. Parse Gemini response
+            try:
+                result = extract_json_from_response(response_text)
+            except Exception as e:
+                print(f"Error parsing Gemini response: {e}")
+                print(f"Response text: {response_text}")
+                raise ValueError(f"Invalid JSON response from Gemini: {e}")
+        else:
+            print(f"Deterministic diagnosis for {input_data.get('anomaly_type')}: {result.get('component')}")
         
         # 7. Validate result matches schema
         if result.get("vehicle_id") != vehicle_id:
             result["vehicle_id"] = vehicle_id
         
+        # 7b. Refine RUL with the vehicle's degradation trend (non-blocking)
+        rul_method = "band"
+        rul_trend = None
+        try:
+            rul_trend = estimate_trend_rul(db, vehicle_id, result.get("component"))
+        except Exception as trend_error:
+            print(f"Trend RUL estimation failed (non-blocking): {str(trend_error)}")
+        
+        if rul_trend and rul_trend["rul_days"] < int(result.get("estimated_rul_days", 180)):
+            # Trend says failure comes sooner than the severity band suggests
+            result["estimated_rul_days"] = rul_trend["rul_days"]
+            rul_method = "trend"
+        
         diagnosis_id = f"diagnosis_{uuid.uuid4().hex[:10]}"
         
         # 8. Prepare diagnosis data for Firestore
@@ -246,6 +322,9 @@ def diagnosis_agent(cloud_event):
             "confidence_score": confidence_score,  # Alternative field name
             "predicted_failure": f"{result.get('component')} failure",  # For frontend display
             "status": "active",  # Changed from "pending_rca" to "active" for frontend
+            "diagnosis_method": diagnosis_method,  # "deterministic" or "llm"
+            "rul_method": rul_method,  # "band" or "trend"
+            "rul_trend": rul_trend,
             "created_at": firestore.SERVER_TIMESTAMP
         }
         
@@ -256,6 +335,7 @@ def diagnosis_agent(cloud_event):
         # 9. Store in Firestore
         db.collection("diagnosis_cases").document(diagnosis_id).set(diagnosis_data)
         print(f"Created diagnosis case {diagnosis_id} for vehicle {vehicle_id}")
+        append_stage(db, case_id, "diagnosis", diagnosis_data)
         
         # 10. Update anomaly case status
         case_ref.update({"status": "diagnosed"})
@@ -287,6 +367,7 @@ def diagnosis_agent(cloud_event):
             "failure_probability": result.get("failure_probability"),
             "estimated_rul_days": result.get("estimated_rul_days"),
             "severity": result.get("severity"),
+            "rul_method": rul_method,
             "confidence": confidence_score,  # Add confidence for orchestrator
             "confidence_score": confidence_score,  # Alternative field name
             "agent_stage": "diagnosis"  # Explicitly set agent stage for orchestrator
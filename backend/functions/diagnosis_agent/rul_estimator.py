@@ -0,0 +1,215 @@
+"""
+Trend-based RUL estimator for the diagnosis_agent Cloud Function.
+
+Fits degradation trends over a vehicle's telemetry history with least squares
+and extrapolates them to a failure threshold:
+- battery_soh_pct decays exponentially (fit on log(SOH))
+- engine_coolant_temp_c / engine_oil_temp_c baselines rise linearly
+
+Fits are kept as sufficient statistics (n, sum t, sum y, sum t^2, sum t*y),
+so new telemetry is folded in incrementally without refitting the history.
+They are cached per vehicle in-process and persisted by main.py in the
+rul_fits collection.
+"""
+
+import math
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# signal -> fit model, failure threshold and degradation direction
+TREND_SIGNALS = {
+    "battery_soh_pct": {"model": "exponential", "threshold": 70.0, "direction": "falling"},
+    "engine_coolant_temp_c": {"model": "linear", "threshold": 110.0, "direction": "rising"},
+    "engine_oil_temp_c": {"model": "linear", "threshold": 130.0, "direction": "rising"},
+}
+
+# component (DiagnosisOutput.component) -> signal that tracks its degradation
+COMPONENT_SIGNALS = {
+    "battery": "battery_soh_pct",
+    "engine_coolant_system": "engine_coolant_temp_c",
+    "engine_oil_system": "engine_oil_temp_c",
+}
+
+# A trend is only trusted with enough points over enough time and a usable fit
+MIN_POINTS = 5
+MIN_SPAN_DAYS = 1.0
+MIN_R_SQUARED = 0.5
+MAX_RUL_DAYS = 365
+
+# Time origin for fits (days since 2024-01-01 UTC) - keeps sum(t^2) well conditioned
+TIME_ORIGIN = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+_STAT_KEYS = ("n", "sum_t", "sum_y", "sum_tt", "sum_ty", "sum_yy")
+
+# vehicle_id -> fits dict (warm across invocations on the same instance)
+_fit_cache: Dict[str, dict] = {}
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Telemetry timestamp (datetime or ISO string) as an aware UTC datetime."""
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, str) and value:
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _empty_fits() -> dict:
+    return {
+        "last_timestamp": None,
+        "signals": {signal: {key: 0.0 for key in _STAT_KEYS} for signal in TREND_SIGNALS},
+    }
+
+
+def get_fits(vehicle_id: str, load: Optional[Callable[[], Optional[dict]]] = None) -> dict:
+    """
+    Cached fits for a vehicle.
+
+    Args:
+        vehicle_id: Vehicle the fits belong to
+        load: Returns the persisted fits (rul_fits document); only called on a cold cache
+    """
+    fits = _fit_cache.get(vehicle_id)
+    if fits is None:
+        fits = _empty_fits()
+        stored = load() if load else None
+        if stored:
+            fits["last_timestamp"] = stored.get("last_timestamp")
+            for signal, stats in (stored.get("signals") or {}).items():
+                if signal in fits["signals"]:
+                    fits["signals"][signal].update({k: float(stats.get(k, 0.0)) for k in _STAT_KEYS})
+        _fit_cache[vehicle_id] = fits
+    return fits
+
+
+def update_fits(fits: dict, events: List[dict]) -> int:
+    """
+    Fold telemetry events newer than the last fitted timestamp into the fits.
+
+    Time is measured in days since TIME_ORIGIN, so sums from separate
+    updates stay additive.
+
+    Returns:
+        Number of new events used
+    """
+    last = parse_timestamp(fits.get("last_timestamp"))
+    rows = []
+    for event in events or []:
+        ts = parse_timestamp(event.get("timestamp_utc"))
+        if ts is not None and (last is None or ts > last):
+            rows.append((ts, event))
+    if not rows:
+        return 0
+
+    rows.sort(key=lambda row: row[0])
+    t = np.array([_days(ts) for ts, _ in rows])
+
+    for signal, spec in TREND_SIGNALS.items():
+        y = np.array([_as_float(event.get(signal)) for _, event in rows])
+        mask = ~np.isnan(y)
+        if spec["model"] == "exponential":
+            mask &= y > 0
+        if not mask.any():
+            continue
+        ts_, ys = t[mask], y[mask]
+        if spec["model"] == "exponential":
+            ys = np.log(ys)
+        stats = fits["signals"][signal]
+        stats["n"] += float(ts_.size)
+        stats["sum_t"] += float(ts_.sum())
+        stats["sum_y"] += float(ys.sum())
+        stats["sum_tt"] += float((ts_ * ts_).sum())
+        stats["sum_ty"] += float((ts_ * ys).sum())
+        stats["sum_yy"] += float((ys * ys).sum())
+
+    fits["last_timestamp"] = rows[-1][0].isoformat()
+    return len(rows)
+
+
+def _days(ts: datetime) -> float:
+    return (ts.timestamp() - TIME_ORIGIN) / 86400.0
+
+
+def _as_float(value) -> float:
+    try:
+        return float(value) if value is not None else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def fit_trend(stats: dict) -> Optional[dict]:
+    """Least-squares slope, intercept and R^2 from sufficient statistics."""
+    n = stats["n"]
+    if n < MIN_POINTS:
+        return None
+    mean_t = stats["sum_t"] / n
+    mean_y = stats["sum_y"] / n
+    var_t = stats["sum_tt"] / n - mean_t * mean_t
+    var_y = stats["sum_yy"] / n - mean_y * mean_y
+    # Spread of t in days - rules out fits over a single short burst
+    if var_t <= 0 or math.sqrt(12 * var_t) < MIN_SPAN_DAYS:
+        return None
+    cov_ty = stats["sum_ty"] / n - mean_t * mean_y
+    slope = cov_ty / var_t
+    r_squared = (cov_ty * cov_ty) / (var_t * var_y) if var_y > 0 else 0.0
+    return {"slope": slope, "intercept": mean_y - slope * mean_t, "r_squared": r_squared}
+
+
+def days_to_threshold(signal: str, stats: dict, now: Optional[datetime] = None) -> Optional[dict]:
+    """
+    Extrapolate one signal's trend to its failure threshold.
+
+    Returns:
+        Dict with rul_days, slope_per_day and r_squared, or None if the
+        signal has no usable degrading trend
+    """
+    spec = TREND_SIGNALS[signal]
+    fit = fit_trend(stats)
+    if fit is None or fit["r_squared"] < MIN_R_SQUARED:
+        return None
+
+    slope = fit["slope"]
+    if (spec["direction"] == "rising" and slope <= 0) or (spec["direction"] == "falling" and slope >= 0):
+        return None
+
+    threshold = spec["threshold"]
+    if spec["model"] == "exponential":
+        threshold = math.log(threshold)
+
+    now_days = _days(now or datetime.now(timezone.utc))
+    crossing_days = (threshold - fit["intercept"]) / slope
+    rul_days = min(MAX_RUL_DAYS, max(1, int(math.floor(crossing_days - now_days))))
+
+    slope_per_day = slope
+    if spec["model"] == "exponential":
+        # Report decay as % of current value per day
+        slope_per_day = (math.exp(slope) - 1) * 100
+    return {
+        "signal": signal,
+        "rul_days": rul_days,
+        "slope_per_day": round(slope_per_day, 4),
+        "r_squared": round(fit["r_squared"], 3),
+    }
+
+
+def estimate_rul(component: Optional[str], fits: dict, now: Optional[datetime] = None) -> Optional[dict]:
+    """
+    Trend RUL for a diagnosed component.
+
+    Returns:
+        days_to_threshold() result for the component's signal, or None if the
+        component has no tracked signal or no usable trend
+    """
+    signal = COMPONENT_SIGNALS.get(component)
+    if signal is None:
+        return None
+    return days_to_threshold(signal, fits["signals"][signal], now)
@@ -0,0 +1,198 @@
+"""
+Template library for engagement_agent.
+
+Engagement scripts differ between vehicles mostly in the vehicle ID, the
+customer's name, the slot and the service center. The library keeps the
+phrasing per (root cause category, action, language) in the
+engagement_templates collection - one transcript per customer decision -
+with $-placeholders for the per-vehicle fields (string.Template syntax, so
+braces in the text are harmless):
+
+    $customer_name, $vehicle_id, $slot, $service_center, $booking_id
+
+Only phrasing is shared. The customer decision is simulated for each vehicle
+(simulate_decision, from its severity and remaining useful life) and picks
+which of the entry's transcripts is rendered, so vehicles with the same issue
+do not all inherit the first vehicle's outcome.
+
+Entries are created lazily: the first case in a category asks Gemini for a
+placeholder version of the scripts (see TEMPLATE_INSTRUCTIONS), which is
+validated and stored; every later case in that category is rendered locally.
+"""
+
+import hashlib
+import re
+import secrets
+import string
+from datetime import datetime, timezone
+from string import Template
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+TEMPLATES_COLLECTION = "engagement_templates"
+TEMPLATE_VERSION = 2  # bump when the prompt or placeholders change
+DEFAULT_LANGUAGE = "en-IN"
+DEFAULT_TIMEZONE = "Asia/Kolkata"
+
+PLACEHOLDERS = ("customer_name", "vehicle_id", "slot", "service_center", "booking_id")
+REQUIRED_PLACEHOLDERS = ("vehicle_id", "slot")
+VALID_DECISIONS = ("confirmed", "declined", "no_response")
+
+# Simulated decision odds (confirmed, declined) by severity; the rest is no_response
+DECISION_ODDS = {
+    "high": (0.80, 0.10),
+    "medium": (0.60, 0.25),
+    "low": (0.40, 0.40),
+}
+URGENT_RUL_DAYS = 14  # failure expected within this many days: more likely to confirm
+URGENT_CONFIRM_BOOST = 0.10
+
+# Root cause keywords -> category (used when the RCA case has no component)
+ROOT_CAUSE_CATEGORIES = [
+    ("engine_coolant_system", ("coolant", "radiator", "thermostat", "overheat", "cooling")),
+    ("battery", ("battery", "alternator", "voltage", "charging")),
+    ("brake_system", ("brake", "abs", "caliper", "rotor")),
+    ("engine_oil_system", ("oil", "lubrication")),
+    ("transmission", ("transmission", "gearbox", "clutch")),
+    ("tyres", ("tyre", "tire", "wheel", "pressure")),
+    ("electrical", ("sensor", "wiring", "fuse", "ecu", "electrical")),
+]
+
+# Recommended action keywords -> action class
+ACTION_CLASSES = [
+    ("replace", ("replace", "replacement", "change", "install new")),
+    ("flush", ("flush", "refill", "top up", "top-up", "drain")),
+    ("repair", ("repair", "fix", "reseal", "tighten", "clean")),
+    ("inspect", ("inspect", "check", "diagnose", "test", "monitor")),
+]
+
+TEMPLATE_INSTRUCTIONS = """
+
+TEMPLATE MODE - these scripts will be reused for other vehicles with the same issue:
+- Write one conversation per customer decision: "confirmed", "declined" and "no_response"
+  (the decision is chosen separately for each vehicle, so do not choose one)
+- Write $vehicle_id wherever you would say the vehicle ID
+- Write $customer_name wherever you would address the customer by name
+- Write $slot wherever you would say the appointment date and time
+- Write $service_center wherever you would name the service center
+- Write $booking_id wherever you would say the booking ID (confirmed conversation only)
+- Do not write any concrete vehicle ID, name, date, time, center or booking ID
+- Do not use the $ sign for anything else
+Instead of the output format above, return ONLY this JSON:
+{"transcripts": {"confirmed": "AI: ...", "declined": "AI: ...", "no_response": "AI: ..."}}
+Every transcript must contain $vehicle_id and $slot."""
+
+
+def _classify(text: Optional[str], classes: list, default: str) -> str:
+    text = (text or "").lower()
+    matched = [name for name, keywords in classes if any(keyword in text for keyword in keywords)]
+    return "+".join(matched) if matched else default
+
+
+def root_cause_category(root_cause: Optional[str], component: Optional[str] = None) -> str:
+    """Category of a root cause: the RCA component if known, else keyword classification."""
+    if component:
+        return component.strip().lower().replace(" ", "_")
+    return _classify(root_cause, ROOT_CAUSE_CATEGORIES, "general")
+
+
+def action_class(recommended_action: Optional[str]) -> str:
+    """Action class(es) of a recommended action, e.g. "replace+flush"."""
+    return _classify(recommended_action, ACTION_CLASSES, "service")
+
+
+def template_key(root_cause: Optional[str], recommended_action: Optional[str],
+                 language: Optional[str] = None, component: Optional[str] = None) -> tuple:
+    """Library key: (root cause category, action class, language)."""
+    return (root_cause_category(root_cause, component), action_class(recommended_action), language or DEFAULT_LANGUAGE)
+
+
+def template_id(key: tuple) -> str:
+    """Firestore document ID for a library key."""
+    raw = "|".join([f"v{TEMPLATE_VERSION}", *key])
+    return f"{key[0]}_{key[1]}_{key[2]}_{hashlib.sha1(raw.encode('utf-8')).hexdigest()[:8]}".replace("+", "-")
+
+
+def validate_template(result: dict) -> Optional[dict]:
+    """
+    Template entry from a Gemini template-mode response, or None if it is not
+    usable (a decision without a transcript, missing or unknown placeholders).
+    """
+    transcripts = result.get("transcripts")
+    if not isinstance(transcripts, dict):
+        return None
+    entry = {}
+    for decision in VALID_DECISIONS:
+        transcript = transcripts.get(decision)
+        if not isinstance(transcript, str):
+            return None
+        used = set(re.findall(r"\$\{?([A-Za-z_]+)\}?", transcript))
+        if not set(REQUIRED_PLACEHOLDERS) <= used or not used <= set(PLACEHOLDERS):
+            return None
+        entry[decision] = transcript
+    return {"transcripts": entry}
+
+
+def simulate_decision(vehicle_id: str, case_ref: Optional[str], severity: Optional[str] = None,
+                      estimated_rul_days: Optional[float] = None) -> str:
+    """
+    Simulated customer decision for one vehicle.
+
+    Higher severity and a nearer failure make "confirmed" more likely. The
+    draw is seeded by (vehicle_id, case_ref), so a redelivered event gets the
+    same decision while different vehicles decide independently.
+    """
+    confirm, decline = DECISION_ODDS.get(str(severity or "").lower(), DECISION_ODDS["medium"])
+    try:
+        if estimated_rul_days is not None and float(estimated_rul_days) <= URGENT_RUL_DAYS:
+            shift = min(URGENT_CONFIRM_BOOST, decline)
+            confirm, decline = confirm + shift, decline - shift
+    except (TypeError, ValueError):
+        pass
+    digest = hashlib.sha1(f"{vehicle_id}|{case_ref or ''}".encode("utf-8")).digest()
+    draw = int.from_bytes(digest[:8], "big") / 2 ** 64
+    if draw < confirm:
+        return "confirmed"
+    if draw < confirm + decline:
+        return "declined"
+    return "no_response"
+
+
+def format_slot(best_slot: Optional[str], timezone_str: Optional[str] = None) -> str:
+    """Spoken slot text in the center's timezone, e.g. "Monday, December 16 at 10:00 AM"."""
+    try:
+        slot = datetime.fromisoformat(str(best_slot).replace("Z", "+00:00"))
+    except ValueError:
+        return str(best_slot or "the next available slot")
+    if slot.tzinfo is None:
+        slot = slot.replace(tzinfo=timezone.utc)
+    try:
+        slot = slot.astimezone(ZoneInfo(timezone_str or DEFAULT_TIMEZONE))
+    except Exception:
+        pass
+    return f"{slot.strftime('%A, %B')} {slot.day} at {slot.strftime('%I:%M %p').lstrip('0')}"
+
+
+def new_booking_id() -> str:
+    """ "booking_" + 8 random alphanumeric characters (same format the prompt asks Gemini for)."""
+    alphabet = string.ascii_lowercase + string.digits
+    return "booking_" + "".join(secrets.choice(alphabet) for _ in range(8))
+
+
+def render(entry: dict, decision: str, vehicle_id: str, customer_name: str, slot_text: str,
+           service_center: str) -> dict:
+    """EngagementOutput-shaped result from a library entry, for this vehicle's decision."""
+    booking_id = new_booking_id() if decision == "confirmed" else None
+    transcript = Template(entry["transcripts"].get(decision) or "").safe_substitute(
+        vehicle_id=vehicle_id,
+        customer_name=customer_name,
+        slot=slot_text,
+        service_center=service_center,
+        booking_id=booking_id or "",
+    )
+    return {
+        "vehicle_id": vehicle_id,
+        "customer_decision": decision,
+        "booking_id": booking_id,
+        "transcript": transcript,
+    }
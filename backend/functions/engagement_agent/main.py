@@ -1,7 +1,8 @@
 """
 Cloud Function: engagement_agent
 Pub/Sub Trigger: Subscribes to navigo-scheduling-complete topic
-Purpose: Generates customer engagement scripts using Gemini 2.5 Flash
+Purpose: Generates customer engagement scripts from a template library
+         (phrasings created lazily with Gemini 2.5 Flash)
 """
 
 import json
@@ -13,6 +14,12 @@ from google.cloud import pubsub_v1, firestore, bigquery
 import functions_framework
 import vertexai
 from vertexai.preview.generative_models import GenerativeModel
+from case_dossier import append_stage, load_dossier
+from engagement_templates import (
+    DEFAULT_LANGUAGE, TEMPLATE_INSTRUCTIONS, TEMPLATES_COLLECTION,
+    format_slot, render, simulate_decision, template_id, template_key, validate_template
+)
+from reference_cache import get_document
 
 # Vertex AI configuration
 PROJECT_ID = os.getenv("PROJECT_ID", "navigo-27206")
@@ -166,13 +173,34 @@ def extract_json_from_response(text: str) -> dict:
         raise
 
 
+def generate_template(input_data: dict) -> dict:
+    """Ask Gemini 2.5 Flash for an engagement script with placeholders (template mode)."""
+    vertexai.init(project=PROJECT_ID, location=LOCATION)
+    model = GenerativeModel("gemini-2.5-flash")
+    
+    prompt = (f"{SYSTEM_PROMPT}{TEMPLATE_INSTRUCTIONS}\n\nGenerate customer engagement for this vehicle:\n"
+              f"{json.dumps(input_data, default=str, indent=2)}\n\n"
+              "Return ONLY the JSON response matching the output format specified above.")
+    
+    response = model.generate_content(prompt)
+    response_text = response.text
+    
+    try:
+        return extract_json_from_response(response_text)
+    except Exception as e:
+        print(f"Error parsing Gemini response: {e}")
+        print(f"Response text: {response_text}")
+        raise ValueError(f"Invalid JSON response from Gemini: {e}")
+
+
 @functions_framework.cloud_event
 def engagement_agent(cloud_event):
     """
     Pub/Sub triggered function that:
     1. Receives scheduling result event
     2. Fetches RCA case to get root cause and recommended action
-    3. Uses Gemini 2.5 Flash to generate customer engagement script
+    3. Renders the customer engagement script from the template library
+       (Gemini 2.5 Flash only for categories not in the library yet)
     4. Stores engagement result and publishes to Pub/Sub
     """
     
@@ -202,87 +230,118 @@ def engagement_agent(cloud_event):
         
         # 2. Fetch vehicle data to get customer phone and name
         db = firestore.Client()
-        vehicle_ref = db.collection("vehicles").document(vehicle_id)
-        vehicle_doc = vehicle_ref.get()
+        vehicle_data = get_document(db, "vehicles", vehicle_id)
         
-        if not vehicle_doc.exists:
+        if vehicle_data is None:
             print(f"Vehicle {vehicle_id} not found")
             return {"status": "error", "error": "Vehicle not found"}
         
-        vehicle_data = vehicle_doc.to_dict()
         customer_phone = vehicle_data.get("owner_phone") or vehicle_data.get("phone")
         customer_name = vehicle_data.get("owner_name") or vehicle_data.get("name") or "Customer"
         
-        # 3. If rca_id not in message, fetch from scheduling document
-        if not rca_id:
-            scheduling_ref = db.collection("scheduling_cases").document(scheduling_id)
-            scheduling_doc = scheduling_ref.get()
+        # 3. Scheduling and RCA come from the case dossier (one read)
+        dossier = load_dossier(db, case_id)
+        scheduling_data = dossier.get("scheduling") or {}
+        rca_data = dossier.get("rca") or {}
+        if scheduling_data.get("scheduling_id") != scheduling_id:
+            scheduling_data = {}
+        
+        rca_id = rca_id or scheduling_data.get("rca_id")
+        if rca_data.get("rca_id") != rca_id:
+            rca_data = {}
+        
+        # Fall back to the stage collections for cases without a dossier
+        if not scheduling_data and (not rca_id or not best_slot or not service_center):
+            scheduling_doc = db.collection("scheduling_cases").document(scheduling_id).get()
             if scheduling_doc.exists:
                 scheduling_data = scheduling_doc.to_dict()
-                rca_id = scheduling_data.get("rca_id")
+                rca_id = rca_id or scheduling_data.get("rca_id")
         
         if not rca_id:
             print("Missing rca_id in message and scheduling case")
             return {"status": "error", "error": "Missing rca_id"}
         
         # 4. Fetch RCA case to get root cause and recommended action
-        rca_ref = db.collection("rca_cases").document(rca_id)
-        rca_doc = rca_ref.get()
-        
-        if not rca_doc.exists:
-            print(f"RCA case {rca_id} not found")
-            return {"status": "error", "error": "RCA case not found"}
+        if not rca_data:
+            rca_ref = db.collection("rca_cases").document(rca_id)
+            rca_doc = rca_ref.get()
+            
+            if not rca_doc.exists:
+                print(f"RCA case {rca_id} not found")
+                return {"status": "error", "error": "RCA case not found"}
+            
+            rca_data = rca_doc.to_dict()
         
-        rca_data = rca_doc.to_dict()
         root_cause = rca_data.get("root_cause")
         recommended_action = rca_data.get("recommended_action")
         
         # Use data from message or fallback to scheduling document
-        best_slot = best_slot or message_data.get("best_slot")
-        service_center = service_center or message_data.get("service_center")
-        
-        # If best_slot or service_center not in message, fetch from scheduling document
-        if not best_slot or not service_center:
-            scheduling_ref = db.collection("scheduling_cases").document(scheduling_id)
-            scheduling_doc = scheduling_ref.get()
-            if scheduling_doc.exists:
-                scheduling_data = scheduling_doc.to_dict()
-                best_slot = best_slot or scheduling_data.get("best_slot")
-                service_center = service_center or scheduling_data.get("service_center")
-        
-        # 5. Prepare input for Gemini
-        input_data = {
-            "vehicle_id": vehicle_id,
-            "root_cause": root_cause,
-            "recommended_action": recommended_action,
-            "best_slot": best_slot,
-            "service_center": service_center
-        }
-        
-        # 6. Initialize Vertex AI and call Gemini 2.5 Flash
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-        model = GenerativeModel("gemini-2.5-flash")
-        
-        prompt = f"{SYSTEM_PROMPT}\n\nGenerate customer engagement for this vehicle:\n{json.dumps(input_data, default=str, indent=2)}\n\nReturn ONLY the JSON response matching the output format specified above."
-        
-        response = model.generate_content(prompt)
-        response_text = response.text
-        
-        # 7. Parse Gemini response
-        try:
-            result = extract_json_from_response(response_text)
-        except Exception as e:
-            print(f"Error parsing Gemini response: {e}")
-            print(f"Response text: {response_text}")
-            raise ValueError(f"Invalid JSON response from Gemini: {e}")
-        
-        # 8. Validate result matches schema
+        best_slot = best_slot or scheduling_data.get("best_slot")
+        service_center = service_center or scheduling_data.get("service_center")
+        
+        # 5. Per-vehicle fields substituted into the script
+        center_data = (get_document(db, "service_centers", service_center) or {}) if service_center else {}
+        slot_text = format_slot(best_slot, center_data.get("timezone"))
+        center_name = center_data.get("name") or service_center
+        language = vehicle_data.get("preferred_language") or DEFAULT_LANGUAGE
+        
+        # 6. The customer decision is simulated for this vehicle; only the phrasing is shared
+        diagnosis_data = dossier.get("diagnosis") or {}
+        diagnosis_id = scheduling_data.get("diagnosis_id")
+        if not diagnosis_data and diagnosis_id:
+            diagnosis_doc = db.collection("diagnosis_cases").document(diagnosis_id).get()
+            diagnosis_data = diagnosis_doc.to_dict() if diagnosis_doc.exists else {}
+        decision = simulate_decision(vehicle_id, scheduling_id, diagnosis_data.get("severity"),
+                                     diagnosis_data.get("estimated_rul_days"))
+        
+        # 7. Render from the template library keyed by (root cause category, action, language)
+        key = template_key(root_cause, recommended_action, language, rca_data.get("component"))
+        library_id = template_id(key)
+        entry = get_document(db, TEMPLATES_COLLECTION, library_id)
+        
+        if entry and entry.get("transcripts"):
+            result = render(entry, decision, vehicle_id, customer_name, slot_text, center_name)
+            script_source = "template"
+            print(f"Rendered engagement for {vehicle_id} from template {library_id}")
+        else:
+            # 8. New category: ask Gemini for placeholder scripts and add them to the library
+            input_data = {
+                "vehicle_id": "$vehicle_id",
+                "root_cause": root_cause,
+                "recommended_action": recommended_action,
+                "best_slot": "$slot",
+                "service_center": "$service_center",
+                "language": language
+            }
+            generated = generate_template(input_data)
+            entry = validate_template(generated)
+            if entry:
+                db.collection(TEMPLATES_COLLECTION).document(library_id).set({
+                    **entry,
+                    "root_cause_category": key[0],
+                    "action": key[1],
+                    "language": key[2],
+                    "example_root_cause": root_cause,
+                    "example_recommended_action": recommended_action,
+                    "created_at": firestore.SERVER_TIMESTAMP
+                })
+                print(f"Added engagement template {library_id} to the library")
+            else:
+                # Unusable as a template - use this phrasing for this vehicle only
+                print(f"Gemini script for {library_id} is not a valid template, not caching it")
+                transcripts = generated.get("transcripts")
+                transcripts = transcripts if isinstance(transcripts, dict) else {}
+                entry = {"transcripts": {decision: str(transcripts.get(decision) or generated.get("transcript") or "")}}
+            result = render(entry, decision, vehicle_id, customer_name, slot_text, center_name)
+            script_source = "llm"
+        
+        # 9. Validate result matches schema
         if result.get("vehicle_id") != vehicle_id:
             result["vehicle_id"] = vehicle_id
         
         engagement_id = f"engagement_{uuid.uuid4().hex[:10]}"
         
-        # 9. Prepare engagement data for Firestore (include customer info)
+        # 10. Prepare engagement data for Firestore (include customer info)
         engagement_data = {
             "engagement_id": engagement_id,
             "scheduling_id": scheduling_id,
@@ -294,19 +353,21 @@ def engagement_agent(cloud_event):
             "customer_decision": result.get("customer_decision"),
             "booking_id": result.get("booking_id"),
             "transcript": result.get("transcript"),
+            "script_source": script_source,
             "status": "completed",
             "created_at": firestore.SERVER_TIMESTAMP
         }
         
-        # 10. Store in Firestore
+        # 11. Store in Firestore
         db.collection("engagement_cases").document(engagement_id).set(engagement_data)
         print(f"Created engagement case {engagement_id} for vehicle {vehicle_id}")
+        append_stage(db, case_id, "engagement", engagement_data)
         
-        # 11. Update scheduling case status
+        # 12. Update scheduling case status
         scheduling_ref = db.collection("scheduling_cases").document(scheduling_id)
         scheduling_ref.update({"status": "engagement_complete"})
         
-        # 12. If booking confirmed, create booking record
+        # 13. If booking confirmed, create booking record
         if result.get("customer_decision") == "confirmed" and result.get("booking_id"):
             booking_data = {
                 "booking_id": result.get("booking_id"),
@@ -320,10 +381,10 @@ def engagement_agent(cloud_event):
             db.collection("bookings").document(result.get("booking_id")).set(booking_data)
             print(f"Created booking {result.get('booking_id')} for vehicle {vehicle_id}")
         
-        # 13. Prepare BigQuery row
+        # 14. Prepare BigQuery row
         bq_row = prepare_bigquery_row(engagement_data)
         
-        # 14. Sync to BigQuery
+        # 15. Sync to BigQuery
         bq_client = bigquery.Client()
         table_ref = bq_client.dataset(DATASET_ID).table(TABLE_ID)
         errors = bq_client.insert_rows_json(table_ref, [bq_row])
@@ -333,7 +394,7 @@ def engagement_agent(cloud_event):
         else:
             print(f"Synced engagement case {engagement_id} to BigQuery")
         
-        # 15. Publish to engagement-complete topic
+        # 16. Publish to engagement-complete topic
         publisher = pubsub_v1.PublisherClient()
         topic_path = publisher.topic_path(PROJECT_ID, ENGAGEMENT_TOPIC_NAME)
         
@@ -356,7 +417,7 @@ def engagement_agent(cloud_event):
         message_id = future.result()
         print(f"Published engagement case {engagement_id} to {ENGAGEMENT_TOPIC_NAME}: {message_id}")
         
-        # 16. Publish to communication-trigger topic (for actual voice call)
+        # 17. Publish to communication-trigger topic (for actual voice call)
         if customer_phone:  # Only trigger if phone number is available
             comm_topic_path = publisher.topic_path(PROJECT_ID, COMMUNICATION_TOPIC_NAME)
             comm_message = {
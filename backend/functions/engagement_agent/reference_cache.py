@@ -0,0 +1,154 @@
+"""
+In-process cache for reference collections (service_centers, vehicles).
+
+Reference data changes hourly at most but is read on every invocation.
+Warm instances serve it from memory:
+- entries expire after REFERENCE_CACHE_TTL_SECONDS
+- the cache is a size-bounded LRU (REFERENCE_CACHE_MAX_ENTRIES)
+- with REFERENCE_CACHE_LISTEN=true, a Firestore snapshot listener on a
+  cached collection invalidates entries as soon as documents change
+
+Callers get copies, so mutating a returned document never corrupts the cache.
+Missing documents are not cached.
+
+Each Cloud Function deploys its own copy - keep the copies identical.
+"""
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+REFERENCE_CACHE_TTL_SECONDS = float(os.getenv("REFERENCE_CACHE_TTL_SECONDS", "300"))
+REFERENCE_CACHE_MAX_ENTRIES = int(os.getenv("REFERENCE_CACHE_MAX_ENTRIES", "2048"))
+REFERENCE_CACHE_LISTEN = os.getenv("REFERENCE_CACHE_LISTEN", "false").lower() == "true"
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ttl seconds after being set."""
+
+    def __init__(self, max_entries: int = REFERENCE_CACHE_MAX_ENTRIES, ttl: float = REFERENCE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# ("doc", collection, doc_id) -> dict, ("collection", collection) -> [(doc_id, dict)]
+_cache = TTLCache()
+
+# collection -> snapshot watch (one listener per collection per instance)
+_watches: Dict[str, Any] = {}
+_watch_lock = threading.Lock()
+
+
+def get_document(db, collection: str, doc_id: str) -> Optional[dict]:
+    """
+    Cached document read.
+
+    Returns:
+        Copy of the document data, or None if the document does not exist
+    """
+    key = ("doc", collection, doc_id)
+    data = _cache.get(key, _MISSING)
+    if data is _MISSING:
+        doc = db.collection(collection).document(doc_id).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict() or {}
+        _cache.set(key, data)
+    return copy.deepcopy(data)
+
+
+def get_collection(db, collection: str) -> List[Tuple[str, dict]]:
+    """
+    Cached full-collection read (one stream() per TTL on a warm instance).
+
+    Returns:
+        List of (doc_id, copy of document data)
+    """
+    key = ("collection", collection)
+    docs = _cache.get(key, _MISSING)
+    if docs is _MISSING:
+        docs = [(doc.id, doc.to_dict() or {}) for doc in db.collection(collection).stream()]
+        _cache.set(key, docs)
+        if REFERENCE_CACHE_LISTEN:
+            watch_collection(db, collection)
+    return copy.deepcopy(docs)
+
+
+def invalidate(collection: str, doc_id: Optional[str] = None) -> None:
+    """Drop a cached document (and the collection listing it belongs to)."""
+    if doc_id is not None:
+        _cache.invalidate(("doc", collection, doc_id))
+    _cache.invalidate(("collection", collection))
+
+
+def _on_snapshot(collection: str):
+    state = {"initial": True}
+
+    def callback(_snapshot, changes, _read_time):
+        # The first snapshot lists every document as ADDED - nothing changed yet
+        if state["initial"]:
+            state["initial"] = False
+            return
+        for change in changes:
+            invalidate(collection, change.document.id)
+    return callback
+
+
+def watch_collection(db, collection: str) -> bool:
+    """
+    Invalidate cached entries of a collection whenever its documents change.
+
+    Non-blocking: if the listener cannot be started, entries still expire
+    after the TTL.
+
+    Returns:
+        True if a listener is active for the collection
+    """
+    with _watch_lock:
+        if collection in _watches:
+            return True
+        try:
+            _watches[collection] = db.collection(collection).on_snapshot(_on_snapshot(collection))
+            return True
+        except Exception as e:
+            print(f"Reference cache listener for {collection} failed (non-blocking, TTL only): {str(e)}")
+            return False
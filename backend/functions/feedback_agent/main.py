@@ -16,6 +16,7 @@ import functions_framework
 import vertexai
 from vertexai.preview.generative_models import GenerativeModel
 from google.api_core import exceptions
+from case_dossier import append_stage, load_dossier
 
 # Vertex AI configuration
 # Read and validate environment variables
@@ -265,15 +266,19 @@ def feedback_agent(cloud_event):
             print(f"Booking {booking_id} status is feedback_complete - feedback already processed. Skipping.")
             return {"status": "skipped", "message": "Feedback already completed"}
         
-        # 4. Fetch original anomaly case to get original anomaly type
-        case_ref = db.collection("anomaly_cases").document(case_id)
-        case_doc = case_ref.get()
+        # 4. Fetch original anomaly case (case dossier first, one read) to get original anomaly type
+        dossier = load_dossier(db, case_id)
+        case_data = dossier.get("anomaly")
         
-        if not case_doc.exists:
-            print(f"Anomaly case {case_id} not found")
-            return {"status": "error", "error": "Anomaly case not found"}
-        
-        case_data = case_doc.to_dict()
+        if case_data is None:
+            case_ref = db.collection("anomaly_cases").document(case_id)
+            case_doc = case_ref.get()
+            
+            if not case_doc.exists:
+                print(f"Anomaly case {case_id} not found")
+                return {"status": "error", "error": "Anomaly case not found"}
+            
+            case_data = case_doc.to_dict()
         original_anomaly_type = case_data.get("anomaly_type")
         
         # 5. If post_service_telemetry not provided, fetch recent telemetry events
@@ -416,6 +421,7 @@ def feedback_agent(cloud_event):
         # 11. Store in Firestore
         db.collection("feedback_cases").document(feedback_id).set(feedback_data)
         print(f"Created feedback case {feedback_id} for vehicle {vehicle_id}")
+        append_stage(db, case_id, "feedback", feedback_data)
         
         # 12. Update booking status
         booking_ref.update({"status": "feedback_complete"})
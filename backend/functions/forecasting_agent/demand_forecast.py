@@ -0,0 +1,226 @@
+"""
+Per-center daily service demand forecasting (CPU only, numpy).
+
+Daily booking counts for every center are stacked into one matrix
+(centers x days) and fitted with additive Holt-Winters exponential smoothing
+with a weekly season. All centers and a small grid of smoothing parameters
+are fitted together: each time step updates a (parameter sets x centers)
+state array, and each center keeps the parameter set with the lowest
+one-step-ahead squared error.
+
+Centers with less than two weeks of history fall back to their day-of-week
+means (or the overall mean).
+"""
+
+from datetime import date, datetime, timedelta
+from itertools import product
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SEASON = 7
+HORIZON_DAYS = 14
+HISTORY_DAYS = 84  # 12 weeks
+MIN_SEASONAL_HISTORY = 2 * SEASON
+
+# Smoothing parameter grid (level alpha, trend beta, season gamma)
+ALPHAS = (0.1, 0.3, 0.5)
+BETAS = (0.0, 0.05)
+GAMMAS = (0.1, 0.3)
+PARAM_GRID = np.array(list(product(ALPHAS, BETAS, GAMMAS)))  # (P, 3)
+
+# Predicted load (demand / daily capacity) at which a center counts as saturated
+SATURATION_LOAD = 0.9
+
+# scheduling_agent compares a center's capacity with its active bookings over this
+# many days (occupancy_index.HORIZON_DAYS); keep the two in sync
+BOOKING_HORIZON_DAYS = 62
+DEFAULT_DAILY_CAPACITY = 10 / BOOKING_HORIZON_DAYS  # scheduling_agent's default capacity of 10
+
+
+def daily_capacity(center: dict) -> float:
+    """
+    Vehicles a center can service per day: daily_capacity if the center declares
+    it, else capacity (active bookings over BOOKING_HORIZON_DAYS, as scheduling_agent
+    uses it) spread over that horizon.
+    """
+    if center.get("daily_capacity"):
+        return float(center["daily_capacity"])
+    if center.get("capacity"):
+        return float(center["capacity"]) / BOOKING_HORIZON_DAYS
+    return DEFAULT_DAILY_CAPACITY
+
+
+def daily_matrix(service_history: Dict[str, Dict[str, float]], end: date,
+                 days: int = HISTORY_DAYS) -> tuple:
+    """
+    Stack per-center daily counts into a (centers x days) matrix.
+
+    Args:
+        service_history: center_id -> {"YYYY-MM-DD": bookings}
+        end: Last day of history (inclusive)
+        days: History length
+
+    Returns:
+        (center_ids, matrix, observed_days) - observed_days is each center's
+        history length (days since its first booking, capped at days)
+    """
+    center_ids = sorted(service_history)
+    start = end - timedelta(days=days - 1)
+    matrix = np.zeros((len(center_ids), days))
+    observed = np.zeros(len(center_ids), dtype=int)
+    for row, center_id in enumerate(center_ids):
+        first = None
+        for day_str, count in (service_history[center_id] or {}).items():
+            try:
+                offset = (date.fromisoformat(day_str[:10]) - start).days
+            except ValueError:
+                continue
+            if 0 <= offset < days:
+                matrix[row, offset] += float(count)
+                first = offset if first is None else min(first, offset)
+        observed[row] = days - first if first is not None else 0
+    return center_ids, matrix, observed
+
+
+def holt_winters(matrix: np.ndarray, horizon: int = HORIZON_DAYS) -> tuple:
+    """
+    Fit additive Holt-Winters (weekly season) to every row, choosing each
+    row's smoothing parameters from PARAM_GRID by one-step-ahead SSE.
+
+    Returns:
+        (forecast (rows x horizon), chosen parameters (rows x 3))
+    """
+    rows, days = matrix.shape
+    alpha = PARAM_GRID[:, 0:1]  # (P, 1) - broadcasts over rows
+    beta = PARAM_GRID[:, 1:2]
+    gamma = PARAM_GRID[:, 2:3]
+
+    # Initial state from the first two seasons
+    first, second = matrix[:, :SEASON], matrix[:, SEASON:2 * SEASON]
+    level = np.broadcast_to(first.mean(axis=1), (len(PARAM_GRID), rows)).copy()
+    trend = np.broadcast_to((second.mean(axis=1) - first.mean(axis=1)) / SEASON, (len(PARAM_GRID), rows)).copy()
+    season = np.broadcast_to((first - first.mean(axis=1, keepdims=True)).T, (len(PARAM_GRID), SEASON, rows)).copy()
+    sse = np.zeros((len(PARAM_GRID), rows))
+
+    for t in range(SEASON, days):
+        s = season[:, t % SEASON, :]
+        y = matrix[:, t]
+        sse += (y - (level + trend + s)) ** 2
+        new_level = alpha * (y - s) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        season[:, t % SEASON, :] = gamma * (y - new_level) + (1 - gamma) * s
+        level = new_level
+
+    best = sse.argmin(axis=0)  # (rows,)
+    cols = np.arange(rows)
+    steps = np.arange(1, horizon + 1)
+    season_idx = (days + steps - 1) % SEASON  # season slot of each forecast day
+    forecast = (
+        level[best, cols][:, None]
+        + trend[best, cols][:, None] * steps[None, :]
+        + season[best[:, None], season_idx[None, :], cols[:, None]]
+    )
+    return np.clip(forecast, 0, None), PARAM_GRID[best]
+
+
+def weekday_means(matrix: np.ndarray, observed: np.ndarray, end: date, horizon: int = HORIZON_DAYS) -> np.ndarray:
+    """Fallback forecast: mean of the same weekday over the observed history."""
+    days = matrix.shape[1]
+    forecast = np.zeros((matrix.shape[0], horizon))
+    weekdays = np.array([(end - timedelta(days=days - 1 - i)).weekday() for i in range(days)])
+    for row in range(matrix.shape[0]):
+        history = matrix[row, days - observed[row]:] if observed[row] else matrix[row, :0]
+        history_weekdays = weekdays[days - observed[row]:] if observed[row] else weekdays[:0]
+        overall = history.mean() if history.size else 0.0
+        for h in range(horizon):
+            weekday = (end + timedelta(days=h + 1)).weekday()
+            same_day = history[history_weekdays == weekday]
+            forecast[row, h] = same_day.mean() if same_day.size else overall
+    return forecast
+
+
+def forecast_demand(service_history: Dict[str, Dict[str, float]], workshop_capacity: Dict[str, float],
+                    end: date, horizon: int = HORIZON_DAYS, demand_multiplier: float = 1.0,
+                    booked: Optional[Dict[str, Dict[str, float]]] = None) -> dict:
+    """
+    Forecast per-center daily demand and load.
+
+    Args:
+        service_history: center_id -> {"YYYY-MM-DD": bookings} (ForecastInput.service_history)
+        workshop_capacity: center_id -> daily capacity (ForecastInput.workshop_capacity)
+        end: Last day of history; forecasts start the day after
+        horizon: Days to forecast
+        demand_multiplier: Fleet-level scaling (e.g. expected growth from fleet usage stats)
+        booked: center_id -> {"YYYY-MM-DD": bookings} already made for forecast days
+            (predicted demand is never below what is already booked)
+
+    Returns:
+        Dict with ForecastOutput fields (service_center_load,
+        demand_prediction_next_14_days, recommended_center) plus per-center
+        daily load and saturated days
+    """
+    history = {center_id: service_history.get(center_id, {}) for center_id in set(service_history) | set(workshop_capacity)}
+    center_ids, matrix, observed = daily_matrix(history, end)
+    if not center_ids:
+        return {"service_center_load": {}, "demand_prediction_next_14_days": {}, "recommended_center": "", "daily_load": {}, "saturated_days": {}}
+
+    forecast = weekday_means(matrix, observed, end, horizon)
+    seasonal = observed >= MIN_SEASONAL_HISTORY
+    if seasonal.any():
+        # Centers with at least two weeks of history get the Holt-Winters fit;
+        # the rest keep the weekday-mean fallback
+        fitted, _ = holt_winters(matrix[seasonal], horizon)
+        forecast[seasonal] = fitted
+    forecast *= demand_multiplier
+
+    dates = [(end + timedelta(days=h + 1)).isoformat() for h in range(horizon)]
+    if booked:
+        known = np.array([[float((booked.get(c) or {}).get(d, 0)) for d in dates] for c in center_ids])
+        forecast = np.maximum(forecast, known)
+    capacity = np.array([float(workshop_capacity.get(c) or 0) for c in center_ids])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        load = np.where(capacity[:, None] > 0, forecast / capacity[:, None], np.inf)
+
+    demand = {c: {d: round(float(v), 2) for d, v in zip(dates, forecast[i])} for i, c in enumerate(center_ids)}
+    daily_load = {c: {d: (round(float(v), 3) if np.isfinite(v) else None) for d, v in zip(dates, load[i])}
+                  for i, c in enumerate(center_ids)}
+    mean_load = np.where(np.isfinite(load), load, np.nan)
+    center_load = {}
+    for i, c in enumerate(center_ids):
+        row = mean_load[i]
+        center_load[c] = round(float(np.nanmean(row)), 3) if np.isfinite(row).any() else None
+    saturated = {c: [d for d, v in zip(dates, load[i]) if v >= SATURATION_LOAD] for i, c in enumerate(center_ids)}
+
+    candidates = [c for c in center_ids if center_load[c] is not None]
+    recommended = min(candidates, key=lambda c: (center_load[c], c)) if candidates else ""
+    return {
+        "service_center_load": center_load,
+        "demand_prediction_next_14_days": demand,
+        "recommended_center": recommended,
+        "daily_load": daily_load,
+        "saturated_days": saturated,
+    }
+
+
+def bookings_to_history(bookings: List[dict], tz_by_center: Optional[Dict[str, object]] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Daily booking counts per center from booking documents
+    (scheduled_date, or the date of scheduled_slot).
+    """
+    history: Dict[str, Dict[str, int]] = {}
+    for booking in bookings:
+        center_id = booking.get("service_center_id") or booking.get("service_center")
+        day = booking.get("scheduled_date")
+        if not day and booking.get("scheduled_slot"):
+            try:
+                slot = datetime.fromisoformat(str(booking["scheduled_slot"]).replace("Z", "+00:00"))
+            except ValueError:
+                continue
+            tz = (tz_by_center or {}).get(center_id)
+            day = (slot.astimezone(tz) if tz else slot).date().isoformat()
+        if not center_id or not day:
+            continue
+        counts = history.setdefault(center_id, {})
+        counts[day[:10]] = counts.get(day[:10], 0) + 1
+    return history
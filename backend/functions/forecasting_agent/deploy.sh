@@ -0,0 +1,38 @@
+#!/bin/bash
+
+# Deploy forecasting_agent function and its daily Cloud Scheduler job
+
+echo "🚀 Deploying forecasting-agent function..."
+echo ""
+
+cd "$(dirname "$0")"
+
+gcloud functions deploy forecasting-agent \
+  --gen2 \
+  --runtime=python311 \
+  --region=us-central1 \
+  --source=. \
+  --entry-point=forecasting_agent \
+  --trigger-http \
+  --memory=512MB \
+  --project=navigo-27206 \
+  --service-account=navigo-functions@navigo-27206.iam.gserviceaccount.com \
+  --no-allow-unauthenticated
+
+FUNCTION_URL=$(gcloud functions describe forecasting-agent --gen2 --region=us-central1 --project=navigo-27206 --format="value(serviceConfig.uri)")
+
+# Refresh forecasts every day at 01:00 IST
+gcloud scheduler jobs create http navigo-demand-forecast \
+  --location=us-central1 \
+  --schedule="0 1 * * *" \
+  --time-zone="Asia/Kolkata" \
+  --uri="$FUNCTION_URL" \
+  --http-method=POST \
+  --message-body='{"region": "all"}' \
+  --headers="Content-Type=application/json" \
+  --oidc-service-account-email=navigo-functions@navigo-27206.iam.gserviceaccount.com \
+  --project=navigo-27206 \
+  || echo "Scheduler job already exists (update with: gcloud scheduler jobs update http navigo-demand-forecast ...)"
+
+echo ""
+echo "✅ Deployment complete!"
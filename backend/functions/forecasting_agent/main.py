@@ -0,0 +1,132 @@
+"""
+Cloud Function: forecasting_agent
+HTTP Trigger: Invoked daily by Cloud Scheduler (or on demand)
+Purpose: Forecasts per-center daily service demand for the next 14 days and
+caches it in Firestore (demand_forecasts) for scheduling_agent
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from flask import Request, jsonify
+from google.cloud import firestore
+import functions_framework
+from demand_forecast import (
+    HISTORY_DAYS, HORIZON_DAYS, SATURATION_LOAD, bookings_to_history, daily_capacity, forecast_demand
+)
+from schemas import ForecastInput, ForecastOutput
+
+# Project configuration
+PROJECT_ID = os.getenv("PROJECT_ID", "navigo-27206")
+
+FORECAST_COLLECTION = "demand_forecasts"
+FIRESTORE_BATCH_LIMIT = 500  # writes per Firestore commit
+
+# Bookings that count as demand
+DEMAND_STATUSES = {"confirmed", "pending", "completed"}
+
+
+@functions_framework.http
+def forecasting_agent(request: Request):
+    """
+    HTTP function that:
+    1. Loads service centers (optionally filtered by region)
+    2. Loads the last HISTORY_DAYS of bookings plus bookings already made for the horizon
+    3. Fits per-center daily demand (vectorized Holt-Winters, weekly season)
+    4. Stores one forecast document per center in demand_forecasts
+    5. Returns ForecastOutput
+
+    Optional JSON body: {"region": "...", "fleet_usage_stats": {"demand_multiplier": 1.1}}
+    """
+
+    try:
+        body = request.get_json(silent=True) or {}
+        region = body.get("region") or "all"
+        fleet_usage_stats = body.get("fleet_usage_stats") or {}
+
+        db = firestore.Client()
+        today = datetime.now(timezone.utc).date()
+        history_end = today - timedelta(days=1)
+        history_start = history_end - timedelta(days=HISTORY_DAYS - 1)
+        horizon_end = today + timedelta(days=HORIZON_DAYS)
+
+        # 1. Service centers
+        centers = {}
+        for center_doc in db.collection("service_centers").stream():
+            center = center_doc.to_dict()
+            if region != "all" and center.get("region") != region:
+                continue
+            centers[center_doc.id] = center
+
+        if not centers:
+            return jsonify({"status": "error", "error": "No service centers found"}), 404
+
+        # 2. Bookings over history + horizon (one range query)
+        bookings = (db.collection("bookings")
+                    .where("scheduled_date", ">=", history_start.isoformat())
+                    .where("scheduled_date", "<=", horizon_end.isoformat())
+                    .stream())
+        demand_bookings = [
+            b for b in (doc.to_dict() for doc in bookings)
+            if b.get("status") in DEMAND_STATUSES
+            and (b.get("service_center_id") or b.get("service_center")) in centers
+        ]
+        counts = bookings_to_history(demand_bookings)
+        service_history = {c: {d: n for d, n in days.items() if d <= history_end.isoformat()} for c, days in counts.items()}
+        booked = {c: {d: n for d, n in days.items() if d > history_end.isoformat()} for c, days in counts.items()}
+
+        forecast_input = ForecastInput(
+            region=region,
+            service_history=service_history,
+            fleet_usage_stats=fleet_usage_stats,
+            workshop_capacity={center_id: daily_capacity(center) for center_id, center in centers.items()}
+        )
+
+        # 3. Forecast
+        result = forecast_demand(
+            forecast_input.service_history,
+            forecast_input.workshop_capacity,
+            end=history_end,
+            demand_multiplier=float(fleet_usage_stats.get("demand_multiplier", 1.0)),
+            booked=booked
+        )
+        output = ForecastOutput(
+            service_center_load=result["service_center_load"],
+            demand_prediction_next_14_days=result["demand_prediction_next_14_days"],
+            recommended_center=result["recommended_center"]
+        )
+
+        # 4. Cache per-center forecasts (batched writes)
+        batch = db.batch()
+        writes = 0
+        for center_id in centers:
+            batch.set(db.collection(FORECAST_COLLECTION).document(center_id), {
+                "service_center_id": center_id,
+                "region": region,
+                "forecast_start": (history_end + timedelta(days=1)).isoformat(),
+                "daily_demand": result["demand_prediction_next_14_days"].get(center_id, {}),
+                "daily_load": result["daily_load"].get(center_id, {}),
+                "mean_load": result["service_center_load"].get(center_id),
+                "saturated_days": result["saturated_days"].get(center_id, []),
+                "saturation_load": SATURATION_LOAD,
+                "daily_capacity": forecast_input.workshop_capacity[center_id],
+                "generated_at": firestore.SERVER_TIMESTAMP
+            })
+            writes += 1
+            if writes == FIRESTORE_BATCH_LIMIT:
+                batch.commit()
+                batch = db.batch()
+                writes = 0
+        if writes:
+            batch.commit()
+
+        saturated = [c for c, days in result["saturated_days"].items() if days]
+        print(f"Forecasted demand for {len(centers)} centers ({region}); saturated within {HORIZON_DAYS} days: {saturated}")
+
+        # 5. ForecastOutput
+        return jsonify({"status": "success", **output.model_dump()}), 200
+
+    except Exception as e:
+        print(f"Error in forecasting_agent: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"status": "error", "error": str(e)}), 500
@@ -13,6 +13,7 @@ from google.cloud import pubsub_v1, firestore, bigquery
 import functions_framework
 import vertexai
 from vertexai.preview.generative_models import GenerativeModel
+from case_dossier import append_stage, load_dossier
 
 # Vertex AI configuration
 PROJECT_ID = os.getenv("PROJECT_ID", "navigo-27206")
@@ -192,32 +193,52 @@ def manufacturing_agent(cloud_event):
             print("Missing feedback_id or vehicle_id in message")
             return {"status": "error", "error": "Missing required fields"}
         
-        # 2. Fetch feedback case to get CEI score
+        # 2. Fetch feedback, anomaly, RCA and diagnosis from the case dossier (one read)
         db = firestore.Client()
         feedback_ref = db.collection("feedback_cases").document(feedback_id)
-        feedback_doc = feedback_ref.get()
+        dossier = load_dossier(db, case_id)
+        feedback_data = dossier.get("feedback")
+        
+        if not feedback_data or feedback_data.get("feedback_id") != feedback_id:
+            # Fall back to the stage collections
+            feedback_doc = feedback_ref.get()
+            
+            if not feedback_doc.exists:
+                print(f"Feedback case {feedback_id} not found")
+                return {"status": "error", "error": "Feedback case not found"}
+            
+            feedback_data = feedback_doc.to_dict()
         
-        if not feedback_doc.exists:
-            print(f"Feedback case {feedback_id} not found")
-            return {"status": "error", "error": "Feedback case not found"}
-        
-        feedback_data = feedback_doc.to_dict()
         cei_score = cei_score if cei_score is not None else feedback_data.get("cei_score")
         
-        # 3. Fetch RCA case to get root cause
-        case_ref = db.collection("anomaly_cases").document(case_id)
-        case_doc = case_ref.get()
+        # First try to get case_id from feedback if not in message
+        if not case_id:
+            case_id = feedback_data.get("case_id")
         
-        if not case_doc.exists:
-            print(f"Anomaly case {case_id} not found")
-            return {"status": "error", "error": "Anomaly case not found"}
+        if not case_id:
+            print("Missing case_id in message and feedback case")
+            return {"status": "error", "error": "Missing case_id"}
+        
+        if not dossier:
+            dossier = load_dossier(db, case_id)
+        
+        # 3. Fetch anomaly case to get anomaly type
+        current_case_data = dossier.get("anomaly")
+        if current_case_data is None:
+            case_ref = db.collection("anomaly_cases").document(case_id)
+            case_doc = case_ref.get()
+            
+            if not case_doc.exists:
+                print(f"Anomaly case {case_id} not found")
+                return {"status": "error", "error": "Anomaly case not found"}
+            
+            current_case_data = case_doc.to_dict()
         
         # Get all cases for this vehicle to calculate recurrence (same vehicle)
         all_cases_query = db.collection("anomaly_cases").where("vehicle_id", "==", vehicle_id).stream()
         all_cases = list(all_cases_query)
         
         # Count how many times this specific anomaly type occurred for this vehicle
-        current_case_data = case_doc.to_dict()
         anomaly_type = current_case_data.get("anomaly_type")
         component = current_case_data.get("component")  # Try from anomaly case first
         
@@ -228,33 +249,30 @@ def manufacturing_agent(cloud_event):
                 recurrence_count += 1
         
         # 4. Fetch RCA case to get root cause and component
-        # First try to get case_id from feedback if not in message
-        if not case_id:
-            case_id = feedback_data.get("case_id")
-        
-        if not case_id:
-            print("Missing case_id in message and feedback case")
-            return {"status": "error", "error": "Missing case_id"}
-        
-        # Find RCA case linked to this case_id
-        rca_query = db.collection("rca_cases").where("case_id", "==", case_id).limit(1).stream()
-        rca_cases = list(rca_query)
-        
-        if not rca_cases:
-            print(f"RCA case for case_id {case_id} not found")
-            return {"status": "error", "error": "RCA case not found"}
+        rca_data = dossier.get("rca")
+        if rca_data is None:
+            # Find RCA case linked to this case_id
+            rca_query = db.collection("rca_cases").where("case_id", "==", case_id).limit(1).stream()
+            rca_cases = list(rca_query)
+            
+            if not rca_cases:
+                print(f"RCA case for case_id {case_id} not found")
+                return {"status": "error", "error": "RCA case not found"}
+            
+            rca_data = rca_cases[0].to_dict()
         
-        rca_data = rca_cases[0].to_dict()
         root_cause = rca_data.get("root_cause")
         
         # Get component from diagnosis case if available (more reliable than anomaly case)
+        diagnosis_data = dossier.get("diagnosis")
         diagnosis_id = rca_data.get("diagnosis_id")
-        if diagnosis_id:
+        if diagnosis_data is None and diagnosis_id:
             diagnosis_ref = db.collection("diagnosis_cases").document(diagnosis_id)
             diagnosis_doc = diagnosis_ref.get()
             if diagnosis_doc.exists:
                 diagnosis_data = diagnosis_doc.to_dict()
-                component = diagnosis_data.get("component") or component  # Use diagnosis component if available
+        if diagnosis_data:
+            component = diagnosis_data.get("component") or component  # Use diagnosis component if available
         
         # Calculate fleet-wide recurrence (across all vehicles) for better CAPA insights
         # This helps identify if it's a manufacturing batch issue
@@ -346,6 +364,7 @@ def manufacturing_agent(cloud_event):
         # 13. Store in Firestore
         db.collection("manufacturing_cases").document(manufacturing_id).set(manufacturing_data)
         print(f"Created manufacturing case {manufacturing_id} for vehicle {vehicle_id}")
+        append_stage(db, case_id, "manufacturing", manufacturing_data)
         
         # 14. Update feedback case status
         feedback_ref.update({"status": "manufacturing_complete"})
@@ -0,0 +1,309 @@
+"""
+Multivariate cross-correlation analysis of RCA context windows.
+
+Turns the raw telemetry window into a compact, ranked list of candidate
+causal chains (e.g. engine_rpm -> engine_coolant_temp_c) from:
+- lagged cross-correlations between every pair of metrics (one matrix
+  product per lag over the standardized window)
+- least-squares slopes of each metric
+- the order in which metrics first cross their abnormal thresholds
+
+main.py sends this summary to Gemini instead of the raw window, and resolves
+low-ambiguity chains with a known explanation locally.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Metrics analysed (numeric TelematicsEvent fields)
+METRICS = [
+    "engine_rpm",
+    "speed_kmph",
+    "engine_coolant_temp_c",
+    "engine_oil_temp_c",
+    "battery_soc_pct",
+    "battery_soh_pct",
+]
+
+# metric -> (threshold, direction) marking the onset of abnormal behaviour.
+# Set at the edge of the normal ranges in the data analysis rules, so onsets
+# precede the anomaly itself.
+ONSET_THRESHOLDS = {
+    "engine_rpm": (4000.0, "above"),
+    "engine_coolant_temp_c": (100.0, "above"),
+    "engine_oil_temp_c": (120.0, "above"),
+    "battery_soc_pct": (20.0, "below"),
+    "battery_soh_pct": (80.0, "below"),
+}
+
+# Diagnosed component -> metric that shows the failure
+COMPONENT_METRICS = {
+    "engine_coolant_system": "engine_coolant_temp_c",
+    "engine_oil_system": "engine_oil_temp_c",
+    "battery": "battery_soc_pct",
+    "engine": "engine_rpm",
+    "transmission": "speed_kmph",
+    "brake_system": "speed_kmph",
+}
+
+# (driver, effect) -> (root cause, recommended action, expected correlation sign)
+# for chains that can be explained without the LLM
+CAUSAL_EXPLANATIONS = {
+    ("engine_rpm", "engine_coolant_temp_c"): (
+        "Coolant temperature tracks engine load (RPM) with a lag - the cooling system cannot reject heat under load, indicating insufficient coolant circulation or radiator capacity",
+        "Inspect coolant pump, radiator and thermostat; flush and refill cooling system",
+        1,
+    ),
+    ("speed_kmph", "engine_coolant_temp_c"): (
+        "Coolant temperature rises with sustained vehicle speed - cooling capacity is insufficient under load, indicating restricted radiator airflow or reduced coolant flow",
+        "Inspect radiator, cooling fan and coolant pump; flush and refill cooling system",
+        1,
+    ),
+    ("engine_rpm", "engine_oil_temp_c"): (
+        "Engine oil temperature follows engine load (RPM) - oil is not being cooled under load, indicating degraded oil or a restricted oil cooler",
+        "Change engine oil and filter; inspect oil cooler and oil pump",
+        1,
+    ),
+    ("engine_coolant_temp_c", "engine_oil_temp_c"): (
+        "Cooling system overheating is propagating into the engine oil",
+        "Repair the cooling system fault first, then change engine oil and filter",
+        1,
+    ),
+    ("speed_kmph", "battery_soc_pct"): (
+        "Battery state of charge falls while driving - the charging system is not replenishing the battery under load",
+        "Test alternator / charging system and battery; replace faulty charging components",
+        -1,
+    ),
+    ("engine_rpm", "battery_soc_pct"): (
+        "Battery state of charge falls as engine speed varies - the charging system output is insufficient",
+        "Test alternator / charging system and battery; replace faulty charging components",
+        -1,
+    ),
+}
+
+MAX_LAG = 3
+MIN_CORRELATION = 0.6
+MIN_EVENTS = 5
+MAX_CHAINS = 5
+
+# Local resolution: top chain score and maximum (second score / top score)
+LOCAL_MIN_SCORE = 0.8
+LOCAL_MAX_AMBIGUITY = 0.7
+
+
+def build_matrix(context_window: List[dict]) -> tuple:
+    """
+    Time-ordered metric matrix (events x metrics) from a telemetry window.
+
+    Metrics missing from more than one event or constant over the window are
+    dropped; a single missing value is filled with the metric's mean.
+
+    Returns:
+        (metric names, matrix) - matrix is None if the window is too short
+    """
+    events = sorted(context_window or [], key=lambda e: str(e.get("timestamp_utc", "")))
+    if len(events) < MIN_EVENTS:
+        return [], None
+
+    raw = np.array(
+        [[_as_float(event.get(metric)) for metric in METRICS] for event in events],
+        dtype=float
+    )
+    missing = np.isnan(raw).sum(axis=0)
+    keep = missing <= 1
+    names = [metric for metric, k in zip(METRICS, keep) if k]
+    matrix = raw[:, keep]
+    if matrix.shape[1] == 0:
+        return [], None
+
+    col_means = np.nanmean(matrix, axis=0)
+    rows, cols = np.where(np.isnan(matrix))
+    matrix[rows, cols] = col_means[cols]
+
+    varying = matrix.std(axis=0) > 1e-9
+    return [n for n, v in zip(names, varying) if v], matrix[:, varying]
+
+
+def _as_float(value) -> float:
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def lagged_correlations(matrix: np.ndarray, max_lag: int = MAX_LAG) -> np.ndarray:
+    """
+    Cross-correlations for lags 0..max_lag.
+
+    Returns:
+        Array C of shape (max_lag + 1, m, m) where C[k, i, j] is the
+        correlation of metric i at time t with metric j at time t + k
+        (i leads j by k events)
+    """
+    n, m = matrix.shape
+    max_lag = max(0, min(max_lag, n - 3))  # keep at least 3 overlapping events
+    result = np.zeros((max_lag + 1, m, m))
+    for lag in range(max_lag + 1):
+        lead = matrix[:n - lag]
+        follow = matrix[lag:]
+        lead_z = (lead - lead.mean(axis=0)) / (lead.std(axis=0) + 1e-12)
+        follow_z = (follow - follow.mean(axis=0)) / (follow.std(axis=0) + 1e-12)
+        result[lag] = lead_z.T @ follow_z / (n - lag)
+    return result
+
+
+def slopes(matrix: np.ndarray) -> np.ndarray:
+    """Least-squares slope of every metric per event (vectorized over metrics)."""
+    t = np.arange(matrix.shape[0], dtype=float)
+    t -= t.mean()
+    return t @ (matrix - matrix.mean(axis=0)) / (t @ t)
+
+
+def onset_order(names: List[str], matrix: np.ndarray) -> Dict[str, int]:
+    """Index of the first event at which each thresholded metric turns abnormal."""
+    onsets = {}
+    for col, name in enumerate(names):
+        if name not in ONSET_THRESHOLDS:
+            continue
+        threshold, direction = ONSET_THRESHOLDS[name]
+        crossed = matrix[:, col] > threshold if direction == "above" else matrix[:, col] < threshold
+        if crossed.any():
+            onsets[name] = int(np.argmax(crossed))
+    return onsets
+
+
+def analyze(context_window: List[dict], component: Optional[str] = None) -> Optional[dict]:
+    """
+    Rank candidate causal chains in a context window.
+
+    Args:
+        context_window: Telemetry events (any order)
+        component: Diagnosed component; chains ending at its metric rank first
+
+    Returns:
+        Dict with chains (ranked), metric ranges, slopes, onsets, events and
+        ambiguity, or None if the window is too short to analyse
+    """
+    names, matrix = build_matrix(context_window)
+    if matrix is None or len(names) < 1:
+        return None
+
+    index = {name: i for i, name in enumerate(names)}
+    corr = lagged_correlations(matrix)
+    metric_slopes = slopes(matrix)
+    onsets = onset_order(names, matrix)
+    target = COMPONENT_METRICS.get(component)
+
+    # Directed edges: driver leads effect (lag >= 1) more strongly than the reverse
+    edges = []
+    if corr.shape[0] > 1:
+        leading = np.abs(corr[1:])             # (lags, m, m)
+        best_lag = leading.argmax(axis=0) + 1  # (m, m)
+        best = leading.max(axis=0)
+        for i, driver in enumerate(names):
+            for j, effect in enumerate(names):
+                if i == j or best[i, j] < MIN_CORRELATION or best[i, j] <= best[j, i]:
+                    continue
+                lag = int(best_lag[i, j])
+                edges.append({
+                    "driver": driver,
+                    "effect": effect,
+                    "lag": lag,
+                    "correlation": round(float(corr[lag, i, j]), 3),
+                    "strength": float(best[i, j]),
+                })
+
+    chains = []
+    for edge in edges:
+        chains.append(_score_chain([edge], onsets, target))
+        # Extend to two hops: driver -> effect -> next effect
+        for nxt in edges:
+            if nxt["driver"] == edge["effect"] and nxt["effect"] != edge["driver"]:
+                chains.append(_score_chain([edge, nxt], onsets, target))
+
+    chains.sort(key=lambda c: c["score"], reverse=True)
+    chains = chains[:MAX_CHAINS]
+
+    # Ambiguity: best competing explanation relative to the top chain. Chains
+    # that merely extend the top chain by a hop are not competitors.
+    ambiguity = 0.0
+    if chains and chains[0]["score"] > 0:
+        top = chains[0]["chain"]
+        competitors = [c["score"] for c in chains[1:] if not _contains(c["chain"], top)]
+        if competitors:
+            ambiguity = round(max(competitors) / chains[0]["score"], 3)
+
+    return {
+        "events": int(matrix.shape[0]),
+        "target_metric": target,
+        "chains": chains,
+        "ranges": {
+            name: [round(float(matrix[:, index[name]].min()), 2), round(float(matrix[:, index[name]].max()), 2)]
+            for name in names
+        },
+        "slopes_per_event": {name: round(float(metric_slopes[index[name]]), 3) for name in names},
+        "onsets": onsets,
+        "ambiguity": ambiguity,
+    }
+
+
+def _contains(chain: List[str], sub: List[str]) -> bool:
+    """True if sub appears as a contiguous run in chain."""
+    return any(chain[i:i + len(sub)] == sub for i in range(len(chain) - len(sub) + 1))
+
+
+def _score_chain(edges: List[dict], onsets: Dict[str, int], target: Optional[str]) -> dict:
+    """Score a chain by its weakest link, onset consistency and whether it explains the target."""
+    path = [edges[0]["driver"]] + [edge["effect"] for edge in edges]
+    score = min(edge["strength"] for edge in edges)
+
+    # Onsets (where known) must not contradict the chain's direction
+    known = [onsets[m] for m in path if m in onsets]
+    onset_consistent = all(a <= b for a, b in zip(known, known[1:]))
+    if not onset_consistent:
+        score *= 0.5
+    if target is not None and path[-1] != target:
+        score *= 0.6
+    # Prefer shorter explanations
+    score *= 0.9 ** (len(edges) - 1)
+
+    return {
+        "chain": path,
+        "lags": [edge["lag"] for edge in edges],
+        "correlations": [edge["correlation"] for edge in edges],
+        "onset_consistent": onset_consistent,
+        "score": round(score, 3),
+    }
+
+
+def resolve_locally(analysis: Optional[dict]) -> Optional[dict]:
+    """
+    Root cause for a low-ambiguity single-hop chain with a known explanation.
+
+    Returns:
+        Dict with root_cause, recommended_action, capa_type and confidence,
+        or None if the LLM is needed
+    """
+    if not analysis or not analysis["chains"]:
+        return None
+    top = analysis["chains"][0]
+    if top["score"] < LOCAL_MIN_SCORE or analysis["ambiguity"] > LOCAL_MAX_AMBIGUITY:
+        return None
+    if len(top["chain"]) != 2 or top["chain"][-1] != analysis["target_metric"]:
+        return None
+    explanation = CAUSAL_EXPLANATIONS.get(tuple(top["chain"]))
+    if explanation is None:
+        return None
+
+    root_cause, action, sign = explanation
+    if np.sign(top["correlations"][0]) != sign:
+        return None
+    driver, effect = top["chain"]
+    evidence = f" ({driver} leads {effect} by {top['lags'][0]} event(s), r={top['correlations'][0]})"
+    return {
+        "root_cause": root_cause + evidence,
+        "recommended_action": action,
+        "capa_type": "Corrective",
+        "confidence": round(min(0.9, top["score"] * (1 - 0.5 * analysis["ambiguity"])), 2),
+    }
@@ -11,11 +11,16 @@ import re
 import time
 import random
 from datetime import datetime
+from typing import Optional
 from google.cloud import pubsub_v1, firestore, bigquery
 import functions_framework
 import vertexai
 from vertexai.preview.generative_models import GenerativeModel
 from google.api_core import exceptions
+from dtc_decoder import collect_codes, summarize_codes
+from case_dossier import append_stage, load_dossier
+from rca_index import RCAIndex, case_tokens, MIN_INDEX_CONFIDENCE
+from causal_analysis import analyze, resolve_locally
 
 # Vertex AI configuration
 # Read and validate environment variables
@@ -41,6 +46,10 @@ print(f"DEBUG: LOCATION_RAW={LOCATION_RAW}, LOCATION={LOCATION}")
 # Pub/Sub configuration
 RCA_TOPIC_NAME = "navigo-rca-complete"
 
+# Similarity index over past RCAs (warmed once per instance, then updated incrementally)
+RCA_INDEX_WARM_LIMIT = 20000
+_rca_index = None
+
 # BigQuery configuration
 DATASET_ID = "telemetry"
 TABLE_ID = "rca_cases"
@@ -56,7 +65,7 @@ CRITICAL INSTRUCTIONS - READ CAREFULLY:
 
 ROOT CAUSE ANALYSIS APPROACH:
 1. Look at the component that is failing
-2. Analyze telemetry patterns in context_window (temperature trends, RPM patterns, etc.)
+2. Analyze telemetry patterns: use the ranked chains in causal_analysis (lagged correlations, slopes, onset order), or context_window when causal_analysis is absent
 3. Identify the underlying cause (not just the symptom)
 4. Root cause should be specific, technical, and actionable
 5. Examples: "Coolant pump failure causing insufficient circulation", "Battery cell degradation due to excessive discharge cycles", "Transmission fluid leak from worn seal"
@@ -89,7 +98,16 @@ INPUT FORMAT (you will receive):
   "failure_probability": float,
   "estimated_rul_days": int,
   "severity": "Low" | "Medium" | "High",
-  "context_window": [array of telemetry events]
+  "causal_analysis": {
+    "events": int (number of telemetry events analysed),
+    "target_metric": "string" (metric that shows the component failure),
+    "chains": [ranked candidate causal chains: {"chain": [driver, ..., effect], "lags": [events], "correlations": [float], "onset_consistent": bool, "score": float}],
+    "ranges": {metric: [min, max]},
+    "slopes_per_event": {metric: float},
+    "onsets": {metric: index of first event outside normal range},
+    "ambiguity": float (0 = one clear explanation, 1 = competing explanations equally likely)
+  },
+  "context_window": [array of telemetry events] (only sent when causal_analysis is unavailable)
 }
 
 OUTPUT FORMAT (you MUST return EXACTLY this JSON structure):
@@ -155,13 +173,79 @@ def extract_json_from_response(text: str) -> dict:
         raise
 
 
+def build_dtc_rca(vehicle_id: str, component: str, dtc_summary: dict) -> Optional[dict]:
+    """
+    Build an RCA result from decoded DTCs without calling Gemini.
+
+    Returns None unless every code resolved and the DTCs attribute the fault
+    to the diagnosed component.
+    """
+    if dtc_summary["unresolved"] or dtc_summary["primary_component"] != component:
+        return None
+
+    findings = sorted(
+        (f for f in dtc_summary["findings"] if f["component"] == component),
+        key=lambda f: f["severity"],
+        reverse=True
+    )
+    descriptions = []
+    for finding in findings:
+        if finding["description"] not in descriptions:
+            descriptions.append(finding["description"])
+    codes = ", ".join(f["code"] for f in findings)
+
+    # Confidence grows with the share of codes that point at this component
+    coverage = len(findings) / len(dtc_summary["findings"])
+    return {
+        "vehicle_id": vehicle_id,
+        "root_cause": f"{'; '.join(descriptions)} (DTC {codes})",
+        "confidence": round(0.6 + 0.3 * coverage, 2),
+        "recommended_action": findings[0]["recommended_action"],
+        "capa_type": "Corrective"
+    }
+
+
+def get_rca_index(db) -> RCAIndex:
+    """
+    Return the in-process RCA similarity index, warming it from rca_cases on
+    first use. Only confident RCAs that were not themselves reused are indexed.
+    """
+    global _rca_index
+    if _rca_index is None:
+        index = RCAIndex()
+        query = db.collection("rca_cases")\
+                  .where("confidence", ">=", MIN_INDEX_CONFIDENCE)\
+                  .limit(RCA_INDEX_WARM_LIMIT)
+        cases = []
+        for doc in query.stream():
+            rca = doc.to_dict()
+            if rca.get("case_tokens") and rca.get("rca_method") != "similar_case":
+                cases.append((doc.id, rca["case_tokens"], index_payload(rca)))
+        index.add_many(cases)
+        print(f"Warmed RCA similarity index with {len(index)} cases")
+        _rca_index = index
+    return _rca_index
+
+
+def index_payload(rca_data: dict) -> dict:
+    """Fields of an RCA case that are kept in the similarity index."""
+    return {
+        "component": rca_data.get("component"),
+        "root_cause": rca_data.get("root_cause"),
+        "recommended_action": rca_data.get("recommended_action"),
+        "capa_type": rca_data.get("capa_type"),
+        "confidence": float(rca_data.get("confidence", 0.0)),
+    }
+
+
 @functions_framework.cloud_event
 def rca_agent(cloud_event):
     """
     Pub/Sub triggered function that:
     1. Receives diagnosis result event
     2. Fetches diagnosis case and telemetry context from Firestore
-    3. Uses Gemini 2.5 Flash to perform root cause analysis
+    3. Resolves DTC-driven failures, closely matching past RCAs and clear causal
+       chains locally, otherwise uses Gemini 2.5 Flash for root cause analysis
     4. Stores RCA result and publishes to Pub/Sub
     """
     
@@ -228,21 +312,29 @@ def rca_agent(cloud_event):
             print(f"RCA already exists for diagnosis {diagnosis_id} - rca_id: {existing_rca_id}. Skipping.")
             return {"status": "skipped", "message": "RCA already exists", "rca_id": existing_rca_id}
         
-        # 3. Fetch diagnosis case from Firestore
+        # 3. Fetch diagnosis from the case dossier (one read), falling back to diagnosis_cases
         diagnosis_ref = db.collection("diagnosis_cases").document(diagnosis_id)
-        diagnosis_doc = diagnosis_ref.get()
-        
-        if not diagnosis_doc.exists:
-            print(f"Diagnosis case {diagnosis_id} not found")
-            return {"status": "error", "error": "Diagnosis case not found"}
-        
-        diagnosis_data = diagnosis_doc.to_dict()
+        dossier = load_dossier(db, case_id)
+        diagnosis_data = dossier.get("diagnosis")
         
-        # Check if diagnosis status is already beyond RCA (prevent processing if already completed)
-        diagnosis_status = diagnosis_data.get("status", "")
-        if diagnosis_status in ["rca_complete", "scheduled", "engaged", "completed"]:
-            print(f"Diagnosis {diagnosis_id} status is {diagnosis_status} - RCA already completed. Skipping.")
-            return {"status": "skipped", "message": f"Diagnosis already {diagnosis_status}"}
+        if diagnosis_data and diagnosis_data.get("diagnosis_id") == diagnosis_id:
+            if "rca" in dossier.get("stages", []):
+                print(f"Dossier for case {case_id} already has an RCA. Skipping.")
+                return {"status": "skipped", "message": "Diagnosis already rca_complete"}
+        else:
+            diagnosis_doc = diagnosis_ref.get()
+            
+            if not diagnosis_doc.exists:
+                print(f"Diagnosis case {diagnosis_id} not found")
+                return {"status": "error", "error": "Diagnosis case not found"}
+            
+            diagnosis_data = diagnosis_doc.to_dict()
+            
+            # Check if diagnosis status is already beyond RCA (prevent processing if already completed)
+            diagnosis_status = diagnosis_data.get("status", "")
+            if diagnosis_status in ["rca_complete", "scheduled", "engaged", "completed"]:
+                print(f"Diagnosis {diagnosis_id} status is {diagnosis_status} - RCA already completed. Skipping.")
+                return {"status": "skipped", "message": f"Diagnosis already {diagnosis_status}"}
         
         # Use data from message or fallback to diagnosis document
         component = component or diagnosis_data.get("component")
@@ -250,11 +342,12 @@ def rca_agent(cloud_event):
         estimated_rul_days = estimated_rul_days if estimated_rul_days is not None else diagnosis_data.get("estimated_rul_days")
         severity = severity or diagnosis_data.get("severity")
         
-        # 4. Fetch context window using event IDs stored in diagnosis
+        # 4. Context window from the dossier, or fetch it using event IDs stored in diagnosis
         context_event_ids = diagnosis_data.get("context_event_ids", [])
-        context_window = []
+        context_window = dossier.get("telemetry_window")
         
-        if context_event_ids:
+        if context_window is None:
+            context_window = []
             for event_id in context_event_ids:
                 event_doc = db.collection("telemetry_events").document(event_id).get()
                 if event_doc.exists:
@@ -274,67 +367,118 @@ def rca_agent(cloud_event):
             "context_window": context_window
         }
         
-        # 6. Initialize Vertex AI and call Gemini 2.5 Flash
-        # Validate PROJECT_ID and LOCATION before initialization
-        if not PROJECT_ID or " " in PROJECT_ID or "=" in PROJECT_ID:
-            raise ValueError(f"Invalid PROJECT_ID: '{PROJECT_ID}'. Must be a single word without spaces or equals signs.")
-        if not LOCATION or " " in LOCATION or "=" in LOCATION:
-            raise ValueError(f"Invalid LOCATION: '{LOCATION}'. Must be a single word without spaces or equals signs.")
-        
-        print(f"Initializing Vertex AI with project={PROJECT_ID}, location={LOCATION}")
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-        model = GenerativeModel("gemini-2.5-flash")
-        
-        prompt = f"{SYSTEM_PROMPT}\n\nAnalyze this diagnosis data:\n{json.dumps(input_data, default=str, indent=2)}\n\nReturn ONLY the JSON response matching the output format specified above."
-        
-        # Add longer random delay (0-10 seconds) to spread out concurrent requests and reduce rate limiting
-        jitter = random.uniform(0, 10)
-        print(f"Adding {jitter:.2f}s jitter delay to spread out requests...")
-        time.sleep(jitter)
+        # 6. DTC-driven cases are resolved from the local DTC knowledge base
+        dtc_summary = summarize_codes(collect_codes(context_window))
+        result = build_dtc_rca(vehicle_id, component, dtc_summary)
+        rca_method = "dtc"
         
-        # Additional check: Before calling Gemini, verify no duplicate RCA was created during jitter delay
-        quick_check = list(db.collection("rca_cases")
-            .where("diagnosis_id", "==", diagnosis_id)
-            .limit(1).stream())
-        
-        if quick_check:
-            existing_rca_id = quick_check[0].id
-            print(f"Skipping Gemini call for diagnosis {diagnosis_id} - duplicate RCA {existing_rca_id} detected after jitter delay")
-            return {"status": "skipped", "message": "Duplicate detected after jitter", "rca_id": existing_rca_id}
-        
-        # Call Gemini with retry logic for rate limiting (429 errors)
-        max_retries = 5
-        retry_delay = 2  # Start with 2 seconds
-        response = None
-        response_text = None
+        # 6b. Otherwise reuse a validated past RCA for a closely matching case
+        anomaly_type = (dossier.get("anomaly") or {}).get("anomaly_type")
+        tokens = case_tokens(component, anomaly_type, severity, context_window)
+        reused_from = None
+        rca_index = None
+        try:
+            rca_index = get_rca_index(db)
+            if result is None:
+                match = rca_index.match(tokens, component)
+                if match:
+                    rca_method = "similar_case"
+                    reused_from = match["rca_id"]
+                    result = {
+                        "vehicle_id": vehicle_id,
+                        "root_cause": match["root_cause"],
+                        "confidence": round(min(match["confidence"], match["similarity"]), 2),
+                        "recommended_action": match["recommended_action"],
+                        "capa_type": match["capa_type"]
+                    }
+                    print(f"Reusing RCA {reused_from} (similarity {match['similarity']}) for diagnosis {diagnosis_id}")
+        except Exception as index_error:
+            print(f"RCA similarity lookup failed (non-blocking): {str(index_error)}")
+        
+        # 6c. Rank candidate causal chains in the context window; clear-cut chains resolve locally
+        causal_analysis = None
+        try:
+            causal_analysis = analyze(context_window, component)
+        except Exception as causal_error:
+            print(f"Causal analysis failed (non-blocking): {str(causal_error)}")
+        
+        if result is None:
+            local = resolve_locally(causal_analysis)
+            if local:
+                rca_method = "causal"
+                result = {"vehicle_id": vehicle_id, **local}
+                print(f"Resolved RCA locally from causal chain {causal_analysis['chains'][0]['chain']}")
+        
+        if result is None:
+            # No decoded DTCs, similar past case or clear causal chain - call Gemini 2.5 Flash
+            rca_method = "llm"
+            if causal_analysis:
+                # Send the ranked chains instead of the raw window (much smaller prompt)
+                input_data.pop("context_window", None)
+                input_data["causal_analysis"] = causal_analysis
+            if dtc_summary["findings"] or dtc_summary["unresolved"]:
+                input_data["dtc_findings"] = dtc_summary
+            
+            # Validate PROJECT_ID and LOCATION before initialization
+            if not PROJECT_ID or " " in PROJECT_ID or "=" in PROJECT_ID:
+                raise ValueError(f"Invalid PROJECT_ID: '{PROJECT_ID}'. Must be a single word without spaces or equals signs.")
+            if not LOCATION or " " in LOCATION or "=" in LOCATION:
+                raise ValueError(f"Invalid LOCATION: '{LOCATION}'. Must be a single word without spaces or equals signs.")
+        
+            print(f"Initializing Vertex AI with project={PROJECT_ID}, location={LOCATION}")
+            vertexai.init(project=PROJECT_ID, location=LOCATION)
+            model = GenerativeModel("gemini-2.5-flash")
+        
+            prompt = f"{SYSTEM_PROMPT}\n\nAnalyze this diagnosis data:\n{json.dumps(input_data, default=str, indent=2)}\n\nReturn ONLY the JSON response matching the output format specified above."
+        
+            # Add longer random delay (0-10 seconds) to spread out concurrent requests and reduce rate limiting
+            jitter = random.uniform(0, 10)
+            print(f"Adding {jitter:.2f}s jitter delay to spread out requests...")
+            time.sleep(jitter)
+        
+            # Additional check: Before calling Gemini, verify no duplicate RCA was created during jitter delay
+            quick_check = list(db.collection("rca_cases")
+                .where("diagnosis_id", "==", diagnosis_id)
+                .limit(1).stream())
+        
+            if quick_check:
+                existing_rca_id = quick_check[0].id
+                print(f"Skipping Gemini call for diagnosis {diagnosis_id} - duplicate RCA {existing_rca_id} detected after jitter delay")
+                return {"status": "skipped", "message": "Duplicate detected after jitter", "rca_id": existing_rca_id}
+        
+            # Call Gemini with retry logic for rate limiting (429 errors)
+            max_retries = 5
+            retry_delay = 2  # Start with 2 seconds
+            response = None
+            response_text = None
+        
+            for attempt in range(max_retries):
+                try:
+                    response = model.generate_content(prompt)
+                    response_text = response.text
+                    break  # Success, exit retry loop
+                except exceptions.ResourceExhausted as e:
+                    if attempt < max_retries - 1:
+                        # Exponential backoff with jitter: 2s, 4s, 8s, 16s, 32s
+                        wait_time = retry_delay * (2 ** attempt) + random.uniform(0, 1)
+                        print(f"Rate limit hit (429), retrying in {wait_time:.2f}s (attempt {attempt + 1}/{max_retries})...")
+                        time.sleep(wait_time)
+                    else:
+                        # Last attempt failed
+                        print(f"Rate limit error after {max_retries} attempts: {str(e)}")
+                        raise
+                except Exception as e:
+                    # For other errors, don't retry
+                    print(f"Error calling Gemini: {str(e)}")
+                    raise
         
-        for attempt in range(max_retries):
+            # 7. Parse Gemini response
             try:
-                response = model.generate_content(prompt)
-                response_text = response.text
-                break  # Success, exit retry loop
-            except exceptions.ResourceExhausted as e:
-                if attempt < max_retries - 1:
-                    # Exponential backoff with jitter: 2s, 4s, 8s, 16s, 32s
-                    wait_time = retry_delay * (2 ** attempt) + random.uniform(0, 1)
-                    print(f"Rate limit hit (429), retrying in {wait_time:.2f}s (attempt {attempt + 1}/{max_retries})...")
-                    time.sleep(wait_time)
-                else:
-                    # Last attempt failed
-                    print(f"Rate limit error after {max_retries} attempts: {str(e)}")
-                    raise
+                result = extract_json_from_response(response_text)
             except Exception as e:
-                # For other errors, don't retry
-                print(f"Error calling Gemini: {str(e)}")
-                raise
-        
-        # 7. Parse Gemini response
-        try:
-            result = extract_json_from_response(response_text)
-        except Exception as e:
-            print(f"Error parsing Gemini response: {e}")
-            print(f"Response text: {response_text}")
-            raise ValueError(f"Invalid JSON response from Gemini: {e}")
+                print(f"Error parsing Gemini response: {e}")
+                print(f"Response text: {response_text}")
+                raise ValueError(f"Invalid JSON response from Gemini: {e}")
         
         # 8. Validate result matches schema
         if result.get("vehicle_id") != vehicle_id:
@@ -352,6 +496,11 @@ def rca_agent(cloud_event):
             "confidence": float(result.get("confidence", 0.0)),
             "recommended_action": result.get("recommended_action"),
             "capa_type": result.get("capa_type"),
+            "rca_method": rca_method,
+            "component": component,
+            "case_tokens": tokens,
+            "reused_from": reused_from,
+            "causal_chains": causal_analysis["chains"][:3] if causal_analysis else [],
             "status": "pending_scheduling",
             "created_at": firestore.SERVER_TIMESTAMP
         }
@@ -391,6 +540,11 @@ def rca_agent(cloud_event):
         # 10. Store in Firestore
         db.collection("rca_cases").document(rca_id).set(rca_data)
         print(f"Created RCA case {rca_id} for vehicle {vehicle_id}")
+        append_stage(db, case_id, "rca", rca_data)
+        
+        # Make confident new RCAs available for reuse on this instance right away
+        if rca_index is not None and rca_method != "similar_case" and rca_data["confidence"] >= MIN_INDEX_CONFIDENCE:
+            rca_index.add(rca_id, tokens, index_payload(rca_data))
         
         # 11. Update diagnosis case status
         diagnosis_ref.update({"status": "rca_complete"})
@@ -0,0 +1,234 @@
+"""
+Similarity index over historical RCA cases for the rca_agent Cloud Function.
+
+A case is described by a set of tokens (component, anomaly signature, DTCs and
+quantized summary statistics of the context window). Token sets are compressed
+to MinHash signatures and bucketed with LSH banding, so a lookup only compares
+the new case against the few past cases that share a band - not the full
+history.
+
+When a new case closely matches a validated past RCA, main.py reuses that
+RCA's root_cause, recommended_action and capa_type instead of calling Gemini.
+"""
+
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# MinHash / LSH parameters: NUM_PERM = BANDS * ROWS_PER_BAND.
+# With 16 bands of 4 rows, pairs at Jaccard 0.8 collide in at least one band
+# with probability ~0.9995; pairs at 0.3 only ~12% of the time.
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+
+# Estimated Jaccard similarity needed to reuse a past RCA
+REUSE_SIMILARITY = 0.85
+
+# Only confident RCAs are indexed (reused RCAs are never re-indexed)
+MIN_INDEX_CONFIDENCE = 0.8
+
+# Multiply-shift hashing: h_i(x) = (a_i * x + b_i) >> 32 (uint64 wraparound)
+_rng = np.random.RandomState(20241211)  # fixed seed - signatures must be stable across instances
+_PERM_A = _rng.randint(0, 2 ** 63 - 1, size=NUM_PERM, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+_PERM_B = _rng.randint(0, 2 ** 63 - 1, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_SHIFT = np.uint64(32)
+_EMPTY = np.uint32(0xFFFFFFFF)
+
+# Token sets hashed per chunk in minhash_many (bounds the NUM_PERM x tokens matrix)
+_CHUNK_SETS = 8192
+
+# telemetry signal -> bucket width used to quantize its summary statistics
+SIGNAL_BUCKETS = {
+    "engine_coolant_temp_c": 5.0,
+    "engine_oil_temp_c": 5.0,
+    "engine_rpm": 500.0,
+    "battery_soc_pct": 10.0,
+    "battery_soh_pct": 5.0,
+    "speed_kmph": 20.0,
+}
+
+
+def case_tokens(component: Optional[str], anomaly_type: Optional[str], severity: Optional[str],
+                context_window: List[dict]) -> List[str]:
+    """
+    Token set describing a case: component, anomaly signature, DTCs and
+    quantized max / mean / trend of each telemetry signal in the window.
+    """
+    tokens = {f"component:{component}", f"anomaly:{anomaly_type}", f"severity:{severity}"}
+
+    for event in context_window or []:
+        for code in event.get("dtc_codes") or []:
+            tokens.add(f"dtc:{str(code).strip().upper()}")
+
+    for signal, width in SIGNAL_BUCKETS.items():
+        values = []
+        for event in context_window or []:
+            value = event.get(signal)
+            if isinstance(value, (int, float)):
+                values.append(float(value))
+        if not values:
+            continue
+        tokens.add(f"{signal}:max:{int(max(values) // width)}")
+        tokens.add(f"{signal}:mean:{int((sum(values) / len(values)) // width)}")
+        change = values[-1] - values[0]
+        trend = "flat" if abs(change) < width else ("up" if change > 0 else "down")
+        tokens.add(f"{signal}:trend:{trend}")
+
+    return sorted(tokens)
+
+
+def _permute(hashes: np.ndarray) -> np.ndarray:
+    """All NUM_PERM hash permutations of the token hashes (NUM_PERM x len(hashes))."""
+    return ((np.outer(_PERM_A, hashes) + _PERM_B[:, None]) >> _SHIFT).astype(np.uint32)
+
+
+def _token_hashes(tokens: Iterable[str]) -> np.ndarray:
+    return np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint64)
+
+
+def minhash(tokens: Iterable[str]) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of a token set."""
+    hashes = _token_hashes(tokens)
+    if hashes.size == 0:
+        return np.full(NUM_PERM, _EMPTY, dtype=np.uint32)
+    return _permute(hashes).min(axis=1)
+
+
+def minhash_many(token_sets: List[List[str]]) -> np.ndarray:
+    """MinHash signatures for many token sets at once (one row per set)."""
+    signatures = np.full((len(token_sets), NUM_PERM), _EMPTY, dtype=np.uint32)
+    for start in range(0, len(token_sets), _CHUNK_SETS):
+        chunk = token_sets[start:start + _CHUNK_SETS]
+        lengths = np.array([len(tokens) for tokens in chunk], dtype=np.int64)
+        nonempty = lengths > 0
+        if not nonempty.any():
+            continue
+        hashes = _token_hashes(t for tokens in chunk for t in tokens)
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        # Min over each set's run of columns
+        mins = np.minimum.reduceat(_permute(hashes), offsets[nonempty], axis=1).T
+        signatures[start:start + len(chunk)][nonempty] = mins
+    return signatures
+
+
+class RCAIndex:
+    """
+    In-memory MinHash/LSH index of past RCA cases.
+
+    Signatures live in one growable numpy matrix, so candidate similarities are
+    computed in a single vectorized comparison. Inserts are incremental.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._signatures = np.empty((capacity, NUM_PERM), dtype=np.uint32)
+        self._payloads: List[dict] = []
+        self._ids: Dict[str, int] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def __contains__(self, rca_id: str) -> bool:
+        return rca_id in self._ids
+
+    @staticmethod
+    def _band_keys(signatures: np.ndarray) -> List[List[bytes]]:
+        """LSH band keys (ROWS_PER_BAND values as bytes) for each signature row."""
+        rows = np.ascontiguousarray(signatures.reshape(-1, NUM_PERM))
+        band_dtype = np.dtype((np.void, ROWS_PER_BAND * rows.dtype.itemsize))
+        return rows.view(band_dtype).reshape(len(rows), BANDS).tolist()
+
+    def add(self, rca_id: str, tokens: Iterable[str], payload: dict) -> bool:
+        """
+        Insert one RCA case.
+
+        Args:
+            rca_id: RCA case ID (duplicates are ignored)
+            tokens: case_tokens() of the case
+            payload: Fields returned on a match (root_cause, recommended_action, ...)
+
+        Returns:
+            True if the case was inserted
+        """
+        if rca_id in self._ids:
+            return False
+        signature = minhash(tokens)
+        row = len(self._payloads)
+        if row == self._signatures.shape[0]:
+            grown = np.empty((row * 2, NUM_PERM), dtype=np.uint32)
+            grown[:row] = self._signatures
+            self._signatures = grown
+        self._signatures[row] = signature
+        self._payloads.append({**payload, "rca_id": rca_id})
+        self._ids[rca_id] = row
+        for band, key in enumerate(self._band_keys(signature)[0]):
+            self._buckets[band].setdefault(key, []).append(row)
+        return True
+
+    def add_many(self, cases: List[tuple]) -> int:
+        """
+        Bulk insert (rca_id, tokens, payload) tuples - used to warm the index.
+
+        Returns:
+            Number of cases inserted
+        """
+        cases = [case for case in cases if case[0] not in self._ids]
+        if not cases:
+            return 0
+        signatures = minhash_many([list(tokens) for _, tokens, _ in cases])
+        start = len(self._payloads)
+        needed = start + len(cases)
+        if needed > self._signatures.shape[0]:
+            grown = np.empty((max(needed, self._signatures.shape[0] * 2), NUM_PERM), dtype=np.uint32)
+            grown[:start] = self._signatures[:start]
+            self._signatures = grown
+        self._signatures[start:needed] = signatures
+
+        band_keys = self._band_keys(signatures)
+        inserted = 0
+        for offset, (rca_id, _, payload) in enumerate(cases):
+            if rca_id in self._ids:
+                continue  # duplicate within the batch
+            row = start + inserted
+            self._signatures[row] = signatures[offset]
+            self._payloads.append({**payload, "rca_id": rca_id})
+            self._ids[rca_id] = row
+            for band, key in enumerate(band_keys[offset]):
+                self._buckets[band].setdefault(key, []).append(row)
+            inserted += 1
+        return inserted
+
+    def query(self, tokens: Iterable[str], component: Optional[str] = None) -> Optional[dict]:
+        """
+        Most similar indexed case.
+
+        Args:
+            tokens: case_tokens() of the new case
+            component: If given, only cases for this component can match
+
+        Returns:
+            Matched payload plus "similarity" (estimated Jaccard), or None
+        """
+        signature = minhash(tokens)
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)[0]):
+            candidates.update(self._buckets[band].get(key, ()))
+        if component is not None:
+            candidates = {row for row in candidates if self._payloads[row].get("component") == component}
+        if not candidates:
+            return None
+
+        rows = np.fromiter(candidates, dtype=np.int64)
+        similarities = (self._signatures[rows] == signature).mean(axis=1)
+        best = int(np.argmax(similarities))
+        return {**self._payloads[rows[best]], "similarity": round(float(similarities[best]), 3)}
+
+    def match(self, tokens: Iterable[str], component: Optional[str],
+              threshold: float = REUSE_SIMILARITY) -> Optional[dict]:
+        """query() restricted to the component, returning only matches at or above threshold."""
+        result = self.query(tokens, component=component)
+        if result is None or result["similarity"] < threshold:
+            return None
+        return result
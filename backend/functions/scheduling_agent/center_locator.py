@@ -0,0 +1,181 @@
+"""
+Spatial index over service centers for the scheduling_agent Cloud Function.
+
+Centers are stored in a KD-tree over unit vectors on the sphere (x, y, z), so
+straight-line (chord) distance orders centers exactly like great-circle
+distance and there is no special case at the poles or the date line.
+nearest() walks the tree best-first and applies the caller's predicate
+(part in stock, free capacity) as centers come out in distance order - it
+stops after k matches instead of scanning every center.
+"""
+
+import heapq
+import math
+from typing import Callable, Dict, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 8
+
+# Centers returned per lookup
+NEAREST_CENTERS = 5
+
+
+def to_unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    phi, lam = math.radians(lat), math.radians(lon)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+
+def chord_to_km(chord: float) -> float:
+    """Chord length on the unit sphere -> great-circle distance in km."""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def center_location(center: dict) -> Optional[Tuple[float, float]]:
+    """(lat, lon) of a service center document, or None if missing / invalid."""
+    location = center.get("location") or {}
+    try:
+        lat, lon = float(location["lat"]), float(location["lon"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def last_gps_fix(events: List[dict]) -> Optional[Tuple[float, float]]:
+    """Most recent valid (gps_lat, gps_lon) in a list of telemetry events."""
+    for event in sorted(events or [], key=lambda e: str(e.get("timestamp_utc", "")), reverse=True):
+        try:
+            lat, lon = float(event["gps_lat"]), float(event["gps_lon"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            return lat, lon
+    return None
+
+
+class _Node:
+    __slots__ = ("axis", "split", "left", "right", "items", "lo", "hi")
+
+    def __init__(self):
+        self.axis = self.split = self.left = self.right = self.items = None
+        self.lo = self.hi = None
+
+
+class CenterIndex:
+    """KD-tree of service centers keyed by location."""
+
+    def __init__(self, centers: List[dict]):
+        self.centers = centers
+        self.unlocated = []
+        points = []
+        for center in centers:
+            location = center_location(center)
+            if location is None:
+                self.unlocated.append(center)
+            else:
+                points.append((to_unit_vector(*location), center))
+        self.root = self._build(points) if points else None
+        self.size = len(points)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _build(self, points: list) -> _Node:
+        node = _Node()
+        node.lo = tuple(min(p[0][d] for p in points) for d in range(3))
+        node.hi = tuple(max(p[0][d] for p in points) for d in range(3))
+        if len(points) <= LEAF_SIZE:
+            node.items = points
+            return node
+        node.axis = max(range(3), key=lambda d: node.hi[d] - node.lo[d])
+        points.sort(key=lambda p: p[0][node.axis])
+        mid = len(points) // 2
+        node.split = points[mid][0][node.axis]
+        node.left = self._build(points[:mid])
+        node.right = self._build(points[mid:])
+        return node
+
+    @staticmethod
+    def _box_distance(node: _Node, q: tuple) -> float:
+        """Lower bound on the chord distance from q to anything in node."""
+        return math.sqrt(sum(
+            (node.lo[d] - q[d]) ** 2 if q[d] < node.lo[d] else (q[d] - node.hi[d]) ** 2 if q[d] > node.hi[d] else 0.0
+            for d in range(3)
+        ))
+
+    def nearest(self, lat: float, lon: float, k: int = NEAREST_CENTERS,
+                predicate: Optional[Callable[[dict], bool]] = None) -> List[Tuple[float, dict]]:
+        """
+        k nearest centers satisfying predicate, closest first.
+
+        Args:
+            lat, lon: Query location (vehicle's last GPS fix)
+            k: Number of centers to return
+            predicate: Called on centers in distance order; only matches are returned
+
+        Returns:
+            List of (distance_km, center) tuples
+        """
+        if self.root is None or k <= 0:
+            return []
+        q = to_unit_vector(lat, lon)
+        results = []
+        counter = 0  # tie-breaker so heap never compares nodes/dicts
+        heap = [(0.0, counter, self.root, None)]
+        while heap and len(results) < k:
+            distance, _, node, center = heapq.heappop(heap)
+            if center is not None:
+                if predicate is None or predicate(center):
+                    results.append((round(chord_to_km(distance), 2), center))
+                continue
+            if node.items is not None:
+                for point, item in node.items:
+                    counter += 1
+                    heapq.heappush(heap, (math.dist(point, q), counter, None, item))
+            else:
+                for child in (node.left, node.right):
+                    counter += 1
+                    heapq.heappush(heap, (self._box_distance(child, q), counter, child, None))
+        return results
+
+
+def stocks_part(center: dict, part: Optional[str]) -> bool:
+    """True if the center lists part as available (or no part is required)."""
+    if not part:
+        return True
+    status = (center.get("spare_parts_availability") or {}).get(part)
+    if status is None:
+        status = (center.get("inventory") or {}).get(part)
+    return status == "available"
+
+
+# Index over the last-seen center list (warm across invocations on the same instance)
+_center_index: Optional[CenterIndex] = None
+_center_index_key: Optional[tuple] = None
+
+
+def get_center_index(centers: List[dict]) -> CenterIndex:
+    """Cached CenterIndex, rebuilt only when center IDs or locations change."""
+    global _center_index, _center_index_key
+    key = tuple((c.get("service_center_id"), center_location(c)) for c in centers)
+    if _center_index is None or key != _center_index_key:
+        _center_index = CenterIndex(centers)
+        _center_index_key = key
+    else:
+        # Same geometry - refresh the documents (parts / capacity may have changed)
+        by_id: Dict[str, dict] = {c.get("service_center_id"): c for c in centers}
+        _center_index.centers = centers
+        _refresh(_center_index.root, by_id)
+        _center_index.unlocated = [by_id.get(c.get("service_center_id"), c) for c in _center_index.unlocated]
+    return _center_index
+
+
+def _refresh(node: Optional[_Node], by_id: Dict[str, dict]) -> None:
+    if node is None:
+        return
+    if node.items is not None:
+        node.items = [(point, by_id.get(center.get("service_center_id"), center)) for point, center in node.items]
+        return
+    _refresh(node.left, by_id)
+    _refresh(node.right, by_id)
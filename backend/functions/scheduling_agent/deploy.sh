@@ -0,0 +1,40 @@
+#!/bin/bash
+
+# Deploy scheduling_batch and the Cloud Scheduler job that runs it
+# (requests are only queued for it when scheduling-agent runs with SCHEDULING_MODE=batch)
+
+echo "🚀 Deploying scheduling-batch function..."
+echo ""
+
+cd "$(dirname "$0")"
+
+gcloud functions deploy scheduling-batch \
+  --gen2 \
+  --runtime=python311 \
+  --region=us-central1 \
+  --source=. \
+  --entry-point=scheduling_batch \
+  --trigger-http \
+  --memory=1GB \
+  --timeout=300s \
+  --project=navigo-27206 \
+  --service-account=navigo-functions@navigo-27206.iam.gserviceaccount.com \
+  --no-allow-unauthenticated
+
+FUNCTION_URL=$(gcloud functions describe scheduling-batch --gen2 --region=us-central1 --project=navigo-27206 --format="value(serviceConfig.uri)")
+
+# Assign queued scheduling requests every 5 minutes
+gcloud scheduler jobs create http navigo-scheduling-batch \
+  --location=us-central1 \
+  --schedule="*/5 * * * *" \
+  --time-zone="Asia/Kolkata" \
+  --uri="$FUNCTION_URL" \
+  --http-method=POST \
+  --message-body='{}' \
+  --headers="Content-Type=application/json" \
+  --oidc-service-account-email=navigo-functions@navigo-27206.iam.gserviceaccount.com \
+  --project=navigo-27206 \
+  || echo "Scheduler job already exists (update with: gcloud scheduler jobs update http navigo-scheduling-batch ...)"
+
+echo ""
+echo "✅ Deployment complete!"
@@ -0,0 +1,199 @@
+"""
+Fleet-wide batch assignment of vehicles to service centers and slots.
+
+When many vehicles need service at once (e.g. a recall-like anomaly), the
+per-case scheduling_agent path lets every case race for the same first free
+slot with stale capacity. Batch mode queues requests and assigns them
+together with greedy-with-priority:
+
+1. Requests are ordered by urgency: slot_type (urgent first), then lowest
+   estimated_rul_days, then severity, then queue time.
+2. Each request considers the NEAREST_CENTERS nearest centers that stock its
+   part and still have capacity left in this batch.
+3. Within a center, slots are ranked once per urgency group (and component,
+   when the center has a technician roster, so only slots of qualified
+   technicians count) with the slot optimizer's scorers (rank_slots); the
+   request takes the cheapest slot not already taken in this batch. Across
+   centers, cost = slot cost + DISTANCE_COST_PER_KM * distance.
+4. The chosen slot and a unit of capacity are removed before the next
+   request, so later (less urgent) requests never displace earlier ones.
+
+The solver is pure - main.py loads requests and center state and writes the
+resulting bookings in batched Firestore commits.
+"""
+
+from datetime import datetime
+from itertools import islice
+from typing import Dict, List, Optional
+
+from center_locator import NEAREST_CENTERS, CenterIndex, stocks_part
+from slot_calendar import get_timezone, to_iso, to_minute
+from slot_optimizer import candidate_slots, classify_slot_type, parts_ready_after, pick_fallbacks, rank_slots
+from technician_roster import DEFAULT_MAX_DAILY_JOBS, TechnicianRoster, pick_technician
+
+# One day outside the urgency window costs 10 (window_scorer weight);
+# 0.05 per km makes 200 km as bad as one day outside the window
+DISTANCE_COST_PER_KM = 0.05
+
+# Best remaining slots considered for fallback_slots
+FALLBACK_CANDIDATES = 50
+
+SLOT_TYPE_PRIORITY = {"urgent": 0, "normal": 1, "delayed": 2}
+SEVERITY_PRIORITY = {"High": 0, "Medium": 1, "Low": 2}
+
+
+def request_priority(request: dict) -> tuple:
+    """Sort key - most urgent request first."""
+    rul = request.get("estimated_rul_days")
+    return (
+        SLOT_TYPE_PRIORITY[classify_slot_type(rul)],
+        rul if rul is not None else float("inf"),
+        SEVERITY_PRIORITY.get(request.get("severity"), 3),
+        str(request.get("queued_at") or ""),
+    )
+
+
+def center_state(center: dict, free_slots: List[int], capacity_left: int,
+                 daily_load: Optional[Dict[str, float]] = None,
+                 roster: Optional[TechnicianRoster] = None,
+                 technician_loads: Optional[Dict[str, Dict[str, int]]] = None) -> dict:
+    """
+    Mutable per-center state for one batch.
+
+    Args:
+        center: Service center document (with service_center_id)
+        free_slots: Unbooked candidate slots (epoch minutes)
+        capacity_left: Bookings the center can still take
+        daily_load: Forecast load by UTC date (demand_forecasts), if any
+        roster: Technician roster; centers in it only offer slots of technicians
+            qualified for each request's component
+        technician_loads: technician_id -> {"YYYY-MM-DD": booked jobs} (updated as the batch books)
+    """
+    technicians = center.get("technicians") or ["tech_1"]
+    slot_technicians: Dict[int, List[str]] = {}
+    for i, slot in enumerate(sorted(free_slots)):
+        slot_technicians.setdefault(slot, []).append(technicians[i % len(technicians)])
+    return {
+        "center": center,
+        "free_slots": free_slots,
+        "slot_technicians": slot_technicians,
+        "tz": get_timezone(center.get("timezone", "UTC")),
+        "capacity_left": capacity_left,
+        "taken": set(),
+        "rankings": {},
+        "daily_load": daily_load,
+        "roster": roster if roster is not None and roster.has_center(center.get("service_center_id")) else None,
+        "technician_loads": technician_loads if technician_loads is not None else {},
+        "skilled_slots": {},
+    }
+
+
+def _slot_technicians(state: dict, part: Optional[str], now: datetime) -> Dict[int, List[str]]:
+    """Slot -> technicians qualified for part (all technicians without a roster)."""
+    if state["roster"] is None:
+        return state["slot_technicians"]
+    slot_technicians = state["skilled_slots"].get(part)
+    if slot_technicians is None:
+        availability = state["roster"].availability(
+            state["center"], part, state["free_slots"], now, state["technician_loads"]
+        )
+        slot_technicians = candidate_slots(availability)
+        state["skilled_slots"][part] = slot_technicians
+    return slot_technicians
+
+
+def _ranked_slots(state: dict, now: datetime, slot_type: str, severity: Optional[str], ready: int,
+                  part: Optional[str]) -> List[tuple]:
+    key = (slot_type, severity, ready, part if state["roster"] is not None else None)
+    ranked = state["rankings"].get(key)
+    if ranked is None:
+        ranked = rank_slots(
+            to_minute(now), slot_type, severity, _slot_technicians(state, part, now), state["tz"], ready,
+            service_center=state["center"].get("service_center_id"),
+            daily_load=state.get("daily_load")
+        )
+        state["rankings"][key] = ranked
+    return ranked
+
+
+def assign_requests(requests: List[dict], states: Dict[str, dict], now: datetime,
+                    k: int = NEAREST_CENTERS) -> dict:
+    """
+    Assign a batch of scheduling requests.
+
+    Args:
+        requests: Dicts with request_id, vehicle_id, estimated_rul_days, severity,
+            component, location ({"lat", "lon"} or None) and queued_at
+        states: service_center_id -> center_state()
+        now: Current time (aware, UTC)
+        k: Centers considered per request
+
+    Returns:
+        {"assignments": [...], "unassigned": [...]} - each assignment carries the
+        SchedulingOutput fields plus request_id and distance_km
+    """
+    now_minute = to_minute(now)
+    index = CenterIndex([state["center"] for state in states.values()])
+    assignments, unassigned = [], []
+
+    for request in sorted(requests, key=request_priority):
+        part = request["component"].lower() if request.get("component") else None
+        slot_type = classify_slot_type(request.get("estimated_rul_days"))
+        severity = request.get("severity")
+
+        def usable(center: dict) -> bool:
+            state = states[center.get("service_center_id")]
+            return state["capacity_left"] > 0 and stocks_part(center, part)
+
+        location = request.get("location") or {}
+        if location.get("lat") is not None and location.get("lon") is not None:
+            options = index.nearest(location["lat"], location["lon"], k=k, predicate=usable)
+        else:
+            options = [(0.0, state["center"]) for state in states.values() if usable(state["center"])][:k]
+
+        best = None
+        for distance_km, center in options:
+            state = states[center.get("service_center_id")]
+            ready = parts_ready_after(now_minute, [part] if part else [], center.get("spare_parts_availability") or {})
+            if ready is None:
+                continue
+            ranked = _ranked_slots(state, now, slot_type, severity, ready, part)
+            for cost, slot in ranked:
+                if slot not in state["taken"]:
+                    total = cost + DISTANCE_COST_PER_KM * distance_km
+                    if best is None or total < best[0]:
+                        best = (total, slot, state, distance_km, ranked, part)
+                    break
+
+        if best is None:
+            unassigned.append({"request_id": request["request_id"], "reason": "No capable center with a free slot"})
+            continue
+
+        _, slot, state, distance_km, ranked, part = best
+        state["taken"].add(slot)
+        state["capacity_left"] -= 1
+        technician_id = pick_technician(
+            {tech_id: [slot] for tech_id in _slot_technicians(state, part, now).get(slot, ())},
+            slot, state["technician_loads"]
+        )
+        if technician_id and state["roster"] is not None:
+            jobs = state["technician_loads"].setdefault(technician_id, {})
+            day = to_iso(slot)[:10]
+            jobs[day] = jobs.get(day, 0) + 1
+            limit = state["roster"].technicians[technician_id].get("max_daily_jobs", DEFAULT_MAX_DAILY_JOBS)
+            if jobs[day] >= limit:
+                # Technician is now full that day - re-derive availability and rankings
+                state["skilled_slots"].clear()
+                state["rankings"].clear()
+        remaining = list(islice((s for _, s in ranked if s not in state["taken"]), FALLBACK_CANDIDATES))
+        assignments.append({
+            "request_id": request["request_id"],
+            "best_slot": to_iso(slot),
+            "service_center": state["center"].get("service_center_id"),
+            "slot_type": slot_type,
+            "fallback_slots": [to_iso(s) for s in pick_fallbacks(remaining, slot)],
+            "technician_id": technician_id,
+            "distance_km": distance_km,
+        })
+
+    return {"assignments": assignments, "unassigned": unassigned}
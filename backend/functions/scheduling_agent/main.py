@@ -1,22 +1,30 @@
 """
 Cloud Function: scheduling_agent
 Pub/Sub Trigger: Subscribes to navigo-rca-complete topic
-Purpose: Optimizes service scheduling using Gemini 2.5 Flash
+HTTP Trigger: scheduling_batch (Cloud Scheduler, deploy.sh) assigns requests queued in batch mode
+Purpose: Optimizes service scheduling with a deterministic constraint-based optimizer
 """
 
 import json
 import os
 import uuid
-import re
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from google.cloud import pubsub_v1, firestore, bigquery
 import functions_framework
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel
+from case_dossier import append_stage, load_dossier
+from center_locator import NEAREST_CENTERS, get_center_index, last_gps_fix, stocks_part
+from fleet_assignment import assign_requests, center_state
+from occupancy_index import booking_capacity, get_occupancy_index
+from reference_cache import get_collection
+from slot_calendar import slot_calendar, to_iso, to_minute
+from slot_optimizer import classify_slot_type, optimize_schedule, saturated_in_window
+from slot_reservation import (
+    MAX_RESERVATION_ATTEMPTS, ReservedBatch, release_slots, reserve_first_free, reserve_slot
+)
+from technician_roster import TechnicianRoster, pick_technician
 
-# Vertex AI configuration
+# GCP configuration
 PROJECT_ID = os.getenv("PROJECT_ID", "navigo-27206")
-LOCATION = os.getenv("LOCATION", "us-central1")
 
 # Pub/Sub configuration
 SCHEDULING_TOPIC_NAME = "navigo-scheduling-complete"
@@ -25,124 +33,81 @@ SCHEDULING_TOPIC_NAME = "navigo-scheduling-complete"
 DATASET_ID = "telemetry"
 TABLE_ID = "scheduling_cases"
 
-# System prompt for Scheduling Agent
-SYSTEM_PROMPT = """You are a Scheduling Agent for NaviGo. You MUST use ONLY the Gemini 2.5 Flash model (gemini-2.5-flash) to optimize service appointment scheduling.
+# Batch scheduling: "immediate" schedules each case on arrival, "batch" queues
+# cases in scheduling_requests for scheduling_batch (run by Cloud Scheduler)
+SCHEDULING_MODE = os.getenv("SCHEDULING_MODE", "immediate")
+REQUESTS_COLLECTION = "scheduling_requests"
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "1000"))
+FIRESTORE_BATCH_LIMIT = 500  # writes per Firestore commit
 
-CRITICAL INSTRUCTIONS - READ CAREFULLY:
-1. You will receive vehicle urgency data (RUL, severity) and service center availability data
-2. Analyze the ACTUAL availability data provided (spare_parts_availability, technician_availability)
-3. Calculate optimal appointment slot based on urgency and availability
-4. DO NOT HALLUCINATE - Only use the data provided, do not assume availability
-5. Return EXACTLY the JSON format specified below - no extra fields, no markdown
+# Per-center demand forecasts written daily by forecasting_agent
+FORECAST_COLLECTION = "demand_forecasts"
 
-SLOT TYPE CLASSIFICATION (based on ACTUAL estimated_rul_days):
-- "urgent": estimated_rul_days < 7 (vehicle needs service within a week)
-- "normal": estimated_rul_days >= 7 AND < 30 (vehicle needs service within a month)
-- "delayed": estimated_rul_days >= 30 (vehicle can wait more than a month)
+# Technician skills, shifts and daily job limits (see technician_roster)
+TECHNICIANS_COLLECTION = "technicians"
 
-SCHEDULING PRIORITY LOGIC:
-1. Urgency first: Higher severity and lower RUL = earlier slot
-2. Parts availability: Ensure required parts are available at the service center
-3. Technician availability: Ensure qualified technician is available
-4. Service center capacity: Consider current booking load
-5. Customer convenience: Prefer slots during business hours (9 AM - 6 PM)
-
-BEST SLOT SELECTION:
-- For "urgent": Schedule within 1-3 days from current date
-- For "normal": Schedule within 7-14 days from current date
-- For "delayed": Schedule within 30-60 days from current date
-- All slots must be during business hours (9 AM - 6 PM, Monday-Friday)
-- Use the ACTUAL available slots from technician_availability data
-- If no slots available, find the earliest available slot
-
-FALLBACK SLOTS:
-- Provide at least 2 alternative slots
-- Fallback slots should be within 7 days of best_slot
-- Prioritize same service center, but can suggest alternatives if needed
-- All fallback slots must also have parts and technician availability
-
-TIMESTAMP FORMAT:
-- All timestamps MUST be in ISO 8601 format with UTC timezone
-- Format: "YYYY-MM-DDTHH:MM:SSZ" (e.g., "2024-12-15T10:00:00Z")
-- Use current date/time as reference point for scheduling
-
-INPUT FORMAT (you will receive):
-{
-  "vehicle_id": "string",
-  "estimated_rul_days": int,
-  "severity": "Low" | "Medium" | "High",
-  "recommended_center": "string",
-  "spare_parts_availability": {
-    "part_name": "available" | "unavailable" | "in_transit",
-    ...
-  },
-  "technician_availability": {
-    "technician_id": ["slot1_iso_timestamp", "slot2_iso_timestamp", ...],
-    ...
-  }
-}
-
-OUTPUT FORMAT (you MUST return EXACTLY this JSON structure):
-{
-  "best_slot": "string (ISO timestamp in UTC, e.g., '2024-12-15T10:00:00Z')",
-  "service_center": "string (service center ID from input or recommended_center)",
-  "slot_type": "urgent" | "normal" | "delayed" (exact strings, case-sensitive)",
-  "fallback_slots": ["string"] (array of ISO timestamps, minimum 2 slots)
-}
+def get_vehicle_location(db, vehicle_id: str, dossier: dict):
+    """
+    Vehicle's last GPS fix as (lat, lon).
+    
+    Uses the telemetry window in the case dossier; falls back to the latest
+    telemetry event. Returns None if no valid fix is found (non-blocking).
+    """
+    location = last_gps_fix(dossier.get("telemetry_window") or [])
+    if location:
+        return location
+    try:
+        latest = (db.collection("telemetry_events")
+                  .where("vehicle_id", "==", vehicle_id)
+                  .order_by("timestamp_utc", direction=firestore.Query.DESCENDING)
+                  .limit(1)
+                  .stream())
+        return last_gps_fix([doc.to_dict() for doc in latest])
+    except Exception as e:
+        print(f"Vehicle location lookup failed for {vehicle_id} (non-blocking): {str(e)}")
+        return None
 
-CRITICAL RULES - FOLLOW EXACTLY:
-1. Use ONLY Gemini 2.5 Flash model (gemini-2.5-flash)
-2. Return ONLY valid JSON - no markdown, no code blocks, no explanations
-3. best_slot MUST be an ISO 8601 timestamp string in UTC
-4. slot_type MUST be exactly "urgent", "normal", or "delayed" (case-sensitive)
-5. fallback_slots MUST be an array of at least 2 ISO timestamp strings
-6. service_center MUST be a valid service center ID from the input data
-7. All slots MUST be based on ACTUAL availability data provided
-8. DO NOT use hard-coded dates - calculate from current date/time
-9. DO NOT assume availability - use only the data provided
-10. If no slots available, select the earliest possible slot from the data
 
-EXAMPLE INPUT:
-{
-  "vehicle_id": "MH-07-AB-1234",
-  "estimated_rul_days": 15,
-  "severity": "High",
-  "recommended_center": "center_001",
-  "spare_parts_availability": {"coolant_pump": "available", "coolant_fluid": "available"},
-  "technician_availability": {
-    "tech_001": ["2024-12-16T10:00:00Z", "2024-12-16T14:00:00Z", "2024-12-17T09:00:00Z"]
-  }
-}
+def load_daily_loads(db) -> dict:
+    """
+    Forecast load by UTC date per center (center_id -> {"YYYY-MM-DD": load}).
+    
+    Served from the reference cache; returns {} if no forecast is available (non-blocking).
+    """
+    try:
+        return {center_id: forecast.get("daily_load") or {}
+                for center_id, forecast in get_collection(db, FORECAST_COLLECTION)}
+    except Exception as e:
+        print(f"Demand forecast lookup failed (non-blocking): {str(e)}")
+        return {}
 
-EXAMPLE OUTPUT:
-{
-  "best_slot": "2024-12-16T10:00:00Z",
-  "service_center": "center_001",
-  "slot_type": "normal",
-  "fallback_slots": ["2024-12-16T14:00:00Z", "2024-12-17T09:00:00Z"]
-}
 
-REMEMBER: Return ONLY the JSON object, use ACTUAL availability data, calculate dates dynamically, use exact slot_type strings."""
+def load_roster(db) -> TechnicianRoster:
+    """Technician roster from the technicians collection (served from the reference cache)."""
+    return TechnicianRoster(
+        {**data, "technician_id": data.get("technician_id") or tech_id}
+        for tech_id, data in get_collection(db, TECHNICIANS_COLLECTION)
+    )
 
 
-def extract_json_from_response(text: str) -> dict:
-    """Extract JSON from Gemini response (handles markdown code blocks)"""
-    text = text.strip()
-    if text.startswith("```json"):
-        text = text[7:]
-    elif text.startswith("```"):
-        text = text[3:]
-    if text.endswith("```"):
-        text = text[:-3]
-    text = text.strip()
+def center_slots(center: dict, now: datetime, days_ahead: int = 30) -> list:
+    """
+    Candidate slots for a center as epoch minutes.
     
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group())
-        raise
+    Uses the center's explicit available_slots if present, otherwise its
+    precomputed operating-hours calendar (see slot_calendar).
+    """
+    explicit = [to_minute(slot) for slot in center.get("available_slots") or []]
+    explicit = [minute for minute in explicit if minute is not None]
+    if explicit:
+        return explicit
+    return slot_calendar(
+        center.get("service_center_id"),
+        center.get("operating_hours", {}),
+        center.get("timezone", "UTC"),
+        now,
+        days_ahead=days_ahead
+    )
 
 
 @functions_framework.cloud_event
@@ -152,7 +117,7 @@ def scheduling_agent(cloud_event):
     1. Receives RCA result event
     2. Fetches diagnosis case to get RUL and severity
     3. Fetches service center availability data
-    4. Uses Gemini 2.5 Flash to optimize scheduling
+    4. Picks best and fallback slots with the constraint-based slot optimizer
     5. Stores scheduling result and publishes to Pub/Sub
     """
     
@@ -181,95 +146,133 @@ def scheduling_agent(cloud_event):
         # 2. Fetch diagnosis case to get RUL and severity
         db = firestore.Client()
         
-        # If diagnosis_id not in message, fetch from RCA case
+        # The case dossier carries both the RCA and the diagnosis (one read)
+        dossier = load_dossier(db, case_id)
+        diagnosis_data = dossier.get("diagnosis")
         if not diagnosis_id:
-            rca_ref = db.collection("rca_cases").document(rca_id)
-            rca_doc = rca_ref.get()
-            if rca_doc.exists:
-                rca_data = rca_doc.to_dict()
-                diagnosis_id = rca_data.get("diagnosis_id")
-        
-        if not diagnosis_id:
-            print("Missing diagnosis_id in message and RCA case")
-            return {"status": "error", "error": "Missing diagnosis_id"}
-        
-        diagnosis_ref = db.collection("diagnosis_cases").document(diagnosis_id)
-        diagnosis_doc = diagnosis_ref.get()
-        
-        if not diagnosis_doc.exists:
-            print(f"Diagnosis case {diagnosis_id} not found")
-            return {"status": "error", "error": "Diagnosis case not found"}
-        
-        diagnosis_data = diagnosis_doc.to_dict()
+            diagnosis_id = (dossier.get("rca") or {}).get("diagnosis_id")
+        
+        if not diagnosis_data or diagnosis_data.get("diagnosis_id") != diagnosis_id:
+            # Fall back to the stage collections
+            # If diagnosis_id not in message, fetch from RCA case
+            if not diagnosis_id:
+                rca_ref = db.collection("rca_cases").document(rca_id)
+                rca_doc = rca_ref.get()
+                if rca_doc.exists:
+                    rca_data = rca_doc.to_dict()
+                    diagnosis_id = rca_data.get("diagnosis_id")
+            
+            if not diagnosis_id:
+                print("Missing diagnosis_id in message and RCA case")
+                return {"status": "error", "error": "Missing diagnosis_id"}
+            
+            diagnosis_ref = db.collection("diagnosis_cases").document(diagnosis_id)
+            diagnosis_doc = diagnosis_ref.get()
+            
+            if not diagnosis_doc.exists:
+                print(f"Diagnosis case {diagnosis_id} not found")
+                return {"status": "error", "error": "Diagnosis case not found"}
+            
+            diagnosis_data = diagnosis_doc.to_dict()
         estimated_rul_days = diagnosis_data.get("estimated_rul_days")
         severity = diagnosis_data.get("severity")
         component = diagnosis_data.get("component")
         
+        # 2b. Batch mode: queue the case for the fleet-wide assignment run
+        if SCHEDULING_MODE == "batch" or message_data.get("batch"):
+            request_id = queue_scheduling_request(db, {
+                "rca_id": rca_id,
+                "diagnosis_id": diagnosis_id,
+                "case_id": case_id,
+                "vehicle_id": vehicle_id,
+                "estimated_rul_days": estimated_rul_days,
+                "severity": severity,
+                "component": component,
+                "location": get_vehicle_location(db, vehicle_id, dossier)
+            })
+            print(f"Queued scheduling request {request_id} for vehicle {vehicle_id}")
+            return {"status": "queued", "request_id": request_id}
+        
         # 3. Fetch service center availability data dynamically from Firestore
         now = datetime.now(timezone.utc)
         
-        # Fetch all service centers
-        service_centers_ref = db.collection("service_centers")
-        service_centers_docs = service_centers_ref.stream()
-        
+        # Fetch all service centers (served from the reference cache on warm instances)
         service_centers_data = []
-        for center_doc in service_centers_docs:
-            center_data = center_doc.to_dict()
-            center_data["service_center_id"] = center_doc.id
+        for center_id, center_data in get_collection(db, "service_centers"):
+            center_data["service_center_id"] = center_id
             service_centers_data.append(center_data)
         
         if not service_centers_data:
             print("No service centers found in Firestore")
             return {"status": "error", "error": "No service centers available"}
         
-        # Select best service center based on proximity, capacity, and availability
-        # For now, use the first available center (can be enhanced with location-based logic)
-        selected_center = service_centers_data[0]
+        # Forecast load per center and day (forecasting_agent)
+        daily_loads = load_daily_loads(db)
+        now_minute = to_minute(now)
+        slot_type = classify_slot_type(estimated_rul_days)
+        
+        def about_to_saturate(center):
+            return saturated_in_window(daily_loads.get(center.get("service_center_id")), now_minute, slot_type)
+        
+        # Centers with technician records must have one qualified for the component
+        roster = load_roster(db)
+        
+        def has_qualified_technician(center):
+            center_id = center.get("service_center_id")
+            return not roster.has_center(center_id) or bool(roster.qualified(center_id, component))
+        
+        # Select best service center based on proximity, parts, capacity and forecast load:
+        # k nearest centers to the vehicle's last GPS fix that stock the part, have
+        # free capacity, a qualified technician and are not forecast to be saturated
+        # in the case's window (falls back to collection order, unsaturated first, without a fix)
+        candidate_centers = sorted(service_centers_data, key=about_to_saturate)
+        vehicle_location = get_vehicle_location(db, vehicle_id, dossier)
+        if vehicle_location:
+            def has_capacity(center):
+                return get_occupancy_index(db, center.get("service_center_id"), now).booked_count() < booking_capacity(center)
+            
+            center_index = get_center_index(service_centers_data)
+            nearest = center_index.nearest(
+                *vehicle_location,
+                k=NEAREST_CENTERS,
+                predicate=lambda center: (stocks_part(center, component.lower() if component else None)
+                                          and has_capacity(center) and not about_to_saturate(center)
+                                          and has_qualified_technician(center))
+            )
+            if nearest:
+                print(f"Nearest capable center for {vehicle_id}: {nearest[0][1].get('service_center_id')} ({nearest[0][0]} km)")
+                candidate_centers = [center for _, center in nearest]
+            else:
+                print(f"No nearby center stocks {component} with free capacity and forecast headroom, using all centers")
+        
+        selected_center = candidate_centers[0]
         recommended_center = selected_center.get("service_center_id")
         center_timezone = selected_center.get("timezone", "UTC")
-        center_capacity = selected_center.get("capacity", 10)
+        center_capacity = booking_capacity(selected_center)
         operating_hours = selected_center.get("operating_hours", {})
         
-        # Fetch existing bookings for this service center to check availability
-        bookings_ref = db.collection("bookings")
-        existing_bookings = bookings_ref.where("service_center", "==", recommended_center).where("status", "in", ["confirmed", "pending"]).stream()
-        
-        booked_slots = set()
-        for booking in existing_bookings:
-            booking_data = booking.to_dict()
-            scheduled_slot = booking_data.get("scheduled_slot")
-            if scheduled_slot:
-                booked_slots.add(scheduled_slot)
+        # Booked slots come from the per-center occupancy index (warm across invocations)
+        occupancy = get_occupancy_index(db, recommended_center, now)
         
-        # Get available slots from service center data
-        available_slots_raw = selected_center.get("available_slots", [])
-        
-        # If no slots in service center document, generate based on operating hours
-        if not available_slots_raw:
-            available_slots_raw = generate_slots_from_operating_hours(operating_hours, center_timezone, now, days_ahead=30)
+        # Get available slots (epoch minutes) from service center data or its cached calendar
+        available_slots_raw = center_slots(selected_center, now, days_ahead=30)
         
         # Filter out booked slots
-        available_slots = [slot for slot in available_slots_raw if slot not in booked_slots]
+        available_slots = occupancy.free_slots(available_slots_raw)
         
         # Check capacity - if center is at capacity, find alternative center
-        if len(booked_slots) >= center_capacity:
+        if occupancy.booked_count() >= center_capacity:
             print(f"Service center {recommended_center} at capacity, checking alternatives...")
-            for alt_center in service_centers_data[1:]:
-                alt_bookings = bookings_ref.where("service_center", "==", alt_center.get("service_center_id")).where("status", "in", ["confirmed", "pending"]).stream()
-                alt_booked_count = sum(1 for _ in alt_bookings)
-                if alt_booked_count < alt_center.get("capacity", 10):
+            for alt_center in candidate_centers[1:]:
+                alt_occupancy = get_occupancy_index(db, alt_center.get("service_center_id"), now)
+                if alt_occupancy.booked_count() < booking_capacity(alt_center):
                     selected_center = alt_center
                     recommended_center = alt_center.get("service_center_id")
                     center_timezone = alt_center.get("timezone", "UTC")
-                    available_slots_raw = alt_center.get("available_slots", [])
-                    if not available_slots_raw:
-                        available_slots_raw = generate_slots_from_operating_hours(alt_center.get("operating_hours", {}), center_timezone, now, days_ahead=30)
-                    alt_booked_slots = set()
-                    for booking in bookings_ref.where("service_center", "==", recommended_center).where("status", "in", ["confirmed", "pending"]).stream():
-                        slot = booking.to_dict().get("scheduled_slot")
-                        if slot:
-                            alt_booked_slots.add(slot)
-                    available_slots = [slot for slot in available_slots_raw if slot not in alt_booked_slots]
+                    operating_hours = alt_center.get("operating_hours", {})
+                    occupancy = alt_occupancy
+                    available_slots_raw = center_slots(alt_center, now, days_ahead=30)
+                    available_slots = occupancy.free_slots(available_slots_raw)
                     break
         
         # Fetch spare parts availability from service center
@@ -281,125 +284,121 @@ def scheduling_agent(cloud_event):
             part_name = component.lower().replace("_", "_")
             spare_parts_availability[part_name] = selected_center.get("inventory", {}).get(part_name, "available")
         
-        # Generate technician availability from available slots
-        # In production, this would come from technician scheduling system
-        technicians = selected_center.get("technicians", [])
-        if not technicians:
-            # Default: assign slots to generic technicians
-            technicians = [f"tech_{i+1}" for i in range(min(3, len(available_slots) // 5))]
-        
-        technician_availability = {}
-        slots_per_tech = len(available_slots) // len(technicians) if technicians else len(available_slots)
-        for i, tech_id in enumerate(technicians):
-            start_idx = i * slots_per_tech
-            end_idx = start_idx + slots_per_tech if i < len(technicians) - 1 else len(available_slots)
-            technician_availability[tech_id] = available_slots[start_idx:end_idx]
-        
-        # If no available slots, generate fallback slots
-        if not available_slots:
-            print(f"No available slots for center {recommended_center}, generating fallback slots")
-            available_slots = generate_slots_from_operating_hours(operating_hours, center_timezone, now, days_ahead=60)
-            # Take first 20 slots as available
-            available_slots = available_slots[:20]
-            # Distribute to technicians
+        # Technician availability: qualified technicians for the component within
+        # their shifts and daily job limits (technician_roster); centers without
+        # technician records split their free slots evenly across technicians
+        if roster.has_center(recommended_center):
+            technician_availability = roster.availability(
+                selected_center, component, available_slots, now, occupancy.technician_loads
+            )
+            if not technician_availability:
+                print(f"No qualified technician free for {component} at center {recommended_center}")
+        else:
+            technicians = selected_center.get("technicians", [])
+            if not technicians:
+                # Default: assign slots to generic technicians
+                technicians = [f"tech_{i+1}" for i in range(min(3, len(available_slots) // 5))]
+        
+            technician_availability = {}
+            slots_per_tech = len(available_slots) // len(technicians) if technicians else len(available_slots)
             for i, tech_id in enumerate(technicians):
-                start_idx = i * (len(available_slots) // len(technicians))
-                end_idx = start_idx + (len(available_slots) // len(technicians)) if i < len(technicians) - 1 else len(available_slots)
+                start_idx = i * slots_per_tech
+                end_idx = start_idx + slots_per_tech if i < len(technicians) - 1 else len(available_slots)
                 technician_availability[tech_id] = available_slots[start_idx:end_idx]
         
-        # 4. Prepare input for Gemini
-        input_data = {
-            "vehicle_id": vehicle_id,
-            "estimated_rul_days": estimated_rul_days,
-            "severity": severity,
-            "recommended_center": recommended_center,
-            "spare_parts_availability": spare_parts_availability,
-            "technician_availability": technician_availability
-        }
-        
-        # 5. Initialize Vertex AI and call Gemini 2.5 Flash
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-        model = GenerativeModel("gemini-2.5-flash")
-        
-        prompt = f"{SYSTEM_PROMPT}\n\nSchedule service for this vehicle:\n{json.dumps(input_data, default=str, indent=2)}\n\nCurrent date/time: {now.isoformat()}Z\n\nReturn ONLY the JSON response matching the output format specified above."
-        
-        response = model.generate_content(prompt)
-        response_text = response.text
-        
-        # 6. Parse Gemini response
+            # If no available slots, generate fallback slots
+            if not available_slots:
+                print(f"No available slots for center {recommended_center}, generating fallback slots")
+                available_slots = slot_calendar(recommended_center, operating_hours, center_timezone, now, days_ahead=60)
+                # Take first 20 slots as available
+                available_slots = available_slots[:20]
+                # Distribute to technicians
+                for i, tech_id in enumerate(technicians):
+                    start_idx = i * (len(available_slots) // len(technicians))
+                    end_idx = start_idx + (len(available_slots) // len(technicians)) if i < len(technicians) - 1 else len(available_slots)
+                    technician_availability[tech_id] = available_slots[start_idx:end_idx]
+        
+        # 4. Optimize schedule (hard constraints + scoring, see slot_optimizer) and
+        # atomically reserve best_slot; if a concurrent case already holds it,
+        # drop it and re-optimize onto the next free slot
+        booking_id = f"booking_{uuid.uuid4().hex[:10]}"
+        result = None
+        for _ in range(MAX_RESERVATION_ATTEMPTS):
+            result = optimize_schedule(
+                now=now,
+                estimated_rul_days=estimated_rul_days,
+                severity=severity,
+                service_center=recommended_center,
+                spare_parts_availability=spare_parts_availability,
+                technician_availability=technician_availability,
+                center_timezone=center_timezone,
+                required_parts=[component.lower()] if component else [],
+                daily_load=daily_loads.get(recommended_center),
+            )
+            if result is None or reserve_slot(db, recommended_center, result["best_slot"], booking_id, vehicle_id):
+                break
+            print(f"Slot {result['best_slot']} at {recommended_center} already reserved, retrying")
+            taken = to_minute(result["best_slot"])
+            occupancy.mark(taken)
+            technician_availability = {
+                tech_id: [slot for slot in slots if to_minute(slot) != taken]
+                for tech_id, slots in technician_availability.items()
+            }
+            result = None
+        
+        if result is None:
+            print(f"No feasible slot for vehicle {vehicle_id} at center {recommended_center}")
+            return {"status": "error", "error": "No feasible slot available"}
+        
+        print(f"Optimizer selected {result['best_slot']} ({result['slot_type']}) at {recommended_center} "
+              f"for RUL {estimated_rul_days} days")
+        
+        # 5-6. From here on the slot is held in slot_locks: any failure before the
+        # scheduling case and booking are committed (in one batch) releases it
         try:
-            result = extract_json_from_response(response_text)
-        except Exception as e:
-            print(f"Error parsing Gemini response: {e}")
-            print(f"Response text: {response_text}")
-            raise ValueError(f"Invalid JSON response from Gemini: {e}")
-        
-        # 7. Validate result matches schema
-        if result.get("vehicle_id") and result.get("vehicle_id") != vehicle_id:
-            # Remove vehicle_id from result if present (not in output schema)
-            pass
-        
-        scheduling_id = f"scheduling_{uuid.uuid4().hex[:10]}"
-        
-        # 8. Prepare scheduling data for Firestore
-        scheduling_data = {
-            "scheduling_id": scheduling_id,
-            "rca_id": rca_id,
-            "diagnosis_id": diagnosis_id,
-            "case_id": case_id,
-            "vehicle_id": vehicle_id,
-            "best_slot": result.get("best_slot"),
-            "service_center": result.get("service_center"),
-            "slot_type": result.get("slot_type"),
-            "fallback_slots": result.get("fallback_slots", []),
-            "status": "pending_engagement",
-            "created_at": firestore.SERVER_TIMESTAMP
-        }
-        
-        # 9. Store in Firestore
-        db.collection("scheduling_cases").document(scheduling_id).set(scheduling_data)
+            scheduling_id = f"scheduling_{uuid.uuid4().hex[:10]}"
+            technician_id = pick_technician(technician_availability, to_minute(result["best_slot"]),
+                                            occupancy.technician_loads)
+            
+            # 5. Prepare scheduling data and the booking record for Firestore
+            scheduling_data = {
+                "scheduling_id": scheduling_id,
+                "rca_id": rca_id,
+                "diagnosis_id": diagnosis_id,
+                "case_id": case_id,
+                "vehicle_id": vehicle_id,
+                "best_slot": result.get("best_slot"),
+                "service_center": result.get("service_center"),
+                "slot_type": result.get("slot_type"),
+                "fallback_slots": result.get("fallback_slots", []),
+                "technician_id": technician_id,
+                "scheduling_method": "optimizer",
+                "status": "pending_engagement",
+                "created_at": firestore.SERVER_TIMESTAMP
+            }
+            booking_data = build_booking_data(booking_id, scheduling_data, component)
+            
+            # 6. Store the scheduling case and the booking atomically
+            batch = db.batch()
+            batch.set(db.collection("scheduling_cases").document(scheduling_id), scheduling_data)
+            batch.set(db.collection("bookings").document(booking_id), booking_data)
+            batch.commit()
+        except Exception:
+            release_slots(db, [(recommended_center, result["best_slot"], booking_id)])
+            raise
         print(f"Created scheduling case {scheduling_id} for vehicle {vehicle_id}")
+        occupancy.mark(scheduling_data["best_slot"], technician_id)
+        print(f"Created booking {booking_id} for vehicle {vehicle_id} (slot reserved in slot_locks)")
+        append_stage(db, case_id, "scheduling", {**scheduling_data, "booking_id": booking_id})
         
-        # 9b. Create booking record
-        booking_id = f"booking_{uuid.uuid4().hex[:10]}"
-        best_slot_iso = result.get("best_slot")
-        
-        # Parse ISO timestamp to extract date and time
-        try:
-            from datetime import datetime as dt
-            slot_dt = dt.fromisoformat(best_slot_iso.replace('Z', '+00:00'))
-            scheduled_date = slot_dt.strftime("%Y-%m-%d")
-            scheduled_time = slot_dt.strftime("%I:%M %p")
-        except:
-            scheduled_date = datetime.now().strftime("%Y-%m-%d")
-            scheduled_time = "10:00 AM"
-        
-        booking_data = {
-            "booking_id": booking_id,
-            "vehicle_id": vehicle_id,
-            "service_center": result.get("service_center"),
-            "service_center_id": result.get("service_center"),
-            "scheduled_date": scheduled_date,
-            "scheduled_time": scheduled_time,
-            "scheduled_slot": best_slot_iso,
-            "status": "pending",
-            "service_type": f"{component} Service" if component else "Vehicle Service",
-            "scheduling_id": scheduling_id,
-            "case_id": case_id,
-            "created_at": firestore.SERVER_TIMESTAMP
-        }
-        
-        db.collection("bookings").document(booking_id).set(booking_data)
-        print(f"Created booking {booking_id} for vehicle {vehicle_id}")
-        
-        # 10. Update RCA case status
+        # 7. Update RCA case status
         rca_ref = db.collection("rca_cases").document(rca_id)
         rca_ref.update({"status": "scheduled"})
         
-        # 11. Prepare BigQuery row
+        # 8. Prepare BigQuery row
         bq_row = prepare_bigquery_row(scheduling_data)
         
-        # 12. Sync to BigQuery
+        # 9. Sync to BigQuery
         bq_client = bigquery.Client()
         table_ref = bq_client.dataset(DATASET_ID).table(TABLE_ID)
         errors = bq_client.insert_rows_json(table_ref, [bq_row])
@@ -409,26 +408,11 @@ def scheduling_agent(cloud_event):
         else:
             print(f"Synced scheduling case {scheduling_id} to BigQuery")
         
-        # 13. Publish to Pub/Sub
+        # 10. Publish to Pub/Sub
         publisher = pubsub_v1.PublisherClient()
         topic_path = publisher.topic_path(PROJECT_ID, SCHEDULING_TOPIC_NAME)
         
-        # Include confidence and agent_stage for orchestrator
-        # Scheduling doesn't have confidence, use default high confidence
-        confidence_score = 0.90
-        pubsub_message = {
-            "scheduling_id": scheduling_id,
-            "rca_id": rca_id,
-            "diagnosis_id": diagnosis_id,
-            "case_id": case_id,
-            "vehicle_id": vehicle_id,
-            "best_slot": result.get("best_slot"),
-            "service_center": result.get("service_center"),
-            "slot_type": result.get("slot_type"),
-            "fallback_slots": result.get("fallback_slots", []),
-            "confidence": confidence_score,  # Add confidence for orchestrator
-            "agent_stage": "scheduling"  # Explicitly set agent stage for orchestrator
-        }
+        pubsub_message = build_scheduling_message(scheduling_data)
         
         message_bytes = json.dumps(pubsub_message).encode("utf-8")
         future = publisher.publish(topic_path, message_bytes)
@@ -444,6 +428,223 @@ def scheduling_agent(cloud_event):
         return {"status": "error", "error": str(e)}
 
 
+def queue_scheduling_request(db, request: dict) -> str:
+    """
+    Store a pending request for scheduling_batch (one document per RCA, so
+    redelivered Pub/Sub messages do not queue a vehicle twice).
+    """
+    location = request.get("location")
+    request_data = {
+        **request,
+        "request_id": request["rca_id"],
+        "location": {"lat": location[0], "lon": location[1]} if location else None,
+        "status": "pending",
+        "queued_at": firestore.SERVER_TIMESTAMP
+    }
+    db.collection(REQUESTS_COLLECTION).document(request["rca_id"]).set(request_data)
+    return request["rca_id"]
+
+
+def load_center_states(db, centers: list, now: datetime) -> dict:
+    """
+    Per-center batch state: free slots (calendar minus bookings), remaining capacity,
+    forecast load and technician roster/workload.
+    """
+    daily_loads = load_daily_loads(db)
+    roster = load_roster(db)
+    states = {}
+    for center in centers:
+        center_id = center.get("service_center_id")
+        occupancy = get_occupancy_index(db, center_id, now)
+        free_slots = occupancy.free_slots(center_slots(center, now, days_ahead=60))
+        capacity_left = booking_capacity(center) - occupancy.booked_count()
+        states[center_id] = center_state(center, free_slots, capacity_left, daily_loads.get(center_id),
+                                         roster, {t: dict(days) for t, days in occupancy.technician_loads.items()})
+    return states
+
+
+@functions_framework.http
+def scheduling_batch(request):
+    """
+    HTTP function (invoked every 5 minutes by the navigo-scheduling-batch
+    Cloud Scheduler job, see deploy.sh) that:
+    1. Loads pending scheduling_requests queued by scheduling_agent in batch mode
+    2. Loads service centers with their free slots and remaining capacity
+    3. Assigns all requests at once, most urgent first (fleet_assignment)
+    4. Reserves each assigned slot (slot_reservation), then writes scheduling cases,
+       bookings and request/RCA status in batched commits
+    5. Syncs to BigQuery and publishes one scheduling-complete message per case
+    """
+    
+    try:
+        db = firestore.Client()
+        now = datetime.now(timezone.utc)
+        
+        # 1. Pending requests (oldest first)
+        pending_docs = (db.collection(REQUESTS_COLLECTION)
+                        .where("status", "==", "pending")
+                        .order_by("queued_at")
+                        .limit(BATCH_MAX_REQUESTS)
+                        .stream())
+        requests = [doc.to_dict() for doc in pending_docs]
+        if not requests:
+            return {"status": "success", "scheduled": 0, "unassigned": 0}
+        requests_by_id = {req["request_id"]: req for req in requests}
+        
+        # 2. Service centers and their state for this batch
+        centers = []
+        for center_id, center_data in get_collection(db, "service_centers"):
+            center_data["service_center_id"] = center_id
+            centers.append(center_data)
+        if not centers:
+            print("No service centers found in Firestore")
+            return {"status": "error", "error": "No service centers available"}
+        states = load_center_states(db, centers, now)
+        
+        # 3. Global assignment
+        solution = assign_requests(requests, states, now)
+        print(f"Batch assigned {len(solution['assignments'])} of {len(requests)} scheduling requests")
+        
+        # 4. Batched writes: scheduling case + booking + request status + RCA status per vehicle
+        writer = ReservedBatch(db, FIRESTORE_BATCH_LIMIT)
+        failure = None
+        try:
+            for assignment in solution["assignments"]:
+                req = requests_by_id[assignment["request_id"]]
+                scheduling_id = f"scheduling_{uuid.uuid4().hex[:10]}"
+                booking_id = f"booking_{uuid.uuid4().hex[:10]}"
+                
+                # Reserve the slot atomically - a case scheduled concurrently outside
+                # this batch may hold it; then take the first free fallback slot
+                candidates = [assignment["best_slot"]] + assignment["fallback_slots"]
+                reserved = reserve_first_free(db, assignment["service_center"], candidates, booking_id, req.get("vehicle_id"))
+                if reserved is None:
+                    print(f"Slots for scheduling request {assignment['request_id']} already reserved, leaving it pending")
+                    continue
+                writer.hold(assignment["service_center"], reserved, booking_id)
+                best_slot = to_iso(reserved)
+                scheduling_data = {
+                    "scheduling_id": scheduling_id,
+                    "rca_id": req.get("rca_id"),
+                    "diagnosis_id": req.get("diagnosis_id"),
+                    "case_id": req.get("case_id"),
+                    "vehicle_id": req.get("vehicle_id"),
+                    "best_slot": best_slot,
+                    "service_center": assignment["service_center"],
+                    "slot_type": assignment["slot_type"],
+                    "fallback_slots": [slot for slot in candidates if slot != best_slot],
+                    "scheduling_method": "batch",
+                    "technician_id": assignment["technician_id"] if best_slot == assignment["best_slot"] else None,
+                    "distance_km": assignment["distance_km"],
+                    "status": "pending_engagement",
+                    "created_at": firestore.SERVER_TIMESTAMP
+                }
+                booking_data = build_booking_data(booking_id, scheduling_data, req.get("component"))
+                
+                writer.batch.set(db.collection("scheduling_cases").document(scheduling_id), scheduling_data)
+                writer.batch.set(db.collection("bookings").document(booking_id), booking_data)
+                writer.batch.update(db.collection(REQUESTS_COLLECTION).document(assignment["request_id"]),
+                                    {"status": "scheduled", "scheduling_id": scheduling_id, "booking_id": booking_id})
+                writer.batch.update(db.collection("rca_cases").document(req.get("rca_id")), {"status": "scheduled"})
+                writer.add((scheduling_data, booking_id), writes=4)
+            writer.commit()
+        except Exception as e:
+            # Chunks committed before the failure are already scheduled: give back only
+            # the uncommitted locks and still run the follow-up steps for the rest
+            writer.release_uncommitted()
+            failure = e
+        scheduled = writer.committed
+        
+        for scheduling_data, booking_id in scheduled:
+            get_occupancy_index(db, scheduling_data["service_center"], now).mark(
+                scheduling_data["best_slot"], scheduling_data["technician_id"]
+            )
+            append_stage(db, scheduling_data["case_id"], "scheduling", {**scheduling_data, "booking_id": booking_id})
+        
+        # Unassigned requests stay pending for the next run
+        for item in solution["unassigned"]:
+            print(f"Scheduling request {item['request_id']} unassigned: {item['reason']}")
+        
+        # 5. BigQuery (one insert) and Pub/Sub (one message per case)
+        if scheduled:
+            bq_client = bigquery.Client()
+            table_ref = bq_client.dataset(DATASET_ID).table(TABLE_ID)
+            errors = bq_client.insert_rows_json(table_ref, [prepare_bigquery_row(data) for data, _ in scheduled])
+            if errors:
+                print(f"BigQuery insert errors: {errors}")
+            
+            publisher = pubsub_v1.PublisherClient()
+            topic_path = publisher.topic_path(PROJECT_ID, SCHEDULING_TOPIC_NAME)
+            futures = [
+                publisher.publish(topic_path, json.dumps(build_scheduling_message(data)).encode("utf-8"))
+                for data, _ in scheduled
+            ]
+            for future in futures:
+                future.result()
+            print(f"Published {len(futures)} scheduling cases to {SCHEDULING_TOPIC_NAME}")
+        
+        if failure is not None:
+            print(f"Batch write failed after {len(scheduled)} scheduled cases")
+            raise failure
+        return {"status": "success", "scheduled": len(scheduled), "unassigned": len(solution["unassigned"])}
+        
+    except Exception as e:
+        print(f"Error in scheduling_batch: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {"status": "error", "error": str(e)}
+
+
+def build_booking_data(booking_id: str, scheduling_data: dict, component) -> dict:
+    """Booking record for a scheduling case's best_slot."""
+    best_slot_iso = scheduling_data.get("best_slot")
+    
+    # Parse ISO timestamp to extract date and time
+    try:
+        slot_dt = datetime.fromisoformat(best_slot_iso.replace('Z', '+00:00'))
+        scheduled_date = slot_dt.strftime("%Y-%m-%d")
+        scheduled_time = slot_dt.strftime("%I:%M %p")
+    except:
+        scheduled_date = datetime.now().strftime("%Y-%m-%d")
+        scheduled_time = "10:00 AM"
+    
+    return {
+        "booking_id": booking_id,
+        "vehicle_id": scheduling_data.get("vehicle_id"),
+        "service_center": scheduling_data.get("service_center"),
+        "service_center_id": scheduling_data.get("service_center"),
+        "scheduled_date": scheduled_date,
+        "scheduled_time": scheduled_time,
+        "scheduled_slot": best_slot_iso,
+        "status": "pending",
+        "service_type": f"{component} Service" if component else "Vehicle Service",
+        "scheduling_id": scheduling_data.get("scheduling_id"),
+        "case_id": scheduling_data.get("case_id"),
+        "technician_id": scheduling_data.get("technician_id"),
+        "created_at": firestore.SERVER_TIMESTAMP
+    }
+
+
+def build_scheduling_message(scheduling_data: dict) -> dict:
+    """navigo-scheduling-complete message for a scheduling case."""
+    # Include confidence and agent_stage for orchestrator
+    # Scheduling doesn't have confidence, use default high confidence
+    confidence_score = 0.90
+    return {
+        "scheduling_id": scheduling_data.get("scheduling_id"),
+        "rca_id": scheduling_data.get("rca_id"),
+        "diagnosis_id": scheduling_data.get("diagnosis_id"),
+        "case_id": scheduling_data.get("case_id"),
+        "vehicle_id": scheduling_data.get("vehicle_id"),
+        "best_slot": scheduling_data.get("best_slot"),
+        "service_center": scheduling_data.get("service_center"),
+        "slot_type": scheduling_data.get("slot_type"),
+        "fallback_slots": scheduling_data.get("fallback_slots", []),
+        "confidence": confidence_score,  # Add confidence for orchestrator
+        "agent_stage": "scheduling"  # Explicitly set agent stage for orchestrator
+    }
+
+
 def prepare_bigquery_row(scheduling_data: dict) -> dict:
     """Prepare scheduling case data for BigQuery insertion."""
     bq_row = {}
@@ -481,59 +682,3 @@ def prepare_bigquery_row(scheduling_data: dict) -> dict:
             bq_row[bq_key] = value
     
     return bq_row
-
-
-def generate_slots_from_operating_hours(operating_hours: dict, timezone_str: str, start_date: datetime, days_ahead: int = 30) -> list:
-    """
-    Generate available time slots based on operating hours.
-    
-    Args:
-        operating_hours: Dict with day names as keys and time ranges as values
-            Example: {"monday": {"start": "09:00", "end": "18:00"}, ...}
-        timezone_str: Timezone string (e.g., "Asia/Kolkata")
-        start_date: Starting datetime (UTC)
-        days_ahead: Number of days to generate slots for
-    
-    Returns:
-        List of ISO timestamp strings in UTC
-    """
-    try:
-        import pytz
-        tz = pytz.timezone(timezone_str)
-    except:
-        # Fallback to UTC if timezone not available
-        import pytz
-        tz = pytz.UTC
-    
-    slots = []
-    default_hours = {"start": "09:00", "end": "18:00"}
-    
-    # Day name mapping
-    day_names = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-    
-    for day_offset in range(1, days_ahead + 1):
-        slot_date = start_date + timedelta(days=day_offset)
-        day_name = day_names[slot_date.weekday()]
-        
-        # Get operating hours for this day
-        day_hours = operating_hours.get(day_name, default_hours)
-        start_time_str = day_hours.get("start", "09:00")
-        end_time_str = day_hours.get("end", "18:00")
-        
-        # Parse time strings
-        start_hour, start_min = map(int, start_time_str.split(":"))
-        end_hour, end_min = map(int, end_time_str.split(":"))
-        
-        # Generate slots for this day (hourly slots)
-        current_hour = start_hour
-        while current_hour < end_hour:
-            # Create datetime in service center timezone
-            local_dt = tz.localize(slot_date.replace(hour=current_hour, minute=0, second=0, microsecond=0))
-            # Convert to UTC
-            utc_dt = local_dt.astimezone(pytz.UTC)
-            # Format as ISO string
-            slots.append(utc_dt.isoformat().replace('+00:00', 'Z'))
-            current_hour += 1
-    
-    return slots
-
@@ -0,0 +1,182 @@
+"""
+Per-center slot occupancy index for the scheduling_agent Cloud Function.
+
+Each service center's confirmed/pending bookings are held as an integer
+bitmap over fixed-size slots (SLOT_MINUTES) for the next HORIZON_DAYS:
+bit i is set when the slot starting at base + i * SLOT_MINUTES is booked.
+Availability checks are single bit tests, the booked count is a popcount
+and the earliest free slot among candidates is found with mask operations
+over the whole horizon at once.
+
+Jobs per technician and day are counted alongside (technician_loads) for
+workload-aware technician allocation (see technician_roster).
+
+Indexes are cached per center on the warm instance, updated in place when
+this function books a slot, and resynced from Firestore every RESYNC_SECONDS
+to pick up bookings changed by other stages.
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Union
+
+from slot_calendar import SLOT_MINUTES, to_iso, to_minute
+
+HORIZON_DAYS = 62  # scheduling looks up to 60 days ahead
+RESYNC_SECONDS = 300
+ACTIVE_BOOKING_STATUSES = ["confirmed", "pending"]
+DEFAULT_CAPACITY = 10
+
+Slot = Union[str, datetime, int]
+
+def booking_capacity(center: dict) -> int:
+    """
+    Active bookings a center can hold over the horizon (compared with booked_count()).
+
+    capacity is that limit; centers that only declare daily_capacity (vehicles
+    per day, as forecasting_agent uses it) get daily_capacity * HORIZON_DAYS.
+    forecasting_agent's daily_capacity() derives the other way with the same horizon.
+    """
+    if center.get("capacity"):
+        return int(center["capacity"])
+    if center.get("daily_capacity"):
+        return int(float(center["daily_capacity"]) * HORIZON_DAYS)
+    return DEFAULT_CAPACITY
+
+
+# center_id -> OccupancyIndex (warm across invocations on the same instance)
+_indexes: Dict[str, "OccupancyIndex"] = {}
+
+
+class OccupancyIndex:
+    """
+    Booked-slot bitmap for one service center.
+
+    Slots that are not aligned to SLOT_MINUTES or fall outside the horizon
+    are kept in a small overflow set, so no booking is ever lost.
+    """
+
+    def __init__(self, center_id: str, start: Slot, horizon_days: int = HORIZON_DAYS,
+                 slot_minutes: int = SLOT_MINUTES):
+        self.center_id = center_id
+        self.slot_minutes = slot_minutes
+        self.base = to_minute(start) // slot_minutes * slot_minutes
+        self.size = horizon_days * 24 * 60 // slot_minutes
+        self.bits = 0
+        self.overflow = set()
+        # technician_id -> {"YYYY-MM-DD" (UTC): booked jobs}
+        self.technician_loads: Dict[str, Dict[str, int]] = {}
+        self.synced_at = time.monotonic()
+
+    def _bit(self, minute: int) -> Optional[int]:
+        offset = minute - self.base
+        if offset < 0 or offset % self.slot_minutes:
+            return None
+        bit = offset // self.slot_minutes
+        return bit if bit < self.size else None
+
+    def mark(self, slot: Slot, technician_id: Optional[str] = None) -> None:
+        """Record a booking for slot (and a job for technician_id, if given)."""
+        minute = to_minute(slot)
+        if minute is None:
+            return
+        if technician_id:
+            jobs = self.technician_loads.setdefault(technician_id, {})
+            day = to_iso(minute)[:10]
+            jobs[day] = jobs.get(day, 0) + 1
+        bit = self._bit(minute)
+        if bit is None:
+            self.overflow.add(minute)
+        else:
+            self.bits |= 1 << bit
+
+    def release(self, slot: Slot, technician_id: Optional[str] = None) -> None:
+        """Remove a booking for slot (cancelled / rescheduled)."""
+        minute = to_minute(slot)
+        if minute is None:
+            return
+        jobs = self.technician_loads.get(technician_id, {}) if technician_id else {}
+        day = to_iso(minute)[:10]
+        if jobs.get(day):
+            jobs[day] -= 1
+        bit = self._bit(minute)
+        if bit is None:
+            self.overflow.discard(minute)
+        else:
+            self.bits &= ~(1 << bit)
+
+    def is_free(self, slot: Slot) -> bool:
+        minute = to_minute(slot)
+        if minute is None:
+            return False
+        bit = self._bit(minute)
+        if bit is None:
+            return minute not in self.overflow
+        return not (self.bits >> bit) & 1
+
+    def booked_count(self) -> int:
+        return self.bits.bit_count() + len(self.overflow)
+
+    def mask(self, slots: Iterable[Slot]) -> int:
+        """Bitmap of the given slots (slots outside the horizon are skipped)."""
+        mask = 0
+        for slot in slots:
+            minute = to_minute(slot)
+            bit = self._bit(minute) if minute is not None else None
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def free_slots(self, slots: List[Slot]) -> List[Slot]:
+        """Candidate slots that are not booked, in their original order."""
+        return [slot for slot in slots if self.is_free(slot)]
+
+    def earliest_free(self, candidates: Union[int, Iterable[Slot]], after: Optional[Slot] = None) -> Optional[int]:
+        """
+        Earliest unbooked candidate slot (epoch minutes), or None.
+
+        Args:
+            candidates: Candidate bitmap from mask(), or slots to build it from
+            after: Only consider slots at or after this time
+        """
+        free = (candidates if isinstance(candidates, int) else self.mask(candidates)) & ~self.bits
+        if after is not None:
+            minute = to_minute(after)
+            if minute is not None and minute > self.base:
+                first = -(-(minute - self.base) // self.slot_minutes)
+                free &= ~((1 << first) - 1)
+        if not free:
+            return None
+        lowest = (free & -free).bit_length() - 1
+        return self.base + lowest * self.slot_minutes
+
+
+def build_index(db, center_id: str, now: datetime) -> OccupancyIndex:
+    """Build a center's index from its confirmed/pending bookings (one query)."""
+    index = OccupancyIndex(center_id, now)
+    bookings = (db.collection("bookings")
+                .where("service_center", "==", center_id)
+                .where("status", "in", ACTIVE_BOOKING_STATUSES)
+                .stream())
+    for booking in bookings:
+        booking_data = booking.to_dict()
+        scheduled_slot = booking_data.get("scheduled_slot")
+        if scheduled_slot:
+            index.mark(scheduled_slot, booking_data.get("technician_id"))
+    return index
+
+
+def get_occupancy_index(db, center_id: str, now: datetime) -> OccupancyIndex:
+    """
+    Cached occupancy index for a center.
+
+    Rebuilt when older than RESYNC_SECONDS or when the horizon start has
+    fallen a day behind now.
+    """
+    index = _indexes.get(center_id)
+    if (index is None
+            or time.monotonic() - index.synced_at > RESYNC_SECONDS
+            or to_minute(now) - index.base >= 24 * 60):
+        index = build_index(db, center_id, now)
+        _indexes[center_id] = index
+    return index
@@ -0,0 +1,129 @@
+"""
+Precomputed slot calendars for the scheduling_agent Cloud Function.
+
+A center's bookable slots for one local day depend only on its operating
+hours and timezone, so each day is computed once and cached under
+(center_id, local date, hours version). The hours version is a hash of the
+timezone and operating_hours, so editing a center's hours invalidates its
+cached days automatically.
+
+Slots are integer epoch minutes (UTC) throughout scheduling - set operations
+against bookings are integer operations - and are converted to ISO strings
+only at the output boundary (to_iso).
+"""
+
+import json
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional, Tuple, Union
+
+import pytz
+
+SLOT_MINUTES = 60
+DEFAULT_HOURS = {"start": "09:00", "end": "18:00"}
+DAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# Cached center-days (e.g. 500 centers x 60 days)
+MAX_CACHED_DAYS = 30000
+
+# (center_id, local date, hours version) -> tuple of epoch minutes
+_day_cache: "OrderedDict[tuple, Tuple[int, ...]]" = OrderedDict()
+
+
+def to_minute(slot: Union[str, datetime, int, None]) -> Optional[int]:
+    """ISO string, datetime or epoch minutes -> epoch minutes (None if unparseable)."""
+    if isinstance(slot, int):
+        return slot
+    if isinstance(slot, str):
+        try:
+            slot = datetime.fromisoformat(slot.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(slot, datetime):
+        return None
+    if slot.tzinfo is None:
+        slot = slot.replace(tzinfo=timezone.utc)
+    return int(slot.timestamp()) // 60
+
+
+def to_datetime(minute: int, tz=timezone.utc) -> datetime:
+    return datetime.fromtimestamp(minute * 60, tz)
+
+
+def to_iso(minute: int) -> str:
+    """Epoch minutes -> "YYYY-MM-DDTHH:MM:SSZ"."""
+    return to_datetime(minute).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def get_timezone(timezone_str: Optional[str]):
+    try:
+        return pytz.timezone(timezone_str or "UTC")
+    except pytz.UnknownTimeZoneError:
+        return pytz.UTC
+
+
+def hours_version(operating_hours: dict, timezone_str: Optional[str]) -> str:
+    """Stable version of a center's hours (changes whenever hours or timezone change)."""
+    payload = json.dumps({"tz": timezone_str, "hours": operating_hours or {}}, sort_keys=True)
+    return format(zlib.crc32(payload.encode("utf-8")), "08x")
+
+
+def _parse_hhmm(value: str) -> int:
+    hours, minutes = map(int, value.split(":"))
+    return hours * 60 + minutes
+
+
+def day_slots(local_date: date, operating_hours: dict, tz) -> Tuple[int, ...]:
+    """
+    Slot starts (epoch minutes) for one local day.
+
+    Days marked {"closed": true} have no slots; days missing from
+    operating_hours use DEFAULT_HOURS. A slot must end by closing time.
+    """
+    day_hours = (operating_hours or {}).get(DAY_NAMES[local_date.weekday()], DEFAULT_HOURS)
+    if day_hours.get("closed"):
+        return ()
+    open_minute = _parse_hhmm(day_hours.get("start", DEFAULT_HOURS["start"]))
+    close_minute = _parse_hhmm(day_hours.get("end", DEFAULT_HOURS["end"]))
+
+    midnight = datetime(local_date.year, local_date.month, local_date.day)
+    slots = []
+    for minute_of_day in range(open_minute, close_minute - SLOT_MINUTES + 1, SLOT_MINUTES):
+        # localize() takes the naive local wall time (handles DST offsets)
+        local_dt = tz.localize(midnight + timedelta(minutes=minute_of_day))
+        slots.append(int(local_dt.timestamp()) // 60)
+    return tuple(slots)
+
+
+def slot_calendar(center_id: str, operating_hours: dict, timezone_str: Optional[str],
+                  start: datetime, days_ahead: int = 30) -> List[int]:
+    """
+    Bookable slots (epoch minutes) for the local days after start's local date.
+
+    Args:
+        center_id: Service center ID (cache key)
+        operating_hours: Center operating_hours, e.g. {"monday": {"start": "09:00", "end": "18:00"}, "sunday": {"closed": true}}
+        timezone_str: Center timezone (e.g. "Asia/Kolkata")
+        start: Reference time (aware)
+        days_ahead: Number of days to include
+
+    Returns:
+        Sorted list of epoch minutes
+    """
+    tz = get_timezone(timezone_str)
+    version = hours_version(operating_hours, timezone_str)
+    first_day = start.astimezone(tz).date()
+
+    slots: List[int] = []
+    for day_offset in range(1, days_ahead + 1):
+        local_date = first_day + timedelta(days=day_offset)
+        key = (center_id, local_date, version)
+        cached = _day_cache.get(key)
+        if cached is None:
+            cached = day_slots(local_date, operating_hours, tz)
+            _day_cache[key] = cached
+            if len(_day_cache) > MAX_CACHED_DAYS:
+                _day_cache.popitem(last=False)
+        slots.extend(cached)
+    return slots
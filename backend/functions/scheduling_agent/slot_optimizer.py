@@ -0,0 +1,278 @@
+"""
+Deterministic slot optimizer for the scheduling_agent Cloud Function.
+
+Implements the scheduling rules that used to be spelled out in the Gemini
+prompt as hard constraints plus pluggable scorers, and returns a dict
+matching SchedulingOutput (best_slot, service_center, slot_type,
+fallback_slots). Only slots present in technician_availability are ever
+returned, so there are no invented slots.
+
+Hard constraints:
+- slot is in the future and offered by at least one technician
+- business hours in the center's timezone (9 AM - 6 PM, Monday-Friday)
+- required parts are not "unavailable"; "in_transit" parts push the earliest
+  slot out by PARTS_IN_TRANSIT_DAYS
+
+Scoring (lower cost wins) is a weighted sum of scorer functions - see
+DEFAULT_SCORERS. Callers can pass their own list. With a demand forecast
+(forecasting_agent) days predicted to be saturated are penalized.
+
+Slots are epoch minutes internally (see slot_calendar); technician slots may
+be given as epoch minutes or ISO strings and are returned as ISO strings.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from slot_calendar import get_timezone, to_datetime, to_iso, to_minute
+
+# Business hours (center local time)
+BUSINESS_DAYS = {0, 1, 2, 3, 4}  # Monday-Friday
+BUSINESS_START_HOUR = 9
+BUSINESS_END_HOUR = 18
+
+# slot_type -> preferred window (days from now)
+SLOT_WINDOWS = {
+    "urgent": (1, 3),
+    "normal": (7, 14),
+    "delayed": (30, 60),
+}
+
+FALLBACK_WINDOW_DAYS = 7
+MIN_FALLBACK_SLOTS = 2
+MAX_FALLBACK_SLOTS = 3
+PARTS_IN_TRANSIT_DAYS = 3
+
+MINUTES_PER_DAY = 24 * 60
+
+# Forecast load (predicted demand / daily capacity, see forecasting_agent) at
+# which a center-day counts as saturated - keep in sync with demand_forecast.py
+SATURATION_LOAD = 0.9
+
+# A scorer maps (slot in epoch minutes, context) -> cost; lower is better
+Scorer = Callable[[int, dict], float]
+
+
+def classify_slot_type(estimated_rul_days) -> str:
+    """
+    Slot urgency from estimated_rul_days.
+
+    Diagnosis refines estimated_rul_days with the vehicle's degradation trend
+    (rul_method="trend"), so urgency follows the vehicle's actual history.
+    """
+    if estimated_rul_days is None:
+        return "normal"
+    if estimated_rul_days < 7:
+        return "urgent"
+    if estimated_rul_days < 30:
+        return "normal"
+    return "delayed"
+
+
+@lru_cache(maxsize=1 << 16)
+def in_business_hours(slot: int, tz) -> bool:
+    local = to_datetime(slot, tz)
+    return (local.weekday() in BUSINESS_DAYS
+            and BUSINESS_START_HOUR <= local.hour < BUSINESS_END_HOUR)
+
+
+def parts_ready_after(now: int, required_parts: List[str], spare_parts_availability: dict) -> Optional[int]:
+    """
+    Earliest time (epoch minutes) the required parts are on hand.
+
+    Returns:
+        None if any required part is unavailable
+    """
+    ready = now
+    for part in required_parts:
+        status = spare_parts_availability.get(part, "available")
+        if status == "unavailable":
+            return None
+        if status == "in_transit":
+            ready = max(ready, now + PARTS_IN_TRANSIT_DAYS * MINUTES_PER_DAY)
+    return ready
+
+
+# --- Scorers ---------------------------------------------------------------
+
+def window_scorer(slot: int, context: dict) -> float:
+    """Days outside the slot_type's preferred window (0 inside it)."""
+    start, end = context["window"]
+    if slot < start:
+        return (start - slot) / MINUTES_PER_DAY
+    if slot > end:
+        return (slot - end) / MINUTES_PER_DAY
+    return 0.0
+
+
+def earliness_scorer(slot: int, context: dict) -> float:
+    """Days from now - sooner is better (weighted up for urgent cases)."""
+    days = (slot - context["now"]) / MINUTES_PER_DAY
+    return days * (3.0 if context["slot_type"] == "urgent" else 1.0)
+
+
+def severity_scorer(slot: int, context: dict) -> float:
+    """High severity pulls the slot towards the start of its window."""
+    if context.get("severity") != "High":
+        return 0.0
+    return max(0.0, (slot - context["window"][0]) / MINUTES_PER_DAY)
+
+
+def technician_scorer(slot: int, context: dict) -> float:
+    """Prefer slots where more technicians are free (easier to keep)."""
+    free = len(context["slot_technicians"].get(slot, ()))
+    return 1.0 / free if free else 1.0
+
+
+def forecast_scorer(slot: int, context: dict) -> float:
+    """Forecast load of the slot's day when it is saturated (0 otherwise or without a forecast)."""
+    daily_load = context.get("daily_load")
+    if not daily_load:
+        return 0.0
+    load = daily_load.get(to_iso(slot)[:10])
+    return load if load is not None and load >= SATURATION_LOAD else 0.0
+
+
+DEFAULT_SCORERS: List[Tuple[float, Scorer]] = [
+    (10.0, window_scorer),
+    (0.1, earliness_scorer),
+    (0.5, severity_scorer),
+    (0.2, technician_scorer),
+    (5.0, forecast_scorer),
+]
+
+
+def candidate_slots(technician_availability: Dict[str, list]) -> Dict[int, List[str]]:
+    """Slot (epoch minutes) -> technicians offering it (unparseable slots are dropped)."""
+    slot_technicians: Dict[int, List[str]] = {}
+    for tech_id, slots in (technician_availability or {}).items():
+        for slot in slots or []:
+            minute = to_minute(slot)
+            if minute is not None:
+                slot_technicians.setdefault(minute, []).append(tech_id)
+    return slot_technicians
+
+
+def rank_slots(
+    now_minute: int,
+    slot_type: str,
+    severity: Optional[str],
+    slot_technicians: Dict[int, List[str]],
+    tz,
+    ready: int,
+    scorers: Optional[List[Tuple[float, Scorer]]] = None,
+    service_center: Optional[str] = None,
+    daily_load: Optional[Dict[str, float]] = None,
+) -> List[Tuple[float, int]]:
+    """
+    Feasible slots with their costs, best first.
+
+    Rankings depend only on the urgency (slot_type, severity), parts
+    readiness and the center's calendar - not on the vehicle - so batch
+    scheduling ranks each center once per urgency group. daily_load is the
+    center's forecast load by UTC date ("YYYY-MM-DD").
+
+    Returns:
+        List of (cost, slot in epoch minutes), cheapest first
+    """
+    feasible = [
+        slot for slot in slot_technicians
+        if slot > now_minute and slot >= ready and in_business_hours(slot, tz)
+    ]
+    window_start, window_end = SLOT_WINDOWS[slot_type]
+    context = {
+        "now": now_minute,
+        "slot_type": slot_type,
+        "severity": severity,
+        "window": (now_minute + window_start * MINUTES_PER_DAY, now_minute + window_end * MINUTES_PER_DAY),
+        "slot_technicians": slot_technicians,
+        "service_center": service_center,
+        "daily_load": daily_load,
+    }
+    scorers = DEFAULT_SCORERS if scorers is None else scorers
+    return sorted(
+        (sum(weight * scorer(slot, context) for weight, scorer in scorers), slot)
+        for slot in feasible
+    )
+
+
+def saturated_in_window(daily_load: Optional[Dict[str, float]], now_minute: int, slot_type: str) -> bool:
+    """
+    True if every forecast day inside the slot_type's window is saturated,
+    i.e. the center is about to be full for this case. Days without a
+    forecast are ignored; no forecast at all is never saturated.
+    """
+    if not daily_load:
+        return False
+    window_start, window_end = SLOT_WINDOWS[slot_type]
+    first = to_iso(now_minute + window_start * MINUTES_PER_DAY)[:10]
+    last = to_iso(now_minute + window_end * MINUTES_PER_DAY)[:10]
+    loads = [load for day, load in daily_load.items() if first <= day <= last and load is not None]
+    return bool(loads) and all(load >= SATURATION_LOAD for load in loads)
+
+
+def pick_fallbacks(ranked: List[int], best: int) -> List[int]:
+    """
+    Fallback slots for best: best-ranked slots within FALLBACK_WINDOW_DAYS
+    of it, topped up with the nearest remaining slots if there are too few.
+    """
+    horizon = FALLBACK_WINDOW_DAYS * MINUTES_PER_DAY
+    others = [slot for slot in ranked if slot != best]
+    fallbacks = [slot for slot in others if abs(slot - best) <= horizon][:MAX_FALLBACK_SLOTS]
+    if len(fallbacks) < MIN_FALLBACK_SLOTS:
+        extra = sorted((s for s in others if s not in fallbacks), key=lambda s: abs(s - best))
+        fallbacks += extra[:MIN_FALLBACK_SLOTS - len(fallbacks)]
+    return sorted(fallbacks)
+
+
+def optimize_schedule(
+    now: datetime,
+    estimated_rul_days,
+    severity: Optional[str],
+    service_center: str,
+    spare_parts_availability: dict,
+    technician_availability: Dict[str, list],
+    center_timezone: Optional[str] = "UTC",
+    required_parts: Optional[List[str]] = None,
+    scorers: Optional[List[Tuple[float, Scorer]]] = None,
+    daily_load: Optional[Dict[str, float]] = None,
+) -> Optional[dict]:
+    """
+    Choose best_slot and fallback_slots for one vehicle at one service center.
+
+    Args:
+        now: Current time (aware, UTC)
+        estimated_rul_days: Remaining useful life from diagnosis
+        severity: "Low" | "Medium" | "High"
+        service_center: Service center ID
+        spare_parts_availability: part -> "available" | "unavailable" | "in_transit"
+        technician_availability: technician_id -> list of slots (epoch minutes or ISO strings)
+        center_timezone: Timezone used for the business-hours constraint
+        required_parts: Parts the repair needs (checked against spare_parts_availability)
+        scorers: (weight, scorer) pairs; defaults to DEFAULT_SCORERS
+        daily_load: Forecast load by UTC date from demand_forecasts (optional)
+
+    Returns:
+        Dict matching SchedulingOutput, or None if no slot satisfies the constraints
+    """
+    slot_type = classify_slot_type(estimated_rul_days)
+    now_minute = to_minute(now)
+    ready = parts_ready_after(now_minute, required_parts or [], spare_parts_availability or {})
+    if ready is None:
+        return None
+
+    ranked = rank_slots(
+        now_minute, slot_type, severity, candidate_slots(technician_availability),
+        get_timezone(center_timezone), ready, scorers, service_center, daily_load
+    )
+    if not ranked:
+        return None
+
+    slots = [slot for _, slot in ranked]
+    return {
+        "best_slot": to_iso(slots[0]),
+        "service_center": service_center,
+        "slot_type": slot_type,
+        "fallback_slots": [to_iso(slot) for slot in pick_fallbacks(slots, slots[0])],
+    }
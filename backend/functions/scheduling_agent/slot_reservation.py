@@ -0,0 +1,149 @@
+"""
+Atomic slot reservation for the scheduling_agent Cloud Function.
+
+Reading free slots and later writing bookings/{booking_id} is not atomic, so
+two concurrent cases could book the same slot. Every booking first claims a
+lock document slot_locks/{center_id}_{slot epoch minute} with create(),
+which Firestore only lets succeed once per document. The loser of a race
+gets AlreadyExists and moves on to its next candidate slot.
+
+Lock documents carry the booking_id, so re-claiming a slot for the same
+booking is idempotent (safe to retry), and a booking whose write fails can
+release its own lock. Locks are not released when a booking is later
+cancelled or declined, and they have no expiry: the slot stays taken.
+"""
+
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Optional, Union
+
+from google.api_core import exceptions
+from google.cloud import firestore
+
+from slot_calendar import to_iso, to_minute
+
+SLOT_LOCKS_COLLECTION = "slot_locks"
+
+# Candidate slots tried before giving up on a center
+MAX_RESERVATION_ATTEMPTS = 10
+
+Slot = Union[str, datetime, int]
+
+
+def slot_lock_id(center_id: str, slot: Slot) -> str:
+    """Lock document ID for a center and slot (slot normalized to epoch minutes)."""
+    return f"{center_id}_{to_minute(slot)}"
+
+
+def reserve_slot(db, center_id: str, slot: Slot, booking_id: str, vehicle_id: Optional[str] = None) -> bool:
+    """
+    Claim slot at center_id for booking_id.
+
+    Returns:
+        True if the slot is now held by booking_id, False if another booking holds it
+    """
+    lock_ref = db.collection(SLOT_LOCKS_COLLECTION).document(slot_lock_id(center_id, slot))
+    try:
+        lock_ref.create({
+            "service_center_id": center_id,
+            "slot": to_iso(to_minute(slot)),
+            "booking_id": booking_id,
+            "vehicle_id": vehicle_id,
+            "created_at": firestore.SERVER_TIMESTAMP
+        })
+        return True
+    except exceptions.Conflict:  # AlreadyExists
+        existing = lock_ref.get()
+        return existing.exists and (existing.to_dict() or {}).get("booking_id") == booking_id
+
+
+def release_slot(db, center_id: str, slot: Slot, booking_id: str) -> bool:
+    """Release slot if it is held by booking_id. Returns True if a lock was removed."""
+    lock_ref = db.collection(SLOT_LOCKS_COLLECTION).document(slot_lock_id(center_id, slot))
+    existing = lock_ref.get()
+    if not existing.exists or (existing.to_dict() or {}).get("booking_id") != booking_id:
+        return False
+    lock_ref.delete()
+    return True
+
+
+def release_slots(db, reservations: Iterable[tuple]) -> int:
+    """
+    Best-effort release of (center_id, slot, booking_id) reservations whose
+    booking was not written. Non-blocking: failures are logged, not raised, so
+    the caller can re-raise the error that made it give the slots back.
+
+    Returns:
+        Number of locks removed
+    """
+    released = 0
+    for center_id, slot, booking_id in reservations:
+        try:
+            released += release_slot(db, center_id, slot, booking_id)
+        except Exception as e:
+            print(f"Could not release slot {slot_lock_id(center_id, slot)} for {booking_id} (non-blocking): {str(e)}")
+    return released
+
+
+class ReservedBatch:
+    """
+    Firestore writes for bookings whose slots are reserved, committed in chunks
+    of at most `limit` writes.
+
+    hold() records a reservation as soon as it is made; add() closes an item
+    whose writes were put on .batch and commits the chunk when the next item
+    could overflow it. committed lists the items of every chunk that was
+    written. If a commit (or anything before it) fails, release_uncommitted()
+    gives back only the locks of items not written yet - committed items keep
+    theirs and still need their follow-up steps.
+    """
+
+    def __init__(self, db, limit: int):
+        self.db = db
+        self.limit = limit
+        self.batch = db.batch()
+        self.writes = 0
+        self.items = []
+        self.locks = []  # (center_id, slot, booking_id) of the open chunk
+        self.committed = []
+
+    def hold(self, center_id: str, slot: Slot, booking_id: str):
+        self.locks.append((center_id, slot, booking_id))
+
+    def add(self, item, writes: int):
+        self.items.append(item)
+        self.writes += writes
+        if self.writes + writes > self.limit:
+            self.commit()
+
+    def commit(self):
+        if self.writes:
+            self.batch.commit()
+            self.committed.extend(self.items)
+        self.batch = self.db.batch()
+        self.writes = 0
+        self.items, self.locks = [], []
+
+    def release_uncommitted(self) -> int:
+        released = release_slots(self.db, self.locks)
+        self.items, self.locks = [], []
+        return released
+
+
+def reserve_first_free(db, center_id: str, slots: Iterable[Slot], booking_id: str,
+                       vehicle_id: Optional[str] = None,
+                       max_attempts: int = MAX_RESERVATION_ATTEMPTS) -> Optional[int]:
+    """
+    Reserve the first slot in preference order that no other booking holds.
+
+    Args:
+        slots: Candidate slots, best first (may be a lazy iterator)
+        max_attempts: Candidates tried before giving up
+
+    Returns:
+        The reserved slot (epoch minutes), or None if every attempt lost
+    """
+    for slot in islice(slots, max_attempts):
+        if reserve_slot(db, center_id, slot, booking_id, vehicle_id):
+            return to_minute(slot)
+    return None
@@ -0,0 +1,110 @@
+"""
+Technician skills, shifts and workload for the scheduling_agent Cloud Function.
+
+Technicians are documents in the technicians collection:
+
+    {
+        "technician_id": "tech_001",
+        "service_center_id": "center_001",
+        "skills": ["engine_coolant_system", "battery"],   # components, or "general"
+        "shifts": {"monday": {"start": "09:00", "end": "17:00"}, ...},  # optional
+        "max_daily_jobs": 6,                               # optional
+        "active": true
+    }
+
+TechnicianRoster indexes them by (service center, skill), so the technicians
+qualified for a diagnosis component are a dict lookup. Specialists for the
+component are preferred; "general" technicians are used only when a center
+has none. Each qualified technician is offered the center's free slots
+inside their own shift (operating-hours format, precomputed by slot_calendar)
+on days where they are below max_daily_jobs - this is the
+technician_availability the slot optimizer consumes.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from slot_calendar import slot_calendar, to_iso
+
+GENERALIST_SKILL = "general"
+DEFAULT_MAX_DAILY_JOBS = 6
+
+
+def skill_key(component: Optional[str]) -> Optional[str]:
+    """Normalized skill name for a component ("Engine Coolant System" -> "engine_coolant_system")."""
+    return component.strip().lower().replace(" ", "_") if component else None
+
+
+class TechnicianRoster:
+    """Active technicians indexed by service center and skill."""
+
+    def __init__(self, technicians: Iterable[dict]):
+        self.technicians: Dict[str, dict] = {}
+        self.by_center: Dict[str, Set[str]] = {}
+        self.by_skill: Dict[tuple, Set[str]] = {}
+        for tech in technicians:
+            tech_id = tech.get("technician_id")
+            center_id = tech.get("service_center_id")
+            if not tech_id or not center_id or tech.get("active") is False:
+                continue
+            self.technicians[tech_id] = tech
+            self.by_center.setdefault(center_id, set()).add(tech_id)
+            for skill in tech.get("skills") or [GENERALIST_SKILL]:
+                self.by_skill.setdefault((center_id, skill_key(skill)), set()).add(tech_id)
+
+    def has_center(self, center_id: str) -> bool:
+        return center_id in self.by_center
+
+    def qualified(self, center_id: str, component: Optional[str]) -> List[str]:
+        """
+        Technicians at center_id who can work on component: specialists if any,
+        otherwise generalists. Without a component every technician qualifies.
+        """
+        if not component:
+            return sorted(self.by_center.get(center_id, ()))
+        specialists = self.by_skill.get((center_id, skill_key(component)))
+        if specialists:
+            return sorted(specialists)
+        return sorted(self.by_skill.get((center_id, GENERALIST_SKILL), ()))
+
+    def availability(self, center: dict, component: Optional[str], free_slots: List[int], now: datetime,
+                     loads: Optional[Dict[str, Dict[str, int]]] = None,
+                     days_ahead: int = 30) -> Dict[str, List[int]]:
+        """
+        technician_availability for a case: qualified technician -> free slots
+        (epoch minutes) inside their shift, on days below their daily job limit.
+
+        Args:
+            center: Service center document (timezone, operating_hours)
+            free_slots: The center's unbooked candidate slots
+            loads: technician_id -> {"YYYY-MM-DD" (UTC): booked jobs}
+        """
+        center_id = center.get("service_center_id")
+        free = set(free_slots)
+        availability: Dict[str, List[int]] = {}
+        for tech_id in self.qualified(center_id, component):
+            tech = self.technicians[tech_id]
+            shift = slot_calendar(
+                f"{center_id}/{tech_id}",
+                tech.get("shifts") or center.get("operating_hours", {}),
+                center.get("timezone", "UTC"),
+                now,
+                days_ahead=days_ahead
+            )
+            limit = tech.get("max_daily_jobs", DEFAULT_MAX_DAILY_JOBS)
+            booked = (loads or {}).get(tech_id, {})
+            full_days = {day for day, jobs in booked.items() if jobs >= limit}
+            slots = [slot for slot in shift if slot in free and to_iso(slot)[:10] not in full_days]
+            if slots:
+                availability[tech_id] = slots
+        return availability
+
+
+def pick_technician(technician_availability: Dict[str, List[int]], slot: int,
+                    loads: Optional[Dict[str, Dict[str, int]]] = None) -> Optional[str]:
+    """Least-loaded technician (that day) offering slot; ties go to the lowest ID."""
+    day = to_iso(slot)[:10]
+    offering = [tech_id for tech_id, slots in technician_availability.items() if slot in slots]
+    if not offering:
+        return None
+    return min(offering, key=lambda tech_id: ((loads or {}).get(tech_id, {}).get(day, 0), tech_id))
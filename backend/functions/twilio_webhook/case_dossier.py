@@ -0,0 +1,75 @@
+"""
+Per-case dossier shared by the pipeline stages.
+
+Every stage appends its output to case_dossiers/{case_id} under its own key
+(anomaly, diagnosis, rca, scheduling, engagement, feedback, manufacturing),
+so the next stage gets full case context from a single document read instead
+of re-fetching each previous stage's collection.
+
+The per-stage collections (anomaly_cases, diagnosis_cases, ...) are still
+written as before and remain the fallback for cases started before the
+dossier existed.
+
+Each Cloud Function deploys its own copy - keep the copies identical.
+"""
+
+from google.cloud import firestore
+
+DOSSIER_COLLECTION = "case_dossiers"
+
+STAGES = ("anomaly", "diagnosis", "rca", "scheduling", "engagement", "feedback", "manufacturing")
+
+
+def append_stage(db, case_id: str, stage: str, stage_data: dict, **extra) -> bool:
+    """
+    Merge one stage's output into the case dossier.
+
+    Non-blocking: a failed write is logged and readers fall back to the
+    per-stage collections.
+
+    Args:
+        db: Firestore client
+        case_id: Anomaly case the dossier belongs to
+        stage: One of STAGES
+        stage_data: Stage output (the document written to the stage's collection)
+        **extra: Additional top-level fields (e.g. telemetry_window)
+
+    Returns:
+        True if the dossier was written
+    """
+    if not case_id:
+        return False
+    if stage not in STAGES:
+        raise ValueError(f"Unknown dossier stage: {stage}")
+    try:
+        update = {
+            "case_id": case_id,
+            stage: stage_data,
+            "stages": firestore.ArrayUnion([stage]),
+            "updated_at": firestore.SERVER_TIMESTAMP,
+            **extra
+        }
+        db.collection(DOSSIER_COLLECTION).document(case_id).set(update, merge=True)
+        return True
+    except Exception as e:
+        print(f"Case dossier update failed for {case_id}/{stage} (non-blocking): {str(e)}")
+        return False
+
+
+def load_dossier(db, case_id: str) -> dict:
+    """
+    Read the full case dossier in one document read.
+
+    Returns:
+        Dossier dict, or {} if there is no dossier for this case
+    """
+    if not case_id:
+        return {}
+    try:
+        doc = db.collection(DOSSIER_COLLECTION).document(case_id).get()
+    except Exception as e:
+        print(f"Case dossier read failed for {case_id} (falling back to stage collections): {str(e)}")
+        return {}
+    if not doc.exists:
+        return {}
+    return doc.to_dict() or {}
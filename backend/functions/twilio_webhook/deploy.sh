@@ -0,0 +1,37 @@
+#!/bin/bash
+
+# Deploy the Twilio voice webhook and the speculative-turn function (same source)
+
+echo "🚀 Deploying twilio-webhook function..."
+echo ""
+
+cd "$(dirname "$0")"
+
+gcloud functions deploy twilio-webhook \
+  --gen2 \
+  --runtime=python311 \
+  --region=us-central1 \
+  --source=. \
+  --entry-point=twilio_webhook \
+  --trigger-http \
+  --memory=512MB \
+  --project=navigo-27206 \
+  --service-account=navigo-functions@navigo-27206.iam.gserviceaccount.com \
+  --allow-unauthenticated
+
+# Speculative turns are generated in their own Pub/Sub-triggered request,
+# not in background threads of the webhook (CPU is throttled after a response)
+echo "🚀 Deploying speculate-voice-turns function..."
+gcloud functions deploy speculate-voice-turns \
+  --gen2 \
+  --runtime=python311 \
+  --region=us-central1 \
+  --source=. \
+  --entry-point=speculate_voice_turns \
+  --trigger-topic=navigo-voice-speculation \
+  --memory=512MB \
+  --project=navigo-27206 \
+  --service-account=navigo-functions@navigo-27206.iam.gserviceaccount.com
+
+echo ""
+echo "✅ Deployment complete!"
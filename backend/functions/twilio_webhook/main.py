@@ -1,17 +1,29 @@
 """
 Cloud Function: twilio_webhook
 HTTP Trigger: Handles Twilio callbacks (gather input, status updates)
-Purpose: Generates dynamic TwiML responses using Gemini 2.5 Flash and manages conversation state
+Purpose: Generates TwiML responses (local intents + precomputed responses, Gemini 2.5 Flash
+         for open questions and speculated follow-ups) and manages conversation state
 """
 
 import json
 import os
 import time
-import random
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timezone
 from google.cloud import firestore, pubsub_v1
 from flask import Request, Response
 import functions_framework
+from case_dossier import load_dossier
+from intent_model import INTENT_MODEL_CONFIDENCE, load_model
+from speculation import (
+    SPECULATIVE_INTENTS, budget_report, serve, should_speculate, speculated_turn,
+    speculation_entry, speculation_prompt
+)
+from transcript_log import RECENT_TURNS, append_turn, format_history, recent_turns, turn_entries
+from voice_turns import (
+    STAGE_COMPLETED, STAGE_PENDING, TurnMetrics, build_facts, detect_intent,
+    greeting, holding_response, model_intent, precomputed_response
+)
 
 # Vertex AI imports
 import vertexai
@@ -49,6 +61,25 @@ print(f"DEBUG: LOCATION_RAW={LOCATION_RAW}, LOCATION={LOCATION}")
 
 # Pub/Sub configuration
 COMMUNICATION_TOPIC_NAME = "navigo-communication-complete"
+SPECULATION_TOPIC_NAME = os.getenv("SPECULATION_TOPIC", "navigo-voice-speculation")
+
+# Voice turn budget: Gemini only answers open questions and must do so within
+# LLM_TURN_TIMEOUT_SECONDS, otherwise the caller gets a holding response
+LLM_TURN_TIMEOUT_SECONDS = float(os.getenv("LLM_TURN_TIMEOUT_SECONDS", "2.5"))
+
+# Warm per-instance clients (created on first use, reused across requests)
+_db = None
+_model = None
+_publisher = None
+_llm_executor = ThreadPoolExecutor(max_workers=4)
+turn_metrics = TurnMetrics()
+
+# Speculative turns are generated in their own request: the webhook publishes the call to
+# SPECULATION_TOPIC_NAME and the speculate_voice_turns function (same source, see deploy.sh)
+# generates them. Threads left running after a webhook response would be CPU-throttled
+# until the instance's next request, i.e. usually too late for the caller's reply.
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "true").lower() == "true"
+_speculation_executor = ThreadPoolExecutor(max_workers=len(SPECULATIVE_INTENTS))
 
 # System prompt for Gemini to generate TwiML conversation
 SYSTEM_PROMPT = """You are a voice assistant for NaviGo, a vehicle maintenance service. You are making a phone call to inform a customer about their vehicle issue and help them schedule service.
@@ -104,6 +135,167 @@ def extract_json_from_response(text: str) -> dict:
         raise
 
 
+def get_db():
+    global _db
+    if _db is None:
+        _db = firestore.Client()
+    return _db
+
+
+def get_model():
+    """Gemini model, initialized once per instance."""
+    global _model
+    if _model is None:
+        # Validate PROJECT_ID and LOCATION before initialization
+        if not PROJECT_ID or " " in PROJECT_ID or "=" in PROJECT_ID:
+            raise ValueError(f"Invalid PROJECT_ID: '{PROJECT_ID}'. Must be a single word without spaces or equals signs.")
+        if not LOCATION or " " in LOCATION or "=" in LOCATION:
+            raise ValueError(f"Invalid LOCATION: '{LOCATION}'. Must be a single word without spaces or equals signs.")
+        print(f"Initializing Vertex AI with project={PROJECT_ID}, location={LOCATION}")
+        vertexai.init(project=PROJECT_ID, location=LOCATION)
+        _model = GenerativeModel("gemini-2.5-flash")
+    return _model
+
+
+def get_publisher():
+    global _publisher
+    if _publisher is None:
+        _publisher = pubsub_v1.PublisherClient()
+    return _publisher
+
+
+def generate_llm_turn(prompt: str, timeout: float = LLM_TURN_TIMEOUT_SECONDS):
+    """
+    One Gemini call within the turn budget (no retries, no jitter).
+    Returns the parsed JSON response, or None on timeout, rate limiting or bad output.
+    """
+    future = _llm_executor.submit(lambda: get_model().generate_content(prompt).text)
+    try:
+        return extract_json_from_response(future.result(timeout=timeout))
+    except FutureTimeoutError:
+        print(f"Gemini missed the {timeout}s turn budget, using holding response")
+    except exceptions.ResourceExhausted as e:
+        print(f"Gemini rate limited (429), using holding response: {str(e)}")
+    except Exception as e:
+        print(f"Error calling Gemini, using holding response: {str(e)}")
+    return None
+
+
+def speculate_next_turns(call_sid: str, facts: dict):
+    """
+    Request the likely next turns (see speculation.py) from speculate_voice_turns.
+    The publish completes before the webhook responds; generation happens in that
+    function's own request.
+    """
+    if not SPECULATION_ENABLED:
+        return
+    try:
+        publisher = get_publisher()
+        topic_path = publisher.topic_path(PROJECT_ID, SPECULATION_TOPIC_NAME)
+        message = json.dumps({"call_sid": call_sid, "facts": facts}, default=str).encode("utf-8")
+        publisher.publish(topic_path, message).result(timeout=LLM_TURN_TIMEOUT_SECONDS)
+    except Exception as e:
+        print(f"Could not request speculative turns for {call_sid} (non-blocking): {str(e)}")
+
+
+@functions_framework.cloud_event
+def speculate_voice_turns(cloud_event):
+    """
+    Pub/Sub triggered function that pre-generates the likely next turns of a call
+    (SPECULATIVE_INTENTS, concurrently) and stores them on the call context.
+    Returns once all of them are stored, so the work runs with the request's CPU.
+    """
+    try:
+        message_data = cloud_event.data
+        if isinstance(message_data, str):
+            message_data = json.loads(message_data)
+        
+        # Handle base64 encoded data
+        if "message" in message_data and "data" in message_data["message"]:
+            import base64
+            decoded = base64.b64decode(message_data["message"]["data"]).decode("utf-8")
+            message_data = json.loads(decoded)
+        
+        call_sid = message_data.get("call_sid")
+        facts = message_data.get("facts") or {}
+        if not call_sid:
+            print("Missing call_sid in speculation request")
+            return {"status": "error", "error": "Missing call_sid"}
+        
+        futures = [_speculation_executor.submit(_speculate_turn, call_sid, intent, facts)
+                   for intent in SPECULATIVE_INTENTS]
+        for future in futures:
+            future.result()
+        return {"status": "success", "call_sid": call_sid}
+    
+    except Exception as e:
+        print(f"Error in speculate_voice_turns: {str(e)}")
+        return {"status": "error", "error": str(e)}
+
+
+def _speculate_turn(call_sid: str, intent: str, facts: dict):
+    prompt = speculation_prompt(SYSTEM_PROMPT, intent, facts)
+    started = time.perf_counter()
+    text, result = "", None
+    try:
+        text = get_model().generate_content(prompt).text
+        result = extract_json_from_response(text)
+    except Exception as e:
+        print(f"Speculative '{intent}' turn failed for {call_sid} (non-blocking): {str(e)}")
+    entry = speculation_entry(speculated_turn(intent, result), (time.perf_counter() - started) * 1000, prompt, text)
+    try:
+        get_db().collection("call_contexts").document(call_sid).update({f"speculations.{intent}": entry})
+    except Exception as e:
+        print(f"Could not store speculative '{intent}' turn for {call_sid} (non-blocking): {str(e)}")
+
+
+def load_call_facts(db, context_ref, context_data: dict) -> dict:
+    """
+    Call facts for the precomputed responses. Built from the case dossier on the
+    first turn and kept in the call context, so later turns need no extra reads.
+    """
+    facts = context_data.get("call_facts")
+    if facts:
+        return facts
+    dossier = load_dossier(db, context_data.get("case_id")) if context_data.get("case_id") else {}
+    center = None
+    center_id = (dossier.get("scheduling") or {}).get("service_center")
+    if center_id:
+        try:
+            center_doc = db.collection("service_centers").document(center_id).get()
+            center = center_doc.to_dict() if center_doc.exists else None
+        except Exception as e:
+            print(f"Service center lookup failed for {center_id} (non-blocking): {str(e)}")
+    facts = build_facts(context_data, dossier, center)
+    try:
+        context_ref.update({"call_facts": facts})
+    except Exception as e:
+        print(f"Could not cache call facts (non-blocking): {str(e)}")
+    return facts
+
+
+def build_twiml(turn: dict, gather_url: str) -> str:
+    """TwiML for a turn: say the message, then gather the next input or hang up."""
+    twiml_response = VoiceResponse()
+    twiml_response.say(turn["message"], voice='Polly.Aditi', language='en-IN')
+    if turn.get("prompt"):
+        gather = Gather(
+            input='speech dtmf',
+            timeout=5,
+            num_digits=1,
+            action=gather_url,
+            method='POST',
+            speech_timeout='auto'
+        )
+        gather.say(turn["prompt"], voice='Polly.Aditi', language='en-IN')
+        twiml_response.append(gather)
+    else:
+        twiml_response.say("Thank you for your time. Have a great day!",
+                           voice='Polly.Aditi', language='en-IN')
+        twiml_response.hangup()
+    return str(twiml_response)
+
+
 @functions_framework.http
 def twilio_webhook(request: Request):
     """
@@ -134,7 +326,7 @@ def twilio_webhook(request: Request):
 
 
 def handle_initial_call(request: Request) -> Response:
-    """Handle initial Twilio call - generate greeting"""
+    """Handle initial Twilio call - precomputed greeting (no LLM call)"""
     
     try:
         call_sid = request.form.get('CallSid')
@@ -142,7 +334,7 @@ def handle_initial_call(request: Request) -> Response:
             return generate_error_response("Missing CallSid")
         
         # Fetch call context
-        db = firestore.Client()
+        db = get_db()
         context_ref = db.collection("call_contexts").document(call_sid)
         context_doc = context_ref.get()
         
@@ -150,86 +342,27 @@ def handle_initial_call(request: Request) -> Response:
             return generate_error_response("Call context not found")
         
         context_data = context_doc.to_dict()
-        customer_name = context_data.get("customer_name", "Customer")
-        vehicle_id = context_data.get("vehicle_id")
-        engagement_data = context_data.get("engagement_data", {})
-        
-        # Generate greeting using Gemini
-        # Validate PROJECT_ID and LOCATION before initialization
-        if not PROJECT_ID or " " in PROJECT_ID or "=" in PROJECT_ID:
-            raise ValueError(f"Invalid PROJECT_ID: '{PROJECT_ID}'. Must be a single word without spaces or equals signs.")
-        if not LOCATION or " " in LOCATION or "=" in LOCATION:
-            raise ValueError(f"Invalid LOCATION: '{LOCATION}'. Must be a single word without spaces or equals signs.")
-        
-        print(f"Initializing Vertex AI with project={PROJECT_ID}, location={LOCATION}")
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-        model = GenerativeModel("gemini-2.5-flash")
-        
-        prompt = f"""{SYSTEM_PROMPT}
-
-Generate the initial greeting for this call:
-- Customer Name: {customer_name}
-- Vehicle ID: {vehicle_id}
-- Issue: {engagement_data.get('transcript', 'Vehicle maintenance issue')}
-
-Return ONLY the JSON response with greeting message and next_stage="explanation"."""
-        
-        # Call Gemini with retry logic for rate limiting (429 errors)
-        max_retries = 5
-        retry_delay = 2  # Start with 2 seconds
-        response = None
-        response_text = None
-        
-        for attempt in range(max_retries):
-            try:
-                response = model.generate_content(prompt)
-                response_text = response.text
-                break  # Success, exit retry loop
-            except exceptions.ResourceExhausted as e:
-                if attempt < max_retries - 1:
-                    # Exponential backoff with jitter: 2s, 4s, 8s, 16s, 32s
-                    wait_time = retry_delay * (2 ** attempt) + random.uniform(0, 1)
-                    print(f"Rate limit hit (429), retrying in {wait_time:.2f}s (attempt {attempt + 1}/{max_retries})...")
-                    time.sleep(wait_time)
-                else:
-                    # Last attempt failed
-                    print(f"Rate limit error after {max_retries} attempts: {str(e)}")
-                    raise
-            except Exception as e:
-                # For other errors, don't retry
-                print(f"Error calling Gemini: {str(e)}")
-                raise
-        
-        result = extract_json_from_response(response_text)
-        
-        # Generate TwiML
-        twiml_response = VoiceResponse()
-        twiml_response.say(result.get("message", f"Hello {customer_name}, this is NaviGo calling about your vehicle."), 
-                          voice='Polly.Aditi', language='en-IN')
-        
-        # Gather user response
-        gather_url = f"{request.url_root}gather"
-        gather = Gather(
-            input='speech dtmf',
-            timeout=5,
-            num_digits=1,
-            action=gather_url,
-            method='POST',
-            speech_timeout='auto'
-        )
-        gather.say("Do you have a moment to discuss an important matter about your vehicle?", 
-                  voice='Polly.Aditi', language='en-IN')
-        twiml_response.append(gather)
+        facts = load_call_facts(db, context_ref, context_data)
+        turn = greeting(facts)
         
         # Update communication case
         communication_id = context_data.get("communication_id")
         if communication_id:
             db.collection("communication_cases").document(communication_id).update({
-                "conversation_stage": "greeting",
+                "conversation_stage": turn["next_stage"],
                 "updated_at": firestore.SERVER_TIMESTAMP
             })
+        context_update = {"conversation_stage": turn["next_stage"]}
+        speculate = should_speculate(context_data, turn["next_stage"])
+        if speculate:
+            context_update["speculation_started"] = True
+        context_ref.update(context_update)
         
-        return Response(str(twiml_response), mimetype='text/xml')
+        # Speculate on the reply while the caller listens to the greeting
+        if speculate:
+            speculate_next_turns(call_sid, facts)
+        
+        return Response(build_twiml(turn, f"{request.url_root}gather"), mimetype='text/xml')
         
     except Exception as e:
         print(f"Error in handle_initial_call: {str(e)}")
@@ -237,8 +370,17 @@ Return ONLY the JSON response with greeting message and next_stage="explanation"
 
 
 def handle_gather(request: Request) -> Response:
-    """Handle user input from Twilio Gather"""
+    """
+    Handle user input from Twilio Gather within the turn latency budget:
+    1. One read (call context, which carries the stage, turn count and call facts)
+    2. Local intent detection (speech keywords / DTMF, then the trained classifier)
+    3. Speculated turn if one is ready, else precomputed response for common intents;
+       Gemini only for open questions
+    4. One batched write (fixed-size transcript turn document + stage), metric logged per turn
+    5. Speculation on the next reply while the caller listens to this turn
+    """
     
+    started = time.perf_counter()
     try:
         call_sid = request.form.get('CallSid')
         speech_result = request.form.get('SpeechResult', '').strip()
@@ -249,8 +391,8 @@ def handle_gather(request: Request) -> Response:
         if not call_sid:
             return generate_error_response("Missing CallSid")
         
-        # Fetch call context
-        db = firestore.Client()
+        # 1. Fetch call context (stage and call facts live here)
+        db = get_db()
         context_ref = db.collection("call_contexts").document(call_sid)
         context_doc = context_ref.get()
         
@@ -259,147 +401,105 @@ def handle_gather(request: Request) -> Response:
         
         context_data = context_doc.to_dict()
         communication_id = context_data.get("communication_id")
-        customer_name = context_data.get("customer_name", "Customer")
         vehicle_id = context_data.get("vehicle_id")
         engagement_data = context_data.get("engagement_data", {})
-        
-        # Fetch current communication case
-        comm_ref = db.collection("communication_cases").document(communication_id)
-        comm_doc = comm_ref.get()
-        comm_data = comm_doc.to_dict() if comm_doc.exists else {}
-        current_stage = comm_data.get("conversation_stage", "greeting")
-        transcript = comm_data.get("conversation_transcript", [])
-        
-        # Add user input to transcript
-        transcript.append({
-            "speaker": "customer",
-            "message": user_input,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        })
-        
-        # Use Gemini to generate response
-        # Validate PROJECT_ID and LOCATION before initialization
-        if not PROJECT_ID or " " in PROJECT_ID or "=" in PROJECT_ID:
-            raise ValueError(f"Invalid PROJECT_ID: '{PROJECT_ID}'. Must be a single word without spaces or equals signs.")
-        if not LOCATION or " " in LOCATION or "=" in LOCATION:
-            raise ValueError(f"Invalid LOCATION: '{LOCATION}'. Must be a single word without spaces or equals signs.")
-        
-        print(f"Initializing Vertex AI with project={PROJECT_ID}, location={LOCATION}")
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-        model = GenerativeModel("gemini-2.5-flash")
-        
-        # Build conversation history
-        history_text = "\n".join([f"{msg.get('speaker', 'unknown')}: {msg.get('message', '')}" 
-                                  for msg in transcript[-5:]])  # Last 5 messages
-        
-        prompt = f"""{SYSTEM_PROMPT}
+        current_stage = context_data.get("conversation_stage", STAGE_PENDING)
+        turn_number = context_data.get("turn_count", 0) + 1
+        case_ref = db.collection("communication_cases").document(communication_id) if communication_id else None
+        facts = load_call_facts(db, context_ref, context_data)
+        
+        # 2. Local intent detection; the classifier (loaded once per instance) only
+        #    sees turns the keywords missed
+        intent = detect_intent(speech_result, digits)
+        classified = model_intent(speech_result, load_model(), INTENT_MODEL_CONFIDENCE) if intent == "open" else None
+        
+        # 3. Speculated turn (already generated while the caller listened), precomputed
+        #    response, or Gemini for open questions
+        speculations = context_data.get("speculations")
+        turn = serve(speculations, classified or intent, current_stage)
+        served_intent = (classified or intent) if turn else None
+        path = "speculative" if turn else ("model" if classified else "local")
+        if turn is None:
+            turn = precomputed_response(classified or intent, current_stage, facts)
+        if turn is None:
+            history = format_history(recent_turns(case_ref, RECENT_TURNS)) if case_ref else "No previous conversation."
+            prompt = f"""{SYSTEM_PROMPT}
 
 Current conversation stage: {current_stage}
-Conversation history:
-{history_text}
+
+Recent conversation:
+{history}
 
 Customer just said: "{user_input}"
 
 Vehicle context:
 - Vehicle ID: {vehicle_id}
-- Issue: {engagement_data.get('transcript', 'Vehicle maintenance issue')}
-- Recommended action: {engagement_data.get('recommended_action', 'Schedule service')}
+- Issue: {facts.get('issue') or 'Vehicle maintenance issue'}
+- Recommended action: {facts.get('recommended_action') or 'Schedule service'}
+- Appointment: {facts.get('slot_text')} at {facts.get('service_center')}
 
-Generate the next response. If customer agrees to schedule, set next_stage="scheduling". 
-If customer asks questions, set next_stage="questions". If customer declines, set next_stage="completed".
+Answer the customer's question, then ask whether they want to confirm the appointment.
+If customer declines, set next_stage="completed". Otherwise set next_stage="questions".
 
 Return ONLY the JSON response."""
-        
-        # Call Gemini with retry logic for rate limiting (429 errors)
-        # Note: For voice calls, we use shorter jitter (0-2s) to keep conversation responsive
-        jitter = random.uniform(0, 2)
-        if jitter > 0:
-            print(f"Adding {jitter:.2f}s jitter delay before Gemini call...")
-            time.sleep(jitter)
-        
-        max_retries = 5
-        retry_delay = 2  # Start with 2 seconds
-        response = None
-        response_text = None
-        
-        for attempt in range(max_retries):
-            try:
-                response = model.generate_content(prompt)
-                response_text = response.text
-                break  # Success, exit retry loop
-            except exceptions.ResourceExhausted as e:
-                if attempt < max_retries - 1:
-                    # Exponential backoff with jitter: 2s, 4s, 8s, 16s, 32s
-                    wait_time = retry_delay * (2 ** attempt) + random.uniform(0, 1)
-                    print(f"Rate limit hit (429), retrying in {wait_time:.2f}s (attempt {attempt + 1}/{max_retries})...")
-                    time.sleep(wait_time)
-                else:
-                    # Last attempt failed
-                    print(f"Rate limit error after {max_retries} attempts: {str(e)}")
-                    raise
-            except Exception as e:
-                # For other errors, don't retry
-                print(f"Error calling Gemini: {str(e)}")
-                raise
-        
-        result = extract_json_from_response(response_text)
-        
-        agent_message = result.get("message", "Thank you for your time.")
-        next_stage = result.get("next_stage", "completed")
-        
-        # Add agent response to transcript
-        transcript.append({
-            "speaker": "agent",
-            "message": agent_message,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        })
-        
-        # Generate TwiML
-        twiml_response = VoiceResponse()
-        twiml_response.say(agent_message, voice='Polly.Aditi', language='en-IN')
-        
-        # If not completed, gather next input
-        if next_stage != "completed":
-            gather_url = f"{request.url_root}gather"
-            gather = Gather(
-                input='speech dtmf',
-                timeout=5,
-                action=gather_url,
-                method='POST',
-                speech_timeout='auto'
-            )
-            if next_stage == "scheduling":
-                gather.say("Would you like to confirm this appointment?", 
-                          voice='Polly.Aditi', language='en-IN')
+            result = generate_llm_turn(prompt)
+            if result and result.get("message"):
+                next_stage = result.get("next_stage") or "questions"
+                turn = {
+                    "message": result["message"],
+                    "prompt": None if next_stage == STAGE_COMPLETED else "Would you like to confirm this appointment?",
+                    "next_stage": next_stage,
+                    "outcome": "declined" if next_stage == STAGE_COMPLETED else None
+                }
+                path = "llm"
             else:
-                gather.say("How can I help you further?", 
-                          voice='Polly.Aditi', language='en-IN')
-            twiml_response.append(gather)
-        else:
-            # Call completed
-            twiml_response.say("Thank you for your time. Have a great day!", 
-                              voice='Polly.Aditi', language='en-IN')
-            twiml_response.hangup()
+                turn = holding_response(current_stage)
+                path = "fallback"
         
-        # Update communication case
-        outcome = "confirmed" if next_stage == "scheduling" and "yes" in user_input.lower() else \
-                  "declined" if "no" in user_input.lower() else None
+        next_stage = turn["next_stage"]
+        outcome = turn["outcome"]
+        now_iso = datetime.now(timezone.utc).isoformat()
         
+        twiml = build_twiml(turn, f"{request.url_root}gather")
+        
+        # 4. One batched write: this turn's transcript document (append-only, fixed size),
+        #    stage and turn count on the case and the call context
         update_data = {
             "conversation_stage": next_stage,
-            "conversation_transcript": transcript,
-            "outcome": outcome,
+            "transcript_turns": turn_number,
             "updated_at": firestore.SERVER_TIMESTAMP
         }
-        
+        if outcome:
+            update_data["outcome"] = outcome
         if outcome == "confirmed" and engagement_data.get("booking_id"):
             update_data["booking_id"] = engagement_data.get("booking_id")
         
-        db.collection("communication_cases").document(communication_id).update(update_data)
+        context_update = {"conversation_stage": next_stage, "turn_count": turn_number}
+        speculate = should_speculate(context_data, next_stage)
+        if speculate:
+            context_update["speculation_started"] = True
+        if next_stage == STAGE_COMPLETED and speculations:
+            # Evict the call's speculations and report what they cost
+            update_data["speculation"] = budget_report(speculations, served_intent, call_sid)
+            context_update["speculations"] = firestore.DELETE_FIELD
+        elif served_intent:
+            context_update[f"speculations.{served_intent}.served"] = True
+        
+        batch = db.batch()
+        if case_ref:
+            # Keyword intent, not the classifier's, so retraining never learns from its own guesses
+            append_turn(batch, case_ref, turn_number, turn_entries(user_input, intent, turn["message"], now_iso))
+            batch.update(case_ref, update_data)
+        batch.update(context_ref, context_update)
+        batch.commit()
+        
+        # 5. Speculate on the next reply while the caller listens to this turn
+        if speculate:
+            speculate_next_turns(call_sid, facts)
         
         # If call completed, publish to Pub/Sub
-        if next_stage == "completed":
-            publisher = pubsub_v1.PublisherClient()
+        if next_stage == STAGE_COMPLETED:
+            publisher = get_publisher()
             topic_path = publisher.topic_path(PROJECT_ID, COMMUNICATION_TOPIC_NAME)
             
             pubsub_message = {
@@ -415,7 +515,8 @@ Return ONLY the JSON response."""
             publisher.publish(topic_path, message_bytes)
             print(f"Published communication completion to {COMMUNICATION_TOPIC_NAME}")
         
-        return Response(str(twiml_response), mimetype='text/xml')
+        turn_metrics.record((time.perf_counter() - started) * 1000, path, call_sid)
+        return Response(twiml, mimetype='text/xml')
         
     except Exception as e:
         print(f"Error in handle_gather: {str(e)}")
@@ -434,7 +535,12 @@ def handle_status(request: Request) -> Response:
             return Response("OK", status=200)
         
         # Update communication case with call status
-        db = firestore.Client()
+        db = get_db()
+        
+        # Evict speculations left over by calls that ended before completing the conversation
+        speculation = None
+        if call_status in ("completed", "busy", "failed", "no-answer", "canceled"):
+            speculation = evict_speculations(db, call_sid)
         
         # Find communication case by call_sid
         comm_cases = db.collection("communication_cases").where("call_sid", "==", call_sid).limit(1).stream()
@@ -447,6 +553,8 @@ def handle_status(request: Request) -> Response:
             
             if call_status == "completed" and call_duration:
                 update_data["call_duration_seconds"] = int(call_duration)
+            if speculation:
+                update_data["speculation"] = speculation
             
             comm_case.reference.update(update_data)
             print(f"Updated call status for {call_sid}: {call_status}")
@@ -459,6 +567,27 @@ def handle_status(request: Request) -> Response:
         return Response("OK", status=200)  # Always return OK to Twilio
 
 
+def evict_speculations(db, call_sid: str):
+    """
+    Drop a finished call's remaining speculations. Returns their budget report for
+    calls that ended mid-conversation; completed conversations were already reported
+    by handle_gather (anything left there finished generating after the call ended).
+    """
+    try:
+        context_ref = db.collection("call_contexts").document(call_sid)
+        context_doc = context_ref.get()
+        context_data = (context_doc.to_dict() or {}) if context_doc.exists else {}
+        speculations = context_data.get("speculations")
+        if not speculations:
+            return None
+        context_ref.update({"speculations": firestore.DELETE_FIELD})
+        report = budget_report(speculations, call_sid=call_sid)
+        return None if context_data.get("conversation_stage") == STAGE_COMPLETED else report
+    except Exception as e:
+        print(f"Could not evict speculations for {call_sid} (non-blocking): {str(e)}")
+        return None
+
+
 def generate_error_response(error_message: str) -> Response:
     """Generate error TwiML response"""
     response = VoiceResponse()
@@ -0,0 +1,135 @@
+"""
+Speculative turns for twilio_webhook.
+
+While the caller listens to a turn (the greeting, then the explanation with the
+slot), the instance is idle. As soon as such a turn is sent, Gemini
+pre-generates the replies to the most likely follow-ups with the call's defect
+facts. The webhook only publishes the request; the generation runs in the
+speculate_voice_turns function (Pub/Sub), because threads left running after a
+webhook response would be CPU-throttled:
+
+    cost      - "How much will this cost?"
+    duration  - "How long will the service take?"
+    no        - the customer declines (a defect-aware nudge before hanging up)
+
+Agreeing is not speculated: the confirmation must state the booked slot
+exactly, so it stays a precomputed template (voice_turns.py).
+
+Speculated turns are stored on the call context (call_contexts.speculations),
+which handle_gather reads anyway, so serving one costs no extra read and no LLM
+call. Entries older than SPECULATION_TTL_SECONDS are not served. When the call
+ends, all entries are evicted and the speculation budget (LLM calls, time and
+approximate tokens, served vs wasted) is reported on the communication case.
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from voice_turns import CONFIRM_PROMPT, STAGE_COMPLETED, STAGE_GREETING, STAGE_QUESTIONS, STAGE_SCHEDULING
+
+SPECULATIVE_INTENTS = ("cost", "duration", "no")
+SPECULATION_TTL_SECONDS = 15 * 60
+MAX_SPECULATED_CHARS = 400  # longer answers are not usable as a voice turn
+
+# Turns after which the next caller reply is worth speculating on
+SPECULATE_AFTER_STAGES = (STAGE_GREETING, STAGE_SCHEDULING)
+# Stages in which a speculated turn may be served
+SERVE_STAGES = (STAGE_SCHEDULING, STAGE_QUESTIONS)
+
+CUSTOMER_UTTERANCES = {
+    "cost": "How much will this cost?",
+    "duration": "How long will the service take? Can I get the car back the same day?",
+    "no": "No, I don't want to book this right now.",
+}
+
+INTENT_INSTRUCTIONS = {
+    "cost": "Give a realistic price range in rupees for this repair at an authorized center, say the exact "
+            "estimate is shared before any work starts, then ask whether they want to confirm the appointment. "
+            'Set next_stage="questions".',
+    "duration": "Say how long this repair usually takes and whether same-day return is likely, then ask "
+                'whether they want to confirm the appointment. Set next_stage="questions".',
+    "no": "Accept the decision politely, explain in one sentence why this issue should not be left too long, "
+          'and say they can call back anytime to book. Do not ask a question. Set next_stage="completed".',
+}
+
+
+def should_speculate(context_data: dict, next_stage: str) -> bool:
+    """True when the turn just sent is worth speculating after, once per call."""
+    return next_stage in SPECULATE_AFTER_STAGES and not context_data.get("speculation_started")
+
+
+def speculation_prompt(system_prompt: str, intent: str, facts: dict) -> str:
+    """Gemini prompt for one speculative turn (same JSON format as live turns)."""
+    return f"""{system_prompt}
+
+Current conversation stage: {STAGE_SCHEDULING}
+
+Customer just said: "{CUSTOMER_UTTERANCES[intent]}"
+
+Vehicle context:
+- Vehicle ID: {facts.get('vehicle_id')}
+- Issue: {facts.get('issue') or 'Vehicle maintenance issue'}
+- Recommended action: {facts.get('recommended_action') or 'Schedule service'}
+- Appointment: {facts.get('slot_text')} at {facts.get('service_center')}
+
+{INTENT_INSTRUCTIONS[intent]}
+
+Return ONLY the JSON response."""
+
+
+def speculated_turn(intent: str, result: Optional[dict]) -> Optional[dict]:
+    """Turn dict (as precomputed_response returns) from Gemini's JSON, or None if unusable."""
+    message = ((result or {}).get("message") or "").strip()
+    if not message or len(message) > MAX_SPECULATED_CHARS:
+        return None
+    if intent == "no":
+        return {"message": message, "prompt": None, "next_stage": STAGE_COMPLETED, "outcome": "declined"}
+    return {"message": message, "prompt": CONFIRM_PROMPT, "next_stage": STAGE_QUESTIONS, "outcome": None}
+
+
+def speculation_entry(turn: Optional[dict], llm_ms: float, prompt: str, response_text: str,
+                      now: Optional[datetime] = None) -> dict:
+    """What is stored per intent; failed speculations are kept (turn None) so they count in the budget."""
+    return {
+        "turn": turn,
+        "generated_at": (now or datetime.now(timezone.utc)).isoformat(),
+        "llm_ms": round(llm_ms, 1),
+        "approx_tokens": (len(prompt) + len(response_text or "")) // 4,
+        "served": False,
+    }
+
+
+def serve(speculations: Optional[Dict[str, dict]], intent: str, stage: str,
+          now: Optional[datetime] = None) -> Optional[dict]:
+    """The speculated turn for this intent, if one is ready, fresh and valid at this stage."""
+    entry = (speculations or {}).get(intent)
+    if not entry or not entry.get("turn") or stage not in SERVE_STAGES:
+        return None
+    generated = datetime.fromisoformat(entry["generated_at"])
+    if ((now or datetime.now(timezone.utc)) - generated).total_seconds() > SPECULATION_TTL_SECONDS:
+        return None
+    return entry["turn"]
+
+
+def budget_report(speculations: Optional[Dict[str, dict]], served_now: Optional[str] = None,
+                  call_sid: Optional[str] = None) -> dict:
+    """
+    Speculation spend for a call, logged as a structured metric line
+    (voice_speculation_budget) and stored on the communication case.
+    """
+    speculations = speculations or {}
+    served = sorted(intent for intent, entry in speculations.items()
+                    if entry.get("served") or intent == served_now)
+    report = {
+        "metric": "voice_speculation_budget",
+        "call_sid": call_sid,
+        "llm_calls": len(speculations),
+        "llm_ms": round(sum(entry.get("llm_ms", 0) for entry in speculations.values()), 1),
+        "approx_tokens": sum(entry.get("approx_tokens", 0) for entry in speculations.values()),
+        "served": served,
+        "wasted": sorted(set(speculations) - set(served)),
+    }
+    report["hit_rate"] = round(len(served) / len(speculations), 2) if speculations else None
+    print(json.dumps(report))
+    return report
@@ -0,0 +1,76 @@
+"""
+Append-only call transcripts for communication_cases.
+
+Each caller turn (customer utterance + agent reply) is its own document:
+
+    communication_cases/{communication_id}/transcript/{turn:05d}
+
+so a turn is one fixed-size write however long the call gets, and the case
+document no longer grows towards the 1 MiB limit. Zero-padded IDs sort in
+call order; a Twilio retry of the same turn rewrites the same document
+instead of appending a duplicate. The running turn number lives on the call
+context (turn_count), which handle_gather reads anyway.
+
+Prompt context is a single query for the last RECENT_TURNS turns.
+"""
+
+from typing import List, Optional
+
+from google.cloud import firestore
+
+TRANSCRIPT_SUBCOLLECTION = "transcript"
+RECENT_TURNS = 4  # turns of history given to Gemini
+
+
+def turn_doc_id(turn_number: int) -> str:
+    return f"{turn_number:05d}"
+
+
+def turn_entries(user_input: str, intent: str, agent_message: str, timestamp: str) -> List[dict]:
+    """Transcript entries of one turn (same shape as the old conversation_transcript items)."""
+    return [
+        {"speaker": "customer", "message": user_input, "intent": intent, "timestamp": timestamp},
+        {"speaker": "agent", "message": agent_message, "timestamp": timestamp},
+    ]
+
+
+def append_turn(batch, case_ref, turn_number: int, entries: List[dict]):
+    """Add one turn's transcript document to a write batch (committed with the turn's other writes)."""
+    batch.set(case_ref.collection(TRANSCRIPT_SUBCOLLECTION).document(turn_doc_id(turn_number)), {
+        "turn": turn_number,
+        "entries": entries,
+        "created_at": firestore.SERVER_TIMESTAMP,
+    })
+
+
+def recent_turns(case_ref, limit: int = RECENT_TURNS) -> List[dict]:
+    """Last `limit` turns in call order (one query). Empty on failure - history is optional."""
+    try:
+        docs = (case_ref.collection(TRANSCRIPT_SUBCOLLECTION)
+                .order_by("turn", direction=firestore.Query.DESCENDING)
+                .limit(limit)
+                .stream())
+        return sorted((doc.to_dict() for doc in docs), key=lambda turn: turn.get("turn", 0))
+    except Exception as e:
+        print(f"Could not load recent transcript turns (non-blocking): {str(e)}")
+        return []
+
+
+def read_transcript(case_ref) -> List[dict]:
+    """Full transcript as a flat list of entries, in call order."""
+    docs = case_ref.collection(TRANSCRIPT_SUBCOLLECTION).order_by("turn").stream()
+    return [entry for doc in docs for entry in (doc.to_dict().get("entries") or [])]
+
+
+def format_history(turns: List[dict], max_chars: Optional[int] = 200) -> str:
+    """Turns as "Customer: ... / Agent: ..." lines for a prompt."""
+    lines = []
+    for turn in turns:
+        for entry in turn.get("entries") or []:
+            message = (entry.get("message") or "").strip()
+            if not message:
+                continue
+            if max_chars and len(message) > max_chars:
+                message = message[:max_chars].rstrip() + "..."
+            lines.append(f"{'Customer' if entry.get('speaker') == 'customer' else 'Agent'}: {message}")
+    return "\n".join(lines) if lines else "No previous conversation."
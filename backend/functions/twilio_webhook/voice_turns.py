@@ -0,0 +1,306 @@
+"""
+Latency-budgeted voice turn pipeline for twilio_webhook.
+
+Most caller turns are "yes", "no", a keypress or a handful of common
+questions, so each turn is handled in this order:
+
+1. Local intent detection on the speech result / DTMF digit (no network);
+   turns the keywords miss go to the trained intent classifier (intent_model.py)
+   and are handled locally when it is confident
+2. A precomputed response for (stage, intent), filled in with the call facts
+   (customer, vehicle, issue, slot, service center)
+3. Only open questions go to Gemini, with a hard timeout; if it does not
+   answer in time the caller hears a short holding response instead of silence
+
+Turn latency is recorded per path and logged as a structured metric
+(voice_turn_latency_ms) with the instance's running p95 against
+TURN_LATENCY_TARGET_MS.
+"""
+
+import json
+import math
+import re
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo
+
+TURN_LATENCY_TARGET_MS = 800
+LATENCY_WINDOW = 1000  # turns kept for the running p95
+
+# Conversation stages (communication_cases.conversation_stage)
+STAGE_PENDING = "pending"
+STAGE_GREETING = "greeting"
+STAGE_SCHEDULING = "scheduling"
+STAGE_QUESTIONS = "questions"
+STAGE_COMPLETED = "completed"
+
+# DTMF keys announced in the prompts
+DTMF_INTENTS = {"1": "yes", "2": "no", "9": "repeat", "0": "human"}
+
+# Intent -> single words / phrases (phrases are matched on word boundaries)
+INTENT_KEYWORDS = {
+    "yes": ({"yes", "yeah", "yep", "yup", "sure", "haan", "theek", "confirm",
+             "confirmed", "fine", "correct", "alright"},
+            ("sounds good", "of course", "please do", "that works", "book it", "go ahead")),
+    "no": ({"no", "nope", "nah", "nahi", "nahin", "cancel", "decline"},
+           ("not interested", "not now", "no thanks", "don't book", "dont book")),
+    "callback": ({"busy", "driving", "baad", "callback"},
+                 ("call me back", "call back", "call me later", "call later", "another time",
+                  "not a good time")),
+    "repeat": ({"repeat", "pardon", "again", "dobara"},
+               ("say that again", "didn't catch", "didn't hear", "come again")),
+    "cost": ({"cost", "price", "charge", "charges", "expensive", "kitna", "paisa", "rupees", "fee", "fees"},
+             ("how much",)),
+    "duration": ({"long", "hours", "duration"}, ("how much time", "how long", "same day")),
+    "location": ({"where", "address", "location", "kahan"}, ("which center", "service center")),
+    "human": ({"human", "agent", "person", "advisor", "representative"}, ("talk to someone", "real person")),
+}
+
+# Acceptances built from negative words ("sure, no problem"); matched first and removed,
+# so their "no" / "don't" never counts as a decline
+YES_PHRASES = ("no problem", "no worries", "no issue", "not a problem", "why not", "don't mind", "dont mind")
+
+# Checked in this order - questions before bare yes/no ("yes, but how much?" is a cost question).
+INTENT_ORDER = ("human", "repeat", "cost", "duration", "location")
+
+# Intents that end the stage (book, decline, hang up for a callback). Only given for
+# short turns that are not questions and match exactly one of them; anything else
+# ("what happens if I don't fix it?", "yes... actually no") is "open" and left to the LLM.
+TERMINAL_INTENTS = ("callback", "no", "yes")
+MAX_ANSWER_WORDS = 8
+
+# A clause starting with one of these is a question, even without a "?"
+# ("okay but is this covered by warranty")
+QUESTION_WORDS = {"how", "what", "why", "when", "where", "which", "who", "can", "could",
+                  "is", "are", "will", "would", "should", "does", "kya", "kab"}
+_CLAUSE_BREAK = re.compile(r"[,.;:!]+|\b(?:but|and|so|then)\b")
+
+# Intent classifier label -> turn intent (questions still need the LLM to answer;
+# emergencies are handed to a service advisor)
+MODEL_INTENTS = {"schedule_service": "yes", "decline": "no", "emergency": "human"}
+
+CONFIRM_PROMPT = "Would you like to confirm this appointment? Say yes, or press 1. Say no, or press 2."
+MOMENT_PROMPT = "Do you have a moment to discuss an important matter about your vehicle?"
+
+_WORD = re.compile(r"[a-z']+")
+
+
+def is_question(speech: Optional[str]) -> bool:
+    """
+    Whether a caller turn asks something: it contains a "?" or one of its
+    clauses starts with a question word. Acceptances such as "why not" are not
+    questions.
+    """
+    text = (speech or "").lower()
+    if "?" in text:
+        return True
+    for clause in _CLAUSE_BREAK.split(text):
+        words = f" {' '.join(_WORD.findall(clause))} "
+        for phrase in YES_PHRASES:
+            words = words.replace(f" {phrase} ", " ")
+        words = words.split()
+        if words and words[0] in QUESTION_WORDS:
+            return True
+    return False
+
+
+def detect_intent(speech: Optional[str], digits: Optional[str] = None) -> str:
+    """
+    Intent of a caller turn: one of INTENT_KEYWORDS, "silence" for no input,
+    or "open" when it needs the LLM.
+    """
+    if digits:
+        return DTMF_INTENTS.get(digits.strip()[:1], "open")
+    text = (speech or "").lower().strip()
+    if not text:
+        return "silence"
+    padded = f" {' '.join(_WORD.findall(text))} "
+    word_count = len(padded.split())
+    accepted = False
+    for phrase in YES_PHRASES:
+        if f" {phrase} " in padded:
+            accepted = True
+            padded = padded.replace(f" {phrase} ", " | ")
+    words = set(padded.split())
+
+    def matches(intent):
+        keywords, phrases = INTENT_KEYWORDS[intent]
+        return bool(words & keywords) or any(f" {phrase} " in padded for phrase in phrases)
+
+    for intent in INTENT_ORDER:
+        if matches(intent):
+            return intent
+    if is_question(text) or word_count > MAX_ANSWER_WORDS:
+        return "open"
+    found = [intent for intent in TERMINAL_INTENTS if (intent == "yes" and accepted) or matches(intent)]
+    return found[0] if len(found) == 1 else "open"
+
+
+def model_intent(speech: Optional[str], model, threshold: float) -> Optional[str]:
+    """
+    Turn intent from the trained classifier for an "open" turn, or None if
+    there is no model, it is not confident enough, or the turn is a question.
+    """
+    if model is None or not (speech or "").strip() or is_question(speech):
+        return None
+    label, confidence = model.predict(speech)
+    if confidence < threshold:
+        return None
+    return MODEL_INTENTS.get(label)
+
+
+def format_slot(best_slot: Optional[str], timezone_str: Optional[str] = None) -> Optional[str]:
+    """Spoken slot text in the center's timezone, e.g. "Monday, June 2 at 10:00 AM"."""
+    if not best_slot:
+        return None
+    try:
+        slot = datetime.fromisoformat(str(best_slot).replace("Z", "+00:00"))
+    except ValueError:
+        return str(best_slot)
+    if slot.tzinfo is None:
+        slot = slot.replace(tzinfo=timezone.utc)
+    try:
+        slot = slot.astimezone(ZoneInfo(timezone_str or "Asia/Kolkata"))
+    except Exception:
+        pass
+    return f"{slot.strftime('%A, %B')} {slot.day} at {slot.strftime('%I:%M %p').lstrip('0')}"
+
+
+def build_facts(context_data: dict, dossier: dict, center: Optional[dict] = None) -> dict:
+    """
+    Call facts used by the precomputed responses, from the call context and the
+    case dossier (RCA + scheduling stages). Built once per call.
+    """
+    rca = dossier.get("rca") or {}
+    scheduling = dossier.get("scheduling") or {}
+    center = center or {}
+    return {
+        "customer_name": context_data.get("customer_name") or "Customer",
+        "vehicle_id": context_data.get("vehicle_id"),
+        "issue": rca.get("root_cause"),
+        "recommended_action": rca.get("recommended_action"),
+        "slot_text": format_slot(scheduling.get("best_slot"), center.get("timezone")),
+        "service_center": center.get("name") or scheduling.get("service_center"),
+    }
+
+
+def _offer(facts: dict) -> str:
+    slot = facts.get("slot_text") or "the next available slot"
+    center = facts.get("service_center") or "our service center"
+    return f"We have a slot on {slot} at {center}."
+
+
+def _explanation(facts: dict) -> str:
+    issue = (facts.get("issue") or "an issue that needs attention").rstrip(".")
+    action = facts.get("recommended_action")
+    sentence = f"Our system has detected a problem with your vehicle: {issue}."
+    if action:
+        sentence += f" We recommend: {action.rstrip('.')}."
+    return f"{sentence} {_offer(facts)}"
+
+
+def greeting(facts: dict) -> dict:
+    """First turn of a call (no caller input yet)."""
+    name = facts.get("customer_name") or "there"
+    vehicle = facts.get("vehicle_id") or "your vehicle"
+    return {
+        "message": f"Hello {name}, this is NaviGo calling about your vehicle {vehicle}.",
+        "prompt": MOMENT_PROMPT,
+        "next_stage": STAGE_GREETING,
+        "outcome": None,
+    }
+
+
+def precomputed_response(intent: str, stage: str, facts: dict) -> Optional[dict]:
+    """
+    Response for a common intent at a stage, or None if the turn needs the LLM.
+
+    Returns:
+        {"message", "prompt" (None to hang up), "next_stage", "outcome"}
+    """
+    if stage in (STAGE_PENDING, None, ""):
+        return greeting(facts)
+
+    def reply(message, prompt, next_stage, outcome=None):
+        return {"message": message, "prompt": prompt, "next_stage": next_stage, "outcome": outcome}
+
+    slot = facts.get("slot_text") or "the scheduled time"
+    center = facts.get("service_center") or "our service center"
+
+    if intent == "human":
+        return reply("I'll ask our service advisor to call you back shortly. Thank you!", None, STAGE_COMPLETED)
+    if intent == "callback":
+        return reply("No problem, we'll call you back at a better time. Drive safe!", None, STAGE_COMPLETED)
+
+    if stage == STAGE_GREETING:
+        if intent == "yes":
+            return reply(_explanation(facts), CONFIRM_PROMPT, STAGE_SCHEDULING)
+        if intent == "no":
+            return reply("No problem, we'll call you back at a better time. Drive safe!", None, STAGE_COMPLETED)
+        if intent in ("repeat", "silence"):
+            return reply(greeting(facts)["message"], MOMENT_PROMPT, STAGE_GREETING)
+
+    if intent == "yes":
+        return reply(f"Great, your appointment on {slot} at {center} is confirmed. "
+                     "We'll send you an SMS with the details.", None, STAGE_COMPLETED, "confirmed")
+    if intent == "no":
+        return reply("I understand. Since this affects your vehicle's health, please call us whenever you're "
+                     "ready and we'll find another slot.", None, STAGE_COMPLETED, "declined")
+    if intent in ("repeat", "silence"):
+        return reply(_explanation(facts), CONFIRM_PROMPT, STAGE_SCHEDULING)
+    if intent == "cost":
+        return reply("The service center will share an exact estimate before starting any work.",
+                     CONFIRM_PROMPT, STAGE_QUESTIONS)
+    if intent == "duration":
+        return reply("The service center will confirm how long it takes when you drop off your vehicle.",
+                     CONFIRM_PROMPT, STAGE_QUESTIONS)
+    if intent == "location":
+        return reply(f"Your appointment is at {center}. We'll send the address by SMS.",
+                     CONFIRM_PROMPT, STAGE_QUESTIONS)
+    return None
+
+
+def holding_response(stage: str) -> dict:
+    """Said when the LLM misses the turn budget - keeps the caller on the confirm question."""
+    return {
+        "message": "That's a good question - our service advisor will go through it with you at the visit.",
+        "prompt": CONFIRM_PROMPT if stage != STAGE_GREETING else MOMENT_PROMPT,
+        "next_stage": stage if stage != STAGE_PENDING else STAGE_GREETING,
+        "outcome": None,
+    }
+
+
+class TurnMetrics:
+    """Running turn latencies on this instance (bounded window)."""
+
+    def __init__(self, window: int = LATENCY_WINDOW, target_ms: float = TURN_LATENCY_TARGET_MS):
+        self.latencies = deque(maxlen=window)
+        self.target_ms = target_ms
+        self.paths: Dict[str, int] = {}
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]  # nearest rank
+
+    def p95(self) -> Optional[float]:
+        return self.percentile(95)
+
+    def record(self, latency_ms: float, path: str, call_sid: Optional[str] = None) -> dict:
+        """Record a turn and log it as a structured metric line (picked up as a log-based metric)."""
+        self.latencies.append(latency_ms)
+        self.paths[path] = self.paths.get(path, 0) + 1
+        p95 = self.p95()
+        entry = {
+            "metric": "voice_turn_latency_ms",
+            "latency_ms": round(latency_ms, 1),
+            "path": path,
+            "call_sid": call_sid,
+            "p95_ms": round(p95, 1),
+            "target_ms": self.target_ms,
+            "within_target": p95 <= self.target_ms,
+        }
+        print(json.dumps(entry))
+        return entry
@@ -62,6 +62,12 @@ gcloud pubsub topics create navigo-human-review-required \
     && echo "✅ Created: navigo-human-review-required" \
     || echo "⚠️  Topic may already exist: navigo-human-review-required"
 
+# Speculative voice turns (twilio_webhook -> speculate-voice-turns)
+gcloud pubsub topics create navigo-voice-speculation \
+    --project=$PROJECT_ID \
+    && echo "✅ Created: navigo-voice-speculation" \
+    || echo "⚠️  Topic may already exist: navigo-voice-speculation"
+
 echo ""
 echo "📨 Creating dead-letter topics for error handling..."
 
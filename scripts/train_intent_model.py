@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Train the local intent classifier from stored call transcripts.
+
+Reads communication_cases (transcript subcollection, or the legacy
+conversation_transcript array) from Firestore, or an exported JSON file,
+trains intent_model.IntentModel, prints an accuracy/latency report on a
+held-out split and writes the model (trained on all examples) next to
+every copy of intent_model.py.
+
+Usage:
+    python scripts/train_intent_model.py                  # from Firestore
+    python scripts/train_intent_model.py --limit 5000
+    python scripts/train_intent_model.py --from-json cases.json
+    python scripts/train_intent_model.py --report-only
+
+cases.json is a list of {"outcome": ..., "transcript": [{"speaker", "message", "intent"}, ...]}.
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+TWILIO_WEBHOOK_DIR = ROOT / "backend" / "functions" / "twilio_webhook"
+sys.path.insert(0, str(TWILIO_WEBHOOK_DIR))
+
+from intent_model import (  # noqa: E402
+    INTENT_MODEL_CONFIDENCE, SEED_EXAMPLES, IntentModel, evaluate, examples_from_case, split
+)
+
+PROJECT_ID = os.getenv("PROJECT_ID", "navigo-27206")
+MODEL_OUTPUTS = [
+    TWILIO_WEBHOOK_DIR / "intent_model.json",
+    ROOT / "agents" / "communication" / "intent_model.json",
+]
+
+
+def load_firestore_cases(limit=None):
+    """(case data, transcript entries) for communication cases with a recorded conversation."""
+    from google.cloud import firestore
+    from transcript_log import read_transcript
+
+    db = firestore.Client(project=PROJECT_ID)
+    query = db.collection("communication_cases")
+    if limit:
+        query = query.limit(limit)
+    for doc in query.stream():
+        data = doc.to_dict() or {}
+        if data.get("transcript_turns"):
+            transcript = read_transcript(doc.reference)
+        else:
+            transcript = data.get("conversation_transcript") or []
+        if transcript:
+            yield data, transcript
+
+
+def load_json_cases(path):
+    with open(path) as f:
+        for case in json.load(f):
+            yield case, case.get("transcript") or []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local intent classifier from call transcripts")
+    parser.add_argument("--from-json", help="Exported cases instead of Firestore")
+    parser.add_argument("--limit", type=int, help="Read at most this many cases from Firestore")
+    parser.add_argument("--threshold", type=float, default=INTENT_MODEL_CONFIDENCE,
+                        help="Confidence above which callers skip the LLM (for the report)")
+    parser.add_argument("--report-only", action="store_true", help="Print the report without writing the model")
+    args = parser.parse_args()
+
+    cases = load_json_cases(args.from_json) if args.from_json else load_firestore_cases(args.limit)
+    examples = []
+    case_count = 0
+    for case_data, transcript in cases:
+        case_count += 1
+        examples.extend(examples_from_case(case_data, transcript))
+    print(f"📦 {len(examples)} labelled customer turns from {case_count} case(s)")
+
+    train, test = split(examples)
+    model = IntentModel.train(train + SEED_EXAMPLES)
+    report = evaluate(model, test, args.threshold) if test else {"examples": 0}
+    report["temperature"] = round(model.temperature, 3)
+    print(json.dumps(report, indent=2))
+
+    if args.report_only:
+        return
+
+    final = IntentModel.train(examples + SEED_EXAMPLES)
+    final.metadata["report"] = report
+    for path in MODEL_OUTPUTS:
+        final.save(str(path))
+        print(f"✅ Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
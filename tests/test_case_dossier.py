@@ -0,0 +1,118 @@
+"""
+Unit tests for the per-case dossier
+(backend/functions/*/case_dossier.py)
+
+Run with: python -m pytest tests/test_case_dossier.py -v
+"""
+
+import filecmp
+import os
+import sys
+
+import pytest
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions'))
+sys.path.insert(0, os.path.join(FUNCTIONS_DIR, 'diagnosis_agent'))
+
+pytest.importorskip("google.cloud.firestore")
+
+from google.cloud import firestore
+from case_dossier import append_stage, load_dossier, DOSSIER_COLLECTION
+
+DOSSIER_FUNCTIONS = (
+    'data_analysis_agent', 'rca_agent', 'scheduling_agent', 'engagement_agent',
+    'feedback_agent', 'manufacturing_agent', 'twilio_webhook'
+)
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def set(self, data, merge=False):
+        existing = self.store.get(self.key, {}) if merge else {}
+        merged = dict(existing)
+        for field, value in data.items():
+            # Resolve ArrayUnion / SERVER_TIMESTAMP like Firestore would
+            if isinstance(value, firestore.ArrayUnion):
+                merged[field] = list(existing.get(field, [])) + [v for v in value.values if v not in existing.get(field, [])]
+            elif value is firestore.SERVER_TIMESTAMP:
+                merged[field] = "server_timestamp"
+            else:
+                merged[field] = value
+        self.store[self.key] = merged
+
+    def get(self):
+        self.store.setdefault("_reads", 0)
+        self.store["_reads"] += 1
+        return FakeSnapshot(self.store.get(self.key))
+
+
+class FakeDB:
+    def __init__(self):
+        self.collections = {}
+
+    def collection(self, name):
+        store = self.collections.setdefault(name, {})
+
+        class _Collection:
+            def document(self, key):
+                return FakeDocument(store, key)
+
+        return _Collection()
+
+
+class TestCaseDossier:
+    """Test that stages accumulate in one document readable with a single read"""
+
+    def test_stages_accumulate(self):
+        db = FakeDB()
+        window = [{"event_id": "evt_1"}, {"event_id": "evt_2"}]
+        assert append_stage(db, "case_1", "anomaly", {"anomaly_type": "thermal_overheat"}, telemetry_window=window)
+        assert append_stage(db, "case_1", "diagnosis", {"diagnosis_id": "diagnosis_1", "component": "engine_coolant_system"})
+        assert append_stage(db, "case_1", "rca", {"rca_id": "rca_1", "diagnosis_id": "diagnosis_1"})
+
+        dossier = load_dossier(db, "case_1")
+        assert dossier["stages"] == ["anomaly", "diagnosis", "rca"]
+        assert dossier["anomaly"]["anomaly_type"] == "thermal_overheat"
+        assert dossier["diagnosis"]["component"] == "engine_coolant_system"
+        assert dossier["rca"]["diagnosis_id"] == "diagnosis_1"
+        assert dossier["telemetry_window"] == window
+        assert db.collections[DOSSIER_COLLECTION]["_reads"] == 1
+        print("✅ Dossier accumulation test passed")
+
+    def test_missing_dossier_and_case_id(self):
+        db = FakeDB()
+        assert load_dossier(db, "case_missing") == {}
+        assert load_dossier(db, None) == {}
+        assert append_stage(db, None, "anomaly", {}) is False
+        with pytest.raises(ValueError):
+            append_stage(db, "case_1", "unknown_stage", {})
+        print("✅ Missing dossier test passed")
+
+    def test_write_failure_is_non_blocking(self):
+        class BrokenDB:
+            def collection(self, name):
+                raise RuntimeError("firestore unavailable")
+
+        assert append_stage(BrokenDB(), "case_1", "rca", {"rca_id": "rca_1"}) is False
+        assert load_dossier(BrokenDB(), "case_1") == {}
+        print("✅ Non-blocking failure test passed")
+
+    def test_copies_identical(self):
+        """Each Cloud Function deploys its own copy of the dossier module"""
+        reference = os.path.join(FUNCTIONS_DIR, 'diagnosis_agent', 'case_dossier.py')
+        for function in DOSSIER_FUNCTIONS:
+            copy = os.path.join(FUNCTIONS_DIR, function, 'case_dossier.py')
+            assert filecmp.cmp(reference, copy, shallow=False), f"{function}/case_dossier.py differs"
+        print("✅ Dossier copies identical test passed")
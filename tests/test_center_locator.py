@@ -0,0 +1,130 @@
+"""
+Unit tests for the service center spatial index
+(backend/functions/scheduling_agent/center_locator.py)
+
+Run with: python -m pytest tests/test_center_locator.py -v
+"""
+
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'scheduling_agent')))
+
+import center_locator
+from center_locator import CenterIndex, get_center_index, last_gps_fix, stocks_part
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), '..', 'test_data', 'service_centers.json')
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlam = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    return 2 * center_locator.EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def random_centers(n, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "service_center_id": f"center_{i:05d}",
+            "location": {"lat": rng.uniform(-60, 70), "lon": rng.uniform(-180, 180)},
+            "spare_parts_availability": {"battery": rng.choice(["available", "unavailable", "in_transit"])},
+        }
+        for i in range(n)
+    ]
+
+
+class TestCenterLocator:
+    """Test KD-tree nearest-center lookups against brute force, predicates and caching"""
+
+    def test_test_data_centers(self):
+        """A vehicle in Mumbai is routed to the Mumbai center first"""
+        with open(TEST_DATA) as f:
+            centers = json.load(f)
+        index = CenterIndex(centers)
+        nearest = index.nearest(19.08, 72.88, k=2)
+        assert nearest[0][1]["service_center_id"] == "center_001"
+        assert nearest[0][0] < 1.0
+        assert nearest[0][0] <= nearest[1][0]
+        print("✅ Test data lookup passed")
+
+    def test_matches_brute_force(self):
+        """k nearest with a predicate equals the brute-force answer"""
+        centers = random_centers(3000)
+        index = CenterIndex(centers)
+        rng = random.Random(11)
+        for _ in range(50):
+            lat, lon = rng.uniform(-60, 70), rng.uniform(-180, 180)
+            got = index.nearest(lat, lon, k=5, predicate=lambda c: stocks_part(c, "battery"))
+            expected = sorted(
+                (haversine_km(lat, lon, c["location"]["lat"], c["location"]["lon"]), c["service_center_id"])
+                for c in centers if stocks_part(c, "battery")
+            )[:5]
+            assert [c["service_center_id"] for _, c in got] == [cid for _, cid in expected]
+            for (distance, _), (true_distance, _) in zip(got, expected):
+                assert abs(distance - true_distance) < 0.05
+        print("✅ Brute force comparison passed")
+
+    def test_date_line(self):
+        """Centers across the date line are near each other"""
+        centers = [
+            {"service_center_id": "east", "location": {"lat": 0.0, "lon": 179.9}},
+            {"service_center_id": "far", "location": {"lat": 0.0, "lon": 170.0}},
+        ]
+        nearest = CenterIndex(centers).nearest(0.0, -179.9, k=1)
+        assert nearest[0][1]["service_center_id"] == "east"
+        assert nearest[0][0] < 25
+        print("✅ Date line test passed")
+
+    def test_unlocated_and_invalid(self):
+        """Centers without a valid location are excluded from the tree"""
+        centers = [
+            {"service_center_id": "a", "location": {"lat": 10, "lon": 10}},
+            {"service_center_id": "b"},
+            {"service_center_id": "c", "location": {"lat": 200, "lon": 10}},
+        ]
+        index = CenterIndex(centers)
+        assert len(index) == 1
+        assert [c["service_center_id"] for c in index.unlocated] == ["b", "c"]
+        print("✅ Unlocated center test passed")
+
+    def test_last_gps_fix(self):
+        """Most recent valid fix wins; invalid coordinates are skipped"""
+        events = [
+            {"timestamp_utc": "2025-06-01T10:00:00Z", "gps_lat": 19.0, "gps_lon": 72.8},
+            {"timestamp_utc": "2025-06-01T10:02:00Z", "gps_lat": 999, "gps_lon": 72.8},
+            {"timestamp_utc": "2025-06-01T10:01:00Z", "gps_lat": 18.5, "gps_lon": 73.8},
+        ]
+        assert last_gps_fix(events) == (18.5, 73.8)
+        assert last_gps_fix([]) is None
+        print("✅ Last GPS fix test passed")
+
+    def test_cached_index_refreshes_documents(self):
+        """Same geometry reuses the tree but serves updated documents"""
+        centers = random_centers(50)
+        index = get_center_index(centers)
+        updated = [dict(c, spare_parts_availability={"battery": "available"}) for c in centers]
+        assert get_center_index(updated) is index
+        assert all(stocks_part(c, "battery") for _, c in index.nearest(0, 0, k=50))
+        moved = [dict(c) for c in updated]
+        moved[0] = dict(moved[0], location={"lat": 1.0, "lon": 1.0})
+        assert get_center_index(moved) is not index
+        print("✅ Cached index test passed")
+
+    def test_lookup_latency(self):
+        """k-nearest lookups over 20k centers take well under 5 ms"""
+        index = CenterIndex(random_centers(20000))
+        rng = random.Random(3)
+        queries = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(200)]
+        start = time.perf_counter()
+        for lat, lon in queries:
+            index.nearest(lat, lon, k=5)
+        per_query_ms = (time.perf_counter() - start) / len(queries) * 1000
+        print(f"nearest(k=5) over 20k centers: {per_query_ms:.3f} ms per query")
+        assert per_query_ms < 5
+        print("✅ Lookup latency test passed")
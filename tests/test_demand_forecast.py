@@ -0,0 +1,112 @@
+"""
+Unit tests for per-center demand forecasting
+(backend/functions/forecasting_agent/demand_forecast.py)
+
+Run with: python -m pytest tests/test_demand_forecast.py -v
+"""
+
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'forecasting_agent')))
+
+from demand_forecast import (
+    BOOKING_HORIZON_DAYS, HISTORY_DAYS, SATURATION_LOAD, bookings_to_history, daily_capacity, forecast_demand,
+    holt_winters
+)
+
+# Sunday - forecasts start on Monday 2025-06-02
+END = date(2025, 6, 1)
+WEEKLY = [8, 9, 9, 10, 12, 4, 1]  # Monday..Sunday
+
+
+def weekly_history(pattern=WEEKLY, days=HISTORY_DAYS, scale=1.0, noise=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    history = {}
+    for i in range(days):
+        day = END - timedelta(days=i)
+        value = pattern[day.weekday()] * scale + rng.normal(0, noise)
+        history[day.isoformat()] = max(0.0, round(value, 2))
+    return history
+
+
+class TestDemandForecast:
+    """Test seasonal fit, short-history fallback, booked floor, saturation and speed"""
+
+    def test_weekly_season_recovered(self):
+        """A noisy weekly pattern is forecast within one booking per day"""
+        result = forecast_demand({"center_001": weekly_history(noise=0.5)}, {"center_001": 20}, END)
+        demand = result["demand_prediction_next_14_days"]["center_001"]
+        assert len(demand) == 14
+        for day, value in demand.items():
+            assert abs(value - WEEKLY[date.fromisoformat(day).weekday()]) < 1.0
+        print("✅ Weekly season test passed")
+
+    def test_short_history_fallback(self):
+        """Centers with less than two weeks of history use weekday means"""
+        history = weekly_history(days=7)
+        result = forecast_demand({"new_center": history}, {"new_center": 20}, END)
+        demand = result["demand_prediction_next_14_days"]["new_center"]
+        assert demand["2025-06-02"] == WEEKLY[0]
+        assert demand["2025-06-07"] == WEEKLY[5]
+        print("✅ Short history fallback test passed")
+
+    def test_booked_is_a_floor(self):
+        """Bookings already made for a forecast day raise its predicted demand"""
+        result = forecast_demand({"center_001": weekly_history()}, {"center_001": 20}, END,
+                                 booked={"center_001": {"2025-06-03": 18}})
+        assert result["demand_prediction_next_14_days"]["center_001"]["2025-06-03"] == 18
+        assert result["daily_load"]["center_001"]["2025-06-03"] == 0.9
+        print("✅ Booked floor test passed")
+
+    def test_saturation_and_recommendation(self):
+        """A busy center is saturated on its peak days; the quietest center is recommended"""
+        history = {"busy": weekly_history(scale=1.2), "quiet": weekly_history(scale=0.3), "no_history": {}}
+        capacity = {"busy": 12, "quiet": 12, "no_history": 10, "closed": 0}
+        result = forecast_demand(history, capacity, END)
+        assert "2025-06-06" in result["saturated_days"]["busy"]  # Friday: 14.4 / 12
+        assert result["saturated_days"]["quiet"] == []
+        assert all(load >= SATURATION_LOAD for load in
+                   (result["daily_load"]["busy"][d] for d in result["saturated_days"]["busy"]))
+        assert result["service_center_load"]["closed"] is None
+        assert result["recommended_center"] == "no_history"
+        print("✅ Saturation test passed")
+
+    def test_bookings_to_history(self):
+        """Bookings are counted per center and day (scheduled_date or scheduled_slot)"""
+        bookings = [
+            {"service_center_id": "c1", "scheduled_date": "2025-06-02"},
+            {"service_center": "c1", "scheduled_slot": "2025-06-02T10:00:00Z"},
+            {"service_center_id": "c2", "scheduled_slot": "not a slot"},
+        ]
+        assert bookings_to_history(bookings) == {"c1": {"2025-06-02": 2}}
+        print("✅ Bookings to history test passed")
+
+    def test_daily_capacity(self):
+        """capacity is spread over the scheduling horizon; an explicit daily_capacity wins"""
+        sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions',
+                                                        'scheduling_agent')))
+        from occupancy_index import HORIZON_DAYS, booking_capacity
+
+        assert BOOKING_HORIZON_DAYS == HORIZON_DAYS
+        assert daily_capacity({"capacity": 124}) == 2
+        assert daily_capacity({"capacity": 124, "daily_capacity": 15}) == 15
+        assert booking_capacity({"daily_capacity": 2}) == 124
+        assert daily_capacity({}) * BOOKING_HORIZON_DAYS == booking_capacity({})
+        print("✅ Daily capacity test passed")
+
+    def test_vectorized_latency(self):
+        """1,000 centers x 12 weeks are fitted over the whole parameter grid in well under a second"""
+        rng = np.random.default_rng(1)
+        matrix = rng.poisson(np.tile(WEEKLY, 12), size=(1000, HISTORY_DAYS)).astype(float)
+        start = time.perf_counter()
+        forecast, params = holt_winters(matrix)
+        elapsed = time.perf_counter() - start
+        print(f"holt_winters: 1000 centers in {elapsed * 1000:.1f} ms")
+        assert forecast.shape == (1000, 14) and params.shape == (1000, 3)
+        assert elapsed < 1
+        print("✅ Vectorized latency test passed")
@@ -0,0 +1,99 @@
+"""
+Unit tests for the deterministic diagnosis fast path
+(backend/functions/diagnosis_agent/diagnoser.py)
+
+Run with: python -m pytest tests/test_diagnosis_fast_path.py -v
+"""
+
+import os
+import sys
+
+# Cloud Function modules import their siblings by top-level name
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'diagnosis_agent')))
+
+from diagnoser import (
+    diagnose, compute_failure_probability, compute_rul_days, classify_severity
+)
+
+TEST_VEHICLE_ID = "MH-07-AB-1234"
+
+
+def make_input(anomaly_type, severity_score, anomaly_detected=True):
+    return {
+        "vehicle_id": TEST_VEHICLE_ID,
+        "anomaly_detected": anomaly_detected,
+        "anomaly_type": anomaly_type,
+        "severity_score": severity_score,
+        "telemetry_window": [{"event_id": "evt_1", "vehicle_id": TEST_VEHICLE_ID}]
+    }
+
+
+class TestDeterministicDiagnoser:
+    """Test the local component mapping and probability/RUL bands"""
+
+    def test_prompt_example(self):
+        """thermal_overheat at 0.75 matches the SYSTEM_PROMPT example output"""
+        result = diagnose(make_input("thermal_overheat", 0.75))
+
+        assert result["vehicle_id"] == TEST_VEHICLE_ID
+        assert result["component"] == "engine_coolant_system"
+        assert result["failure_probability"] == 0.8
+        assert 7 <= result["estimated_rul_days"] <= 30
+        assert result["severity"] == "High"
+        assert result["context_window"][0]["event_id"] == "evt_1"
+        print("✅ Prompt example diagnosis test passed")
+
+    def test_component_mapping(self):
+        """Every mapped anomaly type resolves to its component"""
+        expected = {
+            "oil_overheat": "engine_oil_system",
+            "battery_degradation": "battery",
+            "low_charge": "battery",
+            "rpm_spike": "engine",
+            "rpm_stall": "engine",
+            "gps_anomaly": "gps_system",
+        }
+        for anomaly_type, component in expected.items():
+            assert diagnose(make_input(anomaly_type, 0.5))["component"] == component
+        print("✅ Component mapping test passed")
+
+    def test_llm_types_fall_through(self):
+        """dtc_fault, speed_anomaly and unknown types return None (LLM path)"""
+        assert diagnose(make_input("dtc_fault", 0.7)) is None
+        assert diagnose(make_input("speed_anomaly", 0.5)) is None
+        assert diagnose(make_input("unknown_type", 0.5)) is None
+        print("✅ LLM fall-through test passed")
+
+    def test_no_anomaly(self):
+        """anomaly_detected=false gives zero probability, 180 days, Low"""
+        result = diagnose(make_input(None, None, anomaly_detected=False))
+        assert result["failure_probability"] == 0.0
+        assert result["estimated_rul_days"] == 180
+        assert result["severity"] == "Low"
+        print("✅ No-anomaly diagnosis test passed")
+
+    def test_bands(self):
+        """Probability and RUL follow the prompt bands and are monotonic"""
+        assert compute_failure_probability(None) == 0.0
+        assert 0.2 <= compute_failure_probability(0.2) <= 0.4
+        assert 0.5 <= compute_failure_probability(0.5) <= 0.7
+        assert 0.9 <= compute_failure_probability(0.95) <= 1.0
+
+        assert 90 <= compute_rul_days(0.2) <= 180
+        assert 30 <= compute_rul_days(0.5) <= 90
+        assert 1 <= compute_rul_days(0.95) <= 7
+
+        scores = [i / 20 for i in range(1, 21)]
+        probabilities = [compute_failure_probability(s) for s in scores]
+        ruls = [compute_rul_days(s) for s in scores]
+        assert probabilities == sorted(probabilities)
+        assert ruls == sorted(ruls, reverse=True)
+        assert min(ruls) >= 1
+        print("✅ Probability/RUL band test passed")
+
+    def test_severity_classification(self):
+        assert classify_severity(0.1) == "Low"
+        assert classify_severity(0.3) == "Medium"
+        assert classify_severity(0.69) == "Medium"
+        assert classify_severity(0.7) == "High"
+        print("✅ Severity classification test passed")
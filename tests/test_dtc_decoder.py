@@ -0,0 +1,95 @@
+"""
+Unit tests for the local DTC knowledge base
+(backend/functions/*/dtc_decoder.py)
+
+Run with: python -m pytest tests/test_dtc_decoder.py -v
+"""
+
+import filecmp
+import os
+import sys
+import time
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions'))
+sys.path.insert(0, os.path.join(FUNCTIONS_DIR, 'diagnosis_agent'))
+
+from dtc_decoder import decode_code, decode_codes, summarize_codes, collect_codes
+from diagnoser import diagnose
+
+TEST_VEHICLE_ID = "MH-07-AB-1234"
+
+
+class TestDTCDecoder:
+    """Test code resolution, component attribution and the dtc_fault fast path"""
+
+    def test_decode_single_codes(self):
+        """Generic ranges resolve and narrower ranges override broader ones"""
+        assert decode_code("P0217")["component"] == "engine_coolant_system"
+        assert decode_code("P0301")["component"] == "engine"
+        assert decode_code("P0524")["severity"] == 0.9
+        assert decode_code("P0501")["component"] == "transmission"
+        assert decode_code("P0550")["component"] == "engine"
+        assert decode_code("p0a80")["component"] == "battery"
+        assert decode_code("P1234")["component"] == "transmission"
+        assert decode_code("C0035")["system"] == "chassis"
+        print("✅ Single code decode test passed")
+
+    def test_unknown_and_malformed_codes(self):
+        assert decode_code("P3000") is None
+        assert decode_code("X0123") is None
+        assert decode_code("P01") is None
+        assert decode_code("") is None
+        print("✅ Unknown code test passed")
+
+    def test_summarize_codes(self):
+        """Primary component is the highest-severity component"""
+        summary = summarize_codes(["P0300", "P0217", "P0301", "P0217", "P3000"])
+        assert summary["primary_component"] == "engine_coolant_system"
+        assert summary["components"] == {"engine": 2, "engine_coolant_system": 1}
+        assert summary["max_severity"] == 0.9
+        assert summary["unresolved"] == ["P3000"]
+        assert len(decode_codes(["P0217", "P0217"])) == 1
+        print("✅ Summarize codes test passed")
+
+    def test_collect_codes(self):
+        window = [{"dtc_codes": ["P0217"]}, {"dtc_codes": []}, {"dtc_codes": ["P0217", "P0128"]}, {}]
+        assert collect_codes(window) == ["P0217", "P0128"]
+        print("✅ Collect codes test passed")
+
+    def test_dtc_fault_diagnosed_locally(self):
+        """dtc_fault with known codes skips the LLM; unknown codes fall through"""
+        input_data = {
+            "vehicle_id": TEST_VEHICLE_ID,
+            "anomaly_detected": True,
+            "anomaly_type": "dtc_fault",
+            "severity_score": 0.75,
+            "telemetry_window": [{"event_id": "evt_1", "dtc_codes": ["P0217"]}]
+        }
+        result = diagnose(input_data)
+        assert result["component"] == "engine_coolant_system"
+        assert result["failure_probability"] == 0.8
+        assert result["severity"] == "High"
+
+        input_data["telemetry_window"] = [{"event_id": "evt_1", "dtc_codes": ["P0217", "P3999"]}]
+        assert diagnose(input_data) is None
+        print("✅ dtc_fault fast path test passed")
+
+    def test_lookup_speed(self):
+        """A three-code summary resolves in well under a millisecond"""
+        codes = ["P0217", "P0301", "C0035"]
+        summarize_codes(codes)
+        runs = 2000
+        start = time.perf_counter()
+        for _ in range(runs):
+            summarize_codes(codes)
+        per_call = (time.perf_counter() - start) / runs
+        assert per_call < 0.001
+        print(f"✅ Lookup speed test passed ({per_call * 1e6:.1f}µs per summary)")
+
+    def test_copies_identical(self):
+        """Each Cloud Function deploys its own copy of the decoder"""
+        reference = os.path.join(FUNCTIONS_DIR, 'diagnosis_agent', 'dtc_decoder.py')
+        for function in ('data_analysis_agent', 'rca_agent'):
+            copy = os.path.join(FUNCTIONS_DIR, function, 'dtc_decoder.py')
+            assert filecmp.cmp(reference, copy, shallow=False), f"{function}/dtc_decoder.py differs"
+        print("✅ Decoder copies identical test passed")
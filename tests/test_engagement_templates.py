@@ -0,0 +1,98 @@
+"""
+Unit tests for the engagement template library
+(backend/functions/engagement_agent/engagement_templates.py)
+
+Run with: python -m pytest tests/test_engagement_templates.py -v
+"""
+
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'engagement_agent')))
+
+from engagement_templates import (
+    format_slot, render, root_cause_category, action_class, simulate_decision, template_id, template_key,
+    validate_template
+)
+
+OPENING = ("AI: Namaste $customer_name! This is NaviGo calling about your vehicle $vehicle_id.\n"
+           "Customer: Yes?\n"
+           "AI: Your coolant pump needs replacing. It usually costs ₹2,000-5,000. "
+           "We have a slot on $slot at $service_center.\n")
+TEMPLATE = {
+    "transcripts": {
+        "confirmed": OPENING + "Customer: Okay.\nAI: Your booking ID is $booking_id.",
+        "declined": OPENING + "Customer: Not this week.\nAI: I understand. We'll send the details by SMS.",
+        "no_response": "AI: Namaste! This is NaviGo about $vehicle_id. We have a slot on $slot, please call us back.",
+    }
+}
+
+
+class TestEngagementTemplates:
+    """Test library keys, template validation, per-vehicle decisions, rendering and slot formatting"""
+
+    def test_keys_shared_across_vehicles(self):
+        """Different wording of the same issue maps to one library entry"""
+        a = template_key("Coolant pump failure causing insufficient circulation",
+                         "Replace coolant pump and flush the cooling system")
+        b = template_key("Radiator thermostat stuck, engine overheating",
+                         "Replace the pump, then flush and refill coolant")
+        assert a == b == ("engine_coolant_system", "replace+flush", "en-IN")
+        assert template_id(a) == template_id(b)
+        assert template_key("x", "Inspect", "hi-IN", component="Battery") == ("battery", "inspect", "hi-IN")
+        assert root_cause_category("Unknown noise") == "general"
+        assert action_class(None) == "service"
+        print("✅ Template key test passed")
+
+    def test_validate_template(self):
+        """Only phrasing is cached: one script per decision, with the required and known placeholders"""
+        transcripts = TEMPLATE["transcripts"]
+        assert validate_template({**TEMPLATE, "customer_decision": "confirmed"}) == TEMPLATE
+        assert validate_template({"transcripts": {**transcripts, "no_response": None}}) is None
+        assert validate_template({"transcripts": {**transcripts, "declined": "AI: Hello MH-07-AB-1234"}}) is None
+        assert validate_template({"transcripts": {**transcripts, "confirmed": transcripts["confirmed"] + " $price"}}) is None
+        assert validate_template({"transcript": transcripts["confirmed"], "customer_decision": "confirmed"}) is None
+        print("✅ Template validation test passed")
+
+    def test_render_substitutes_vehicle_fields(self):
+        """Rendering fills vehicle, customer, slot and center and issues a booking ID"""
+        result = render(TEMPLATE, "confirmed", "MH-07-AB-1234", "Swaroop", "Monday, June 2 at 10:00 AM",
+                        "Mumbai Central")
+        assert result["vehicle_id"] == "MH-07-AB-1234"
+        assert re.fullmatch(r"booking_[a-z0-9]{8}", result["booking_id"])
+        transcript = result["transcript"]
+        assert "$" not in transcript
+        assert "Namaste Swaroop" in transcript and "Mumbai Central" in transcript
+        assert result["booking_id"] in transcript
+        declined = render(TEMPLATE, "declined", "V1", "A", "soon", "C")
+        assert declined["booking_id"] is None and declined["customer_decision"] == "declined"
+        assert "Not this week" in declined["transcript"]
+        print("✅ Render test passed")
+
+    def test_decision_chosen_per_vehicle(self):
+        """Vehicles sharing a library entry reach their own decisions from their own inputs"""
+        assert template_key("Coolant pump failure", "Replace coolant pump") == \
+            template_key("Coolant leak at the pump", "Replace the pump")
+        urgent = simulate_decision("MH-07-AB-0003", "scheduling_a", "High", 5)
+        mild = simulate_decision("MH-07-AB-0002", "scheduling_b", "Low", 200)
+        assert urgent == "confirmed" and mild == "declined"
+        assert render(TEMPLATE, urgent, "MH-07-AB-0003", "A", "soon", "C")["booking_id"]
+        assert render(TEMPLATE, mild, "MH-07-AB-0002", "B", "soon", "C")["booking_id"] is None
+        # A redelivered event gets the same decision
+        assert simulate_decision("MH-07-AB-0002", "scheduling_b", "Low", 200) == mild
+
+        def confirm_rate(severity, rul_days):
+            decisions = [simulate_decision(f"V{i:04d}", "s", severity, rul_days) for i in range(1000)]
+            assert set(decisions) <= {"confirmed", "declined", "no_response"}
+            return decisions.count("confirmed") / len(decisions)
+
+        assert confirm_rate("High", 5) > confirm_rate("Medium", 60) > confirm_rate("Low", 200)
+        print("✅ Per-vehicle decision test passed")
+
+    def test_format_slot_in_center_timezone(self):
+        """UTC slots are spoken in the center's local time"""
+        assert format_slot("2025-06-02T04:30:00Z", "Asia/Kolkata") == "Monday, June 2 at 10:00 AM"
+        assert format_slot("2025-06-02T14:00:00Z", "UTC") == "Monday, June 2 at 2:00 PM"
+        assert format_slot("not a slot") == "not a slot"
+        print("✅ Slot formatting test passed")
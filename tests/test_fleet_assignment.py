@@ -0,0 +1,131 @@
+"""
+Unit tests for fleet-wide batch scheduling
+(backend/functions/scheduling_agent/fleet_assignment.py)
+
+Run with: python -m pytest tests/test_fleet_assignment.py -v
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'scheduling_agent')))
+
+from fleet_assignment import assign_requests, center_state, request_priority
+from slot_calendar import slot_calendar, to_minute
+
+# Monday 08:00 UTC
+NOW = datetime(2025, 6, 2, 8, 0, tzinfo=timezone.utc)
+HOURS = {day: {"start": "09:00", "end": "18:00"} for day in
+         ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]}
+
+
+def make_center(center_id, lat, lon, capacity=100, parts=None, days=60):
+    center = {
+        "service_center_id": center_id,
+        "location": {"lat": lat, "lon": lon},
+        "timezone": "UTC",
+        "capacity": capacity,
+        "operating_hours": HOURS,
+        "spare_parts_availability": parts or {"battery": "available", "engine_coolant_system": "available"},
+        "technicians": ["tech_001", "tech_002"],
+    }
+    return center, slot_calendar(center_id, HOURS, "UTC", NOW, days_ahead=days)
+
+
+def make_states(*centers):
+    return {c["service_center_id"]: center_state(c, slots, c["capacity"]) for c, slots in centers}
+
+
+def request(request_id, rul, severity="Medium", component="battery", lat=19.0, lon=72.8):
+    return {
+        "request_id": request_id,
+        "vehicle_id": f"V-{request_id}",
+        "estimated_rul_days": rul,
+        "severity": severity,
+        "component": component,
+        "location": {"lat": lat, "lon": lon},
+        "queued_at": "2025-06-02T07:00:00Z",
+    }
+
+
+class TestFleetAssignment:
+    """Test priority ordering, capacity, no double booking, parts and distance trade-offs"""
+
+    def test_priority_order(self):
+        """Urgent before normal before delayed; lower RUL and higher severity first"""
+        reqs = [request("a", 40), request("b", 3, "Low"), request("c", 3, "High"), request("d", 10)]
+        assert [r["request_id"] for r in sorted(reqs, key=request_priority)] == ["c", "b", "d", "a"]
+        print("✅ Priority order test passed")
+
+    def test_urgent_cases_get_earliest_slots(self):
+        """When urgent vehicles compete for one center, none is double-booked and all stay in the urgent window"""
+        states = make_states(make_center("center_001", 19.0, 72.8))
+        reqs = [request(f"r{i}", 2, "High") for i in range(20)]
+        result = assign_requests(reqs, states, NOW)
+        slots = [a["best_slot"] for a in result["assignments"]]
+        assert len(slots) == 20 and len(set(slots)) == 20
+        now_minute = to_minute(NOW)
+        for slot in slots:
+            days = (to_minute(slot) - now_minute) / 1440
+            assert 1 <= days <= 3.5
+        print("✅ Urgent contention test passed")
+
+    def test_capacity_respected(self):
+        """A center never receives more vehicles than its remaining capacity"""
+        near, near_slots = make_center("near", 19.0, 72.8, capacity=3)
+        far, far_slots = make_center("far", 19.5, 73.2, capacity=100)
+        states = make_states((near, near_slots), (far, far_slots))
+        result = assign_requests([request(f"r{i}", 15) for i in range(10)], states, NOW)
+        centers = [a["service_center"] for a in result["assignments"]]
+        assert centers.count("near") == 3 and centers.count("far") == 7
+        print("✅ Capacity test passed")
+
+    def test_most_urgent_keep_nearest_center(self):
+        """Under scarce capacity the urgent vehicle gets the nearby center"""
+        near, near_slots = make_center("near", 19.0, 72.8, capacity=1)
+        far, far_slots = make_center("far", 21.0, 75.0)
+        states = make_states((near, near_slots), (far, far_slots))
+        result = assign_requests([request("normal", 20), request("urgent", 2, "High")], states, NOW)
+        by_id = {a["request_id"]: a for a in result["assignments"]}
+        assert by_id["urgent"]["service_center"] == "near"
+        assert by_id["normal"]["service_center"] == "far"
+        print("✅ Urgent nearest center test passed")
+
+    def test_parts_and_unassigned(self):
+        """Centers without the part are skipped; requests with no option are reported"""
+        center, slots = make_center("center_001", 19.0, 72.8, parts={"battery": "unavailable"})
+        states = make_states((center, slots))
+        result = assign_requests([request("r1", 5)], states, NOW)
+        assert result["assignments"] == []
+        assert result["unassigned"][0]["request_id"] == "r1"
+        print("✅ Parts / unassigned test passed")
+
+    def test_output_fields(self):
+        """Assignments carry the SchedulingOutput fields with at least 2 fallbacks"""
+        states = make_states(make_center("center_001", 19.0, 72.8))
+        assignment = assign_requests([request("r1", 15)], states, NOW)["assignments"][0]
+        assert {"best_slot", "service_center", "slot_type", "fallback_slots"} <= set(assignment)
+        assert assignment["slot_type"] == "normal"
+        assert len(assignment["fallback_slots"]) >= 2
+        assert assignment["best_slot"] not in assignment["fallback_slots"]
+        print("✅ Output fields test passed")
+
+    def test_recall_batch_latency(self):
+        """500 vehicles across 50 centers are assigned in well under a few seconds"""
+        rng = random.Random(5)
+        centers = [make_center(f"c{i:02d}", rng.uniform(18, 20), rng.uniform(72, 74), capacity=30) for i in range(50)]
+        states = make_states(*centers)
+        reqs = [request(f"r{i}", rng.choice([2, 5, 12, 20, 45]), rng.choice(["Low", "Medium", "High"]),
+                        lat=rng.uniform(18, 20), lon=rng.uniform(72, 74)) for i in range(500)]
+        start = time.perf_counter()
+        result = assign_requests(reqs, states, NOW)
+        elapsed = time.perf_counter() - start
+        print(f"assign_requests: 500 vehicles / 50 centers in {elapsed:.2f} s")
+        assert len(result["assignments"]) == 500
+        pairs = [(a["service_center"], a["best_slot"]) for a in result["assignments"]]
+        assert len(set(pairs)) == len(pairs)
+        assert elapsed < 5
+        print("✅ Recall batch test passed")
@@ -0,0 +1,147 @@
+"""
+Unit tests for the local intent classifier
+(backend/functions/twilio_webhook/intent_model.py, scripts/train_intent_model.py)
+
+Run with: python -m pytest tests/test_intent_model.py -v
+"""
+
+import filecmp
+import json
+import os
+import random
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TWILIO_WEBHOOK_DIR = os.path.join(ROOT, 'backend', 'functions', 'twilio_webhook')
+sys.path.insert(0, TWILIO_WEBHOOK_DIR)
+
+from intent_model import SEED_EXAMPLES, IntentModel, evaluate, examples_from_case, load_model, split
+from voice_turns import model_intent
+
+PHRASES = {
+    "schedule_service": ["that is fine go ahead", "alright put me down for that", "sounds perfect see you then",
+                         "haan theek hai book karo", "please reserve the slot", "count me in for monday"],
+    "decline": ["I will get it done myself", "not interested thank you", "my own mechanic will handle it",
+                "I am selling the car anyway", "leave it for now", "stop calling me"],
+    "ask_question": ["what happens if I keep driving", "is the part covered under warranty",
+                     "can I get a loaner car", "which parts will you change", "do I need to stay there",
+                     "why did this happen so soon"],
+    "emergency": ["there is smoke coming from the bonnet", "the car just stopped on the highway",
+                  "brakes are not working at all", "temperature gauge is in the red and steam everywhere",
+                  "I smell burning from the engine", "car is stuck and will not start on the highway"],
+}
+FILLERS = ["", "hmm ", "okay so ", "actually ", "listen "]
+
+
+def synthetic_examples(count, seed=1):
+    rng = random.Random(seed)
+    labels = list(PHRASES)
+    return [(rng.choice(FILLERS) + rng.choice(PHRASES[label]), label)
+            for label in (rng.choice(labels) for _ in range(count))]
+
+
+class TestIntentModel:
+    """Test labelling, training, calibration, persistence, the voice mapping and the CLI"""
+
+    def test_examples_from_case(self):
+        """Keyword intents label their turns; the last open turn takes the outcome"""
+        transcript = [
+            {"speaker": "agent", "message": "Hello!"},
+            {"speaker": "customer", "message": "kitna lagega", "intent": "cost"},
+            {"speaker": "customer", "message": "will I need to leave it overnight", "intent": "open"},
+            {"speaker": "customer", "message": "1", "intent": "yes"},
+            {"speaker": "customer", "message": "", "intent": "silence"},
+            {"speaker": "customer", "message": "put me down for that", "intent": "open"},
+        ]
+        examples = examples_from_case({"outcome": "confirmed"}, transcript)
+        assert examples == [("kitna lagega", "ask_question"),
+                            ("will I need to leave it overnight", "ask_question"),
+                            ("put me down for that", "schedule_service")]
+        assert examples_from_case({}, transcript)[-1] == ("put me down for that", "ask_question")
+        print("✅ Case labelling test passed")
+
+    def test_questions_are_not_answers(self):
+        """Questions recorded with a yes/no/callback intent, or as the last open turn, are ask_question"""
+        transcript = [
+            {"speaker": "customer", "message": "What happens if I don't fix it?", "intent": "no"},
+            {"speaker": "customer", "message": "okay but is this covered by warranty", "intent": "yes"},
+            {"speaker": "customer", "message": "Can I come later in the week", "intent": "callback"},
+            {"speaker": "customer", "message": "why not", "intent": "yes"},
+            {"speaker": "customer", "message": "fine, put me down for that", "intent": "open"},
+            {"speaker": "customer", "message": "what time was that again?", "intent": "open"},
+        ]
+        examples = examples_from_case({"outcome": "confirmed"}, transcript)
+        assert examples == [("What happens if I don't fix it?", "ask_question"),
+                            ("okay but is this covered by warranty", "ask_question"),
+                            ("Can I come later in the week", "ask_question"),
+                            ("why not", "schedule_service"),
+                            ("fine, put me down for that", "schedule_service"),
+                            ("what time was that again?", "ask_question")]
+        print("✅ Question labelling test passed")
+
+    def test_accuracy_and_calibration(self):
+        """Held-out accuracy is high and confidence tracks accuracy"""
+        train, test = split(synthetic_examples(600))
+        model = IntentModel.train(train + SEED_EXAMPLES)
+        report = evaluate(model, test, threshold=0.85)
+        assert report["accuracy"] >= 0.95
+        assert report["expected_calibration_error"] <= 0.1
+        assert report["coverage"] > 0.5 and report["accuracy_above_threshold"] >= 0.95
+        assert report["latency_us_p95"] < 5000
+        assert model.predict("the engine is smoking on the highway")[0] == "emergency"
+        print("✅ Accuracy and calibration test passed")
+
+    def test_unknown_text_is_not_confident(self):
+        """Text with no known words gets the prior, not a confident guess"""
+        model = IntentModel.train(synthetic_examples(200) + SEED_EXAMPLES)
+        _, confidence = model.predict("zxq blorp")
+        assert confidence < 0.85
+        print("✅ Unknown text test passed")
+
+    def test_save_and_load(self, tmp_path):
+        """A saved model predicts the same after loading; a missing file means no model"""
+        model = IntentModel.train(synthetic_examples(200) + SEED_EXAMPLES)
+        path = str(tmp_path / "intent_model.json")
+        model.save(path)
+        loaded = load_model(path)
+        text = "alright put me down for that"
+        assert loaded.predict(text)[0] == model.predict(text)[0]
+        assert abs(loaded.predict(text)[1] - model.predict(text)[1]) < 1e-9
+        assert load_model(str(tmp_path / "missing.json")) is None
+        print("✅ Save and load test passed")
+
+    def test_voice_turn_mapping(self):
+        """Confident schedule/decline/emergency predictions map to turn intents; questions stay open"""
+        model = IntentModel.train(synthetic_examples(400) + SEED_EXAMPLES)
+        assert model_intent("alright put me down for that", model, 0.85) == "yes"
+        assert model_intent("my own mechanic will handle it", model, 0.85) == "no"
+        assert model_intent("there is smoke coming from the bonnet", model, 0.85) == "human"
+        assert model_intent("is the part covered under warranty", model, 0.85) is None
+        assert model_intent("alright put me down for that", model, 1.01) is None
+        assert model_intent("anything", None, 0.85) is None
+        print("✅ Voice turn mapping test passed")
+
+    def test_training_cli_report(self, tmp_path):
+        """The CLI trains from exported cases and prints the report"""
+        cases = [{"outcome": "confirmed" if label == "schedule_service" else None,
+                  "transcript": [{"speaker": "customer", "message": text,
+                                  "intent": "yes" if label == "schedule_service" else
+                                  "no" if label == "decline" else "open"}]}
+                 for text, label in synthetic_examples(200) if label != "emergency"]
+        path = tmp_path / "cases.json"
+        path.write_text(json.dumps(cases))
+        result = subprocess.run([sys.executable, os.path.join(ROOT, 'scripts', 'train_intent_model.py'),
+                                 "--from-json", str(path), "--report-only"],
+                                capture_output=True, text=True, check=True)
+        assert "labelled customer turns" in result.stdout
+        report = json.loads(result.stdout[result.stdout.index("{"):])
+        assert report["accuracy"] >= 0.9 and "latency_us_p50" in report
+        print("✅ Training CLI test passed")
+
+    def test_copies_identical(self):
+        """twilio_webhook and agents/communication deploy their own copy"""
+        reference = os.path.join(TWILIO_WEBHOOK_DIR, 'intent_model.py')
+        copy = os.path.join(ROOT, 'agents', 'communication', 'intent_model.py')
+        assert filecmp.cmp(reference, copy, shallow=False)
+        print("✅ Intent model copies identical test passed")
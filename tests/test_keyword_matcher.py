@@ -0,0 +1,92 @@
+"""
+Unit tests for the single-pass keyword matcher
+(agents/communication/keyword_matcher.py) and its use as a pre-classifier
+
+Run with: python -m pytest tests/test_keyword_matcher.py -v
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents', 'communication')))
+
+from keyword_matcher import (
+    AMBIGUOUS_CONFIDENCE, DEFAULT_CONFIDENCE, UNAMBIGUOUS_CONFIDENCE, KeywordMatcher, analyze, match_classes
+)
+from llm_service import LLMConfig, LLMService
+
+
+class TestKeywordMatcher:
+    """Test one-pass classification, word boundaries and pre-classification"""
+
+    def test_one_pass_collects_every_class(self):
+        """A phrase can belong to several classes; all of them are reported"""
+        matcher = KeywordMatcher({"a": ["how much"], "b": ["how much", "cost"], "c": ["cost"]})
+        assert matcher.match("How much will it cost?") == {"a", "b", "c"}
+        assert matcher.match("nothing here") == set()
+        print("✅ Multi-class match test passed")
+
+    def test_word_boundaries_and_suffixes(self):
+        """No substring false hits; common suffixes still match"""
+        assert "schedule" not in match_classes("I would like a booklet")
+        assert "decline" not in match_classes("I know the problem")
+        assert "schedule" in match_classes("book it")
+        assert "cost" in match_classes("what does it costs")
+        assert "safety" in match_classes("is it a safety issue")
+        print("✅ Word boundary test passed")
+
+    def test_longest_phrase_wins(self):
+        """"not now" is a decline, not an emergency"""
+        result = analyze("not now, I'm busy")
+        assert result["intent"] == "decline" and result["sentiment"] == "negative"
+        assert result["confidence"] == UNAMBIGUOUS_CONFIDENCE
+        assert analyze("I need help right now")["intent"] == "emergency"
+        print("✅ Longest phrase test passed")
+
+    def test_analysis_fields(self):
+        """Intent, tone, sentiment, language preference and concerns from one call"""
+        result = analyze("Yes please, kindly book it. How long will it take and what is the price?")
+        assert result["tone"] == "formal"
+        assert result["key_concerns"] == ["cost", "timeline"]
+        assert result["intent"] == "schedule_service" and result["confidence"] == AMBIGUOUS_CONFIDENCE
+
+        result = analyze("I'm worried, is the sensor dangerous?")
+        assert result["sentiment"] == "concerned" and result["is_concerned"]
+        assert result["language_preference"] == "technical" and result["key_concerns"] == ["safety"]
+        assert result["intent"] == "ask_question"
+
+        result = analyze("hmm")
+        assert result["intent"] == "ask_question" and result["confidence"] == DEFAULT_CONFIDENCE
+        assert result["tone"] == "neutral" and result["key_concerns"] == []
+        print("✅ Analysis fields test passed")
+
+    def test_preclassifier_skips_llm(self):
+        """Unambiguous messages are answered by the matcher; the rest reach the LLM"""
+        service = LLMService(LLMConfig())
+        service.client = object()
+        service.cache = None
+        calls = []
+
+        def call_llm(prompt):
+            calls.append(prompt)
+            return '{"intent": "schedule_service", "tone": "casual"}'
+
+        service._call_llm = call_llm
+        quick = service.analyze_user_input("yes please book it", [], {})
+        assert quick["method"] == "rules" and quick["intent"] == "schedule_service"
+        assert calls == []
+
+        service.analyze_user_input("yes, but how much will it cost?", [], {})
+        assert len(calls) == 1
+        print("✅ Pre-classifier test passed")
+
+    def test_fast_enough_for_every_turn(self):
+        """Thousands of messages per second on one core"""
+        messages = ["Yes please book it for Monday", "not now, maybe later",
+                    "How much will the brake pad replacement cost?", "I'm worried, is it safe to drive?"] * 500
+        started = time.perf_counter()
+        for message in messages:
+            analyze(message)
+        assert time.perf_counter() - started < 1.0
+        print("✅ Matcher speed test passed")
@@ -0,0 +1,127 @@
+"""
+Unit tests for the LLM reply cache
+(agents/communication/llm_cache.py, LLMService integration)
+
+Run with: python -m pytest tests/test_llm_cache.py -v
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents', 'communication')))
+
+from llm_cache import LLMCache, cache_key, normalize_prompt
+from llm_service import LLMConfig, LLMService
+
+TTLS = {"translate_technical_to_simple": 100, "analyze_user_input": 10, "generate_response": 0}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def service_with(replies, cache):
+    """LLMService whose provider returns the given replies in turn and counts calls"""
+    service = LLMService(LLMConfig())
+    service.client = object()
+    service.cache = cache
+    calls = []
+
+    def call_llm(prompt):
+        calls.append(prompt)
+        return replies[min(len(calls), len(replies)) - 1]
+
+    service._call_llm = call_llm
+    return service, calls
+
+
+class TestLLMCache:
+    """Test keys, both cache tiers, TTLs, metrics and the LLMService integration"""
+
+    def test_key_normalizes_prompt_and_separates_models(self):
+        """Whitespace-only differences share a key; provider, model and temperature do not"""
+        assert normalize_prompt("  Brake  pad\n\n wear ") == "Brake pad wear"
+        key = cache_key("translate", "groq", "llama", 0.7, "Brake pad\n wear")
+        assert key == cache_key("translate", "groq", "llama", 0.7, "Brake pad wear")
+        assert key != cache_key("translate", "gemini", "llama", 0.7, "Brake pad wear")
+        assert key != cache_key("translate", "groq", "llama-2", 0.7, "Brake pad wear")
+        assert key != cache_key("translate", "groq", "llama", 0.2, "Brake pad wear")
+        print("✅ Cache key test passed")
+
+    def test_lru_bound_and_ttl(self):
+        """Memory tier evicts least recently used entries and expires per method"""
+        clock = FakeClock()
+        cache = LLMCache(max_entries=2, ttls=TTLS, clock=clock)
+        method = "translate_technical_to_simple"
+        cache.set(method, "a", "A")
+        cache.set(method, "b", "B")
+        assert cache.get(method, "a") == "A"
+        cache.set(method, "c", "C")  # evicts b, the least recently used
+        assert cache.get(method, "b") is None and cache.get(method, "c") == "C"
+
+        cache.set("analyze_user_input", "d", "D")
+        clock.now += 11
+        assert cache.get("analyze_user_input", "d") is None
+        assert cache.get(method, "c") == "C"  # longer TTL still fresh
+
+        cache.set("generate_response", "e", "E")  # TTL 0: not cached
+        assert cache.get("generate_response", "e") is None
+        print("✅ LRU and TTL test passed")
+
+    def test_sqlite_tier_survives_restart(self, tmp_path):
+        """A new cache on the same file serves earlier replies and promotes them to memory"""
+        clock = FakeClock()
+        db_path = str(tmp_path / "llm_cache.sqlite")
+        LLMCache(ttls=TTLS, db_path=db_path, clock=clock).set("translate_technical_to_simple", "k", "cached")
+
+        cache = LLMCache(ttls=TTLS, db_path=db_path, clock=clock)
+        assert cache.get("translate_technical_to_simple", "k") == "cached"
+        assert cache.get("translate_technical_to_simple", "k") == "cached"
+        counts = cache.report()["methods"]["translate_technical_to_simple"]
+        assert counts["disk_hits"] == 1 and counts["hits"] == 1
+
+        clock.now += 101
+        assert cache.get("translate_technical_to_simple", "k") is None
+        assert cache.prune() == 1
+        print("✅ SQLite tier test passed")
+
+    def test_service_caches_translation(self):
+        """Repeated translations of the same defect text call the LLM once"""
+        service, calls = service_with(["  Your brake pads are worn.  "], LLMCache(ttls=TTLS))
+        for _ in range(5):
+            assert service.translate_technical_to_simple("Brake pad friction material degradation") == "Your brake pads are worn."
+        assert len(calls) == 1
+        report = service.cache_report()
+        assert report["hits"] == 4 and report["misses"] == 1 and report["hit_rate"] == 0.8
+        print("✅ Service translation cache test passed")
+
+    def test_malformed_analysis_is_not_cached(self):
+        """A reply that is not valid JSON falls back and is asked again next time"""
+        replies = ["not json", '{"intent": "schedule_service", "confidence": 0.9}']
+        service, calls = service_with(replies, LLMCache(ttls=TTLS))
+        service.analyze_user_input("hmm let me think about it", [], {})  # rule-based fallback
+        assert len(calls) == 1
+        second = service.analyze_user_input("hmm let me think about it", [], {})
+        third = service.analyze_user_input("hmm let me think about it", [], {})
+        assert second == third == {"intent": "schedule_service", "confidence": 0.9}
+        assert len(calls) == 2
+        third["intent"] = "changed"  # callers get a fresh dict each time
+        assert service.analyze_user_input("hmm let me think about it", [], {})["intent"] == "schedule_service"
+        print("✅ Malformed analysis test passed")
+
+    def test_uncached_method_and_disabled_cache(self):
+        """Methods with TTL 0 and a disabled cache always reach the LLM"""
+        service, calls = service_with(["Hello!"], LLMCache(ttls=TTLS))
+        for _ in range(3):
+            service.generate_response("hi", [], {"registration_number": "MH-12-AB-1234"})
+        assert len(calls) == 3
+
+        service, calls = service_with(["Simple."], None)
+        service.translate_technical_to_simple("x")
+        service.translate_technical_to_simple("x")
+        assert len(calls) == 2 and service.cache_report() is None
+        print("✅ Uncached paths test passed")
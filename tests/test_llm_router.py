@@ -0,0 +1,202 @@
+"""
+Unit tests for hedged multi-provider LLM routing
+(agents/communication/llm_router.py, benchmark_llm_router.py)
+
+Run with: python -m pytest tests/test_llm_router.py -v
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents', 'communication')))
+
+from benchmark_llm_router import FakeProvider, benchmark
+from llm_router import MIN_SAMPLES, CircuitBreaker, LLMRouter, LLMUnavailable
+from llm_service import LLMConfig, LLMService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def sleeper(name, seconds):
+    def call(prompt):
+        time.sleep(seconds)
+        return name
+    return call
+
+
+def failing(prompt):
+    raise RuntimeError("provider down")
+
+
+class TestLLMRouter:
+    """Test circuit breakers, failover, hedging and the LLMService integration"""
+
+    def test_breaker_transitions(self):
+        """Opens after consecutive failures, allows one probe after the reset, closes on success"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=clock)
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+        clock.now = 10
+        assert breaker.available()
+        assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow()  # only one probe
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        clock.now = 20
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+        print("✅ Circuit breaker test passed")
+
+    def test_fast_failover(self):
+        """A failing primary is failed over without waiting for the hedge delay"""
+        router = LLMRouter({"groq": failing, "gemini": sleeper("gemini", 0.01)}, hedge_delay_seconds=2.0)
+        started = time.perf_counter()
+        assert router.complete_sync("hi") == "gemini"
+        assert time.perf_counter() - started < 0.5
+        assert router.hedges == 0
+        print("✅ Fast failover test passed")
+
+    def test_open_breaker_skips_provider(self):
+        """After failure_threshold errors the dead provider is not called any more"""
+        down = FakeProvider("groq", 5, error_rate=1.0)
+        router = LLMRouter({"groq": down, "gemini": sleeper("gemini", 0.005)}, failure_threshold=3)
+        for _ in range(10):
+            assert router.complete_sync("hi") == "gemini"
+        assert down.calls == 3
+        assert router.report()["providers"]["groq"]["state"] == CircuitBreaker.OPEN
+        print("✅ Open breaker test passed")
+
+    def test_hedge_wins_against_slow_primary(self):
+        """A primary stuck past the hedge delay loses to the hedged provider"""
+        router = LLMRouter({"groq": sleeper("groq", 1.0), "gemini": sleeper("gemini", 0.01)},
+                           hedge_delay_seconds=0.05, max_hedge_ratio=1.0)
+        started = time.perf_counter()
+        assert router.complete_sync("hi") == "gemini"
+        assert time.perf_counter() - started < 0.5
+        assert router.hedges == 1 and router.hedge_wins == 1
+        print("✅ Hedge test passed")
+
+    def test_primary_win_is_not_a_hedge_win(self):
+        """A fast primary answers before the hedge delay; nothing is hedged"""
+        router = LLMRouter({"groq": sleeper("groq", 0.01), "gemini": sleeper("gemini", 0.01)},
+                           hedge_delay_seconds=0.5, max_hedge_ratio=1.0)
+        assert router.complete_sync("hi") == "groq"
+        assert router.hedges == 0 and router.hedge_wins == 0
+        print("✅ Primary win test passed")
+
+    def test_hedge_ratio_cap(self):
+        """Hedges stay within max_hedge_ratio of requests even when the primary is always slow"""
+        router = LLMRouter({"groq": sleeper("groq", 0.1), "gemini": sleeper("gemini", 0.1)},
+                           hedge_delay_seconds=0.01, max_hedge_ratio=0.25)
+        for _ in range(12):
+            router.complete_sync("hi")
+        assert router.hedges <= 0.25 * router.requests
+        assert router.hedges >= 1
+        print("✅ Hedge ratio cap test passed")
+
+    def test_hedge_delay_follows_p90(self):
+        """With enough samples the hedge delay is the provider's own p90 latency"""
+        router = LLMRouter({"groq": sleeper("groq", 0.0)}, hedge_delay_seconds=0.8)
+        provider = router.providers[0]
+        assert provider.hedge_delay(0.8) == 0.8
+        for i in range(MIN_SAMPLES):
+            provider.stats.record(0.1 + i / 100)
+        assert provider.hedge_delay(0.8) == pytest.approx(0.1 + 17 / 100)
+        print("✅ Hedge delay test passed")
+
+    def test_all_providers_failed(self):
+        """Every provider failing raises LLMUnavailable with each error"""
+        router = LLMRouter({"groq": failing, "gemini": failing})
+        with pytest.raises(LLMUnavailable) as error:
+            router.complete_sync("hi")
+        assert "groq" in str(error.value) and "gemini" in str(error.value)
+        print("✅ All failed test passed")
+
+    def test_llm_service_routes_through_router(self):
+        """LLMService sends prompts through its router and falls back when every provider fails"""
+        service = LLMService(LLMConfig())
+        service.router = LLMRouter({"groq": failing, "gemini": lambda prompt: '{"response": "Hello from gemini"}'})
+        assert service._call_llm("hi") == '{"response": "Hello from gemini"}'
+
+        service.router = LLMRouter({"groq": failing, "gemini": failing})
+        service.client = object()
+        result = service.translate_technical_to_simple("Brake pad friction material degradation")
+        assert result  # rule-based fallback
+        print("✅ LLMService routing test passed")
+
+    def test_stream_fails_over_before_first_delta(self):
+        """Streaming follows the ranking, fails over until a first delta and records it"""
+        def broken_stream(prompt):
+            raise RuntimeError("provider down")
+            yield  # pragma: no cover
+
+        def slow_stream(prompt):
+            time.sleep(0.5)
+            yield "late"
+
+        def gemini_stream(prompt):
+            yield "Hello "
+            yield "from gemini"
+
+        router = LLMRouter({"groq": failing, "openai": failing, "gemini": failing}, timeout_seconds=0.1,
+                           failure_threshold=1,
+                           streams={"groq": broken_stream, "openai": slow_stream, "gemini": gemini_stream})
+        assert "".join(router.stream("hi")) == "Hello from gemini"
+        report = router.report()["providers"]
+        assert report["groq"]["state"] == "open" and report["openai"]["state"] == "open"
+        assert report["gemini"]["wins"] == 1 and report["gemini"]["stream_first_delta_p50_ms"] is not None
+        assert [p.name for p in router.ranked()] == ["gemini"]  # next stream skips the open breakers
+        print("✅ Stream failover test passed")
+
+    def test_stream_failure_after_first_delta_is_raised(self):
+        """Once text has been streamed the reply is not restarted on another provider"""
+        def cut_off(prompt):
+            yield "Hello "
+            raise RuntimeError("connection reset")
+
+        router = LLMRouter({"groq": failing, "gemini": failing}, failure_threshold=1,
+                           streams={"groq": cut_off, "gemini": lambda prompt: iter(["never"])})
+        deltas = []
+        with pytest.raises(RuntimeError):
+            for delta in router.stream("hi"):
+                deltas.append(delta)
+        assert deltas == ["Hello "] and router.report()["providers"]["groq"]["state"] == "open"
+
+        router = LLMRouter({"groq": failing}, streams={"groq": lambda prompt: iter([])})
+        with pytest.raises(LLMUnavailable):
+            list(router.stream("hi"))
+        print("✅ Stream mid-reply failure test passed")
+
+    def test_llm_service_streams_through_router(self):
+        """LLMService.stream_response uses the router's stream, and falls back when no provider streams"""
+        service = LLMService(LLMConfig())
+        service.client = object()
+        service.router = LLMRouter({"groq": failing, "gemini": failing},
+                                   streams={"groq": lambda prompt: (_ for _ in ()).throw(RuntimeError("down")),
+                                            "gemini": lambda prompt: iter(["Brake pads ", "are worn."])})
+        assert "".join(service.stream_response("what is wrong?", [], {})) == "Brake pads are worn."
+
+        service.router = LLMRouter({"groq": failing}, streams={"groq": lambda prompt: iter([])})
+        assert "".join(service.stream_response("what is wrong?", [], {}))  # rule-based fallback
+        print("✅ LLMService streaming routing test passed")
+
+    def test_benchmark_hedging_cuts_tail(self):
+        """Hedged p99 is below single-provider p99 when one call in ten is slow"""
+        result = benchmark(requests=60, latency_ms=5.0, tail_ms=150.0, tail_rate=0.1)
+        assert result["hedged"]["p99_ms"] < result["single"]["p99_ms"]
+        assert result["hedged"]["hedge_rate"] <= 0.25
+        assert result["outage"]["failures"] == 0 and result["outage"]["primary_calls"] == 3
+        print("✅ Benchmark test passed")
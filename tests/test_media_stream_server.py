@@ -0,0 +1,236 @@
+"""
+Unit tests for the streaming voice mode
+(agents/communication/media_stream_server.py, google_speech.py, fake_twilio.py)
+
+Run with: python -m pytest tests/test_media_stream_server.py -v
+"""
+
+import asyncio
+import os
+import struct
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents', 'communication')))
+
+from agent import VoiceCommunicationAgent
+from fake_twilio import FakeTwilioCall, TextRecognizer, TextSpeech
+from google_speech import GOOGLE_SPEECH_AVAILABLE, GoogleSpeechToText, strip_wav_header
+from media_stream_server import (
+    FOLLOW_UP_PROMPT, SCHEDULE_PROMPT, STREAM_PATH, MediaStreamServer, SentenceChunker, SpeechToText,
+    TextToSpeech, agent_from_parameters, classify_reply
+)
+
+PARAMETERS = {
+    "customer_name": "Rajesh Kumar",
+    "vehicle_id": "VEH001",
+    "registration_number": "MH-12-AB-1234",
+    "component": "brake_pad",
+    "severity": "High",
+    "description": "Brake pad friction material degradation detected",
+    "recommended_action": "Replace brake pads immediately",
+    "estimated_time_to_failure": "7-10 days",
+    "service_center_name": "NaviGo Pune Central",
+    "appointment_time": "Monday at 10 AM",
+}
+
+STREAMED_REPLY = ("Your brake pads are wearing thin, so stopping takes longer than it should. "
+                  "We recommend replacing them within the next week. "
+                  "The service takes about an hour and our team will check the discs too.")
+
+
+class SlowStreamingLLM:
+    """Stands in for LLMService: streams a fixed reply word by word"""
+
+    def __init__(self, delay_seconds=0.02):
+        self.delay_seconds = delay_seconds
+        self.finished_at = None
+
+    def stream_response(self, **kwargs):
+        for word in STREAMED_REPLY.split(" "):
+            time.sleep(self.delay_seconds)
+            yield word + " "
+        self.finished_at = time.perf_counter()
+
+
+def run_call(script, agent_factory=agent_from_parameters, playback_seconds=0.0):
+    """Start a server on a free port, run script(call) against it with the fake client"""
+    async def main():
+        server = MediaStreamServer(TextRecognizer, TextSpeech(), agent_factory, host="127.0.0.1", port=0)
+        port = await server.start()
+        try:
+            url = f"http://127.0.0.1:{port}{STREAM_PATH}"
+            async with FakeTwilioCall(url, PARAMETERS, playback_seconds=playback_seconds) as call:
+                return await script(call)
+        finally:
+            await server.stop()
+
+    return asyncio.run(main())
+
+
+class TestMediaStreamServer:
+    """Test sentence chunking, reply routing and streamed calls against the fake Twilio client"""
+
+    def test_sentence_chunker(self):
+        """Sentences are released as soon as they end; decimals and short fragments are not cut"""
+        chunker = SentenceChunker(min_chars=10)
+        out = []
+        for delta in ["Hello! Your bat", "tery reads 11.8 V", " today. It should", " be replaced"]:
+            out.extend(chunker.feed(delta))
+        assert out == ["Hello! Your battery reads 11.8 V today."]
+        assert chunker.flush() == ["It should be replaced"]
+        assert chunker.flush() == []
+
+        long_run = SentenceChunker(max_chars=40)
+        pieces = long_run.feed("one two three, four five six seven eight nine ten eleven ")
+        assert pieces == ["one two three,", "four five six seven eight nine ten"]
+        print("✅ Sentence chunker test passed")
+
+    def test_classify_reply(self):
+        """Keypresses and unambiguous yes/no are routed locally; anything else is a question"""
+        assert classify_reply("Yes please") == "yes"
+        assert classify_reply("not now, I'm driving") == "no"
+        assert classify_reply("yes but how much will it cost?") == "question"
+        assert classify_reply("How serious is it") == "question"
+        assert classify_reply("Sure, no problem") == "yes"
+        assert classify_reply("no worries, book it") == "yes"
+        assert classify_reply("yes... actually no") == "question"  # both: the agent asks again
+        assert classify_reply("Is it ok to drive") == "question"
+        assert classify_reply("I'm busy") == "no"
+        assert classify_reply(None, "1") == "yes"
+        assert classify_reply(None, "2") == "no"
+        print("✅ Reply classification test passed")
+
+    def test_twiml_connects_stream(self):
+        """The media-stream TwiML connects the call and passes call facts as parameters"""
+        agent = VoiceCommunicationAgent()
+        twiml = agent.generate_twiml_media_stream("wss://example.com/stream", {"customer_name": "Rajesh", "x": None})
+        assert "<Connect><Stream url=\"wss://example.com/stream\">" in twiml
+        assert "<Parameter name=\"customer_name\" value=\"Rajesh\" />" in twiml
+        assert "name=\"x\"" not in twiml and "<Hangup />" in twiml
+        print("✅ Media stream TwiML test passed")
+
+    def test_rule_based_call_flow(self):
+        """Greeting -> explanation -> keypress confirmation, then the server ends the stream"""
+        async def script(call):
+            greeting = await call.listen()
+            await call.say("yes sure")
+            explanation = await call.listen()
+            await call.press("1")
+            confirmation = await call.listen()
+            return greeting, explanation, confirmation, await call.wait_closed()
+
+        greeting, explanation, confirmation, closed = run_call(script)
+        assert "Rajesh Kumar" in greeting[0] and "MH-12-AB-1234" in " ".join(greeting)
+        assert "brake pads" in " ".join(explanation)
+        assert " ".join(explanation).endswith(SCHEDULE_PROMPT)
+        assert "NaviGo Pune Central" in " ".join(confirmation)
+        assert closed
+        print("✅ Rule-based call flow test passed")
+
+    def test_streamed_reply_starts_before_generation_ends(self):
+        """The first sentence of an LLM reply is played while the rest is still generated"""
+        llm = SlowStreamingLLM()
+
+        def llm_agent(parameters):
+            agent = agent_from_parameters(parameters)
+            agent.llm_service, agent.use_llm = llm, True
+            return agent
+
+        async def script(call):
+            await call.listen()
+            await call.say("How serious is this?")
+            return await call.listen()
+
+        reply = run_call(script, llm_agent)
+        assert " ".join(reply) == STREAMED_REPLY + " " + FOLLOW_UP_PROMPT
+        assert len(reply) == 5  # three streamed sentences + the two-sentence follow-up
+
+        async def timed(call):
+            await call.listen()
+            started = time.perf_counter()
+            await call.say("How serious is this?")
+            await call.listen()
+            first_ms = call.timeline[-5][0]
+            generation_ms = (llm.finished_at - started) * 1000
+            return first_ms, generation_ms
+
+        first_ms, generation_ms = run_call(timed, llm_agent)
+        print(f"first audio {first_ms:.0f} ms, generation {generation_ms:.0f} ms")
+        assert first_ms < generation_ms / 2
+        print("✅ Streaming latency test passed")
+
+    def test_barge_in_clears_playback(self):
+        """Speaking over a reply cancels it and clears the queued audio"""
+        def llm_agent(parameters):
+            agent = agent_from_parameters(parameters)
+            agent.llm_service, agent.use_llm = SlowStreamingLLM(delay_seconds=0.05), True
+            return agent
+
+        async def script(call):
+            await call.listen()
+            played = len(call.timeline)
+            await call.say("What exactly is wrong?")
+            while len(call.timeline) <= played:
+                await asyncio.sleep(0.01)
+            await call.press("2")
+            return await call.listen(), call.cleared, await call.wait_closed()
+
+        goodbye, cleared, closed = run_call(script, llm_agent, playback_seconds=0.5)
+        assert cleared == 2  # once over the greeting, once over the streamed answer
+        assert "SMS" in " ".join(goodbye) and closed
+        print("✅ Barge-in test passed")
+
+    def test_speech_interfaces_are_abstract(self):
+        """SpeechToText / TextToSpeech must be implemented before use"""
+        with pytest.raises(TypeError):
+            SpeechToText()
+        with pytest.raises(TypeError):
+            TextToSpeech()
+        assert isinstance(TextRecognizer(), SpeechToText) and isinstance(TextSpeech(), TextToSpeech)
+        print("✅ Abstract speech interfaces test passed")
+
+    def test_strip_wav_header(self):
+        """Text-to-Speech mu-law audio is sent to Twilio without its WAV header"""
+        samples = bytes(range(1, 12))
+        fmt = struct.pack("<HHIIHH", 7, 1, 8000, 8000, 1, 8)
+        wav = (b"RIFF" + struct.pack("<I", 4 + 8 + len(fmt) + 8 + 1 + 8 + len(samples)) + b"WAVE"
+               + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+               + b"LIST" + struct.pack("<I", 1) + b"x\x00"  # odd-sized chunk is padded
+               + b"data" + struct.pack("<I", len(samples)) + samples)
+        assert strip_wav_header(wav) == samples
+        assert strip_wav_header(samples) == samples
+        print("✅ WAV header test passed")
+
+    @pytest.mark.skipif(not GOOGLE_SPEECH_AVAILABLE, reason="google-cloud-speech not installed")
+    def test_google_speech_to_text_returns_finals(self):
+        """Streamed audio reaches Cloud Speech; final transcripts come back from feed()"""
+        class Result:
+            def __init__(self, transcript, is_final):
+                self.is_final = is_final
+                self.alternatives = [type("Alternative", (), {"transcript": transcript})()]
+
+        class FakeSpeechClient:
+            def __init__(self):
+                self.chunks = []
+
+            def streaming_recognize(self, config, requests):
+                for request in requests:
+                    self.chunks.append(request.audio_content)
+                    if len(self.chunks) == 2:
+                        yield type("Response", (), {"results": [Result("yes", False), Result("yes please", True)]})()
+
+        client = FakeSpeechClient()
+        stt = GoogleSpeechToText(client=client)
+        assert stt.feed(b"\xff" * 160) is None
+        stt.feed(b"\xff" * 160)
+        deadline = time.monotonic() + 2
+        text = None
+        while text is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+            text = stt.feed(b"")
+        stt.close()
+        assert text == "yes please" and client.chunks[:2] == [b"\xff" * 160] * 2
+        print("✅ Google speech-to-text test passed")
@@ -0,0 +1,130 @@
+"""
+Unit tests for the per-center slot occupancy index
+(backend/functions/scheduling_agent/occupancy_index.py)
+
+Run with: python -m pytest tests/test_occupancy_index.py -v
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'scheduling_agent')))
+
+import occupancy_index
+from occupancy_index import OccupancyIndex, get_occupancy_index, to_minute
+
+NOW = datetime(2025, 6, 2, 8, 30, tzinfo=timezone.utc)
+
+
+def iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def hour(days, h):
+    return NOW.replace(minute=0) + timedelta(days=days, hours=h - NOW.hour)
+
+
+class FakeQuery:
+    def __init__(self, db, filters=()):
+        self.db = db
+        self.filters = filters
+
+    def where(self, field, op, value):
+        return FakeQuery(self.db, self.filters + ((field, op, value),))
+
+    def stream(self):
+        self.db.queries += 1
+        for booking in self.db.bookings:
+            if all(booking.get(f) == v if op == "==" else booking.get(f) in v for f, op, v in self.filters):
+                yield type("Doc", (), {"to_dict": lambda self, b=booking: dict(b)})()
+
+
+class FakeDB:
+    def __init__(self, bookings):
+        self.bookings = bookings
+        self.queries = 0
+
+    def collection(self, name):
+        assert name == "bookings"
+        return FakeQuery(self)
+
+
+class TestOccupancyIndex:
+    """Test bitmap marking, popcount, earliest-free scans and the cached per-center index"""
+
+    def setup_method(self):
+        occupancy_index._indexes.clear()
+
+    def test_mark_release_is_free(self):
+        """Marked slots are booked; released slots are free again"""
+        index = OccupancyIndex("center_001", NOW)
+        slot = iso(hour(1, 10))
+        assert index.is_free(slot)
+        index.mark(slot)
+        assert not index.is_free(slot)
+        assert not index.is_free(hour(1, 10))
+        assert index.booked_count() == 1
+        index.release(slot)
+        assert index.is_free(slot) and index.booked_count() == 0
+        print("✅ Mark / release test passed")
+
+    def test_overflow_slots(self):
+        """Unaligned and out-of-horizon bookings are still tracked"""
+        index = OccupancyIndex("center_001", NOW)
+        far = iso(hour(90, 10))
+        unaligned = iso(hour(1, 10) + timedelta(minutes=30))
+        index.mark(far)
+        index.mark(unaligned)
+        assert not index.is_free(far) and not index.is_free(unaligned)
+        assert index.booked_count() == 2
+        print("✅ Overflow slot test passed")
+
+    def test_free_slots_and_earliest_free(self):
+        """free_slots filters booked slots; earliest_free skips booked and too-early slots"""
+        index = OccupancyIndex("center_001", NOW)
+        slots = [iso(hour(d, h)) for d in range(1, 4) for h in (9, 10, 11)]
+        index.mark(slots[0])
+        index.mark(slots[1])
+        assert index.free_slots(slots) == slots[2:]
+        assert index.earliest_free(slots) == to_minute(slots[2])
+        assert index.earliest_free(index.mask(slots), after=slots[4]) == to_minute(slots[4])
+        for slot in slots:
+            index.mark(slot)
+        assert index.earliest_free(slots) is None
+        print("✅ Earliest free slot test passed")
+
+    def test_cached_index_and_resync(self):
+        """One bookings query per center; rebuilt only after RESYNC_SECONDS"""
+        db = FakeDB([
+            {"service_center": "center_001", "status": "confirmed", "scheduled_slot": iso(hour(1, 10))},
+            {"service_center": "center_001", "status": "cancelled", "scheduled_slot": iso(hour(1, 11))},
+            {"service_center": "center_002", "status": "pending", "scheduled_slot": iso(hour(1, 12))},
+        ])
+        index = get_occupancy_index(db, "center_001", NOW)
+        assert not index.is_free(iso(hour(1, 10)))
+        assert index.is_free(iso(hour(1, 11))) and index.is_free(iso(hour(1, 12)))
+        assert get_occupancy_index(db, "center_001", NOW) is index
+        assert db.queries == 1
+
+        index.synced_at -= occupancy_index.RESYNC_SECONDS + 1
+        assert get_occupancy_index(db, "center_001", NOW) is not index
+        assert db.queries == 2
+        print("✅ Cached index test passed")
+
+    def test_scan_performance(self):
+        """Earliest-free over a 60-day hourly horizon with most slots booked stays sub-millisecond"""
+        index = OccupancyIndex("center_001", NOW)
+        slots = [hour(d, h) for d in range(1, 61) for h in range(9, 18)]
+        for slot in slots[:-1]:
+            index.mark(slot)
+        candidates = index.mask(slots)
+        start = time.perf_counter()
+        for _ in range(1000):
+            earliest = index.earliest_free(candidates)
+        per_call_ms = (time.perf_counter() - start)
+        assert earliest == to_minute(slots[-1])
+        print(f"earliest_free: {per_call_ms:.4f} ms per call")
+        assert per_call_ms < 1.0
+        print("✅ Scan performance test passed")
@@ -0,0 +1,125 @@
+"""
+Unit tests and latency benchmark for the RCA similarity index
+(backend/functions/rca_agent/rca_index.py)
+
+Run with: python -m pytest tests/test_rca_index.py -v -s
+"""
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'rca_agent')))
+
+from rca_index import RCAIndex, case_tokens, minhash, minhash_many
+
+COMPONENTS = ["engine_coolant_system", "engine_oil_system", "battery", "engine", "transmission", "brake_system"]
+
+
+def coolant_window(start_temp, end_temp, events=10):
+    step = (end_temp - start_temp) / (events - 1)
+    return [
+        {"engine_coolant_temp_c": start_temp + i * step, "engine_rpm": 2200, "speed_kmph": 60, "dtc_codes": []}
+        for i in range(events)
+    ]
+
+
+def random_case(rng):
+    component = rng.choice(COMPONENTS)
+    tokens = [f"component:{component}", f"anomaly:type_{rng.randint(0, 9)}", f"severity:{rng.choice(['Low', 'Medium', 'High'])}"]
+    for signal in range(6):
+        tokens += [
+            f"s{signal}:max:{rng.randint(0, 30)}",
+            f"s{signal}:mean:{rng.randint(0, 30)}",
+            f"s{signal}:trend:{rng.choice(['up', 'down', 'flat'])}",
+        ]
+    return component, tokens
+
+
+class TestRCAIndex:
+    """Test case signatures, matching and incremental inserts"""
+
+    def test_case_tokens(self):
+        tokens = case_tokens("engine_coolant_system", "thermal_overheat", "High", coolant_window(85, 115))
+        assert "component:engine_coolant_system" in tokens
+        assert "anomaly:thermal_overheat" in tokens
+        assert "engine_coolant_temp_c:trend:up" in tokens
+        assert "engine_coolant_temp_c:max:23" in tokens
+        print("✅ Case token test passed")
+
+    def test_similar_case_reused(self):
+        """A near-identical case matches; a different component or pattern does not"""
+        index = RCAIndex()
+        past = case_tokens("engine_coolant_system", "thermal_overheat", "High", coolant_window(85, 115))
+        index.add("rca_past", past, {
+            "component": "engine_coolant_system",
+            "root_cause": "Coolant pump failure",
+            "recommended_action": "Replace coolant pump",
+            "capa_type": "Corrective",
+            "confidence": 0.92,
+        })
+
+        same = case_tokens("engine_coolant_system", "thermal_overheat", "High", coolant_window(86, 116))
+        match = index.match(same, "engine_coolant_system")
+        assert match["rca_id"] == "rca_past"
+        assert match["root_cause"] == "Coolant pump failure"
+        assert match["similarity"] >= 0.85
+
+        assert index.match(same, "battery") is None
+        different = case_tokens("engine_coolant_system", "oil_overheat", "Low", coolant_window(90, 70))
+        assert index.match(different, "engine_coolant_system") is None
+        print("✅ Similar case reuse test passed")
+
+    def test_incremental_and_bulk_inserts(self):
+        """add() and add_many() produce identical signatures; duplicates are ignored"""
+        rng = random.Random(7)
+        cases = [(f"rca_{i}", random_case(rng)[1], {"component": "engine"}) for i in range(50)]
+
+        bulk = RCAIndex(capacity=4)
+        assert bulk.add_many(cases) == 50
+        assert bulk.add_many(cases[:10]) == 0
+
+        incremental = RCAIndex(capacity=4)
+        for rca_id, tokens, payload in cases:
+            assert incremental.add(rca_id, tokens, payload)
+        assert not incremental.add("rca_0", cases[0][1], {})
+
+        assert len(bulk) == len(incremental) == 50
+        signatures = minhash_many([tokens for _, tokens, _ in cases] + [[]])
+        assert (signatures[:50] == np.stack([minhash(tokens) for _, tokens, _ in cases])).all()
+        assert (signatures[50] == minhash([])).all()
+        for rca_id, tokens, _ in cases[:5]:
+            assert bulk.match(tokens, "engine")["rca_id"] == rca_id
+        print("✅ Incremental/bulk insert test passed")
+
+    def test_latency_benchmark_100k(self):
+        """Query latency with 100k indexed cases"""
+        rng = random.Random(42)
+        cases = [random_case(rng) for _ in range(100_000)]
+
+        index = RCAIndex()
+        start = time.perf_counter()
+        index.add_many([(f"rca_{i}", tokens, {"component": component}) for i, (component, tokens) in enumerate(cases)])
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        for component, tokens in cases[:1000]:
+            start = time.perf_counter()
+            match = index.match(tokens, component)
+            latencies.append(time.perf_counter() - start)
+            assert match is not None and match["similarity"] == 1.0
+        latencies.sort()
+        p50, p95 = latencies[500] * 1000, latencies[950] * 1000
+
+        start = time.perf_counter()
+        for i, (component, tokens) in enumerate(cases[:1000]):
+            index.add(f"rca_new_{i}", tokens, {"component": component})
+        insert_ms = (time.perf_counter() - start)  # seconds per 1000 inserts == ms per insert
+
+        assert len(index) == 101_000
+        assert p95 < 20  # generous bound for shared CI machines
+        print(f"✅ 100k benchmark passed: build {build_seconds:.1f}s, query p50 {p50:.2f}ms p95 {p95:.2f}ms, "
+              f"insert {insert_ms:.2f}ms avg")
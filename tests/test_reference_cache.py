@@ -0,0 +1,145 @@
+"""
+Unit tests for the reference-data cache
+(backend/functions/*/reference_cache.py)
+
+Run with: python -m pytest tests/test_reference_cache.py -v
+"""
+
+import filecmp
+import os
+import sys
+
+FUNCTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions'))
+sys.path.insert(0, os.path.join(FUNCTIONS_DIR, 'scheduling_agent'))
+
+import reference_cache
+from reference_cache import TTLCache, get_collection, get_document, invalidate, watch_collection
+
+COPIES = ['scheduling_agent', 'engagement_agent', 'communication_agent']
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocRef:
+    def __init__(self, db, collection, doc_id):
+        self.db, self.collection, self.doc_id = db, collection, doc_id
+
+    def get(self):
+        self.db.reads += 1
+        return FakeDoc(self.doc_id, self.db.data.get(self.collection, {}).get(self.doc_id))
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+
+    def document(self, doc_id):
+        return FakeDocRef(self.db, self.name, doc_id)
+
+    def stream(self):
+        self.db.reads += 1
+        return [FakeDoc(doc_id, data) for doc_id, data in self.db.data.get(self.name, {}).items()]
+
+    def on_snapshot(self, callback):
+        self.db.listeners[self.name] = callback
+        return object()
+
+
+class FakeDB:
+    def __init__(self, data):
+        self.data = data
+        self.reads = 0
+        self.listeners = {}
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+
+class TestReferenceCache:
+    """Test TTL expiry, LRU bounds, copy semantics and snapshot invalidation"""
+
+    def setup_method(self):
+        reference_cache._cache.clear()
+        reference_cache._watches.clear()
+
+    def test_copies_identical(self):
+        """Every function deploys the same reference_cache.py"""
+        reference = os.path.join(FUNCTIONS_DIR, COPIES[0], 'reference_cache.py')
+        for function in COPIES[1:]:
+            assert filecmp.cmp(reference, os.path.join(FUNCTIONS_DIR, function, 'reference_cache.py'), shallow=False), function
+        print("✅ Identical copies test passed")
+
+    def test_document_cached(self):
+        """Second read is served from memory; returned dicts are copies"""
+        db = FakeDB({"vehicles": {"V1": {"owner_name": "Asha", "tags": ["fleet"]}}})
+        vehicle = get_document(db, "vehicles", "V1")
+        vehicle["tags"].append("mutated")
+        assert get_document(db, "vehicles", "V1") == {"owner_name": "Asha", "tags": ["fleet"]}
+        assert db.reads == 1
+        print("✅ Document cache test passed")
+
+    def test_missing_document_not_cached(self):
+        """A missing vehicle is re-read once it exists"""
+        db = FakeDB({"vehicles": {}})
+        assert get_document(db, "vehicles", "V2") is None
+        db.data["vehicles"]["V2"] = {"owner_name": "Ravi"}
+        assert get_document(db, "vehicles", "V2") == {"owner_name": "Ravi"}
+        print("✅ Missing document test passed")
+
+    def test_collection_cached_and_invalidated(self):
+        """One stream per TTL; invalidate() forces a re-read"""
+        db = FakeDB({"service_centers": {"center_001": {"capacity": 15}}})
+        assert get_collection(db, "service_centers") == [("center_001", {"capacity": 15})]
+        get_collection(db, "service_centers")[0][1]["capacity"] = 0
+        assert get_collection(db, "service_centers")[0][1]["capacity"] == 15
+        assert db.reads == 1
+        invalidate("service_centers", "center_001")
+        get_collection(db, "service_centers")
+        assert db.reads == 2
+        print("✅ Collection cache test passed")
+
+    def test_ttl_expiry(self):
+        """Entries expire after the TTL"""
+        cache = TTLCache(max_entries=10, ttl=-1)
+        cache.set("k", "v")
+        assert cache.get("k") is None
+        assert len(cache) == 0
+        print("✅ TTL expiry test passed")
+
+    def test_lru_bound(self):
+        """Least recently used entries are evicted past max_entries"""
+        cache = TTLCache(max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        print("✅ LRU bound test passed")
+
+    def test_snapshot_invalidation(self):
+        """Changes after the initial snapshot invalidate cached entries"""
+        db = FakeDB({"service_centers": {"center_001": {"capacity": 15}}})
+        get_collection(db, "service_centers")
+        assert watch_collection(db, "service_centers")
+        assert watch_collection(db, "service_centers")  # idempotent
+        callback = db.listeners["service_centers"]
+
+        change = type("Change", (), {"document": FakeDoc("center_001", {})})()
+        callback(None, [change], None)  # initial snapshot
+        get_collection(db, "service_centers")
+        assert db.reads == 1
+
+        db.data["service_centers"]["center_001"] = {"capacity": 20}
+        callback(None, [change], None)
+        assert get_collection(db, "service_centers")[0][1]["capacity"] == 20
+        assert db.reads == 2
+        print("✅ Snapshot invalidation test passed")
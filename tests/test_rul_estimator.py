@@ -0,0 +1,114 @@
+"""
+Unit tests for the trend-based RUL estimator
+(backend/functions/diagnosis_agent/rul_estimator.py)
+
+Run with: python -m pytest tests/test_rul_estimator.py -v
+"""
+
+import math
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'diagnosis_agent')))
+
+import rul_estimator
+from rul_estimator import get_fits, update_fits, estimate_rul, fit_trend
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+def make_history(days, signal, values, start=NOW - timedelta(days=30)):
+    return [
+        {"timestamp_utc": (start + timedelta(days=d)).isoformat(), signal: v}
+        for d, v in zip(days, values)
+    ]
+
+
+class TestRULEstimator:
+    """Test least-squares trend fits, incremental updates and RUL extrapolation"""
+
+    def setup_method(self):
+        rul_estimator._fit_cache.clear()
+
+    def test_linear_coolant_trend(self):
+        """Coolant baseline rising 1°C/day from 90°C reaches 110°C 20 days after start"""
+        days = list(range(0, 31))
+        events = make_history(days, "engine_coolant_temp_c", [90.0 + d for d in days], start=NOW - timedelta(days=10))
+        fits = get_fits("V1")
+        assert update_fits(fits, events) == 31
+
+        trend = estimate_rul("engine_coolant_system", fits, now=NOW)
+        assert trend["signal"] == "engine_coolant_temp_c"
+        assert trend["rul_days"] == 10
+        assert math.isclose(trend["slope_per_day"], 1.0, rel_tol=1e-6)
+        assert trend["r_squared"] > 0.99
+        print("✅ Linear coolant trend test passed")
+
+    def test_exponential_soh_decay(self):
+        """SOH decaying 1%/day from 100% crosses 70% after ln(0.7)/ln(0.99) ≈ 35.5 days"""
+        days = list(range(0, 21))
+        events = make_history(days, "battery_soh_pct", [100.0 * 0.99 ** d for d in days], start=NOW - timedelta(days=20))
+        fits = get_fits("V2")
+        update_fits(fits, events)
+
+        trend = estimate_rul("battery", fits, now=NOW)
+        expected = math.log(0.7) / math.log(0.99) - 20
+        assert abs(trend["rul_days"] - expected) <= 1
+        assert math.isclose(trend["slope_per_day"], -1.0, rel_tol=1e-3)
+        print("✅ Exponential SOH decay test passed")
+
+    def test_incremental_matches_batch(self):
+        """Folding history in chunks gives the same fit as one batch; old events are ignored"""
+        days = list(range(0, 40))
+        values = [85.0 + 0.5 * d + (1 if d % 3 else -1) for d in days]
+        events = make_history(days, "engine_coolant_temp_c", values)
+
+        batch = get_fits("batch")
+        update_fits(batch, events)
+
+        incremental = get_fits("incremental")
+        update_fits(incremental, events[:15])
+        update_fits(incremental, events[:25])  # overlaps - only 10 new events
+        update_fits(incremental, events)
+
+        a = fit_trend(batch["signals"]["engine_coolant_temp_c"])
+        b = fit_trend(incremental["signals"]["engine_coolant_temp_c"])
+        assert incremental["signals"]["engine_coolant_temp_c"]["n"] == 40
+        assert math.isclose(a["slope"], b["slope"], rel_tol=1e-9)
+        assert math.isclose(a["intercept"], b["intercept"], rel_tol=1e-9)
+        print("✅ Incremental fit test passed")
+
+    def test_cold_cache_loads_persisted_fits(self):
+        """A cold instance restores fits from the persisted document"""
+        days = list(range(0, 10))
+        fits = get_fits("V3")
+        update_fits(fits, make_history(days, "engine_oil_temp_c", [100.0 + 2 * d for d in days]))
+        stored = {"last_timestamp": fits["last_timestamp"], "signals": {k: dict(v) for k, v in fits["signals"].items()}}
+
+        rul_estimator._fit_cache.clear()
+        restored = get_fits("V3", load=lambda: stored)
+        assert restored["signals"] == fits["signals"]
+        assert get_fits("V3", load=lambda: None) is restored
+        print("✅ Cold cache load test passed")
+
+    def test_no_usable_trend(self):
+        """Too few points, short spans, flat or improving trends and untracked components give None"""
+        fits = get_fits("V4")
+        update_fits(fits, make_history([0, 1, 2], "engine_coolant_temp_c", [90.0, 91.0, 92.0]))
+        assert estimate_rul("engine_coolant_system", fits, now=NOW) is None
+
+        burst = [
+            {"timestamp_utc": (NOW - timedelta(minutes=m)).isoformat(), "engine_coolant_temp_c": 120.0 - m}
+            for m in range(10)
+        ]
+        fits = get_fits("V5")
+        update_fits(fits, burst)
+        assert estimate_rul("engine_coolant_system", fits, now=NOW) is None
+
+        days = list(range(0, 20))
+        fits = get_fits("V6")
+        update_fits(fits, make_history(days, "battery_soh_pct", [80.0 + 0.1 * d for d in days]))
+        assert estimate_rul("battery", fits, now=NOW) is None
+        assert estimate_rul("gps_system", fits, now=NOW) is None
+        print("✅ No usable trend test passed")
@@ -0,0 +1,93 @@
+"""
+Unit tests for precomputed slot calendars
+(backend/functions/scheduling_agent/slot_calendar.py)
+
+Run with: python -m pytest tests/test_slot_calendar.py -v
+"""
+
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'scheduling_agent')))
+
+import slot_calendar
+from slot_calendar import hours_version, slot_calendar as build_calendar, to_iso, to_minute
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), '..', 'test_data', 'service_centers.json')
+
+# Monday 10:00 UTC (aware - the old generator failed on aware start dates)
+NOW = datetime(2025, 6, 2, 10, 0, tzinfo=timezone.utc)
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def load_center():
+    with open(TEST_DATA) as f:
+        return json.load(f)[0]
+
+
+class TestSlotCalendar:
+    """Test operating-hours calendars, timezone handling and the per-day cache"""
+
+    def setup_method(self):
+        slot_calendar._day_cache.clear()
+
+    def test_operating_hours_in_center_timezone(self):
+        """Weekday 09:00-18:00 IST gives 9 slots; Saturday 09:00-15:00 gives 6; Sunday is closed"""
+        center = load_center()
+        slots = build_calendar("center_001", center["operating_hours"], "Asia/Kolkata", NOW, days_ahead=7)
+        by_day = {}
+        for minute in slots:
+            local = datetime.fromtimestamp(minute * 60, IST)
+            by_day.setdefault(local.strftime("%A"), []).append(local.hour)
+        assert by_day["Tuesday"] == list(range(9, 18))
+        assert by_day["Saturday"] == list(range(9, 15))
+        assert "Sunday" not in by_day
+        assert slots == sorted(slots)
+        print("✅ Operating hours test passed")
+
+    def test_iso_boundary(self):
+        """Epoch minutes round-trip to the "YYYY-MM-DDTHH:MM:SSZ" format"""
+        minute = to_minute("2025-06-03T03:30:00Z")
+        assert to_iso(minute) == "2025-06-03T03:30:00Z"
+        assert to_minute(datetime(2025, 6, 3, 9, 0, tzinfo=IST)) == minute
+        assert to_minute("not a slot") is None
+        print("✅ ISO boundary test passed")
+
+    def test_dst_transition(self):
+        """09:00 local stays 09:00 across the US DST change"""
+        hours = {day: {"start": "09:00", "end": "10:00"} for day in slot_calendar.DAY_NAMES}
+        start = datetime(2025, 3, 7, 12, 0, tzinfo=timezone.utc)
+        slots = build_calendar("center_ny", hours, "America/New_York", start, days_ahead=4)
+        utc_hours = [datetime.fromtimestamp(m * 60, timezone.utc).hour for m in slots]
+        assert utc_hours == [14, 13, 13, 13]  # Mar 8 EST, then EDT from 02:00 on Mar 9
+        print("✅ DST transition test passed")
+
+    def test_days_cached_and_versioned(self):
+        """Repeat calls reuse cached days; changing hours changes the version"""
+        center = load_center()
+        build_calendar("center_001", center["operating_hours"], "Asia/Kolkata", NOW, days_ahead=30)
+        cached_days = len(slot_calendar._day_cache)
+        assert cached_days == 30
+        build_calendar("center_001", center["operating_hours"], "Asia/Kolkata", NOW, days_ahead=60)
+        assert len(slot_calendar._day_cache) == 60
+
+        changed = dict(center["operating_hours"], saturday={"closed": True})
+        assert hours_version(changed, "Asia/Kolkata") != hours_version(center["operating_hours"], "Asia/Kolkata")
+        slots = build_calendar("center_001", changed, "Asia/Kolkata", NOW, days_ahead=7)
+        assert all(datetime.fromtimestamp(m * 60, IST).weekday() < 5 for m in slots)
+        print("✅ Cache versioning test passed")
+
+    def test_cached_calendar_latency(self):
+        """A warm 60-day calendar is built far faster than localizing every slot"""
+        center = load_center()
+        build_calendar("center_001", center["operating_hours"], "Asia/Kolkata", NOW, days_ahead=60)
+        start = time.perf_counter()
+        for _ in range(100):
+            build_calendar("center_001", center["operating_hours"], "Asia/Kolkata", NOW, days_ahead=60)
+        per_call_ms = (time.perf_counter() - start) / 100 * 1000
+        print(f"slot_calendar (warm, 60 days): {per_call_ms:.3f} ms per call")
+        assert per_call_ms < 2
+        print("✅ Cached calendar latency test passed")
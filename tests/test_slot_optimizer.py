@@ -0,0 +1,165 @@
+"""
+Unit tests for the constraint-based slot optimizer
+(backend/functions/scheduling_agent/slot_optimizer.py)
+
+Run with: python -m pytest tests/test_slot_optimizer.py -v
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'scheduling_agent')))
+
+from slot_optimizer import optimize_schedule, classify_slot_type, saturated_in_window
+
+# Monday 08:00 UTC
+NOW = datetime(2025, 6, 2, 8, 0, tzinfo=timezone.utc)
+
+
+def parse_slot(slot):
+    return datetime.fromisoformat(slot.replace("Z", "+00:00"))
+
+
+def format_slot(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def hourly_slots(days=60, hours=range(8, 20)):
+    """Hourly UTC slots every day (including weekends and out-of-hours)"""
+    return [
+        format_slot(NOW.replace(hour=0) + timedelta(days=d, hours=h))
+        for d in range(0, days) for h in hours
+    ]
+
+
+def availability(slots, technicians=2):
+    return {f"tech_{i + 1}": slots[i::technicians] for i in range(technicians)}
+
+
+def schedule(rul, severity="Medium", slots=None, parts=None, **kwargs):
+    return optimize_schedule(
+        now=NOW,
+        estimated_rul_days=rul,
+        severity=severity,
+        service_center="center_001",
+        spare_parts_availability=parts or {},
+        technician_availability=availability(slots if slots is not None else hourly_slots()),
+        center_timezone=kwargs.pop("center_timezone", "UTC"),
+        **kwargs
+    )
+
+
+class TestSlotOptimizer:
+    """Test hard constraints, urgency windows, fallbacks and pluggable scoring"""
+
+    def test_classify_slot_type(self):
+        """RUL thresholds: < 7 urgent, < 30 normal, otherwise delayed"""
+        assert classify_slot_type(3) == "urgent"
+        assert classify_slot_type(7) == "normal"
+        assert classify_slot_type(29) == "normal"
+        assert classify_slot_type(30) == "delayed"
+        assert classify_slot_type(None) == "normal"
+        print("✅ Slot type classification test passed")
+
+    def test_output_matches_scheduling_output(self):
+        """Result has exactly the SchedulingOutput fields in the expected formats"""
+        result = schedule(15)
+        assert set(result) == {"best_slot", "service_center", "slot_type", "fallback_slots"}
+        assert result["service_center"] == "center_001"
+        assert result["best_slot"].endswith("Z") and len(result["best_slot"]) == 20
+        assert len(result["fallback_slots"]) >= 2
+        print("✅ Output format test passed")
+
+    def test_urgency_windows(self):
+        """best_slot falls inside the slot_type's window (urgent 1-3, normal 7-14, delayed 30-60 days)"""
+        for rul, (low, high) in [(3, (1, 3)), (15, (7, 14)), (45, (30, 60))]:
+            result = schedule(rul)
+            days = (parse_slot(result["best_slot"]) - NOW).total_seconds() / 86400
+            assert low <= days <= high, (rul, result["best_slot"])
+        print("✅ Urgency window test passed")
+
+    def test_business_hours_and_no_invented_slots(self):
+        """All slots are offered slots on weekdays between 9 AM and 6 PM (center local time)"""
+        offered = set(hourly_slots())
+        for rul in (3, 15, 45):
+            result = schedule(rul, center_timezone="Asia/Kolkata")
+            for slot in [result["best_slot"]] + result["fallback_slots"]:
+                assert slot in offered
+                local = parse_slot(slot).astimezone(timezone(timedelta(hours=5, minutes=30)))
+                assert local.weekday() < 5 and 9 <= local.hour < 18
+        print("✅ Business hours test passed")
+
+    def test_fallbacks_within_seven_days(self):
+        """Fallbacks are distinct from best_slot and within 7 days of it"""
+        result = schedule(15)
+        best = parse_slot(result["best_slot"])
+        assert result["best_slot"] not in result["fallback_slots"]
+        for slot in result["fallback_slots"]:
+            assert abs(parse_slot(slot) - best) <= timedelta(days=7)
+        print("✅ Fallback window test passed")
+
+    def test_earliest_slot_when_window_empty(self):
+        """With no slot inside the window, the nearest feasible slot is chosen"""
+        slots = hourly_slots(days=5)
+        result = schedule(15, slots=slots)
+        assert result["best_slot"] == max(s for s in slots if parse_slot(s).weekday() < 5 and 9 <= parse_slot(s).hour < 18)
+        print("✅ Empty window fallback test passed")
+
+    def test_parts_constraints(self):
+        """Unavailable parts make the center infeasible; in-transit parts delay the slot"""
+        assert schedule(3, parts={"battery": "unavailable"}, required_parts=["battery"]) is None
+        result = schedule(3, parts={"battery": "in_transit"}, required_parts=["battery"])
+        assert parse_slot(result["best_slot"]) >= NOW + timedelta(days=3)
+        print("✅ Parts constraint test passed")
+
+    def test_no_feasible_slots(self):
+        """Only weekend / out-of-hours slots -> None"""
+        weekend = [format_slot(NOW + timedelta(days=5, hours=4))]  # Saturday 12:00
+        assert schedule(15, slots=weekend) is None
+        print("✅ No feasible slot test passed")
+
+    def test_pluggable_scorers(self):
+        """Custom scorers (over epoch-minute slots) replace the defaults"""
+        latest_first = [(1.0, lambda slot, context: -slot)]
+        result = schedule(3, scorers=latest_first)
+        assert parse_slot(result["best_slot"]) > NOW + timedelta(days=50)
+        print("✅ Pluggable scorer test passed")
+
+    def test_forecast_saturation(self):
+        """Days forecast to be saturated are avoided; a center full across the window is flagged"""
+        slots = hourly_slots()
+        baseline = optimize_schedule(NOW, 2, "High", "center_001", {}, availability(slots), "UTC")
+        best_day = baseline["best_slot"][:10]
+        loaded = optimize_schedule(NOW, 2, "High", "center_001", {}, availability(slots), "UTC",
+                                   daily_load={best_day: 1.2})
+        assert loaded["best_slot"][:10] != best_day
+
+        now_minute = int(NOW.timestamp()) // 60
+        full = {format_slot(NOW + timedelta(days=d))[:10]: 0.95 for d in range(0, 15)}
+        assert saturated_in_window(full, now_minute, "urgent")
+        assert not saturated_in_window(dict(full, **{best_day: 0.5}), now_minute, "urgent")
+        assert not saturated_in_window(full, now_minute, "delayed")  # beyond the forecast horizon
+        assert not saturated_in_window(None, now_minute, "urgent")
+        print("✅ Forecast saturation test passed")
+
+    def test_epoch_minute_slots(self):
+        """Technician slots given as epoch minutes give the same result as ISO strings"""
+        slots = hourly_slots()
+        minutes = [int(parse_slot(slot).timestamp()) // 60 for slot in slots]
+        as_iso = optimize_schedule(NOW, 15, "Medium", "center_001", {}, availability(slots), "UTC")
+        as_minutes = optimize_schedule(NOW, 15, "Medium", "center_001", {}, availability(minutes), "UTC")
+        assert as_iso == as_minutes
+        print("✅ Epoch minute slot test passed")
+
+    def test_latency(self):
+        """A 60-day calendar with several technicians is scheduled in milliseconds"""
+        slots = hourly_slots()
+        start = time.perf_counter()
+        for _ in range(20):
+            optimize_schedule(NOW, 15, "High", "center_001", {}, availability(slots, 4), "UTC")
+        per_call_ms = (time.perf_counter() - start) / 20 * 1000
+        print(f"optimize_schedule: {per_call_ms:.2f} ms per call")
+        assert per_call_ms < 100
+        print("✅ Latency test passed")
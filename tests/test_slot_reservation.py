@@ -0,0 +1,203 @@
+"""
+Unit tests for atomic slot reservation
+(backend/functions/scheduling_agent/slot_reservation.py)
+
+Run with: python -m pytest tests/test_slot_reservation.py -v
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'scheduling_agent')))
+
+from google.api_core import exceptions
+
+from slot_calendar import to_minute
+from slot_reservation import (
+    SLOT_LOCKS_COLLECTION, ReservedBatch, release_slot, release_slots, reserve_first_free, reserve_slot,
+    slot_lock_id
+)
+
+# Monday 09:00 UTC onwards, hourly
+FIRST_SLOT = to_minute("2025-06-02T09:00:00Z")
+
+
+class FakeDoc:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocRef:
+    def __init__(self, db, collection, doc_id):
+        self.db, self.collection, self.doc_id = db, collection, doc_id
+
+    def _docs(self):
+        return self.db.data.setdefault(self.collection, {})
+
+    def get(self):
+        with self.db.lock:
+            return FakeDoc(self._docs().get(self.doc_id))
+
+    def create(self, data):
+        """Create-if-absent, atomic like Firestore's create()"""
+        time.sleep(random.random() / 1000)  # widen the race window
+        with self.db.lock:
+            if self.doc_id in self._docs():
+                raise exceptions.AlreadyExists(f"{self.collection}/{self.doc_id}")
+            self._docs()[self.doc_id] = dict(data)
+
+    def delete(self):
+        with self.db.lock:
+            self._docs().pop(self.doc_id, None)
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+
+    def document(self, doc_id):
+        return FakeDocRef(self.db, self.name, doc_id)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db, self.writes = db, []
+
+    def set(self, ref, data):
+        self.writes.append((ref, data))
+
+    def commit(self):
+        self.db.commits += 1
+        if self.db.commits in self.db.failing_commits:
+            raise exceptions.ServiceUnavailable("commit failed")
+        with self.db.lock:
+            for ref, data in self.writes:
+                ref._docs()[ref.doc_id] = dict(data)
+
+
+class FakeDB:
+    """Thread-safe Firestore stand-in"""
+
+    def __init__(self, failing_commits=()):
+        self.data = {}
+        self.lock = threading.Lock()
+        self.commits = 0
+        self.failing_commits = set(failing_commits)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+def ranked_slots(count):
+    """The same stale ranking every scheduler computes before anyone has booked"""
+    return [FIRST_SLOT + 60 * i for i in range(count)]
+
+
+def run_schedulers(db, schedulers, slots, max_attempts):
+    barrier = threading.Barrier(schedulers)
+
+    def schedule(i):
+        barrier.wait()
+        return reserve_first_free(db, "center_001", iter(slots), f"booking_{i}", f"V{i}", max_attempts=max_attempts)
+
+    with ThreadPoolExecutor(max_workers=schedulers) as pool:
+        return list(pool.map(schedule, range(schedulers)))
+
+
+class TestSlotReservation:
+    """Test create-if-absent locks, idempotency, release and concurrent schedulers"""
+
+    def test_reserve_and_conflict(self):
+        """A slot can be reserved once; the same booking may re-claim it"""
+        db = FakeDB()
+        assert reserve_slot(db, "center_001", "2025-06-02T09:00:00Z", "booking_a", "V1")
+        assert not reserve_slot(db, "center_001", FIRST_SLOT, "booking_b", "V2")
+        assert reserve_slot(db, "center_001", FIRST_SLOT, "booking_a", "V1")
+        assert reserve_slot(db, "center_002", FIRST_SLOT, "booking_b", "V2")
+        lock = db.data[SLOT_LOCKS_COLLECTION][slot_lock_id("center_001", FIRST_SLOT)]
+        assert lock["booking_id"] == "booking_a" and lock["slot"] == "2025-06-02T09:00:00Z"
+        print("✅ Reserve / conflict test passed")
+
+    def test_release_only_own_lock(self):
+        """Only the holding booking can release a slot"""
+        db = FakeDB()
+        reserve_slot(db, "center_001", FIRST_SLOT, "booking_a")
+        assert not release_slot(db, "center_001", FIRST_SLOT, "booking_b")
+        assert release_slot(db, "center_001", FIRST_SLOT, "booking_a")
+        assert reserve_slot(db, "center_001", FIRST_SLOT, "booking_b")
+        print("✅ Release test passed")
+
+    def test_release_slots_after_failed_write(self):
+        """Reservations whose booking was not written are all given back, even if one release fails"""
+        db = FakeDB()
+        reserve_slot(db, "center_001", FIRST_SLOT, "booking_a")
+        reserve_slot(db, "center_001", FIRST_SLOT + 60, "booking_b")
+        failing = FakeDB()
+        failing.collection = lambda name: (_ for _ in ()).throw(exceptions.ServiceUnavailable("down"))
+        assert release_slots(failing, [("center_001", FIRST_SLOT, "booking_a")]) == 0
+        released = release_slots(db, [("center_001", FIRST_SLOT, "booking_a"),
+                                      ("center_001", FIRST_SLOT + 60, "booking_b"),
+                                      ("center_001", FIRST_SLOT + 120, "booking_c")])
+        assert released == 2 and not db.data[SLOT_LOCKS_COLLECTION]
+        print("✅ Release after failed write test passed")
+
+    def test_failed_chunk_keeps_committed_bookings(self):
+        """When the second chunk fails, the first stays committed with its locks; only the second's are released"""
+        db = FakeDB(failing_commits={2})
+        writer = ReservedBatch(db, limit=4)  # two bookings (2 writes each) per chunk
+        try:
+            for i in range(5):
+                booking_id = f"booking_{i}"
+                slot = reserve_first_free(db, "center_001", ranked_slots(5), booking_id)
+                writer.hold("center_001", slot, booking_id)
+                writer.batch.set(db.collection("bookings").document(booking_id), {"slot": slot})
+                writer.batch.set(db.collection("rca_cases").document(f"rca_{i}"), {"status": "scheduled"})
+                writer.add(booking_id, writes=2)
+            writer.commit()
+        except exceptions.ServiceUnavailable:
+            assert writer.release_uncommitted() == 2
+        assert writer.committed == ["booking_0", "booking_1"]
+        assert sorted(db.data["bookings"]) == ["booking_0", "booking_1"]
+        locks = db.data[SLOT_LOCKS_COLLECTION]
+        assert sorted(lock["booking_id"] for lock in locks.values()) == ["booking_0", "booking_1"]
+        print("✅ Failed chunk test passed")
+
+    def test_retry_onto_next_free_slot(self):
+        """A lost slot moves the booking to the next candidate"""
+        db = FakeDB()
+        reserve_slot(db, "center_001", FIRST_SLOT, "booking_a")
+        assert reserve_first_free(db, "center_001", ranked_slots(3), "booking_b") == FIRST_SLOT + 60
+        assert reserve_first_free(db, "center_001", ranked_slots(2), "booking_c") is None
+        print("✅ Retry test passed")
+
+    def test_100_parallel_schedulers_no_double_booking(self):
+        """100 schedulers with the same stale view all get distinct slots"""
+        db = FakeDB()
+        results = run_schedulers(db, 100, ranked_slots(150), max_attempts=150)
+        assert None not in results
+        assert max(Counter(results).values()) == 1
+        locks = db.data[SLOT_LOCKS_COLLECTION]
+        assert len(locks) == 100
+        assert len({lock["booking_id"] for lock in locks.values()}) == 100
+        print("✅ 100 parallel schedulers test passed")
+
+    def test_scarce_slots_under_contention(self):
+        """With 20 slots and 100 schedulers exactly 20 win and the rest report failure"""
+        db = FakeDB()
+        results = run_schedulers(db, 100, ranked_slots(20), max_attempts=20)
+        won = [slot for slot in results if slot is not None]
+        assert len(won) == 20 and len(set(won)) == 20
+        assert results.count(None) == 80
+        print("✅ Scarce slots test passed")
@@ -0,0 +1,174 @@
+"""
+Unit tests for bulk SMS dispatch
+(agents/communication/sms_dispatch.py, SMSAgent.send_bulk, load_test_sms_dispatch.py)
+
+Run with: python -m pytest tests/test_sms_dispatch.py -v
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents', 'communication')))
+
+pytest.importorskip("twilio")
+
+from twilio.base.exceptions import TwilioRestException
+
+from load_test_sms_dispatch import load_test
+from sms_agent import SMSAgent
+from sms_dispatch import BulkSMSDispatcher, TokenBucket, is_retryable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def http_error(status):
+    return TwilioRestException(status, "https://api.twilio.com/2010-04-01/Accounts/AC0/Messages.json",
+                               f"HTTP {status}")
+
+
+class Sent:
+    def __init__(self, to):
+        self.sid = f"SM-{to}"
+        self.status = "queued"
+        self.num_segments = "1"
+
+
+class FakeSender:
+    """send callable: fails given recipients with given statuses a number of times"""
+
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})  # to -> [status, ...] raised in order
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, to, from_, body, media_urls=None):
+        with self.lock:
+            self.calls.append((to, from_, time.perf_counter()))
+            pending = self.failures.get(to)
+            if pending:
+                raise http_error(pending.pop(0))
+        return Sent(to)
+
+
+def batch(count):
+    return [{"to": f"+9198{i:08d}", "message": f"Reminder {i}", "reference": f"VEH{i:03d}"} for i in range(count)]
+
+
+class TestSMSDispatch:
+    """Test the token bucket, retries, per-recipient results, SMSAgent.send_bulk and the load test"""
+
+    def test_token_bucket(self):
+        """Burst up front, then one token per 1/rate seconds"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate_per_second=2, burst=3, clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            assert bucket.try_acquire() == 0
+        assert bucket.try_acquire() == pytest.approx(0.5)
+        bucket.acquire()
+        assert clock.now == pytest.approx(0.5)
+        print("✅ Token bucket test passed")
+
+    def test_retries_and_per_recipient_status(self):
+        """Retryable errors are retried with backoff; a bad number fails once; results keep input order"""
+        sender = FakeSender({"+919800000001": [503, 429], "+919800000002": [400], "+919800000003": [503] * 5})
+        sleeps = []
+        dispatcher = BulkSMSDispatcher(sender, ["+15550000001"], rate_per_second=1000, max_attempts=3,
+                                       backoff_seconds=0.001, sleep=lambda s: sleeps.append(s))
+        report = dispatcher.dispatch(batch(5))
+        results = report["results"]
+        assert [r["reference"] for r in results] == ["VEH000", "VEH001", "VEH002", "VEH003", "VEH004"]
+        assert results[1]["status"] == "sent" and results[1]["attempts"] == 3
+        assert results[2]["status"] == "failed" and results[2]["attempts"] == 1 and results[2]["error_status"] == 400
+        assert results[3]["status"] == "failed" and results[3]["attempts"] == 3
+        assert results[0]["message_sid"] == "SM-+919800000000"
+        assert report["summary"]["sent"] == 3 and report["summary"]["failed"] == 2
+        assert report["summary"]["retries"] == 4
+        assert is_retryable(requests.ConnectionError()) and is_retryable(requests.ReadTimeout())
+        assert is_retryable(http_error(429)) and not is_retryable(http_error(404))
+        assert not is_retryable(TypeError()) and not is_retryable(KeyError("to"))
+        print("✅ Retry and status test passed")
+
+    def test_duplicates_sent_once(self):
+        """The same message to the same number in one batch is sent once"""
+        sender = FakeSender()
+        messages = batch(3) + [dict(batch(3)[1], reference="again")]
+        report = BulkSMSDispatcher(sender, ["+15550000001"], rate_per_second=1000).dispatch(messages)
+        assert len(sender.calls) == 3
+        assert report["results"][3]["status"] == "duplicate" and report["results"][3]["duplicate_of"] == 1
+        print("✅ Duplicate test passed")
+
+    def test_rate_limit_per_sender(self):
+        """Each sender stays within its rate; senders share the batch round-robin"""
+        sender = FakeSender()
+        dispatcher = BulkSMSDispatcher(sender, ["+15550000001", "+15550000002"], rate_per_second=20, burst=1)
+        report = dispatcher.dispatch(batch(22))
+        assert report["summary"]["sent"] == 22
+        for number in ("+15550000001", "+15550000002"):
+            times = sorted(t for _, from_, t in sender.calls if from_ == number)
+            assert len(times) == 11
+            assert times[-1] - times[0] >= 10 / 20 * 0.9  # 11 sends need 10 intervals of 1/rate
+        print("✅ Per-sender rate test passed")
+
+    def test_retry_only_transient_errors(self):
+        """A bug in the send path (TypeError) fails once instead of being retried"""
+        def broken_send(to, from_, body, media_urls=None):
+            raise TypeError("unexpected keyword")
+
+        report = BulkSMSDispatcher(broken_send, ["+15550000001"], rate_per_second=1000,
+                                   sleep=lambda s: None).dispatch(batch(2))
+        assert [r["attempts"] for r in report["results"]] == [1, 1]
+        assert report["summary"]["failed"] == 2 and report["summary"]["retries"] == 0
+        print("✅ Non-retryable error test passed")
+
+    def test_concurrent_bulk_sends_share_sender_rate(self):
+        """SMSAgent keeps one bucket per sender, so two concurrent batches share its rate"""
+        sender = FakeSender()
+        agent = SMSAgent()
+        agent.twilio_client = object()
+        agent._create_message = sender
+        agent.sms_senders = ["+15550000001"]
+        agent.sms_rate_per_second = 20
+        first = [dict(m, to="+9197" + m["to"][5:]) for m in batch(15)]
+        threads = [threading.Thread(target=agent.send_bulk, args=(messages,)) for messages in (first, batch(15))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        times = sorted(t for _, _, t in sender.calls)
+        assert len(times) == 30 and list(agent.sms_buckets) == ["+15550000001"]
+        assert times[-1] - times[0] >= (30 - 20) / 20 * 0.9  # one shared burst of 20, then 1/rate apart
+        print("✅ Shared sender rate test passed")
+
+    def test_send_bulk_without_twilio(self):
+        """Without Twilio credentials every recipient is reported as not sent"""
+        agent = SMSAgent()
+        agent.twilio_client = None
+        result = agent.send_bulk(batch(2))
+        assert result["status"] == "error" and result["summary"]["failed"] == 2
+        print("✅ Unconfigured bulk send test passed")
+
+    def test_load_test_against_fake_endpoint(self):
+        """Bulk dispatch through the Twilio client beats sequential sends and recovers from 503s"""
+        result = load_test(messages=80, sequential_sample=10, rate_per_second=50.0,
+                           latency_seconds=0.01, failure_rate=0.05)
+        bulk = result["bulk"]
+        assert bulk["sent"] == 79 and bulk["failed"] == 1  # one invalid number
+        assert result["failed"][0]["error_status"] == 400
+        assert bulk["endpoint"]["failed"] > 0 and bulk["retries"] >= bulk["endpoint"]["failed"]
+        assert bulk["messages_per_second"] > result["sequential_messages_per_second"]
+        assert len(bulk["per_sender"]) == 4
+        print("✅ Load test passed")
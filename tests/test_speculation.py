@@ -0,0 +1,88 @@
+"""
+Unit tests for speculative voice turns
+(backend/functions/twilio_webhook/speculation.py)
+
+Run with: python -m pytest tests/test_speculation.py -v
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'twilio_webhook')))
+
+from speculation import (
+    SPECULATION_TTL_SECONDS, budget_report, serve, should_speculate, speculated_turn,
+    speculation_entry, speculation_prompt
+)
+from voice_turns import STAGE_COMPLETED, STAGE_GREETING, STAGE_QUESTIONS, STAGE_SCHEDULING
+
+NOW = datetime(2025, 6, 2, 8, 0, tzinfo=timezone.utc)
+FACTS = {
+    "customer_name": "Swaroop",
+    "vehicle_id": "MH-07-AB-1234",
+    "issue": "Coolant pump failure causing insufficient circulation.",
+    "recommended_action": "Replace the coolant pump",
+    "slot_text": "Monday, June 2 at 10:00 AM",
+    "service_center": "NaviGo Mumbai Central",
+}
+
+
+def entry(intent, message="It usually costs between 3,000 and 5,000 rupees.", now=NOW, llm_ms=900.0):
+    turn = speculated_turn(intent, {"message": message})
+    return speculation_entry(turn, llm_ms, "p" * 400, "r" * 100, now)
+
+
+class TestSpeculation:
+    """Test when to speculate, the speculative prompts, serving and the budget report"""
+
+    def test_speculate_once_after_informative_turns(self):
+        """Speculation starts after the greeting or explanation, once per call"""
+        assert should_speculate({}, STAGE_GREETING)
+        assert should_speculate({}, STAGE_SCHEDULING)
+        assert not should_speculate({}, STAGE_COMPLETED)
+        assert not should_speculate({"speculation_started": True}, STAGE_SCHEDULING)
+        print("✅ Speculation trigger test passed")
+
+    def test_prompt_carries_defect_context(self):
+        """Each speculative prompt has the caller's likely question and the call facts"""
+        prompt = speculation_prompt("SYSTEM", "cost", FACTS)
+        assert prompt.startswith("SYSTEM")
+        assert "How much will this cost?" in prompt and "Coolant pump failure" in prompt
+        assert "NaviGo Mumbai Central" in prompt
+        assert 'next_stage="completed"' in speculation_prompt("SYSTEM", "no", FACTS)
+        print("✅ Speculation prompt test passed")
+
+    def test_speculated_turns(self):
+        """Question answers keep the confirm prompt; a decline ends the call"""
+        cost = speculated_turn("cost", {"message": " About 4,000 rupees. "})
+        assert cost["message"] == "About 4,000 rupees." and cost["next_stage"] == STAGE_QUESTIONS
+        assert cost["prompt"]
+        declined = speculated_turn("no", {"message": "Okay, please don't wait too long."})
+        assert declined["outcome"] == "declined" and declined["prompt"] is None
+        assert speculated_turn("cost", None) is None
+        assert speculated_turn("cost", {"message": "x" * 1000}) is None
+        print("✅ Speculated turn test passed")
+
+    def test_serve_matching_fresh_turn(self):
+        """Only a ready, fresh speculation for the caller's intent at a serving stage is used"""
+        speculations = {"cost": entry("cost"), "no": speculation_entry(None, 1200.0, "p", "", NOW)}
+        assert serve(speculations, "cost", STAGE_SCHEDULING, NOW + timedelta(seconds=20))["message"].startswith("It usually")
+        assert serve(speculations, "duration", STAGE_SCHEDULING, NOW) is None  # not generated
+        assert serve(speculations, "no", STAGE_SCHEDULING, NOW) is None  # generation failed
+        assert serve(speculations, "cost", STAGE_GREETING, NOW) is None  # caller has not heard the issue yet
+        stale = NOW + timedelta(seconds=SPECULATION_TTL_SECONDS + 1)
+        assert serve(speculations, "cost", STAGE_QUESTIONS, stale) is None
+        assert serve(None, "cost", STAGE_QUESTIONS, NOW) is None
+        print("✅ Serve speculation test passed")
+
+    def test_budget_report(self):
+        """The report counts every speculative call and splits served from wasted"""
+        speculations = {"cost": {**entry("cost"), "served": True}, "duration": entry("duration"), "no": entry("no")}
+        report = budget_report(speculations, served_now="no", call_sid="CA123")
+        assert report["llm_calls"] == 3 and report["llm_ms"] == 2700.0
+        assert report["approx_tokens"] == 3 * 125
+        assert report["served"] == ["cost", "no"] and report["wasted"] == ["duration"]
+        assert report["hit_rate"] == 0.67
+        assert budget_report({})["hit_rate"] is None
+        print("✅ Speculation budget test passed")
@@ -0,0 +1,126 @@
+"""
+Unit tests for technician skills, shifts and workload
+(backend/functions/scheduling_agent/technician_roster.py)
+
+Run with: python -m pytest tests/test_technician_roster.py -v
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'scheduling_agent')))
+
+from fleet_assignment import assign_requests, center_state
+from occupancy_index import OccupancyIndex
+from slot_calendar import slot_calendar, to_iso, to_minute
+from technician_roster import TechnicianRoster, pick_technician, skill_key
+
+# Monday 08:00 UTC
+NOW = datetime(2025, 6, 2, 8, 0, tzinfo=timezone.utc)
+HOURS = {day: {"start": "09:00", "end": "18:00"} for day in
+         ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]}
+MORNINGS = {day: {"start": "09:00", "end": "12:00"} for day in HOURS}
+
+CENTER = {
+    "service_center_id": "center_001",
+    "location": {"lat": 19.0, "lon": 72.8},
+    "timezone": "UTC",
+    "capacity": 100,
+    "operating_hours": HOURS,
+    "spare_parts_availability": {"battery": "available", "brake_system": "available", "transmission": "available"},
+}
+
+TECHNICIANS = [
+    {"technician_id": "tech_001", "service_center_id": "center_001", "skills": ["battery"], "shifts": MORNINGS},
+    {"technician_id": "tech_002", "service_center_id": "center_001", "skills": ["Brake System"], "max_daily_jobs": 1},
+    {"technician_id": "tech_003", "service_center_id": "center_001", "skills": ["general"]},
+    {"technician_id": "tech_004", "service_center_id": "center_001", "skills": ["battery"], "active": False},
+    {"technician_id": "tech_101", "service_center_id": "center_002", "skills": ["battery"]},
+]
+
+
+def free_slots(days=7):
+    return slot_calendar("center_001", HOURS, "UTC", NOW, days_ahead=days)
+
+
+class TestTechnicianRoster:
+    """Test skill matching, shifts, daily job limits and batch allocation"""
+
+    def test_qualified_lookup(self):
+        """Specialists first, generalists as fallback, inactive and other centers excluded"""
+        roster = TechnicianRoster(TECHNICIANS)
+        assert skill_key("Brake System") == "brake_system"
+        assert roster.qualified("center_001", "battery") == ["tech_001"]
+        assert roster.qualified("center_001", "BRAKE_SYSTEM") == ["tech_002"]
+        assert roster.qualified("center_001", "transmission") == ["tech_003"]
+        assert roster.qualified("center_001", None) == ["tech_001", "tech_002", "tech_003"]
+        assert roster.qualified("center_002", "transmission") == []
+        assert not roster.has_center("center_999")
+        print("✅ Qualified lookup test passed")
+
+    def test_shift_calendar(self):
+        """A technician is only offered free slots inside their own shift"""
+        roster = TechnicianRoster(TECHNICIANS)
+        slots = free_slots()
+        booked = to_minute("2025-06-03T10:00:00Z")
+        availability = roster.availability(CENTER, "battery", [s for s in slots if s != booked], NOW)
+        hours = {datetime.fromtimestamp(m * 60, timezone.utc).hour for m in availability["tech_001"]}
+        assert hours == {9, 10, 11}
+        assert booked not in availability["tech_001"]
+        print("✅ Shift calendar test passed")
+
+    def test_daily_job_limit(self):
+        """Days where a technician reached max_daily_jobs are not offered"""
+        roster = TechnicianRoster(TECHNICIANS)
+        occupancy = OccupancyIndex("center_001", NOW)
+        occupancy.mark("2025-06-03T09:00:00Z", "tech_002")
+        availability = roster.availability(CENTER, "brake_system", free_slots(), NOW, occupancy.technician_loads)
+        days = {to_iso(m)[:10] for m in availability["tech_002"]}
+        assert "2025-06-03" not in days and "2025-06-04" in days
+        occupancy.release("2025-06-03T09:00:00Z", "tech_002")
+        assert occupancy.technician_loads["tech_002"]["2025-06-03"] == 0
+        print("✅ Daily job limit test passed")
+
+    def test_pick_least_loaded(self):
+        """The least-loaded technician offering the slot gets the job"""
+        slot = to_minute("2025-06-03T09:00:00Z")
+        availability = {"tech_a": [slot], "tech_b": [slot], "tech_c": []}
+        loads = {"tech_a": {"2025-06-03": 2}, "tech_b": {"2025-06-03": 1}}
+        assert pick_technician(availability, slot, loads) == "tech_b"
+        assert pick_technician(availability, slot + 60, loads) is None
+        print("✅ Pick technician test passed")
+
+    def test_batch_allocation_matches_skills(self):
+        """Batch assignments go to qualified technicians and respect daily limits"""
+        roster = TechnicianRoster(TECHNICIANS)
+        states = {"center_001": center_state(CENTER, free_slots(14), 100, roster=roster)}
+        requests = [
+            {"request_id": f"r{i}", "estimated_rul_days": 2, "severity": "High", "component": component,
+             "location": {"lat": 19.0, "lon": 72.8}, "queued_at": "2025-06-02T07:00:00Z"}
+            for i, component in enumerate(["battery", "brake_system", "brake_system", "transmission"])
+        ]
+        result = assign_requests(requests, states, NOW)
+        by_id = {a["request_id"]: a for a in result["assignments"]}
+        assert by_id["r0"]["technician_id"] == "tech_001"
+        assert datetime.fromisoformat(by_id["r0"]["best_slot"].replace("Z", "+00:00")).hour < 12
+        assert by_id["r1"]["technician_id"] == by_id["r2"]["technician_id"] == "tech_002"
+        assert by_id["r1"]["best_slot"][:10] != by_id["r2"]["best_slot"][:10]  # max_daily_jobs = 1
+        assert by_id["r3"]["technician_id"] == "tech_003"
+        print("✅ Batch skill allocation test passed")
+
+    def test_indexed_lookup_latency(self):
+        """Qualification lookups stay constant-time with thousands of technicians"""
+        skills = ["battery", "brake_system", "transmission", "engine_coolant_system", "general"]
+        roster = TechnicianRoster(
+            {"technician_id": f"t{i}", "service_center_id": f"c{i % 500}", "skills": [skills[i % 5]]}
+            for i in range(10000)
+        )
+        start = time.perf_counter()
+        for i in range(10000):
+            roster.qualified(f"c{i % 500}", "battery")
+        per_call_us = (time.perf_counter() - start) / 10000 * 1e6
+        print(f"qualified: {per_call_us:.2f} us per lookup")
+        assert per_call_us < 50
+        print("✅ Indexed lookup latency test passed")
@@ -0,0 +1,132 @@
+"""
+Unit tests for append-only call transcripts
+(backend/functions/twilio_webhook/transcript_log.py)
+
+Run with: python -m pytest tests/test_transcript_log.py -v
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'twilio_webhook')))
+
+from google.cloud import firestore
+
+from transcript_log import (
+    TRANSCRIPT_SUBCOLLECTION, append_turn, format_history, read_transcript, recent_turns, turn_doc_id, turn_entries
+)
+
+
+class FakeDoc:
+    def __init__(self, data):
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    def __init__(self, docs, field=None, descending=False, limit=None):
+        self.docs, self.field, self.descending, self._limit = docs, field, descending, limit
+
+    def order_by(self, field, direction=None):
+        return FakeQuery(self.docs, field, direction == firestore.Query.DESCENDING, self._limit)
+
+    def limit(self, count):
+        return FakeQuery(self.docs, self.field, self.descending, count)
+
+    def stream(self):
+        docs = sorted(self.docs.values(), key=lambda d: d[self.field], reverse=self.descending)
+        return [FakeDoc(d) for d in docs[:self._limit]]
+
+
+class FakeRef:
+    """Document reference with subcollections; writes land in a shared dict keyed by path"""
+
+    def __init__(self, store, path):
+        self.store, self.path = store, path
+
+    def collection(self, name):
+        return FakeCollection(self.store, f"{self.path}/{name}")
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, store, path):
+        self.store, self.path = store, path
+        prefix = path + "/"
+        super().__init__({k: v for k, v in store.items() if k.startswith(prefix) and "/" not in k[len(prefix):]})
+
+    def document(self, doc_id):
+        return FakeRef(self.store, f"{self.path}/{doc_id}")
+
+
+class FakeBatch:
+    def __init__(self, store):
+        self.store, self.writes = store, []
+
+    def set(self, ref, data):
+        self.writes.append((ref.path, data))
+
+    def commit(self):
+        for path, data in self.writes:
+            self.store[path] = {k: v for k, v in data.items() if v is not firestore.SERVER_TIMESTAMP}
+
+
+def run_call(turns):
+    store = {}
+    case_ref = FakeRef(store, "communication_cases/comm_1")
+    write_sizes = []
+    for n in range(1, turns + 1):
+        batch = FakeBatch(store)
+        entries = turn_entries(f"question number {n}", "open", f"answer number {n}", "2025-06-02T08:00:00Z")
+        append_turn(batch, case_ref, n, entries)
+        write_sizes.append(sum(len(json.dumps(data, default=str)) for _, data in batch.writes))
+        batch.commit()
+    return store, case_ref, write_sizes
+
+
+class TestTranscriptLog:
+    """Test per-turn documents, recent-turn reads and history formatting"""
+
+    def test_turn_documents_sort_in_call_order(self):
+        """Zero-padded IDs keep lexicographic and call order the same"""
+        assert turn_doc_id(7) == "00007"
+        assert sorted(turn_doc_id(n) for n in (10, 9, 100)) == ["00009", "00010", "00100"]
+        print("✅ Turn document ID test passed")
+
+    def test_per_turn_write_is_constant(self):
+        """A long call writes the same amount per turn; nothing accumulates on the case"""
+        store, case_ref, write_sizes = run_call(300)
+        assert max(write_sizes) - min(write_sizes) <= 6  # only the digits of the turn number differ
+        assert len([k for k in store if f"/{TRANSCRIPT_SUBCOLLECTION}/" in k]) == 300
+        assert "communication_cases/comm_1" not in store
+        print("✅ Constant write size test passed")
+
+    def test_retried_turn_is_not_duplicated(self):
+        """A Twilio retry of the same turn rewrites its document"""
+        store, case_ref, _ = run_call(3)
+        batch = FakeBatch(store)
+        append_turn(batch, case_ref, 3, turn_entries("question number 3", "open", "answer number 3", "t"))
+        batch.commit()
+        assert len(read_transcript(case_ref)) == 6
+        print("✅ Retried turn test passed")
+
+    def test_recent_turns_and_full_read(self):
+        """Prompt context is the last K turns in order; the full transcript is still readable"""
+        _, case_ref, _ = run_call(12)
+        recent = recent_turns(case_ref, 4)
+        assert [turn["turn"] for turn in recent] == [9, 10, 11, 12]
+        transcript = read_transcript(case_ref)
+        assert len(transcript) == 24 and transcript[0]["message"] == "question number 1"
+        assert transcript[-1] == {"speaker": "agent", "message": "answer number 12", "timestamp": "2025-06-02T08:00:00Z"}
+        print("✅ Recent turns test passed")
+
+    def test_format_history(self):
+        """History lines skip empty input and truncate long messages"""
+        turns = [{"turn": 1, "entries": turn_entries("", "silence", "Hello Swaroop!", "t")},
+                 {"turn": 2, "entries": turn_entries("yes", "yes", "x" * 300, "t")}]
+        history = format_history(turns, max_chars=50)
+        assert history.splitlines() == ["Agent: Hello Swaroop!", "Customer: yes", "Agent: " + "x" * 50 + "..."]
+        assert format_history([]) == "No previous conversation."
+        print("✅ History formatting test passed")
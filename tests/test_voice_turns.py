@@ -0,0 +1,124 @@
+"""
+Unit tests for the voice turn pipeline
+(backend/functions/twilio_webhook/voice_turns.py)
+
+Run with: python -m pytest tests/test_voice_turns.py -v
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'functions', 'twilio_webhook')))
+
+from voice_turns import (
+    STAGE_COMPLETED, STAGE_GREETING, STAGE_PENDING, STAGE_QUESTIONS, STAGE_SCHEDULING,
+    TURN_LATENCY_TARGET_MS, TurnMetrics, build_facts, detect_intent, format_slot,
+    holding_response, precomputed_response
+)
+
+CONTEXT = {"customer_name": "Swaroop", "vehicle_id": "MH-07-AB-1234", "case_id": "case_1"}
+DOSSIER = {
+    "rca": {"root_cause": "Coolant pump failure causing insufficient circulation.",
+            "recommended_action": "Replace the coolant pump"},
+    "scheduling": {"best_slot": "2025-06-02T04:30:00Z", "service_center": "center_001"},
+}
+CENTER = {"name": "NaviGo Mumbai Central", "timezone": "Asia/Kolkata"}
+
+
+class TestVoiceTurns:
+    """Test local intents, precomputed responses, holding responses and turn metrics"""
+
+    def test_detect_intent(self):
+        """Yes/no/DTMF and common questions are detected locally; the rest is open"""
+        assert detect_intent("Yes, that works") == "yes"
+        assert detect_intent("haan theek hai") == "yes"
+        assert detect_intent("No thanks") == "no"
+        assert detect_intent("I don't know, how much will it cost?") == "cost"
+        assert detect_intent("I'm driving, call me back later") == "callback"
+        assert detect_intent("Where is the service center?") == "location"
+        assert detect_intent("", "1") == "yes"
+        assert detect_intent("", "2") == "no"
+        assert detect_intent("   ") == "silence"
+        assert detect_intent("Is the pump covered under my extended warranty?") == "open"
+        assert detect_intent("I know the car makes a noise") == "open"  # "know" is not "no"
+        assert detect_intent("Sure, no problem") == "yes"
+        assert detect_intent("no problem, book it") == "yes"
+        assert detect_intent("No worries, go ahead") == "yes"
+        assert detect_intent("why not") == "yes"
+        assert detect_intent("I don't mind, that works") == "yes"
+        assert detect_intent("yes... actually no") == "open"  # conflicting: the LLM decides
+        assert detect_intent("No, no problem at all") == "open"
+        # Questions are never final answers, whatever yes/no/callback words they contain
+        assert detect_intent("What happens if I don't fix it?") == "open"
+        assert detect_intent("No, wait, what slot was that?") == "open"
+        assert detect_intent("Can I come later in the week?") == "open"
+        assert detect_intent("okay but is this covered by warranty") == "open"
+        assert detect_intent("Why not tomorrow instead?") == "open"
+        assert detect_intent("ok") == "open"
+        assert detect_intent("I don't") == "open"
+        assert detect_intent("yes please go ahead but only if the parts are already in stock there") == "open"
+        print("✅ Intent detection test passed")
+
+    def test_call_flow(self):
+        """Greeting -> explanation with the slot -> confirmation, without the LLM"""
+        facts = build_facts(CONTEXT, DOSSIER, CENTER)
+        assert facts["slot_text"] == "Monday, June 2 at 10:00 AM"
+
+        first = precomputed_response("silence", STAGE_PENDING, facts)
+        assert "Swaroop" in first["message"] and first["next_stage"] == STAGE_GREETING
+
+        explain = precomputed_response("yes", STAGE_GREETING, facts)
+        assert "coolant pump failure" in explain["message"].lower()
+        assert "June 2 at 10:00 AM at NaviGo Mumbai Central" in explain["message"]
+        assert explain["next_stage"] == STAGE_SCHEDULING
+
+        cost = precomputed_response("cost", STAGE_SCHEDULING, facts)
+        assert cost["next_stage"] == STAGE_QUESTIONS and cost["prompt"]
+
+        confirm = precomputed_response("yes", STAGE_QUESTIONS, facts)
+        assert confirm["outcome"] == "confirmed" and confirm["next_stage"] == STAGE_COMPLETED
+        assert confirm["prompt"] is None
+
+        declined = precomputed_response("no", STAGE_SCHEDULING, facts)
+        assert declined["outcome"] == "declined"
+        print("✅ Call flow test passed")
+
+    def test_open_questions_need_llm(self):
+        """Open questions fall through to the LLM; a missed budget keeps the caller in the flow"""
+        facts = build_facts(CONTEXT, DOSSIER, CENTER)
+        assert precomputed_response("open", STAGE_SCHEDULING, facts) is None
+        holding = holding_response(STAGE_SCHEDULING)
+        assert holding["next_stage"] == STAGE_SCHEDULING and holding["prompt"]
+        print("✅ Open question test passed")
+
+    def test_missing_facts(self):
+        """Responses still read naturally without a dossier"""
+        facts = build_facts(CONTEXT, {})
+        message = precomputed_response("yes", STAGE_GREETING, facts)["message"]
+        assert "None" not in message
+        assert format_slot(None) is None
+        print("✅ Missing facts test passed")
+
+    def test_turn_metrics(self):
+        """p95 is the nearest-rank 95th percentile over the window"""
+        metrics = TurnMetrics(window=100)
+        for latency in range(1, 101):
+            metrics.record(float(latency), "local")
+        assert metrics.p95() == 95.0
+        entry = metrics.record(2000.0, "llm", "CA123")
+        assert entry["metric"] == "voice_turn_latency_ms" and entry["target_ms"] == TURN_LATENCY_TARGET_MS
+        assert metrics.paths == {"local": 100, "llm": 1}
+        print("✅ Turn metrics test passed")
+
+    def test_local_turn_latency(self):
+        """Intent detection plus a precomputed response takes well under a millisecond"""
+        facts = build_facts(CONTEXT, DOSSIER, CENTER)
+        utterances = ["yes please", "no", "how much does it cost", "call me back later", "where is it"]
+        start = time.perf_counter()
+        for i in range(10000):
+            precomputed_response(detect_intent(utterances[i % 5]), STAGE_SCHEDULING, facts)
+        per_turn_us = (time.perf_counter() - start) / 10000 * 1e6
+        print(f"local turn: {per_turn_us:.1f} us")
+        assert per_turn_us < 1000
+        print("✅ Local turn latency test passed")